@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark del almacén de reparaciones: compara las búsquedas lineales
+sobre la lista completa con las búsquedas mediante índices del controlador.
+
+Uso:
+    python bench_reparaciones.py [numero_reparaciones]
+"""
+
+import os
+import io
+import sys
+import random
+import shutil
+import tempfile
+import timeit
+import contextlib
+
+# Añadir src al path, igual que main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from database.journal import JournalStore
+from controllers.reparacion_controller import ReparacionController
+
+ESTADOS = ["Pendiente", "En Diagnóstico", "En Reparación", "Esperando Repuestos", "Terminada", "Entregada"]
+NUM_CAMIONES = 5000
+NUM_MECANICOS = 200
+REPETICIONES = 200
+
+
+def generar_instantanea(ruta, total):
+    """Escribe una instantánea con el número de reparaciones indicado"""
+    rnd = random.Random(42)
+    reparaciones = []
+    for i in range(1, total + 1):
+        reparaciones.append({
+            'id': i,
+            'matricula': f"ABC-{i:06d}",
+            'camion_id': f"{rnd.randrange(NUM_CAMIONES):024x}",
+            'mecanico_id': f"{rnd.randrange(NUM_MECANICOS):024x}",
+            'estado': rnd.choice(ESTADOS),
+            'fecha_ingreso': '2024-01-01',
+            'total': 0.0
+        })
+    JournalStore(ruta, clave_registros='reparaciones').reemplazar(reparaciones, total)
+
+
+def medir(nombre, funcion, claves):
+    """Ejecuta una búsqueda para cada clave y muestra el tiempo medio en microsegundos"""
+    iterador = iter(claves * (REPETICIONES // len(claves) + 1))
+    with contextlib.redirect_stdout(io.StringIO()):
+        segundos = timeit.timeit(lambda: funcion(next(iterador)), number=REPETICIONES)
+    media = segundos / REPETICIONES * 1e6
+    print(f"  {nombre:<28} {media:>12.1f} µs/consulta")
+    return media
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    directorio = tempfile.mkdtemp(prefix='bench_reparaciones_')
+
+    try:
+        ruta = os.path.join(directorio, 'reparaciones.json')
+        generar_instantanea(ruta, total)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            controller = ReparacionController(ruta)
+        lista = controller.reparaciones
+
+        rnd = random.Random(7)
+        ids = [rnd.randint(1, total) for _ in range(50)]
+        camiones = [f"{rnd.randrange(NUM_CAMIONES):024x}" for _ in range(50)]
+        mecanicos = [f"{rnd.randrange(NUM_MECANICOS):024x}" for _ in range(50)]
+
+        # Búsquedas lineales equivalentes a la implementación anterior
+        def lineal_id(id_reparacion):
+            for r in lista:
+                if r['id'] == id_reparacion:
+                    return r
+            return None
+
+        casos = [
+            ("por id", ids,
+             lineal_id,
+             controller.obtener_reparacion),
+            ("por camión", camiones,
+             lambda c: [r for r in lista if str(r.get('camion_id')) == str(c)],
+             controller.obtener_reparaciones_por_camion),
+            ("por mecánico", mecanicos,
+             lambda m: [r for r in lista if str(r.get('mecanico_id')) == str(m)],
+             controller.obtener_reparaciones_por_mecanico),
+            ("por estado", ESTADOS,
+             lambda e: [r for r in lista if r.get('estado') == e],
+             controller.obtener_reparaciones_por_estado),
+        ]
+
+        print(f"Reparaciones: {total}")
+        for nombre, claves, lineal, indexada in casos:
+            print(f"Búsqueda {nombre}:")
+            t_lineal = medir("lineal", lineal, claves)
+            t_indexada = medir("indexada", indexada, claves)
+            print(f"  {'aceleración':<28} {t_lineal / t_indexada:>12.1f}x")
+
+        controller.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
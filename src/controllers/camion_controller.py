@@ -1,53 +1,39 @@
 import datetime
 import logging
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-import os
-import json
+from pymongo import ASCENDING
+from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar
+from database.exportacion import exportar_coleccion
+from database.importacion import importar_csv
+from models.camion import Camion
+from utils.texto import filtro_prefijo
 
 class CamionController:
     """Controlador para gestionar operaciones con camiones"""
     
+    # Encabezados del CSV de importación (normalizados) y campo que rellenan
+    COLUMNAS_CSV = {
+        'matricula': 'matricula',
+        'modelo': 'modelo',
+        'anio': 'anio',
+        'ano': 'anio',
+        'estado': 'estado'
+    }
+    
     def __init__(self):
         """Inicializa el controlador de camiones conectando a la base de datos"""
         try:
-            # Obtener configuración de la base de datos
-            self.config = self._cargar_configuracion()
-            
-            # Conectar a MongoDB
-            self.client = MongoClient(self.config.get('mongodb_uri', 'mongodb://localhost:27017'))
-            self.db = self.client[self.config.get('mongodb_db', 'gestion_camiones')]
-            self.collection = self.db['camiones']
+            # Usar el cliente compartido del proceso
+            self.db_connection = DatabaseConnection()
+            self.collection = self.db_connection.get_camiones_collection()
+            self.cache = EntityCache.de_coleccion('camiones')
             
         except Exception as e:
             logging.error(f"Error al conectar a la base de datos: {str(e)}")
             raise
     
-    def _cargar_configuracion(self):
-        """Carga la configuración de la aplicación"""
-        try:
-            # Ruta al archivo de configuración
-            config_dir = os.path.join(os.path.expanduser('~'), 'AppData', 'Roaming', 'GestionCamiones')
-            config_file = os.path.join(config_dir, 'config.json')
-            
-            # Verificar si existe el archivo y cargarlo
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    return json.load(f)
-            else:
-                # Configuración por defecto
-                return {
-                    'mongodb_uri': 'mongodb://localhost:27017',
-                    'mongodb_db': 'gestion_camiones'
-                }
-        except Exception as e:
-            logging.error(f"Error al cargar configuración: {str(e)}")
-            # Configuración por defecto en caso de error
-            return {
-                'mongodb_uri': 'mongodb://localhost:27017',
-                'mongodb_db': 'gestion_camiones'
-            }
-    
     def obtener_camiones(self, filtros=None):
         """
         Obtiene los camiones según los filtros especificados
@@ -63,9 +49,9 @@ class CamionController:
             
             # Aplicar filtros si existen
             if filtros:
-                # Filtro por matrícula
+                # Filtro por prefijo de matrícula (sobre la clave normalizada)
                 if 'matricula' in filtros and filtros['matricula']:
-                    query['matricula'] = {'$regex': filtros['matricula'], '$options': 'i'}
+                    query.update(filtro_prefijo('matricula_busqueda', filtros['matricula'], ''))
                 
                 # Filtro por modelo
                 if 'modelo' in filtros and filtros['modelo']:
@@ -102,9 +88,12 @@ class CamionController:
             if isinstance(id_camion, str):
                 id_camion = ObjectId(id_camion)
             
-            camion = self.collection.find_one({'_id': id_camion})
+            camion = self.cache.leer(self.collection, id_camion)
             
             if camion:
+                # Copia: el documento de la caché se comparte
+                camion = dict(camion)
+                
                 # Convertir ObjectId a string
                 camion['_id'] = str(camion['_id'])
                 return camion
@@ -153,11 +142,13 @@ class CamionController:
             
             # Agregar fecha de creación
             datos_camion['fecha_creacion'] = datetime.datetime.now()
+            datos_camion.update(Camion.claves_busqueda(datos_camion))
             
             # Insertar en la base de datos
             resultado = self.collection.insert_one(datos_camion)
             
             if resultado.inserted_id:
+                publicar('camiones', INSERCION, resultado.inserted_id)
                 return str(resultado.inserted_id)
             
             return None
@@ -186,12 +177,17 @@ class CamionController:
             
             # Agregar fecha de actualización
             datos_camion['fecha_actualizacion'] = datetime.datetime.now()
+            if 'matricula' in datos_camion:
+                datos_camion.update(Camion.claves_busqueda(datos_camion))
             
             # Actualizar en la base de datos
             resultado = self.collection.update_one(
                 {'_id': id_camion},
                 {'$set': datos_camion}
             )
+            self.cache.invalidar(id_camion)
+            if resultado.modified_count:
+                publicar('camiones', ACTUALIZACION, id_camion)
             
             return resultado.modified_count > 0
         except Exception as e:
@@ -215,19 +211,24 @@ class CamionController:
             
             # Eliminar de la base de datos
             resultado = self.collection.delete_one({'_id': id_camion})
+            self.cache.invalidar(id_camion)
+            if resultado.deleted_count:
+                publicar('camiones', ELIMINACION, id_camion)
             
             return resultado.deleted_count > 0
         except Exception as e:
             logging.error(f"Error al eliminar camión: {str(e)}")
             raise
     
-    def _validar_datos_camion(self, datos, es_actualizacion=False):
+    def _validar_datos_camion(self, datos, es_actualizacion=False, comprobar_duplicados=True):
         """
         Valida los datos de un camión
         
         Args:
             datos: Diccionario con los datos del camión
             es_actualizacion: Indica si es una actualización o un nuevo registro
+            comprobar_duplicados: Si se consulta la base de datos para buscar
+                                  la matrícula; la importación lo deja al índice único
         
         Raises:
             ValueError: Si los datos no son válidos
@@ -240,7 +241,7 @@ class CamionController:
                     raise ValueError(f"El campo '{campo}' es obligatorio")
         
         # Validar matrícula
-        if 'matricula' in datos and datos['matricula']:
+        if comprobar_duplicados and 'matricula' in datos and datos['matricula']:
             # Verificar si ya existe otro camión con la misma matrícula
             camion_existente = self.collection.find_one({
                 'matricula': datos['matricula'],
@@ -260,6 +261,66 @@ class CamionController:
                 raise ValueError("El año debe ser un número entero")
         
     
+    def importar_desde_csv(self, ruta_archivo, progreso=None, ruta_rechazos=None):
+        """
+        Importa camiones desde un archivo CSV
+        
+        Las filas se validan con las mismas reglas que el formulario; las
+        matrículas que ya existen las rechaza el índice único al escribir.
+        
+        Args:
+            ruta_archivo: Ruta del archivo CSV
+            progreso: Función (leidas, importadas, rechazadas, fracción) llamada tras cada lote
+            ruta_rechazos: Archivo de las filas rechazadas (por defecto, junto al CSV)
+        
+        Returns:
+            Diccionario con el resumen de la importación
+        """
+        def preparar(datos):
+            self._validar_datos_camion(datos, comprobar_duplicados=False)
+            estado = datos.get('estado', Camion.ESTADO_OPERATIVO)
+            if estado not in Camion.ESTADOS_VALIDOS:
+                raise ValueError(f"El estado '{estado}' no es válido")
+            return Camion(datos['matricula'], datos['modelo'], int(datos['anio']), estado).to_dict()
+        
+        try:
+            return importar_csv(ruta_archivo, self.collection, self.COLUMNAS_CSV, preparar,
+                                progreso, ruta_rechazos)
+        except Exception as e:
+            logging.error(f"Error al importar camiones desde CSV: {str(e)}")
+            raise
+    
+    def exportar_a_csv(self, ruta_archivo, progreso=None, cancelacion=None, comprimir=None):
+        """
+        Exporta todos los camiones a un archivo CSV leyendo el cursor por lotes
+        
+        Args:
+            ruta_archivo: Ruta del archivo CSV (si termina en '.gz' se comprime)
+            progreso: Función (escritas, total) llamada cada lote de filas
+            cancelacion: threading.Event que detiene la exportación si se activa
+            comprimir: Fuerza o desactiva la compresión gzip
+        
+        Returns:
+            Diccionario con las filas escritas y si se canceló
+        """
+        columnas = [
+            ('ID', '_id'),
+            ('Matrícula', 'matricula'),
+            ('Modelo', 'modelo'),
+            # Los camiones creados desde este controlador guardan 'anio'
+            ('Año', lambda c: c.get('año', c.get('anio', ''))),
+            ('Estado', 'estado'),
+            ('Fecha de Registro', lambda c: c.get('fecha_registro') or c.get('fecha_creacion', '')),
+            ('Última Actualización', 'ultima_actualizacion')
+        ]
+        try:
+            return exportar_coleccion(ruta_archivo, self.collection, columnas,
+                                      orden=[('matricula', ASCENDING)], progreso=progreso,
+                                      cancelacion=cancelacion, comprimir=comprimir)
+        except Exception as e:
+            logging.error(f"Error al exportar camiones a CSV: {str(e)}")
+            raise
+    
     def obtener_estadisticas(self):
         """
         Obtiene estadísticas sobre los camiones
@@ -1,55 +1,38 @@
 import datetime
 import logging
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-import os
-import json
+from pymongo import ASCENDING
+from database.busqueda import valor_busqueda
+from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar
+from database.exportacion import exportar_coleccion
+from database.importacion import importar_csv
+from database.mecanicos_dao import MecanicosDAO
+from models.mecanico import Mecanico
+from utils.texto import CAMPO_BUSQUEDA, filtro_prefijo
 
 class MecanicoController:
     """Controlador para gestionar operaciones con mecánicos"""
     
+    # Encabezados del CSV de importación (normalizados) y campo que rellenan
+    COLUMNAS_CSV = {
+        'nombre': 'nombre',
+        'apellidos': 'apellidos',
+        'actividad': 'actividad'
+    }
+    
     def __init__(self):
         """Inicializa el controlador de mecánicos conectando a la base de datos"""
         try:
-            # Obtener configuración de la base de datos
-            self.config = self._cargar_configuracion()
-            
-            # Conectar a MongoDB
-            self.client = MongoClient(self.config.get('mongodb_uri', 'mongodb://localhost:27017'))
-            self.db = self.client[self.config.get('mongodb_db', 'gestion_camiones')]
-            self.collection = self.db['mecanicos']
-            
-            logging.info(f"Conexión establecida a MongoDB: {self.config.get('mongodb_uri')}")
-            logging.info(f"Base de datos: {self.config.get('mongodb_db')}")
+            # Usar el cliente compartido del proceso
+            self.db_connection = DatabaseConnection()
+            self.collection = self.db_connection.get_mecanicos_collection()
+            self.cache = EntityCache.de_coleccion('mecanicos')
         except Exception as e:
             logging.error(f"Error al conectar a la base de datos: {str(e)}")
             raise
     
-    def _cargar_configuracion(self):
-        """Carga la configuración de la aplicación"""
-        try:
-            # Ruta al archivo de configuración
-            config_dir = os.path.join(os.path.expanduser('~'), 'AppData', 'Roaming', 'GestionCamiones')
-            config_file = os.path.join(config_dir, 'config.json')
-            
-            # Verificar si existe el archivo y cargarlo
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    return json.load(f)
-            else:
-                # Configuración por defecto
-                return {
-                    'mongodb_uri': 'mongodb://localhost:27017',
-                    'mongodb_db': 'gestion_camiones'
-                }
-        except Exception as e:
-            logging.error(f"Error al cargar configuración: {str(e)}")
-            # Configuración por defecto en caso de error
-            return {
-                'mongodb_uri': 'mongodb://localhost:27017',
-                'mongodb_db': 'gestion_camiones'
-            }
-    
     def obtener_mecanicos(self, filtros=None):
         """
         Obtiene los mecánicos según los filtros especificados
@@ -65,12 +48,14 @@ class MecanicoController:
             
             # Aplicar filtros si existen
             if filtros:
-                # Filtro por nombre
+                # Filtro por prefijo del nombre completo o de los apellidos
                 if 'nombre' in filtros and filtros['nombre']:
-                    query['$or'] = [
-                        {'nombre': {'$regex': filtros['nombre'], '$options': 'i'}},
-                        {'apellidos': {'$regex': filtros['nombre'], '$options': 'i'}}
+                    condiciones = [
+                        filtro_prefijo('nombre_busqueda', filtros['nombre']),
+                        filtro_prefijo('apellidos_busqueda', filtros['nombre'])
                     ]
+                    if all(condiciones):
+                        query['$or'] = condiciones
                 
                 # Filtro por actividad
                 if 'actividad' in filtros and filtros['actividad']:
@@ -103,9 +88,12 @@ class MecanicoController:
             if isinstance(id_mecanico, str):
                 id_mecanico = ObjectId(id_mecanico)
             
-            mecanico = self.collection.find_one({'_id': id_mecanico})
+            mecanico = self.cache.leer(self.collection, id_mecanico)
             
             if mecanico:
+                # Copia: el documento de la caché se comparte
+                mecanico = dict(mecanico)
+                
                 # Convertir ObjectId a string
                 mecanico['_id'] = str(mecanico['_id'])
                 return mecanico
@@ -159,11 +147,14 @@ class MecanicoController:
             # Agregar fecha de creación
             datos_mecanico['fecha_creacion'] = datetime.datetime.now()
             datos_mecanico['ultima_actualizacion'] = datetime.datetime.now()
+            datos_mecanico[CAMPO_BUSQUEDA] = valor_busqueda(datos_mecanico, MecanicosDAO.CAMPOS_BUSQUEDA)
+            datos_mecanico.update(Mecanico.claves_busqueda(datos_mecanico))
             
             # Insertar en la base de datos
             resultado = self.collection.insert_one(datos_mecanico)
             
             if resultado.inserted_id:
+                publicar('mecanicos', INSERCION, resultado.inserted_id)
                 return str(resultado.inserted_id)
             
             return None
@@ -193,11 +184,23 @@ class MecanicoController:
             # Agregar fecha de actualización
             datos_mecanico['fecha_actualizacion'] = datetime.datetime.now()
             
+            # Recalcular la búsqueda si cambia algún campo de texto; los que
+            # no vienen en la actualización se toman del documento actual
+            campos = MecanicosDAO.CAMPOS_BUSQUEDA
+            if any(campo in datos_mecanico for campo in campos):
+                actual = self.collection.find_one({'_id': id_mecanico}, {campo: 1 for campo in campos}) or {}
+                completos = {**actual, **datos_mecanico}
+                datos_mecanico[CAMPO_BUSQUEDA] = valor_busqueda(completos, campos)
+                datos_mecanico.update(Mecanico.claves_busqueda(completos))
+            
             # Actualizar en la base de datos
             resultado = self.collection.update_one(
                 {'_id': id_mecanico},
                 {'$set': datos_mecanico}
             )
+            self.cache.invalidar(id_mecanico)
+            if resultado.modified_count:
+                publicar('mecanicos', ACTUALIZACION, id_mecanico)
             
             return resultado.modified_count > 0
         except Exception as e:
@@ -221,19 +224,24 @@ class MecanicoController:
             
             # Eliminar de la base de datos
             resultado = self.collection.delete_one({'_id': id_mecanico})
+            self.cache.invalidar(id_mecanico)
+            if resultado.deleted_count:
+                publicar('mecanicos', ELIMINACION, id_mecanico)
             
             return resultado.deleted_count > 0
         except Exception as e:
             logging.error(f"Error al eliminar mecánico: {str(e)}")
             raise
     
-    def _validar_datos_mecanico(self, datos, es_actualizacion=False):
+    def _validar_datos_mecanico(self, datos, es_actualizacion=False, comprobar_duplicados=True):
         """
         Valida los datos de un mecánico
         
         Args:
             datos: Diccionario con los datos del mecánico
             es_actualizacion: Indica si es una actualización o un nuevo registro
+            comprobar_duplicados: Si se consulta la base de datos para buscar el
+                                  nombre completo; la importación lo deja al índice único
         
         Raises:
             ValueError: Si los datos no son válidos
@@ -246,7 +254,7 @@ class MecanicoController:
                     raise ValueError(f"El campo '{campo}' es obligatorio")
         
         # Validar que no exista un mecánico con el mismo nombre completo (solo en nuevos registros)
-        if not es_actualizacion and 'nombre' in datos and 'apellidos' in datos:
+        if comprobar_duplicados and not es_actualizacion and 'nombre' in datos and 'apellidos' in datos:
             mecanico_existente = self.collection.find_one({
                 'nombre': datos['nombre'],
                 'apellidos': datos['apellidos'],
@@ -256,6 +264,65 @@ class MecanicoController:
             if mecanico_existente:
                 raise ValueError(f"Ya existe un mecánico con el nombre {datos['nombre']} {datos['apellidos']}")
     
+    def importar_desde_csv(self, ruta_archivo, progreso=None, ruta_rechazos=None):
+        """
+        Importa mecánicos desde un archivo CSV
+        
+        Las filas se validan con las mismas reglas que el formulario; los
+        nombres completos que ya existen los rechaza el índice único al escribir.
+        
+        Args:
+            ruta_archivo: Ruta del archivo CSV
+            progreso: Función (leidas, importadas, rechazadas, fracción) llamada tras cada lote
+            ruta_rechazos: Archivo de las filas rechazadas (por defecto, junto al CSV)
+        
+        Returns:
+            Diccionario con el resumen de la importación
+        """
+        def preparar(datos):
+            self._validar_datos_mecanico(datos, comprobar_duplicados=False)
+            if datos['actividad'] not in Mecanico.ACTIVIDADES_VALIDAS:
+                raise ValueError(f"La actividad '{datos['actividad']}' no es válida")
+            documento = Mecanico(datos['nombre'], datos['apellidos'], datos['actividad']).to_dict()
+            documento[CAMPO_BUSQUEDA] = valor_busqueda(documento, MecanicosDAO.CAMPOS_BUSQUEDA)
+            return documento
+        
+        try:
+            return importar_csv(ruta_archivo, self.collection, self.COLUMNAS_CSV, preparar,
+                                progreso, ruta_rechazos)
+        except Exception as e:
+            logging.error(f"Error al importar mecánicos desde CSV: {str(e)}")
+            raise
+    
+    def exportar_a_csv(self, ruta_archivo, progreso=None, cancelacion=None, comprimir=None):
+        """
+        Exporta todos los mecánicos a un archivo CSV leyendo el cursor por lotes
+        
+        Args:
+            ruta_archivo: Ruta del archivo CSV (si termina en '.gz' se comprime)
+            progreso: Función (escritas, total) llamada cada lote de filas
+            cancelacion: threading.Event que detiene la exportación si se activa
+            comprimir: Fuerza o desactiva la compresión gzip
+        
+        Returns:
+            Diccionario con las filas escritas y si se canceló
+        """
+        columnas = [
+            ('ID', '_id'),
+            ('Nombre', 'nombre'),
+            ('Apellidos', 'apellidos'),
+            ('Actividad', 'actividad'),
+            ('Fecha de Registro', lambda m: m.get('fecha_registro') or m.get('fecha_creacion', '')),
+            ('Última Actualización', 'ultima_actualizacion')
+        ]
+        try:
+            return exportar_coleccion(ruta_archivo, self.collection, columnas,
+                                      orden=[('apellidos', ASCENDING)], progreso=progreso,
+                                      cancelacion=cancelacion, comprimir=comprimir)
+        except Exception as e:
+            logging.error(f"Error al exportar mecánicos a CSV: {str(e)}")
+            raise
+    
     def obtener_mecanicos_por_actividad(self, actividad):
         """
         Obtiene los mecánicos que tienen una actividad específica
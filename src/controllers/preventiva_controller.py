@@ -1,53 +1,43 @@
+import copy
 import datetime
 import logging
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-import os
-import json
+from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar
+from database.exportacion import exportar_coleccion
+from database.importacion import importar_csv
+from database.query_cache import QueryCache
+from models.preventiva import Preventiva
+from utils.texto import filtro_prefijo
 
 class PreventivaController:
     """Controlador para gestionar operaciones con tareas de mantenimiento preventivo"""
     
+    # Encabezados del CSV de importación (normalizados) y campo que rellenan;
+    # admite los del propio exportar_a_csv
+    COLUMNAS_CSV = {
+        'matricula': 'matricula',
+        'modelo': 'modelo',
+        'tipo': 'tipo',
+        'estado': 'estado',
+        'nivel_urgencia': 'nivel_urgencia',
+        'nivel_de_urgencia': 'nivel_urgencia'
+    }
+    
     def __init__(self):
         """Inicializa el controlador de preventivas conectando a la base de datos"""
         try:
-            # Obtener configuración de la base de datos
-            self.config = self._cargar_configuracion()
-            
-            # Conectar a MongoDB
-            self.client = MongoClient(self.config.get('mongodb_uri', 'mongodb://localhost:27017'))
-            self.db = self.client[self.config.get('mongodb_db', 'gestion_camiones')]
-            self.collection = self.db['preventivas']
+            # Usar el cliente compartido del proceso
+            self.db_connection = DatabaseConnection()
+            self.collection = self.db_connection.get_preventivas_collection()
+            self.cache = EntityCache.de_coleccion('preventivas')
+            self.cache_consultas = QueryCache.de_coleccion('preventivas')
             
         except Exception as e:
             logging.error(f"Error al conectar a la base de datos: {str(e)}")
             raise
     
-    def _cargar_configuracion(self):
-        """Carga la configuración de la aplicación"""
-        try:
-            # Ruta al archivo de configuración
-            config_dir = os.path.join(os.path.expanduser('~'), 'AppData', 'Roaming', 'GestionCamiones')
-            config_file = os.path.join(config_dir, 'config.json')
-            
-            # Verificar si existe el archivo y cargarlo
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    return json.load(f)
-            else:
-                # Configuración por defecto
-                return {
-                    'mongodb_uri': 'mongodb://localhost:27017',
-                    'mongodb_db': 'gestion_camiones'
-                }
-        except Exception as e:
-            logging.error(f"Error al cargar configuración: {str(e)}")
-            # Configuración por defecto en caso de error
-            return {
-                'mongodb_uri': 'mongodb://localhost:27017',
-                'mongodb_db': 'gestion_camiones'
-            }
-    
     def obtener_todas_preventivas(self, filtros=None):
         """
         Obtiene las tareas preventivas según los filtros especificados
@@ -63,9 +53,9 @@ class PreventivaController:
             
             # Aplicar filtros si existen
             if filtros:
-                # Filtro por matrícula
+                # Filtro por prefijo de matrícula (sobre la clave normalizada)
                 if 'matricula' in filtros and filtros['matricula']:
-                    query['matricula'] = {'$regex': filtros['matricula'], '$options': 'i'}
+                    query.update(filtro_prefijo('matricula_busqueda', filtros['matricula'], ''))
                 
                 # Filtro por modelo
                 if 'modelo' in filtros and filtros['modelo']:
@@ -110,9 +100,12 @@ class PreventivaController:
             if isinstance(id_preventiva, str):
                 id_preventiva = ObjectId(id_preventiva)
             
-            preventiva = self.collection.find_one({'_id': id_preventiva})
+            preventiva = self.cache.leer(self.collection, id_preventiva)
             
             if preventiva:
+                # Copia: el documento de la caché se comparte
+                preventiva = dict(preventiva)
+                
                 # Convertir ObjectId a string
                 preventiva['_id'] = str(preventiva['_id'])
                 return preventiva
@@ -160,11 +153,15 @@ class PreventivaController:
             
             # Agregar fecha de creación
             datos_preventiva['fecha_registro'] = datetime.datetime.now()
+            datos_preventiva['ultima_actualizacion'] = datos_preventiva['fecha_registro']
+            datos_preventiva.update(Preventiva.claves_busqueda(datos_preventiva))
             
             # Insertar en la base de datos
             resultado = self.collection.insert_one(datos_preventiva)
+            self.cache_consultas.limpiar()
             
             if resultado.inserted_id:
+                publicar('preventivas', INSERCION, resultado.inserted_id)
                 return str(resultado.inserted_id)
             
             return None
@@ -193,12 +190,19 @@ class PreventivaController:
             
             # Agregar fecha de actualización
             datos_preventiva['ultima_actualizacion_reparacion'] = datetime.datetime.now()
+            datos_preventiva['ultima_actualizacion'] = datos_preventiva['ultima_actualizacion_reparacion']
+            if 'matricula' in datos_preventiva:
+                datos_preventiva.update(Preventiva.claves_busqueda(datos_preventiva))
             
             # Actualizar en la base de datos
             resultado = self.collection.update_one(
                 {'_id': id_preventiva},
                 {'$set': datos_preventiva}
             )
+            self.cache.invalidar(id_preventiva)
+            self.cache_consultas.limpiar()
+            if resultado.modified_count:
+                publicar('preventivas', ACTUALIZACION, id_preventiva)
             
             return resultado.modified_count > 0
         except Exception as e:
@@ -222,6 +226,10 @@ class PreventivaController:
             
             # Eliminar de la base de datos
             resultado = self.collection.delete_one({'_id': id_preventiva})
+            self.cache.invalidar(id_preventiva)
+            self.cache_consultas.limpiar()
+            if resultado.deleted_count:
+                publicar('preventivas', ELIMINACION, id_preventiva)
             
             return resultado.deleted_count > 0
         except Exception as e:
@@ -264,42 +272,65 @@ class PreventivaController:
             if datos['tipo'] not in Preventiva.TIPOS_VALIDOS:
                 raise ValueError(f"El tipo '{datos['tipo']}' no es válido")
     
-    def obtener_estadisticas(self):
+    def obtener_estadisticas(self, fecha_desde=None, fecha_hasta=None):
         """
         Obtiene estadísticas sobre las tareas preventivas
         
+        Todos los recuentos se calculan en una sola agregación con $facet y el
+        resultado se guarda unos segundos en caché; cualquier escritura en
+        preventivas lo invalida.
+        
+        Args:
+            fecha_desde: Fecha de registro mínima (opcional)
+            fecha_hasta: Fecha de registro máxima (opcional)
+        
         Returns:
             Diccionario con estadísticas
         """
+        clave = ('estadisticas', fecha_desde, fecha_hasta)
+        estadisticas = self.cache_consultas.obtener(clave)
+        if estadisticas is not None:
+            return copy.deepcopy(estadisticas)
+        
         try:
-            # Total de preventivas
-            total_preventivas = self.collection.count_documents({})
+            generacion = self.cache_consultas.generacion()
             
-            # Preventivas por estado
-            preventivas_por_estado = {}
+            # Filtro por fecha de registro si es necesario
+            pipeline = []
+            if fecha_desde or fecha_hasta:
+                rango = {}
+                if fecha_desde:
+                    rango['$gte'] = fecha_desde
+                if fecha_hasta:
+                    rango['$lte'] = fecha_hasta
+                pipeline.append({'$match': {'fecha_registro': rango}})
             
-            from models.preventiva import Preventiva
-            for estado in Preventiva.ESTADOS_VALIDOS:
-                preventivas_por_estado[estado] = self.collection.count_documents({'estado': estado})
-            
-            # Preventivas por nivel de urgencia
-            preventivas_por_urgencia = {}
+            pipeline.append({'$facet': {
+                'total': [{'$count': 'cantidad'}],
+                'por_estado': [{'$group': {'_id': '$estado', 'cantidad': {'$sum': 1}}}],
+                'por_urgencia': [{'$group': {'_id': '$nivel_urgencia', 'cantidad': {'$sum': 1}}}],
+                'por_tipo': [{'$group': {'_id': '$tipo', 'cantidad': {'$sum': 1}}}]
+            }})
             
-            for nivel in Preventiva.NIVELES_URGENCIA:
-                preventivas_por_urgencia[nivel] = self.collection.count_documents({'nivel_urgencia': nivel})
+            resultado = next(self.collection.aggregate(pipeline), {})
             
-            # Preventivas por tipo
-            preventivas_por_tipo = {}
+            from models.preventiva import Preventiva
             
-            for tipo in Preventiva.TIPOS_VALIDOS:
-                preventivas_por_tipo[tipo] = self.collection.count_documents({'tipo': tipo})
+            def contar(faceta, valores):
+                # Los valores sin documentos no aparecen en el $group
+                cantidades = {doc['_id']: doc['cantidad'] for doc in resultado.get(faceta, [])}
+                return {valor: cantidades.get(valor, 0) for valor in valores}
             
-            return {
-                'total_preventivas': total_preventivas,
-                'por_estado': preventivas_por_estado,
-                'por_urgencia': preventivas_por_urgencia,
-                'por_tipo': preventivas_por_tipo
+            total = resultado.get('total')
+            estadisticas = {
+                'total_preventivas': total[0]['cantidad'] if total else 0,
+                'por_estado': contar('por_estado', Preventiva.ESTADOS_VALIDOS),
+                'por_urgencia': contar('por_urgencia', Preventiva.NIVELES_URGENCIA),
+                'por_tipo': contar('por_tipo', Preventiva.TIPOS_VALIDOS)
             }
+            
+            self.cache_consultas.guardar(clave, estadisticas, generacion)
+            return copy.deepcopy(estadisticas)
         except Exception as e:
             logging.error(f"Error al obtener estadísticas de preventivas: {str(e)}")
             return {
@@ -309,44 +340,60 @@ class PreventivaController:
                 'por_tipo': {}
             }
     
-    def exportar_a_csv(self, ruta_archivo):
+    def importar_desde_csv(self, ruta_archivo, progreso=None, ruta_rechazos=None):
         """
-        Exporta todas las preventivas a un archivo CSV.
+        Importa tareas preventivas desde un archivo CSV
         
         Args:
-            ruta_archivo (str): Ruta del archivo donde se guardará el CSV.
+            ruta_archivo: Ruta del archivo CSV
+            progreso: Función (leidas, importadas, rechazadas, fracción) llamada tras cada lote
+            ruta_rechazos: Archivo de las filas rechazadas (por defecto, junto al CSV)
         
         Returns:
-            bool: True si se exportó correctamente, False en caso contrario.
+            Diccionario con el resumen de la importación
         """
+        def preparar(datos):
+            self._validar_datos_preventiva(datos)
+            return Preventiva(
+                datos['matricula'], datos['modelo'], datos['tipo'],
+                datos['estado'], datos['nivel_urgencia']
+            ).to_dict()
+        
         try:
-            import csv
-            preventivas = self.obtener_todas_preventivas()
-            
-            with open(ruta_archivo, 'w', newline='', encoding='utf-8') as archivo:
-                writer = csv.writer(archivo)
-                
-                # Escribir encabezados
-                writer.writerow([
-                    'ID', 'Matrícula', 'Modelo', 'Tipo', 'Estado', 
-                    'Nivel de Urgencia', 'Fecha de Registro', 
-                    'Última Actualización de Reparación'
-                ])
-                
-                # Escribir datos
-                for preventiva in preventivas:
-                    writer.writerow([
-                        preventiva.get('_id', ''),
-                        preventiva.get('matricula', ''),
-                        preventiva.get('modelo', ''),
-                        preventiva.get('tipo', ''),
-                        preventiva.get('estado', ''),
-                        preventiva.get('nivel_urgencia', ''),
-                        preventiva.get('fecha_registro', ''),
-                        preventiva.get('ultima_actualizacion_reparacion', '')
-                    ])
-            
-            return True
+            return importar_csv(ruta_archivo, self.collection, self.COLUMNAS_CSV, preparar,
+                                progreso, ruta_rechazos)
+        except Exception as e:
+            logging.error(f"Error al importar preventivas desde CSV: {str(e)}")
+            raise
+        finally:
+            self.cache_consultas.limpiar()
+    
+    def exportar_a_csv(self, ruta_archivo, progreso=None, cancelacion=None, comprimir=None):
+        """
+        Exporta todas las preventivas a un archivo CSV leyendo el cursor por lotes.
+        
+        Args:
+            ruta_archivo: Ruta del archivo CSV (si termina en '.gz' se comprime)
+            progreso: Función (escritas, total) llamada cada lote de filas
+            cancelacion: threading.Event que detiene la exportación si se activa
+            comprimir: Fuerza o desactiva la compresión gzip
+        
+        Returns:
+            Diccionario con las filas escritas y si se canceló, o False si hay error
+        """
+        columnas = [
+            ('ID', '_id'),
+            ('Matrícula', 'matricula'),
+            ('Modelo', 'modelo'),
+            ('Tipo', 'tipo'),
+            ('Estado', 'estado'),
+            ('Nivel de Urgencia', 'nivel_urgencia'),
+            ('Fecha de Registro', 'fecha_registro'),
+            ('Última Actualización de Reparación', 'ultima_actualizacion_reparacion')
+        ]
+        try:
+            return exportar_coleccion(ruta_archivo, self.collection, columnas, progreso=progreso,
+                                      cancelacion=cancelacion, comprimir=comprimir)
         except Exception as e:
             logging.error(f"Error al exportar preventivas a CSV: {str(e)}")
-            return False
\ No newline at end of file
+            return False
@@ -1,12 +1,43 @@
 import os
-import json
 import datetime
-import csv
 from bson import ObjectId
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar
+from database.exportacion import exportar_csv
+from database.journal import JournalStore
+from utils.texto import clave_busqueda
 
 class ReparacionController:
     """Controlador para manejar las reparaciones"""
     
+    # Un controlador por archivo: cada uno tiene su propio diario abierto y
+    # una compactación de uno borraría el diario en el que anexan los demás
+    _compartidos = {}
+    
+    @classmethod
+    def compartido(cls, archivo_db=None):
+        """
+        Devuelve el controlador compartido para el archivo indicado
+        
+        Args:
+            archivo_db (str, optional): Ruta al archivo de base de datos
+            
+        Returns:
+            ReparacionController: El mismo controlador en cada llamada
+        """
+        ruta = os.path.abspath(archivo_db or os.path.join('data', 'reparaciones.json'))
+        controlador = cls._compartidos.get(ruta)
+        if controlador is None:
+            controlador = cls(archivo_db)
+            cls._compartidos[ruta] = controlador
+        return controlador
+    
+    @classmethod
+    def cerrar_compartidos(cls):
+        """Cierra los diarios de todos los controladores compartidos"""
+        for controlador in cls._compartidos.values():
+            controlador.cerrar()
+        cls._compartidos.clear()
+    
     def __init__(self, archivo_db=None):
         """
         Inicializa el controlador
@@ -21,31 +52,29 @@ class ReparacionController:
             self.archivo_db = os.path.join('data', 'reparaciones.json')
         else:
             self.archivo_db = archivo_db
+        
+        # Instantánea + diario de cambios: cada mutación anexa un registro
+        self.journal = JournalStore(self.archivo_db, clave_registros='reparaciones')
             
         # Cargar datos existentes
-        self.reparaciones = []
+        self._por_id = {}
+        self._por_camion = {}
+        self._por_mecanico = {}
+        self._por_estado = {}
+        self._por_matricula = {}
         self.ultimo_id = 0
         
         self.cargar_datos()
         
     def cargar_datos(self):
-        """Carga los datos del archivo JSON"""
+        """Carga los datos desde la instantánea y el diario de cambios"""
         try:
-            # Verificar si el directorio existe, si no, crearlo
-            directorio = os.path.dirname(self.archivo_db)
-            if directorio and not os.path.exists(directorio):
-                os.makedirs(directorio)
-                
-            # Verificar si el archivo existe
-            if os.path.exists(self.archivo_db):
-                with open(self.archivo_db, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.reparaciones = data.get('reparaciones', [])
-                    self.ultimo_id = data.get('ultimo_id', 0)
-            else:
-                # Archivo no existe, inicializar con datos vacíos
-                self.reparaciones = []
-                self.ultimo_id = 0
+            existia = os.path.exists(self.archivo_db)
+            
+            registros, self.ultimo_id = self.journal.cargar()
+            self._reconstruir_indices(registros.values())
+            
+            if not existia and not self._por_id:
                 # Guardar para crear el archivo
                 self.guardar_datos()
                 print(f"Archivo {self.archivo_db} no encontrado. Se ha creado uno nuevo.")
@@ -54,42 +83,99 @@ class ReparacionController:
             import traceback
             traceback.print_exc()
             # Inicializar con datos vacíos en caso de error
-            self.reparaciones = []
+            self._reconstruir_indices([])
             self.ultimo_id = 0
+    
+    @property
+    def reparaciones(self):
+        """Lista de reparaciones en orden de inserción"""
+        return list(self._por_id.values())
+    
+    def _reparaciones_vista(self):
+        """Vista de las reparaciones sin copiarlas; solo para recorrerlas sin modificar el índice"""
+        return self._por_id.values()
+    
+    def _reconstruir_indices(self, reparaciones):
+        """Reconstruye el índice principal y los secundarios"""
+        self._por_id = {}
+        self._por_camion = {}
+        self._por_mecanico = {}
+        self._por_estado = {}
+        self._por_matricula = {}
+        for reparacion in reparaciones:
+            self._indexar(reparacion)
+    
+    @staticmethod
+    def _claves_secundarias(reparacion):
+        """Devuelve los pares (índice, clave) de una reparación"""
+        # La matrícula se indexa por cada uno de sus fragmentos (son cortas)
+        matricula = reparacion['matricula_busqueda']
+        fragmentos = {matricula[inicio:fin]
+                      for inicio in range(len(matricula))
+                      for fin in range(inicio + 1, len(matricula) + 1)}
+        return (
+            ('_por_camion', str(reparacion.get('camion_id'))),
+            ('_por_mecanico', str(reparacion.get('mecanico_id'))),
+            ('_por_estado', reparacion.get('estado')),
+        ) + tuple(('_por_matricula', fragmento) for fragmento in fragmentos)
+    
+    @staticmethod
+    def _clave_matricula(reparacion):
+        """Calcula la clave normalizada de la matrícula para filtrar por prefijo"""
+        reparacion['matricula_busqueda'] = clave_busqueda(reparacion.get('matricula'), '')
+    
+    def _indexar(self, reparacion):
+        """Añade una reparación a todos los índices"""
+        id_reparacion = reparacion['id']
+        # Registros guardados antes de existir la clave
+        if 'matricula_busqueda' not in reparacion:
+            self._clave_matricula(reparacion)
+        self._por_id[id_reparacion] = reparacion
+        # Los índices secundarios usan dict como conjunto ordenado
+        for indice, clave in self._claves_secundarias(reparacion):
+            getattr(self, indice).setdefault(clave, {})[id_reparacion] = None
+    
+    def _desindexar(self, reparacion):
+        """Quita una reparación de todos los índices"""
+        self._por_id.pop(reparacion['id'], None)
+        self._desindexar_secundarios(reparacion)
+    
+    def _desindexar_secundarios(self, reparacion):
+        """Quita una reparación de los índices secundarios"""
+        id_reparacion = reparacion['id']
+        for indice, clave in self._claves_secundarias(reparacion):
+            tabla = getattr(self, indice)
+            ids = tabla.get(clave)
+            if ids is not None:
+                ids.pop(id_reparacion, None)
+                if not ids:
+                    del tabla[clave]
+    
+    def _buscar_por_indice(self, tabla, clave):
+        """Devuelve las reparaciones registradas bajo una clave de un índice secundario"""
+        return [self._por_id[id_reparacion] for id_reparacion in tabla.get(clave, ())]
+    
+    def _serializar(self, reparacion):
+        """Convierte los ObjectId de una reparación a string para guardarla en JSON"""
+        reparacion_serializable = {}
+        for key, value in reparacion.items():
+            # Convertir ObjectId a string si es necesario
+            if key in ('camion_id', 'mecanico_id', 'id') and isinstance(value, ObjectId):
+                reparacion_serializable[key] = str(value)
+            else:
+                reparacion_serializable[key] = value
+        return reparacion_serializable
             
     def guardar_datos(self):
-        """Guarda los datos en el archivo JSON"""
+        """
+        Guarda el estado completo como nueva instantánea.
+        
+        Las operaciones individuales no necesitan llamarlo: se registran en el
+        diario y se compactan en segundo plano.
+        """
         try:
-            # Convertir ObjectId a string antes de serializar a JSON
-            reparaciones_serializables = []
-            for reparacion in self.reparaciones:
-                reparacion_serializable = {}
-                for key, value in reparacion.items():
-                    # Convertir ObjectId a string si es necesario
-                    if key == 'camion_id' or key == 'mecanico_id' or key == 'id':
-                        if isinstance(value, ObjectId):
-                            reparacion_serializable[key] = str(value)
-                        else:
-                            reparacion_serializable[key] = value
-                    else:
-                        reparacion_serializable[key] = value
-                reparaciones_serializables.append(reparacion_serializable)
-            
-            # Preparar datos para guardar
-            data = {
-                'reparaciones': reparaciones_serializables,
-                'ultimo_id': self.ultimo_id
-            }
-            
-            # Guardar en el archivo
-            directorio = os.path.dirname(self.archivo_db)
-            if directorio and not os.path.exists(directorio):
-                os.makedirs(directorio)
-                
-            with open(self.archivo_db, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-                
-                
+            reparaciones_serializables = [self._serializar(r) for r in self._reparaciones_vista()]
+            self.journal.reemplazar(reparaciones_serializables, self.ultimo_id)
         except Exception as e:
             import traceback
             error_detallado = traceback.format_exc()
@@ -116,12 +202,14 @@ class ReparacionController:
         
         # Agregar timestamp de creación
         nueva_reparacion['fecha_creacion'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._clave_matricula(nueva_reparacion)
         
-        # Agregar a la lista
-        self.reparaciones.append(nueva_reparacion)
+        # Registrar en el diario antes de modificar el estado en memoria
+        self.journal.guardar(self._serializar(nueva_reparacion), self.ultimo_id)
         
-        # Guardar cambios
-        self.guardar_datos()
+        # Agregar a los índices
+        self._indexar(nueva_reparacion)
+        publicar('reparaciones', INSERCION, self.ultimo_id)
         
         print(f"Nueva reparación agregada con ID: {self.ultimo_id}")
         
@@ -139,25 +227,27 @@ class ReparacionController:
             bool: True si se actualizó correctamente, False si no se encontró
         """
         # Buscar la reparación por ID
-        for i, reparacion in enumerate(self.reparaciones):
-            if reparacion['id'] == id_reparacion:
-                # Actualizar datos manteniendo el ID y la fecha de creación
-                datos_actualizados = datos.copy()
-                datos_actualizados['id'] = id_reparacion
-                if 'fecha_creacion' in reparacion:
-                    datos_actualizados['fecha_creacion'] = reparacion['fecha_creacion']
-                
-                # Agregar timestamp de actualización
-                datos_actualizados['fecha_actualizacion'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Reemplazar la reparación en la lista
-                self.reparaciones[i] = datos_actualizados
-                
-                # Guardar cambios
-                self.guardar_datos()
-                
-                
-                return True
+        reparacion = self._por_id.get(id_reparacion)
+        if reparacion is not None:
+            # Actualizar datos manteniendo el ID y la fecha de creación
+            datos_actualizados = datos.copy()
+            datos_actualizados['id'] = id_reparacion
+            if 'fecha_creacion' in reparacion:
+                datos_actualizados['fecha_creacion'] = reparacion['fecha_creacion']
+            
+            # Agregar timestamp de actualización
+            datos_actualizados['fecha_actualizacion'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._clave_matricula(datos_actualizados)
+            
+            # Registrar el cambio en el diario
+            self.journal.guardar(self._serializar(datos_actualizados), self.ultimo_id)
+            
+            # Reemplazar la reparación manteniendo su posición
+            self._desindexar_secundarios(reparacion)
+            self._indexar(datos_actualizados)
+            publicar('reparaciones', ACTUALIZACION, id_reparacion)
+            
+            return True
                 
         # No se encontró la reparación
         print(f"No se encontró la reparación con ID {id_reparacion} para actualizar")
@@ -174,20 +264,24 @@ class ReparacionController:
             bool: True si se eliminó correctamente, False si no se encontró
         """
         # Buscar la reparación por ID
-        for i, reparacion in enumerate(self.reparaciones):
-            if reparacion['id'] == id_reparacion:
-                # Eliminar de la lista
-                del self.reparaciones[i]
-                
-                # Guardar cambios
-                self.guardar_datos()
-                
-                
-                return True
+        reparacion = self._por_id.get(id_reparacion)
+        if reparacion is not None:
+            # Registrar la eliminación en el diario
+            self.journal.eliminar(reparacion['id'])
+            
+            # Eliminar de los índices
+            self._desindexar(reparacion)
+            publicar('reparaciones', ELIMINACION, id_reparacion)
+            
+            return True
                 
         # No se encontró la reparación
         print(f"No se encontró la reparación con ID {id_reparacion} para eliminar")
         return False
+    
+    def cerrar(self):
+        """Espera a que termine la compactación pendiente y cierra el diario"""
+        self.journal.cerrar()
         
     def obtener_reparacion(self, id_reparacion):
         """
@@ -200,9 +294,9 @@ class ReparacionController:
             dict: Datos de la reparación o None si no se encontró
         """
         # Buscar la reparación por ID
-        for reparacion in self.reparaciones:
-            if reparacion['id'] == id_reparacion:
-                return reparacion
+        reparacion = self._por_id.get(id_reparacion)
+        if reparacion is not None:
+            return reparacion
                 
         # No se encontró la reparación
         print(f"No se encontró la reparación con ID {id_reparacion}")
@@ -213,9 +307,9 @@ class ReparacionController:
         Obtiene todas las reparaciones
         
         Returns:
-            list: Lista de todas las reparaciones
+            list: Lista de todas las reparaciones, en orden de inserción
         """
-        return self.reparaciones
+        return list(self._por_id.values())
         
     def obtener_reparaciones_por_camion(self, camion_id):
         """
@@ -227,7 +321,7 @@ class ReparacionController:
         Returns:
             list: Lista de reparaciones del camión
         """
-        reparaciones_camion = [r for r in self.reparaciones if str(r.get('camion_id')) == str(camion_id)]
+        reparaciones_camion = self._buscar_por_indice(self._por_camion, str(camion_id))
         print(f"Obteniendo reparaciones del camión {camion_id}: {len(reparaciones_camion)} encontradas")
         return reparaciones_camion
         
@@ -241,7 +335,7 @@ class ReparacionController:
         Returns:
             list: Lista de reparaciones en ese estado
         """
-        reparaciones_estado = [r for r in self.reparaciones if r.get('estado') == estado]
+        reparaciones_estado = self._buscar_por_indice(self._por_estado, estado)
         print(f"Obteniendo reparaciones con estado {estado}: {len(reparaciones_estado)} encontradas")
         return reparaciones_estado
         
@@ -255,19 +349,37 @@ class ReparacionController:
         Returns:
             list: Lista de reparaciones asignadas al mecánico
         """
-        reparaciones_mecanico = [r for r in self.reparaciones if str(r.get('mecanico_id')) == str(mecanico_id)]
+        reparaciones_mecanico = self._buscar_por_indice(self._por_mecanico, str(mecanico_id))
         print(f"Obteniendo reparaciones del mecánico {mecanico_id}: {len(reparaciones_mecanico)} encontradas")
         return reparaciones_mecanico
         
-    def exportar_a_csv(self, ruta_archivo):
+    def buscar_por_matricula(self, texto):
+        """
+        Obtiene las reparaciones cuya matrícula contiene el texto indicado
+        
+        Args:
+            texto: Texto escrito por el usuario (se normaliza como la matrícula)
+            
+        Returns:
+            list: Lista de reparaciones que coinciden
+        """
+        return self._buscar_por_indice(self._por_matricula, clave_busqueda(texto, ''))
+        
+    def exportar_a_csv(self, ruta_archivo, progreso=None, cancelacion=None, comprimir=None):
         """
         Exporta las reparaciones a un archivo CSV
         
+        Las reparaciones ya están en memoria: se recorre una instantánea de
+        la lista sin construir copias de los registros.
+        
         Args:
-            ruta_archivo: Ruta del archivo CSV a generar
+            ruta_archivo: Ruta del archivo CSV a generar (si termina en '.gz' se comprime)
+            progreso: Función (escritas, total) llamada cada lote de filas
+            cancelacion: threading.Event que detiene la exportación si se activa
+            comprimir: Fuerza o desactiva la compresión gzip
             
         Returns:
-            bool: True si se exportó correctamente, False en caso contrario
+            dict: Filas escritas y si se canceló, o False si hay error
         """
         try:
             # Definir campos a exportar
@@ -276,19 +388,18 @@ class ReparacionController:
                 'diagnostico', 'costo_repuestos', 'costo_mano_obra', 'total',
                 'fecha_ingreso', 'fecha_entrega_estimada', 'fecha_creacion'
             ]
+            # Copia: la exportación corre en segundo plano y la interfaz
+            # puede modificar las reparaciones mientras tanto
+            reparaciones = list(self._por_id.values())
             
-            # Escribir el archivo CSV
-            with open(ruta_archivo, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=campos)
-                writer.writeheader()
-                
-                # Escribir solo los campos seleccionados para cada reparación
-                for reparacion in self.reparaciones:
-                    fila = {campo: reparacion.get(campo, '') for campo in campos}
-                    writer.writerow(fila)
+            resumen = exportar_csv(
+                ruta_archivo, reparaciones, [(campo, campo) for campo in campos],
+                len(reparaciones), progreso, cancelacion, comprimir
+            )
             
-            print(f"Datos exportados a CSV en {ruta_archivo}")
-            return True
+            if not resumen['cancelada']:
+                print(f"Datos exportados a CSV en {ruta_archivo}")
+            return resumen
         except Exception as e:
             print(f"Error al exportar a CSV: {str(e)}")
             import traceback
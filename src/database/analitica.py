@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Exportación de reparaciones y preventivas a Parquet para análisis.
+
+A diferencia del CSV, Parquet conserva los tipos: las fechas son marcas de
+tiempo y ``costo`` es un número. Los documentos se leen del cursor en lotes
+y cada lote se convierte en un RecordBatch de Arrow, así que la memoria no
+depende del tamaño de la colección.
+
+Los archivos se reparten por mes de la fecha principal (``fecha_entrada`` en
+reparaciones, ``fecha_registro`` en preventivas) con el esquema de
+particiones de Hive, que pandas, pyarrow, DuckDB o Spark leen directamente::
+
+    destino/reparaciones/mes=2024-05/parte-20240601T120000000.parquet
+
+En modo incremental se guarda en ``destino/<colección>/_marca.json`` hasta
+qué fecha de modificación se exportó, y cada ejecución añade archivos nuevos
+solo con los documentos creados o modificados desde entonces. Las fechas de
+modificación las pone el reloj de cada cliente, así que cada ejecución vuelve
+a leer también los ``MARGEN_RELOJ`` anteriores a la marca: entran los
+documentos de clientes con el reloj atrasado y los escritos durante la
+exportación anterior. Un documento modificado (o releído en el margen)
+aparece de nuevo; la columna ``_exportado`` indica en qué ejecución, y la
+versión vigente de cada ``_id`` es la de la más reciente.
+
+Requiere pyarrow (opcional). Uso desde la línea de comandos (desde src)::
+
+    python -m database.analitica DESTINO              # incremental
+    python -m database.analitica DESTINO --completo   # todo, ignorando la marca
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Documentos por lote del cursor y por RecordBatch
+TAMANO_LOTE = 10000
+
+# Archivo con la marca de agua de cada colección
+ARCHIVO_MARCA = '_marca.json'
+
+# Columna añadida con el instante de la ejecución que exportó cada fila
+COLUMNA_EXPORTADO = '_exportado'
+
+# Partición de los documentos sin fecha principal
+MES_SIN_FECHA = 'sin_fecha'
+
+# Tiempo anterior a la marca que se vuelve a leer en cada exportación
+# incremental (el mismo margen que usa el sincronizador de la réplica)
+MARGEN_RELOJ = timedelta(minutes=5)
+
+
+class DefinicionExportacion:
+    """Campos, tipos y fechas de una colección exportada a Parquet"""
+
+    def __init__(self, coleccion, campos, campo_particion, campos_marca):
+        """
+        Inicializa la definición.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            campos (list): Tuplas (campo, tipo): 'texto', 'id', 'numero' o 'fecha'
+            campo_particion (str): Campo de fecha que decide el mes
+            campos_marca (tuple): Campos de fecha de creación o modificación
+                                  que se comparan con la marca de agua
+        """
+        self.coleccion = coleccion
+        self.campos = campos
+        self.campo_particion = campo_particion
+        self.campos_marca = campos_marca
+
+    def esquema(self):
+        """Devuelve el esquema de Arrow de la colección"""
+        tipos = {
+            'texto': pa.string(),
+            'id': pa.string(),
+            'numero': pa.float64(),
+            'fecha': pa.timestamp('ms'),
+        }
+        campos = [(campo, tipos[tipo]) for campo, tipo in self.campos]
+        return pa.schema(campos + [(COLUMNA_EXPORTADO, pa.timestamp('ms'))])
+
+
+REPARACIONES = DefinicionExportacion(
+    'reparaciones',
+    [
+        ('_id', 'id'),
+        ('camion_id', 'id'),
+        ('mecanico_id', 'id'),
+        ('id_falla', 'texto'),
+        ('motivo_falla', 'texto'),
+        ('descripcion', 'texto'),
+        ('estado', 'texto'),
+        ('tiempo_estimado', 'numero'),
+        ('costo', 'numero'),
+        ('fecha_entrada', 'fecha'),
+        ('fecha_salida', 'fecha'),
+        ('ultima_actualizacion', 'fecha'),
+        ('notas_adicionales', 'texto'),
+    ],
+    'fecha_entrada',
+    ('ultima_actualizacion',)
+)
+
+PREVENTIVAS = DefinicionExportacion(
+    'preventivas',
+    [
+        ('_id', 'id'),
+        ('matricula', 'texto'),
+        ('modelo', 'texto'),
+        ('tipo', 'texto'),
+        ('estado', 'texto'),
+        ('nivel_urgencia', 'texto'),
+        ('fecha_registro', 'fecha'),
+        ('ultima_actualizacion_reparacion', 'fecha'),
+        ('ultima_actualizacion', 'fecha'),
+    ],
+    'fecha_registro',
+    # ultima_actualizacion cambia con cualquier escritura (estado, urgencia...);
+    # las otras dos cubren los documentos anteriores a ese campo
+    ('ultima_actualizacion', 'fecha_registro', 'ultima_actualizacion_reparacion')
+)
+
+DEFINICIONES = {d.coleccion: d for d in (REPARACIONES, PREVENTIVAS)}
+
+
+def disponible():
+    """
+    Indica si está instalado pyarrow.
+
+    Returns:
+        bool: True si se puede exportar a Parquet
+    """
+    return pa is not None
+
+
+def _convertir(valor, tipo):
+    """Convierte un valor de MongoDB al tipo de su columna; None si no encaja"""
+    if valor is None:
+        return None
+    if tipo == 'fecha':
+        return valor if isinstance(valor, datetime) else None
+    if tipo == 'numero':
+        try:
+            return float(valor)
+        except (TypeError, ValueError):
+            return None
+    if tipo == 'id':
+        return str(valor)
+    return valor if isinstance(valor, str) else str(valor)
+
+
+def _mes(documento, campo):
+    """Partición (AAAA-MM) de un documento"""
+    fecha = documento.get(campo)
+    return fecha.strftime('%Y-%m') if isinstance(fecha, datetime) else MES_SIN_FECHA
+
+
+def _temporal(ruta):
+    """Ruta oculta mientras se escribe: los lectores de Parquet ignoran los archivos con '.'"""
+    carpeta, nombre = os.path.split(ruta)
+    return os.path.join(carpeta, f".{nombre}")
+
+
+def _leer_marca(directorio):
+    """Devuelve la marca de agua guardada o None"""
+    ruta = os.path.join(directorio, ARCHIVO_MARCA)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return datetime.fromisoformat(json.load(f)['hasta'])
+
+
+def _guardar_marca(directorio, hasta):
+    """Guarda la marca de agua de forma atómica"""
+    ruta = os.path.join(directorio, ARCHIVO_MARCA)
+    with open(f"{ruta}.parcial", 'w', encoding='utf-8') as f:
+        json.dump({'hasta': hasta.isoformat()}, f)
+    os.replace(f"{ruta}.parcial", ruta)
+
+
+def _filtro(definicion, desde, hasta):
+    """Documentos creados o modificados en el intervalo (desde - MARGEN_RELOJ, hasta]"""
+    rango = {'$lte': hasta}
+    if desde is not None:
+        rango['$gt'] = desde - MARGEN_RELOJ
+    condiciones = [{campo: dict(rango)} for campo in definicion.campos_marca]
+    if desde is None:
+        # En la primera exportación entran también los documentos sin fechas
+        condiciones.append({campo: None for campo in definicion.campos_marca})
+    return condiciones[0] if len(condiciones) == 1 else {'$or': condiciones}
+
+
+def exportar_coleccion(db, definicion, destino, incremental=True, progreso=None, cancelacion=None):
+    """
+    Exporta una colección a archivos Parquet particionados por mes.
+
+    Los archivos se escriben con un nombre oculto y solo se renombran, y se
+    avanza la marca, si la exportación termina; una ejecución cancelada
+    o fallida no deja datos a medias.
+
+    Args:
+        db: Base de datos de MongoDB
+        definicion (DefinicionExportacion): Colección a exportar
+        destino (str): Directorio raíz de la exportación
+        incremental (bool, optional): Solo lo posterior a la marca de agua
+        progreso (callable, optional): Función (colección, filas) llamada por lote
+        cancelacion (threading.Event, optional): Detiene la exportación si se activa
+
+    Returns:
+        dict: 'filas', 'archivos' escritos, 'desde', 'hasta' y 'cancelada'
+
+    Raises:
+        RuntimeError: Si pyarrow no está instalado
+    """
+    if not disponible():
+        raise RuntimeError("La exportación a Parquet requiere pyarrow (pip install pyarrow)")
+
+    directorio = os.path.join(destino, definicion.coleccion)
+    os.makedirs(directorio, exist_ok=True)
+
+    desde = _leer_marca(directorio) if incremental else None
+    # Precisión de milisegundos, la misma que guarda MongoDB
+    ahora = datetime.now()
+    hasta = ahora.replace(microsecond=ahora.microsecond // 1000 * 1000)
+    ejecucion = hasta.strftime('%Y%m%dT%H%M%S%f')[:-3]
+
+    esquema = definicion.esquema()
+    proyeccion = {campo: 1 for campo, _ in definicion.campos}
+    cursor = db[definicion.coleccion].find(
+        _filtro(definicion, desde, hasta), proyeccion
+    ).batch_size(TAMANO_LOTE)
+
+    escritores = {}
+    filas = 0
+    cancelada = False
+
+    def escribir(lote):
+        # Un RecordBatch por mes presente en el lote
+        por_mes = {}
+        for documento in lote:
+            por_mes.setdefault(_mes(documento, definicion.campo_particion), []).append(documento)
+
+        for mes, documentos in por_mes.items():
+            columnas = [
+                pa.array([_convertir(d.get(campo), tipo) for d in documentos], type=esquema.field(campo).type)
+                for campo, tipo in definicion.campos
+            ]
+            columnas.append(pa.array([hasta] * len(documentos), type=esquema.field(COLUMNA_EXPORTADO).type))
+            escritor = escritores.get(mes)
+            if escritor is None:
+                carpeta = os.path.join(directorio, f"mes={mes}")
+                os.makedirs(carpeta, exist_ok=True)
+                ruta = os.path.join(carpeta, f"parte-{ejecucion}.parquet")
+                escritor = escritores[mes] = (ruta, pq.ParquetWriter(_temporal(ruta), esquema))
+            escritor[1].write_batch(pa.RecordBatch.from_arrays(columnas, schema=esquema))
+
+    try:
+        lote = []
+        for documento in cursor:
+            lote.append(documento)
+            if len(lote) >= TAMANO_LOTE:
+                escribir(lote)
+                filas += len(lote)
+                lote = []
+                if progreso:
+                    progreso(definicion.coleccion, filas)
+                if cancelacion is not None and cancelacion.is_set():
+                    cancelada = True
+                    break
+        if lote and not cancelada:
+            escribir(lote)
+            filas += len(lote)
+    except Exception:
+        cancelada = True
+        raise
+    finally:
+        cursor.close()
+        for ruta, escritor in escritores.values():
+            escritor.close()
+            if cancelada:
+                os.remove(_temporal(ruta))
+            else:
+                os.replace(_temporal(ruta), ruta)
+
+    archivos = [] if cancelada else sorted(ruta for ruta, _ in escritores.values())
+    if not cancelada:
+        _guardar_marca(directorio, hasta)
+        if progreso:
+            progreso(definicion.coleccion, filas)
+        logging.info(
+            f"Exportadas {filas} filas de {definicion.coleccion} a Parquet en {len(archivos)} archivos"
+        )
+
+    return {'filas': filas, 'archivos': archivos, 'desde': desde, 'hasta': hasta, 'cancelada': cancelada}
+
+
+def exportar(db, destino, colecciones=None, incremental=True, progreso=None, cancelacion=None):
+    """
+    Exporta reparaciones y preventivas a Parquet.
+
+    Args:
+        db: Base de datos de MongoDB
+        destino (str): Directorio raíz de la exportación
+        colecciones (list, optional): Nombres de las colecciones; por defecto, todas
+        incremental (bool, optional): Solo lo posterior a la marca de agua
+        progreso (callable, optional): Función (colección, filas)
+        cancelacion (threading.Event, optional): Detiene la exportación si se activa
+
+    Returns:
+        dict: Resultado de exportar_coleccion por colección
+    """
+    resultados = {}
+    for nombre in colecciones or DEFINICIONES:
+        resultados[nombre] = exportar_coleccion(
+            db, DEFINICIONES[nombre], destino, incremental, progreso, cancelacion
+        )
+        if resultados[nombre]['cancelada']:
+            break
+    return resultados
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Exporta reparaciones y preventivas a Parquet")
+    parser.add_argument('destino', help="Directorio de la exportación")
+    parser.add_argument('--completo', action='store_true',
+                        help="Exporta todo ignorando la marca de agua")
+    parser.add_argument('--coleccion', action='append', choices=sorted(DEFINICIONES),
+                        help="Colección a exportar (se puede repetir)")
+    args = parser.parse_args(argv)
+
+    if not disponible():
+        print("La exportación a Parquet requiere pyarrow: pip install pyarrow")
+        return 1
+
+    from database.connection import DatabaseConnection
+    db = DatabaseConnection().get_database()
+
+    resultados = exportar(db, args.destino, args.coleccion, incremental=not args.completo)
+    for nombre, resultado in resultados.items():
+        desde = resultado['desde'].isoformat() if resultado['desde'] else 'inicio'
+        print(f"{nombre}: {resultado['filas']} filas ({desde} -> {resultado['hasta'].isoformat()}), "
+              f"{len(resultado['archivos'])} archivos")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
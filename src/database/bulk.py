@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Escrituras en bloque con resultado por elemento.
+
+Los DAO preparan una operación (InsertOne, UpdateOne...) por elemento y
+``ejecutar_lote`` las envía con un solo ``bulk_write``. Los duplicados no se
+comprueban leyendo antes de escribir: los detectan los índices únicos y
+llegan como errores de escritura con el código 11000.
+
+Cada operación va acompañada de su objetivo: el documento que inserta o el
+filtro que la dirige. Así el resultado y la réplica local saben qué
+documentos se escribieron sin leer los atributos internos de pymongo.
+"""
+
+import logging
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+# Código de error de MongoDB para una clave duplicada en un índice único
+CODIGO_DUPLICADO = 11000
+
+
+class ResultadoLote:
+    """Resultado global y por elemento de una escritura en bloque"""
+
+    # Estados de cada elemento
+    INSERTADO = 'insertado'
+    ESCRITO = 'escrito'
+    DUPLICADO = 'duplicado'
+    ERROR = 'error'
+    NO_EJECUTADO = 'no_ejecutado'
+
+    def __init__(self, total):
+        """
+        Inicializa el resultado con todos los elementos sin ejecutar.
+
+        Args:
+            total (int): Número de elementos del lote
+        """
+        self.elementos = [
+            {'estado': self.NO_EJECUTADO, 'id': None, 'error': None}
+            for _ in range(total)
+        ]
+        self.insertados = 0
+        self.coincidentes = 0
+        self.modificados = 0
+
+    def marcar(self, indice, estado, id=None, error=None):
+        """
+        Asigna el resultado de un elemento.
+
+        Args:
+            indice (int): Posición del elemento en el lote
+            estado (str): Uno de los estados de la clase
+            id (optional): ID del documento insertado
+            error (str, optional): Mensaje de error
+        """
+        self.elementos[indice] = {'estado': estado, 'id': id, 'error': error}
+
+    def rechazar(self, error):
+        """
+        Marca todos los elementos como erróneos sin escribir nada.
+
+        Args:
+            error (str): Motivo del rechazo
+        """
+        for indice in range(len(self.elementos)):
+            self.marcar(indice, self.ERROR, error=error)
+
+    def con_estado(self, *estados):
+        """
+        Devuelve las posiciones de los elementos con alguno de los estados.
+
+        Returns:
+            list: Posiciones en el lote
+        """
+        return [i for i, e in enumerate(self.elementos) if e['estado'] in estados]
+
+    @property
+    def correctos(self):
+        """Posiciones de los elementos escritos sin error"""
+        return self.con_estado(self.INSERTADO, self.ESCRITO)
+
+    @property
+    def fallidos(self):
+        """Posiciones de los elementos con error o no ejecutados"""
+        return self.con_estado(self.DUPLICADO, self.ERROR, self.NO_EJECUTADO)
+
+    @property
+    def ok(self):
+        """True si todos los elementos se escribieron"""
+        return not self.fallidos
+
+    def __repr__(self):
+        return (f"ResultadoLote(correctos={len(self.correctos)}, fallidos={len(self.fallidos)}, "
+                f"insertados={self.insertados}, modificados={self.modificados})")
+
+
+def operacion_insertar(documento):
+    """
+    Construye la operación que inserta un documento.
+
+    Returns:
+        tuple: (InsertOne, documento); pymongo asigna el _id en el propio documento
+    """
+    return InsertOne(documento), documento
+
+
+def operacion_actualizar(filtro, actualizacion, upsert=False):
+    """
+    Construye la operación que actualiza el documento que cumple el filtro.
+
+    Returns:
+        tuple: (UpdateOne, filtro)
+    """
+    return UpdateOne(filtro, actualizacion, upsert=upsert), filtro
+
+
+def operacion_upsert(documento, claves, solo_insercion=('_id', 'fecha_registro')):
+    """
+    Construye la operación que inserta un documento o actualiza el existente.
+
+    Args:
+        documento (dict): Documento completo (to_dict del modelo)
+        claves (tuple): Campos que identifican el documento (con índice único)
+        solo_insercion (tuple, optional): Campos que no se sobrescriben si ya existe
+
+    Returns:
+        tuple: (UpdateOne con upsert, filtro por las claves)
+    """
+    filtro = {campo: documento.get(campo) for campo in claves}
+    cambios = {c: v for c, v in documento.items() if c not in solo_insercion and c not in claves}
+    en_insercion = {
+        c: documento[c] for c in solo_insercion
+        if c not in claves and documento.get(c) is not None
+    }
+
+    actualizacion = {'$set': cambios}
+    if en_insercion:
+        actualizacion['$setOnInsert'] = en_insercion
+    return operacion_actualizar(filtro, actualizacion, upsert=True)
+
+
+def operacion_guardar(documento, claves, actualizar_existentes=True):
+    """
+    Construye la operación de bulk_upsert de un documento.
+
+    Args:
+        documento (dict): Documento completo (to_dict del modelo)
+        claves (tuple): Campos que identifican el documento
+        actualizar_existentes (bool, optional): False inserta y deja que los
+                                                existentes fallen como duplicados
+
+    Returns:
+        tuple: (InsertOne o UpdateOne, documento o filtro)
+    """
+    if actualizar_existentes:
+        return operacion_upsert(documento, claves)
+    return operacion_insertar(documento)
+
+
+def ejecutar_lote(collection, operaciones, resultado, ordered=True):
+    """
+    Ejecuta las operaciones con un solo bulk_write y completa el resultado.
+
+    En modo ordenado MongoDB se detiene en el primer error y los elementos
+    siguientes quedan sin ejecutar; sin orden se ejecutan todos los demás.
+    Un elemento que el DAO ya marcó como erróneo (p. ej. un ID no válido)
+    cuenta igual que un error de escritura en esa posición.
+
+    bulk_write no informa de las coincidencias por operación: una
+    actualización cuyo filtro no encontró documento queda como ESCRITO y
+    solo se refleja en los totales ``coincidentes`` y ``modificados``.
+
+    Args:
+        collection: Colección replicada (ver ``database.replica``)
+        operaciones (list): Tuplas (posición en el lote, operación, objetivo),
+                            con el objetivo de ``operacion_insertar`` o
+                            ``operacion_actualizar``
+        resultado (ResultadoLote): Resultado a completar
+        ordered (bool, optional): Si la ejecución se detiene en el primer error
+
+    Returns:
+        ResultadoLote: El mismo resultado, completado
+    """
+    if ordered:
+        anteriores = resultado.con_estado(ResultadoLote.ERROR, ResultadoLote.DUPLICADO)
+        if anteriores:
+            operaciones = [operacion for operacion in operaciones if operacion[0] < min(anteriores)]
+
+    if not operaciones:
+        return resultado
+
+    try:
+        detalles = collection.bulk_write(
+            [op for _, op, _ in operaciones], ordered=ordered,
+            afectados=[objetivo for _, _, objetivo in operaciones]
+        ).bulk_api_result
+    except BulkWriteError as e:
+        detalles = e.details
+    except PyMongoError as e:
+        logging.error(f"Error en la escritura en bloque de {collection.name}: {str(e)}")
+        for indice, _, _ in operaciones:
+            resultado.marcar(indice, ResultadoLote.ERROR, error=str(e))
+        return resultado
+
+    errores = {error['index']: error for error in detalles.get('writeErrors', [])}
+    insertados = {u['index']: u['_id'] for u in detalles.get('upserted', [])}
+    limite = min(errores) if ordered and errores else len(operaciones)
+
+    for posicion, (indice, operacion, objetivo) in enumerate(operaciones):
+        error = errores.get(posicion)
+        if error is not None:
+            estado = ResultadoLote.DUPLICADO if error.get('code') == CODIGO_DUPLICADO else ResultadoLote.ERROR
+            resultado.marcar(indice, estado, error=error.get('errmsg'))
+        elif posicion > limite:
+            continue
+        elif posicion in insertados:
+            resultado.marcar(indice, ResultadoLote.INSERTADO, id=insertados[posicion])
+        elif isinstance(operacion, InsertOne):
+            resultado.marcar(indice, ResultadoLote.INSERTADO, id=objetivo.get('_id'))
+        else:
+            resultado.marcar(indice, ResultadoLote.ESCRITO)
+
+    resultado.insertados += detalles.get('nInserted', 0) + detalles.get('nUpserted', 0)
+    resultado.coincidentes += detalles.get('nMatched', 0)
+    resultado.modificados += detalles.get('nModified', 0)
+
+    if errores:
+        logging.warning(f"Escritura en bloque de {collection.name}: {len(errores)} operaciones con error")
+    return resultado
+
+
+def convertir_ids(ids, resultado):
+    """
+    Convierte los IDs del lote a ObjectId y marca como error los no válidos.
+
+    Args:
+        ids (list): IDs (str o ObjectId)
+        resultado (ResultadoLote): Resultado del lote
+
+    Returns:
+        list: Tuplas (posición, ObjectId) de los IDs válidos
+    """
+    validos = []
+    for indice, documento_id in enumerate(ids):
+        if isinstance(documento_id, str):
+            try:
+                documento_id = ObjectId(documento_id)
+            except InvalidId:
+                resultado.marcar(indice, ResultadoLote.ERROR, error=f"ID no válido: {documento_id}")
+                continue
+        validos.append((indice, documento_id))
+    return validos
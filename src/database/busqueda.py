@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mantenimiento de los campos de búsqueda calculados de las colecciones.
+"""
+
+import logging
+from pymongo.errors import PyMongoError
+from database.bulk import operacion_actualizar
+from utils.texto import CAMPO_BUSQUEDA, ngramas
+
+
+def valor_busqueda(documento, campos):
+    """
+    Calcula el valor del campo de búsqueda por n-gramas de un documento.
+
+    Args:
+        documento (dict): Documento o datos con los campos de texto
+        campos (tuple): Campos de texto que se indexan
+
+    Returns:
+        list: Prefijos normalizados de las palabras de los campos
+    """
+    return ngramas(*(documento.get(campo) for campo in campos))
+
+
+def completar_campos(collection, campos, calcular, calculados, lote=1000, todos=False):
+    """
+    Calcula los campos de búsqueda de los documentos que no los tienen.
+
+    Se usa para los documentos creados antes de que existieran los campos o
+    escritos por otras herramientas.
+
+    Args:
+        collection: Colección de MongoDB
+        campos (tuple): Campos de origen que necesita el cálculo
+        calcular (callable): Recibe el documento y devuelve el dict a asignar
+        calculados (tuple): Campos calculados; falta alguno => se recalcula
+        lote (int, optional): Documentos por escritura en bloque
+        todos (bool, optional): Recalcula también los que ya los tienen
+
+    Returns:
+        int: Número de documentos actualizados
+    """
+    if todos:
+        filtro = {}
+    else:
+        filtro = {'$or': [{campo: {'$exists': False}} for campo in calculados]}
+    proyeccion = {campo: 1 for campo in campos}
+    actualizados = 0
+    operaciones = []
+
+    def escribir():
+        return collection.bulk_write(
+            [operacion for operacion, _ in operaciones], ordered=False,
+            afectados=[filtro_id for _, filtro_id in operaciones]
+        ).modified_count
+
+    try:
+        for doc in collection.find(filtro, proyeccion).batch_size(lote):
+            operaciones.append(operacion_actualizar({'_id': doc['_id']}, {'$set': calcular(doc)}))
+            if len(operaciones) >= lote:
+                actualizados += escribir()
+                operaciones = []
+
+        if operaciones:
+            actualizados += escribir()
+    except PyMongoError as e:
+        logging.error(f"Error al completar los campos de búsqueda de {collection.name}: {str(e)}")
+
+    if actualizados:
+        logging.info(f"Campos de búsqueda calculados en {actualizados} documentos de {collection.name}")
+    return actualizados
+
+
+def reconstruir_busqueda(collection, campos, claves_busqueda=None, campos_claves=(), todos=False):
+    """
+    Completa el campo de n-gramas y las claves normalizadas de una colección.
+
+    Args:
+        collection: Colección de MongoDB
+        campos (tuple): Campos de texto del campo de n-gramas (puede estar vacío)
+        claves_busqueda (callable, optional): claves_busqueda del modelo
+        campos_claves (tuple, optional): Campos de origen de las claves
+        todos (bool, optional): Recalcula también los documentos completos
+
+    Returns:
+        int: Número de documentos actualizados
+    """
+    calculados = ()
+    if campos:
+        calculados += (CAMPO_BUSQUEDA,)
+    if claves_busqueda:
+        calculados += tuple(claves_busqueda({}))
+
+    def calcular(doc):
+        valores = {}
+        if campos:
+            valores[CAMPO_BUSQUEDA] = valor_busqueda(doc, campos)
+        if claves_busqueda:
+            valores.update(claves_busqueda(doc))
+        return valores
+
+    origen = tuple(dict.fromkeys(tuple(campos) + tuple(campos_claves)))
+    return completar_campos(collection, origen, calcular, calculados, todos=todos)
@@ -6,10 +6,20 @@ Data Access Object (DAO) para operaciones CRUD con camiones.
 """
 
 import logging
+from datetime import datetime
 from bson import ObjectId
-from pymongo.errors import PyMongoError
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from database.bulk import ResultadoLote, convertir_ids, ejecutar_lote, operacion_actualizar, operacion_guardar
+from database.busqueda import reconstruir_busqueda
 from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar, publicar_varios
+from database.paginacion import Pagina, TAMANO_PAGINA, obtener_pagina
+from models.actividad import Actividad
 from models.camion import Camion
+from models.filas import FilaCamion
+from utils.texto import filtro_prefijo
 
 class CamionesDAO:
     """Clase para operaciones CRUD con camiones en MongoDB"""
@@ -18,6 +28,7 @@ class CamionesDAO:
         """Inicializa el DAO conectándose a la base de datos"""
         self.db_connection = DatabaseConnection()
         self.collection = self.db_connection.get_camiones_collection()
+        self.cache = EntityCache.de_coleccion('camiones')
     
     def obtener_todos(self):
         """
@@ -33,6 +44,110 @@ class CamionesDAO:
             logging.error(f"Error al obtener los camiones: {str(e)}")
             return []
     
+    def obtener_pagina(self, token=None, tamano=TAMANO_PAGINA):
+        """
+        Obtiene una página de camiones ordenados por matrícula.
+        
+        Args:
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de camiones
+            
+        Returns:
+            Pagina: Camiones de la página y token de la siguiente
+        """
+        return self.buscar_pagina(None, token, tamano)
+    
+    def buscar_pagina(self, filtros=None, token=None, tamano=TAMANO_PAGINA):
+        """
+        Busca una página de camiones ordenados por matrícula.
+        
+        Args:
+            filtros (dict, optional): Criterios de búsqueda ('matricula', 'estado')
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de camiones
+            
+        Returns:
+            Pagina: Camiones de la página y token de la siguiente
+        """
+        try:
+            documentos, siguiente = obtener_pagina(
+                self.collection, self._construir_consulta(filtros),
+                'matricula', ASCENDING, token, tamano
+            )
+            return Pagina([Camion.from_dict(c) for c in documentos], siguiente)
+        except (PyMongoError, ValueError) as e:
+            logging.error(f"Error al buscar la página de camiones: {str(e)}")
+            return Pagina([])
+    
+    def buscar_filas(self, filtros=None, token=None, tamano=TAMANO_PAGINA):
+        """
+        Busca una página de filas ligeras de camiones ordenados por matrícula.
+        
+        Solo se transfieren los campos que muestra la tabla.
+        
+        Args:
+            filtros: Diccionario con criterios de búsqueda
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de filas
+            
+        Returns:
+            Pagina: Objetos FilaCamion de la página y token de la siguiente
+        """
+        try:
+            documentos, siguiente = obtener_pagina(
+                self.collection, self._construir_consulta(filtros),
+                'matricula', ASCENDING, token, tamano, FilaCamion.PROYECCION
+            )
+            return Pagina([FilaCamion.desde_documento(doc) for doc in documentos], siguiente)
+        except (PyMongoError, ValueError) as e:
+            logging.error(f"Error al buscar las filas de camiones: {str(e)}")
+            return Pagina([])
+    
+    def obtener_fila(self, camion_id, filtros=None):
+        """
+        Obtiene la fila ligera de un camión si cumple los filtros de la lista.
+        
+        Se usa para actualizar una sola fila de la tabla tras un cambio.
+        
+        Args:
+            camion_id (str or ObjectId): ID del camión
+            filtros (dict, optional): Criterios de búsqueda de la lista
+            
+        Returns:
+            FilaCamion: Fila si existe y cumple los filtros, None en caso contrario
+        """
+        try:
+            if isinstance(camion_id, str):
+                camion_id = ObjectId(camion_id)
+            
+            consulta = {**self._construir_consulta(filtros), '_id': camion_id}
+            documento = self.collection.find_one(consulta, FilaCamion.PROYECCION)
+            return FilaCamion.desde_documento(documento) if documento else None
+        except PyMongoError as e:
+            logging.error(f"Error al obtener la fila del camión {camion_id}: {str(e)}")
+            return None
+    
+    def _construir_consulta(self, filtros):
+        """
+        Construye la consulta de MongoDB a partir de los filtros de la lista.
+        
+        Args:
+            filtros (dict): Criterios de búsqueda
+            
+        Returns:
+            dict: Consulta de MongoDB
+        """
+        query = {}
+        if filtros:
+            # Filtro por prefijo de matrícula (sobre la clave normalizada)
+            if filtros.get('matricula'):
+                query.update(filtro_prefijo('matricula_busqueda', filtros['matricula'], ''))
+            
+            # Filtro por estado
+            if filtros.get('estado'):
+                query['estado'] = filtros['estado']
+        return query
+    
     def obtener_por_id(self, camion_id):
         """
         Obtiene un camión por su ID.
@@ -47,7 +162,7 @@ class CamionesDAO:
             if isinstance(camion_id, str):
                 camion_id = ObjectId(camion_id)
                 
-            camion = self.collection.find_one({'_id': camion_id})
+            camion = self.cache.leer(self.collection, camion_id)
             if camion:
                 return Camion.from_dict(camion)
             return None
@@ -55,6 +170,19 @@ class CamionesDAO:
             logging.error(f"Error al obtener el camión {camion_id}: {str(e)}")
             return None
     
+    def obtener_en_cache(self, camion_id):
+        """
+        Obtiene el camión si ya está en la caché, sin consultar la base de datos.
+        
+        Args:
+            camion_id (str or ObjectId): ID del camión
+            
+        Returns:
+            Camion: Objeto Camion si está en caché, None en caso contrario
+        """
+        doc = self.cache.obtener(camion_id)
+        return Camion.from_dict(doc) if doc else None
+    
     def obtener_por_matricula(self, matricula):
         """
         Obtiene un camión por su matrícula.
@@ -85,14 +213,13 @@ class CamionesDAO:
             bool: True si se insertó correctamente, False en caso contrario
         """
         try:
-            # Verificar si ya existe un camión con la misma matrícula
-            if self.obtener_por_matricula(camion.matricula):
-                logging.warning(f"Ya existe un camión con matrícula {camion.matricula}")
-                return False
-            
-            # Insertar el camión
+            # El índice único de matrícula rechaza los duplicados
             result = self.collection.insert_one(camion.to_dict())
+            publicar('camiones', INSERCION, result.inserted_id)
             return result.acknowledged
+        except DuplicateKeyError:
+            logging.warning(f"Ya existe un camión con matrícula {camion.matricula}")
+            return False
         except PyMongoError as e:
             logging.error(f"Error al insertar el camión: {str(e)}")
             return False
@@ -108,10 +235,21 @@ class CamionesDAO:
             bool: True si se actualizó correctamente, False en caso contrario
         """
         try:
+            cambios = camion.cambios()
+            if not cambios:
+                return True
+
+            camion.ultima_actualizacion = datetime.now()
+            cambios['ultima_actualizacion'] = camion.ultima_actualizacion
+
             result = self.collection.update_one(
                 {'_id': camion.id},
-                {'$set': camion.to_dict()}
+                {'$set': cambios}
             )
+            self.cache.invalidar(camion.id)
+            camion.marcar_sin_cambios()
+            if result.matched_count:
+                publicar('camiones', ACTUALIZACION, camion.id)
             return result.matched_count > 0
         except PyMongoError as e:
             logging.error(f"Error al actualizar el camión {camion.id}: {str(e)}")
@@ -132,11 +270,27 @@ class CamionesDAO:
                 camion_id = ObjectId(camion_id)
                 
             result = self.collection.delete_one({'_id': camion_id})
+                
+            self.cache.invalidar(camion_id)
+            if result.deleted_count:
+                publicar('camiones', ELIMINACION, camion_id)
             return result.deleted_count > 0
         except PyMongoError as e:
             logging.error(f"Error al eliminar el camión {camion_id}: {str(e)}")
             return False
     
+    def reconstruir_busqueda(self, todos=False):
+        """
+        Calcula la clave de búsqueda de los camiones que no la tienen.
+        
+        Args:
+            todos (bool, optional): Recalcula también los que ya la tienen
+            
+        Returns:
+            int: Número de camiones actualizados
+        """
+        return reconstruir_busqueda(self.collection, (), Camion.claves_busqueda, ('matricula',), todos)
+    
     def obtener_por_estado(self, estado):
         """
         Obtiene los camiones que tienen un estado específico.
@@ -181,7 +335,135 @@ class CamionesDAO:
                     'ultima_actualizacion': Camion().ultima_actualizacion  # Actualizar fecha
                 }}
             )
+                
+            self.cache.invalidar(camion_id)
+            if result.matched_count:
+                publicar('camiones', ACTUALIZACION, camion_id)
             return result.matched_count > 0
         except PyMongoError as e:
             logging.error(f"Error al cambiar el estado del camión {camion_id}: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def bulk_upsert(self, camiones, ordered=False, actualizar_existentes=True):
+        """
+        Inserta o actualiza varios camiones, identificados por matrícula,
+        con una sola escritura en bloque.
+        
+        Los camiones que ya existían conservan su _id y su fecha de registro;
+        el atributo id del objeto solo es válido para los insertados.
+        
+        Args:
+            camiones (list): Objetos Camion
+            ordered (bool, optional): Si se detiene en el primer error
+            actualizar_existentes (bool, optional): False solo inserta; las
+                                                    matrículas existentes se
+                                                    informan como duplicadas
+            
+        Returns:
+            ResultadoLote: Resultado global y por camión
+        """
+        resultado = ResultadoLote(len(camiones))
+        ahora = datetime.now()
+        operaciones = []
+        for indice, camion in enumerate(camiones):
+            camion.ultima_actualizacion = ahora
+            operaciones.append(
+                (indice, *operacion_guardar(camion.to_dict(), ('matricula',), actualizar_existentes))
+            )
+        
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        # Los upserts por matrícula no devuelven el _id de los existentes
+        self.cache.limpiar()
+        if resultado.correctos:
+            publicar('camiones', ACTUALIZACION)
+        return resultado
+    
+    def bulk_cambiar_estado(self, camion_ids, nuevo_estado, ordered=False):
+        """
+        Cambia el estado de varios camiones con una sola escritura en bloque.
+        
+        Args:
+            camion_ids (list): IDs de los camiones (str u ObjectId)
+            nuevo_estado (str): Nuevo estado
+            ordered (bool, optional): Si se detiene en el primer error
+            
+        Returns:
+            ResultadoLote: Resultado global y por camión
+        """
+        resultado = ResultadoLote(len(camion_ids))
+        if nuevo_estado not in Camion.ESTADOS_VALIDOS:
+            logging.warning(f"Estado no válido: {nuevo_estado}")
+            resultado.rechazar(f"Estado no válido: {nuevo_estado}")
+            return resultado
+        
+        cambios = {'$set': {'estado': nuevo_estado, 'ultima_actualizacion': datetime.now()}}
+        ids = convertir_ids(camion_ids, resultado)
+        operaciones = [(indice, *operacion_actualizar({'_id': camion_id}, cambios)) for indice, camion_id in ids]
+        
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        for _, camion_id in ids:
+            self.cache.invalidar(camion_id)
+        correctos = set(resultado.correctos)
+        publicar_varios('camiones', ACTUALIZACION,
+                        [camion_id for indice, camion_id in ids if indice in correctos])
+        return resultado
+    
+    def obtener_resumen_estados(self):
+        """
+        Obtiene el número de camiones por estado con una sola agregación.
+        
+        Returns:
+            dict: {'total': int, 'por_estado': {estado: int}}
+        """
+        try:
+            pipeline = [
+                {'$group': {'_id': '$estado', 'cantidad': {'$sum': 1}}}
+            ]
+            por_estado = {doc['_id']: doc['cantidad'] for doc in self.collection.aggregate(pipeline)}
+            return {
+                'total': sum(por_estado.values()),
+                'por_estado': por_estado
+            }
+        except PyMongoError as e:
+            logging.error(f"Error al obtener el resumen de estados de camiones: {str(e)}")
+            return {'total': 0, 'por_estado': {}}
+    
+    def obtener_actividad_reciente(self, limite=20):
+        """
+        Obtiene los camiones modificados más recientemente.
+        
+        Usa el índice sobre 'ultima_actualizacion' y solo transfiere los
+        campos necesarios para mostrar la actividad.
+        
+        Args:
+            limite (int, optional): Número máximo de camiones a devolver
+            
+        Returns:
+            list: Lista de diccionarios con matricula, modelo, estado y ultima_actualizacion
+        """
+        try:
+            cursor = self.collection.find(
+                {}, Actividad.PROYECCION_CAMION
+            ).sort('ultima_actualizacion', -1).limit(limite)
+            return list(cursor)
+        except PyMongoError as e:
+            logging.error(f"Error al obtener la actividad reciente de camiones: {str(e)}")
+            return []
+    
+    def obtener_actividad(self, camion_id):
+        """
+        Obtiene los campos de actividad de un camión tras un cambio.
+        
+        Args:
+            camion_id (str or ObjectId): ID del camión
+            
+        Returns:
+            dict: Documento con los campos de Actividad.PROYECCION_CAMION, o None
+        """
+        try:
+            if isinstance(camion_id, str):
+                camion_id = ObjectId(camion_id)
+            return self.collection.find_one({'_id': camion_id}, Actividad.PROYECCION_CAMION)
+        except PyMongoError as e:
+            logging.error(f"Error al obtener la actividad del camión {camion_id}: {str(e)}")
+            return None
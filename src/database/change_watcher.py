@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Observador de cambios en MongoDB que notifica a la interfaz mediante señales Qt.
+"""
+
+import logging
+import threading
+from pymongo.errors import PyMongoError, OperationFailure
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.query_cache import QueryCache
+from database.replica import ColeccionLocal
+
+
+class ChangeWatcher(QThread):
+    """
+    Hilo que vigila las colecciones y emite una señal por cada cambio.
+
+    Usa change streams cuando el servidor los admite (replica set o Atlas).
+    En un mongod independiente recurre a un sondeo incremental sobre los
+    campos de fecha de actualización de cada colección.
+    """
+
+    # Señal emitida con (colección, operación, id del documento o None)
+    cambio_detectado = pyqtSignal(str, str, object)
+
+    COLECCIONES = ('camiones', 'reparaciones', 'mecanicos', 'preventivas')
+
+    # Campos de fecha usados por el sondeo incremental
+    CAMPOS_FECHA = {
+        'camiones': ('ultima_actualizacion',),
+        'reparaciones': ('ultima_actualizacion',),
+        'mecanicos': ('ultima_actualizacion',),
+        'preventivas': ('fecha_registro', 'ultima_actualizacion_reparacion', 'ultima_actualizacion'),
+    }
+
+    # Segundos entre consultas del sondeo
+    INTERVALO_SONDEO = 5
+
+    # Tiempo máximo de espera de cada lectura del change stream (ms)
+    ESPERA_STREAM_MS = 1000
+
+    def __init__(self, colecciones=None, parent=None):
+        """
+        Inicializa el observador.
+
+        Args:
+            colecciones (tuple, optional): Colecciones a vigilar
+            parent (QObject, optional): Objeto padre
+        """
+        super().__init__(parent)
+        self.colecciones = tuple(colecciones or self.COLECCIONES)
+        self._detener = threading.Event()
+        self._resume_token = None
+        self._db = None
+
+        # Estado del sondeo: marca de tiempo, ids ya vistos en esa marca y conteo
+        self._marcas = {}
+        self._vistos_en_marca = {}
+        self._conteos = {}
+
+    def detener(self):
+        """Solicita la parada del hilo y espera a que termine"""
+        self._detener.set()
+        self.wait()
+
+    def run(self):
+        """Bucle principal del hilo"""
+        db = self._esperar_conexion()
+        if db is None:
+            return
+        self._db = db
+
+        if self._vigilar_stream(db):
+            return
+
+        logging.info("ChangeWatcher: Change streams no disponibles, se usa sondeo incremental")
+        self._vigilar_sondeo(db)
+
+    def _esperar_conexion(self):
+        """
+        Espera a que haya conexión con el servidor.
+        
+        La conexión la establece el arranque o, si el servidor no estaba
+        disponible, el sincronizador de la réplica local.
+        
+        Returns:
+            Database: Base de datos, o None si se detuvo el hilo antes
+        """
+        conexion = DatabaseConnection()
+        while conexion.db is None:
+            if self._detener.wait(self.INTERVALO_SONDEO):
+                return None
+        return conexion.db
+
+    def _vigilar_stream(self, db):
+        """
+        Vigila los cambios mediante un change stream de la base de datos.
+
+        Returns:
+            bool: False si el servidor no admite change streams
+        """
+        pipeline = [{'$match': {'ns.coll': {'$in': list(self.colecciones)}}}]
+
+        while not self._detener.is_set():
+            try:
+                with db.watch(pipeline, resume_after=self._resume_token,
+                              max_await_time_ms=self.ESPERA_STREAM_MS) as stream:
+                    logging.info("ChangeWatcher: Escuchando change streams")
+                    while not self._detener.is_set() and stream.alive:
+                        cambio = stream.try_next()
+                        if cambio is None:
+                            continue
+                        self._resume_token = stream.resume_token
+                        self._emitir_cambio(cambio)
+            except OperationFailure as e:
+                # Códigos de servidor sin soporte de change streams
+                if e.code in (40573, 40324, 136) or 'replica set' in str(e):
+                    return False
+                logging.error(f"ChangeWatcher: Error en el change stream: {str(e)}")
+                self._resume_token = None
+                self._detener.wait(self.INTERVALO_SONDEO)
+            except PyMongoError as e:
+                logging.error(f"ChangeWatcher: Error en el change stream: {str(e)}")
+                self._detener.wait(self.INTERVALO_SONDEO)
+
+        return True
+
+    def _emitir_cambio(self, cambio):
+        """Traduce un evento del change stream a la señal Qt"""
+        coleccion = cambio.get('ns', {}).get('coll')
+        operacion = cambio.get('operationType')
+        documento_id = cambio.get('documentKey', {}).get('_id')
+
+        if operacion in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+            documento_id = None
+
+        if coleccion:
+            self._notificar(coleccion, operacion, documento_id)
+    
+    def _notificar(self, coleccion, operacion, documento_id):
+        """Actualiza la réplica, invalida la caché de entidades y emite la señal de cambio"""
+        # Antes de emitir, para que los refrescos ya lean el dato nuevo
+        self._actualizar_replica(coleccion, documento_id)
+        EntityCache.invalidar_en(coleccion, documento_id)
+        QueryCache.invalidar_en(coleccion)
+        self.cambio_detectado.emit(coleccion, operacion, documento_id)
+
+    def _actualizar_replica(self, coleccion, documento_id):
+        """Copia en la réplica local el documento modificado en el servidor"""
+        if documento_id is None:
+            # Sin ID (eliminaciones del sondeo): lo recoge el sincronizador
+            return
+        local = DatabaseConnection().get_collection(coleccion)
+        if isinstance(local, ColeccionLocal):
+            local.refrescar(self._db[coleccion], [documento_id])
+
+    def _vigilar_sondeo(self, db):
+        """Vigila los cambios consultando periódicamente los campos de fecha"""
+        for coleccion in self.colecciones:
+            self._inicializar_marca(db, coleccion)
+
+        while not self._detener.wait(self.INTERVALO_SONDEO):
+            for coleccion in self.colecciones:
+                try:
+                    self._sondear(db, coleccion)
+                except PyMongoError as e:
+                    logging.error(f"ChangeWatcher: Error al sondear {coleccion}: {str(e)}")
+
+    def _inicializar_marca(self, db, coleccion):
+        """Toma como punto de partida la fecha más reciente de la colección"""
+        try:
+            marca = None
+            for campo in self.CAMPOS_FECHA.get(coleccion, ()):
+                doc = db[coleccion].find_one(
+                    {campo: {'$ne': None}}, {campo: 1}, sort=[(campo, -1)]
+                )
+                if doc and (marca is None or doc[campo] > marca):
+                    marca = doc[campo]
+
+            vistos = set()
+            if marca is not None:
+                # Los documentos con la marca inicial ya están en pantalla
+                filtro = {'$or': [{campo: marca} for campo in self.CAMPOS_FECHA[coleccion]]}
+                vistos = {doc['_id'] for doc in db[coleccion].find(filtro, {'_id': 1})}
+
+            self._marcas[coleccion] = marca
+            self._vistos_en_marca[coleccion] = vistos
+            self._conteos[coleccion] = db[coleccion].estimated_document_count()
+        except PyMongoError as e:
+            logging.error(f"ChangeWatcher: Error al inicializar {coleccion}: {str(e)}")
+            self._marcas[coleccion] = None
+            self._vistos_en_marca[coleccion] = set()
+            self._conteos[coleccion] = None
+
+    def _sondear(self, db, coleccion):
+        """Emite los documentos modificados desde la última consulta"""
+        campos = self.CAMPOS_FECHA.get(coleccion, ())
+        marca = self._marcas.get(coleccion)
+
+        if marca is None:
+            filtro = {'$or': [{campo: {'$ne': None}} for campo in campos]}
+        else:
+            # $gte para no perder documentos con la misma marca de tiempo
+            filtro = {'$or': [{campo: {'$gte': marca}} for campo in campos]}
+
+        proyeccion = {campo: 1 for campo in campos}
+        nueva_marca = marca
+        vistos = self._vistos_en_marca.setdefault(coleccion, set())
+        nuevos_vistos = set()
+
+        for doc in db[coleccion].find(filtro, proyeccion):
+            fecha = max((doc[c] for c in campos if doc.get(c) is not None), default=None)
+            if fecha is None:
+                continue
+
+            if fecha == marca and doc['_id'] in vistos:
+                continue
+
+            self._notificar(coleccion, 'update', doc['_id'])
+
+            if nueva_marca is None or fecha > nueva_marca:
+                nueva_marca = fecha
+                nuevos_vistos = {doc['_id']}
+            elif fecha == nueva_marca:
+                nuevos_vistos.add(doc['_id'])
+
+        if nueva_marca != marca:
+            self._marcas[coleccion] = nueva_marca
+            self._vistos_en_marca[coleccion] = nuevos_vistos
+        else:
+            vistos.update(nuevos_vistos)
+
+        # Las eliminaciones no dejan marca de tiempo: se detectan por el conteo
+        conteo = db[coleccion].estimated_document_count()
+        conteo_anterior = self._conteos.get(coleccion)
+        self._conteos[coleccion] = conteo
+        if conteo_anterior is not None and conteo < conteo_anterior:
+            self._notificar(coleccion, 'delete', None)
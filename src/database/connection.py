@@ -8,11 +8,127 @@ Módulo para gestionar la conexión a la base de datos MongoDB.
 import logging
 import os
 import json
-from pymongo import MongoClient
+import time
+import threading
+from pymongo import MongoClient, monitoring
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from database.indices import reconciliar
+from database.replica import COLECCIONES, ColeccionLocal, ReplicaLocal
+from utils import arranque
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Listener del pool de conexiones que acumula contadores de uso.
+    
+    Mide cuántas veces se ha pedido una conexión al pool y cuánto tiempo se
+    ha esperado hasta obtenerla, además de las conexiones abiertas y cerradas.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        """Pone a cero todos los contadores"""
+        with self._lock:
+            self.checkouts = 0
+            self.checkouts_fallidos = 0
+            self.checkins = 0
+            self.conexiones_creadas = 0
+            self.conexiones_cerradas = 0
+            self.espera_total_ms = 0.0
+            self.espera_maxima_ms = 0.0
+    
+    def _fin_espera(self):
+        """Devuelve los milisegundos transcurridos desde el inicio del checkout en este hilo"""
+        inicio = getattr(self._local, 'inicio_checkout', None)
+        self._local.inicio_checkout = None
+        if inicio is None:
+            return 0.0
+        return (time.perf_counter() - inicio) * 1000.0
+    
+    def connection_check_out_started(self, event):
+        # El checkout se realiza en el hilo que lanza la operación
+        self._local.inicio_checkout = time.perf_counter()
+    
+    def connection_checked_out(self, event):
+        espera = self._fin_espera()
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total_ms += espera
+            self.espera_maxima_ms = max(self.espera_maxima_ms, espera)
+    
+    def connection_check_out_failed(self, event):
+        espera = self._fin_espera()
+        with self._lock:
+            self.checkouts_fallidos += 1
+            self.espera_total_ms += espera
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checkins += 1
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.conexiones_creadas += 1
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.conexiones_cerradas += 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def estadisticas(self):
+        """
+        Devuelve una copia de los contadores actuales.
+        
+        Returns:
+            dict: Contadores de uso del pool
+        """
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkouts_fallidos': self.checkouts_fallidos,
+                'checkins': self.checkins,
+                'en_uso': self.checkouts - self.checkins,
+                'conexiones_abiertas': self.conexiones_creadas - self.conexiones_cerradas,
+                'conexiones_creadas': self.conexiones_creadas,
+                'espera_total_ms': round(self.espera_total_ms, 3),
+                'espera_media_ms': round(self.espera_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'espera_maxima_ms': round(self.espera_maxima_ms, 3)
+            }
+
 
 class DatabaseConnection:
-    """Clase para gestionar la conexión a MongoDB"""
+    """
+    Clase para gestionar la conexión a MongoDB.
+    
+    Es el único punto del proceso que crea un MongoClient: controladores y DAOs
+    obtienen sus colecciones de aquí y comparten el mismo pool de conexiones.
+    
+    Las colecciones replicadas se sirven desde la réplica local (ver
+    ``database.replica``), de modo que la aplicación funciona aunque el
+    servidor no esté disponible.
+    
+    Crear la instancia no conecta: la conexión se establece al pedir la base
+    de datos (``get_database``) o en segundo plano con
+    ``conectar_en_segundo_plano``, como hace la aplicación al arrancar.
+    """
     
     _instance = None
     
@@ -23,7 +139,18 @@ class DatabaseConnection:
         'log_level': 'INFO',
         'log_file': 'app.log',
         'debug_mode': 'False',
-        'app_port': '5000'
+        'app_port': '5000',
+        'max_pool_size': '20',
+        'min_pool_size': '0',
+        'max_idle_time_ms': '300000',
+        'replica_path': os.path.join('data', 'replica.sqlite3')
+    }
+    
+    # Variables de entorno para ajustar el pool de conexiones
+    POOL_ENV = {
+        'max_pool_size': 'MONGODB_MAX_POOL_SIZE',
+        'min_pool_size': 'MONGODB_MIN_POOL_SIZE',
+        'max_idle_time_ms': 'MONGODB_MAX_IDLE_TIME_MS'
     }
     
     def __new__(cls):
@@ -42,7 +169,14 @@ class DatabaseConnection:
         self.config = self._cargar_configuracion()
         self.client = None
         self.db = None
-        self.connect()
+        self.pool_stats = PoolStatsListener()
+        self.informe_indices = None
+        self._connect_lock = threading.Lock()
+        self.replica = ReplicaLocal(self.config.get('replica_path', self.DEFAULT_CONFIG['replica_path']))
+        self._colecciones_locales = {}
+        # Desactivado mientras dura la conexión del arranque
+        self._conexion_inicial = threading.Event()
+        self._conexion_inicial.set()
     
     def _cargar_configuracion(self):
         """Carga la configuración de la aplicación"""
@@ -55,6 +189,10 @@ class DatabaseConnection:
             config['log_file'] = os.environ.get('LOG_FILE', self.DEFAULT_CONFIG['log_file'])
             config['debug_mode'] = os.environ.get('DEBUG_MODE', self.DEFAULT_CONFIG['debug_mode'])
             config['app_port'] = os.environ.get('APP_PORT', self.DEFAULT_CONFIG['app_port'])
+            config['replica_path'] = os.environ.get('REPLICA_PATH', self.DEFAULT_CONFIG['replica_path'])
+            for key, env_var in self.POOL_ENV.items():
+                if os.environ.get(env_var):
+                    config[key] = os.environ[env_var]
             
             # Si no hay variables de entorno, intentar cargar desde archivo
             if not config['mongodb_uri'] or config['mongodb_uri'] == self.DEFAULT_CONFIG['mongodb_uri']:
@@ -78,25 +216,91 @@ class DatabaseConnection:
             # Configuración por defecto en caso de error
             return self.DEFAULT_CONFIG.copy()
     
+    def _get_pool_options(self):
+        """
+        Obtiene las opciones del pool de conexiones.
+        
+        Returns:
+            dict: Argumentos de pool para MongoClient
+        """
+        opciones = {}
+        for key, opcion in (('max_pool_size', 'maxPoolSize'),
+                            ('min_pool_size', 'minPoolSize'),
+                            ('max_idle_time_ms', 'maxIdleTimeMS')):
+            valor = self.config.get(key, self.DEFAULT_CONFIG[key])
+            try:
+                opciones[opcion] = int(valor)
+            except (TypeError, ValueError):
+                logging.warning(f"DatabaseConnection: Valor no válido para {key}: {valor}")
+                opciones[opcion] = int(self.DEFAULT_CONFIG[key])
+        return opciones
+    
     def connect(self):
         """Establece la conexión a MongoDB"""
         if self.client is not None:
             return True
         
+        # Evitar que dos hilos creen clientes distintos a la vez
+        with self._connect_lock:
+            if self.client is not None:
+                return True
+            return self._connect()
+    
+    def conectar_en_segundo_plano(self):
+        """
+        Conecta al servidor en un hilo aparte, sin bloquear la interfaz.
+        
+        Mientras dura el intento, las colecciones replicadas que todavía no
+        se han descargado nunca esperan a que termine en lugar de responder
+        con la réplica vacía.
+        
+        Returns:
+            threading.Thread: Hilo de la conexión
+        """
+        self._conexion_inicial.clear()
+        hilo = threading.Thread(target=self._conectar_inicial, name='ConexionInicial', daemon=True)
+        hilo.start()
+        return hilo
+    
+    def _conectar_inicial(self):
+        """Intento de conexión del arranque"""
+        try:
+            with arranque.fase('conexion'):
+                self.connect()
+            logging.info("Conexión a la base de datos establecida correctamente")
+        except Exception:
+            # Sin servidor se trabaja sobre la réplica; el sincronizador reintenta
+            logging.warning("DatabaseConnection: Sin conexión a MongoDB, se usará la réplica local")
+        finally:
+            self._conexion_inicial.set()
+    
+    def _connect(self):
+        """Crea el cliente compartido y verifica la conexión"""
         try:
             # Obtener URI de la configuración
             uri = self.config.get('mongodb_uri', self.DEFAULT_CONFIG['mongodb_uri'])
             db_name = self.config.get('mongodb_db', self.DEFAULT_CONFIG['mongodb_db'])
             
-            # Establecer conexión con timeout
-            self.client = MongoClient(uri, serverSelectionTimeoutMS=10000)
+            # Establecer conexión con timeout y el pool compartido
+            pool_options = self._get_pool_options()
+            client = MongoClient(
+                uri,
+                serverSelectionTimeoutMS=10000,
+                event_listeners=[self.pool_stats],
+                **pool_options
+            )
             # Verificar conexión
-            self.client.admin.command('ping')
+            try:
+                client.admin.command('ping')
+            except Exception:
+                client.close()
+                raise
             
-            # Obtener referencia a la base de datos
-            self.db = self.client[db_name]
+            # Obtener referencia a la base de datos antes de publicar el cliente
+            self.db = client[db_name]
+            self.client = client
             
-            logging.info(f"Conexión establecida a MongoDB Atlas en {uri.split('@')[1]}")
+            logging.info(f"Conexión establecida a MongoDB en {uri.split('@')[-1]} (pool: {pool_options})")
             
             # Asegurarse de que las colecciones existan
             self._ensure_collections_exist()
@@ -126,23 +330,9 @@ class DatabaseConnection:
                 if collection_name not in existing_collections:
                     self.db.create_collection(collection_name)
                     logging.info(f"Colección '{collection_name}' creada")
-                    
-                    # Crear índices básicos según la colección
-                    if collection_name == 'mecanicos':
-                        self.db[collection_name].create_index([('apellidos', 1)])
-                        self.db[collection_name].create_index([('actividad', 1)])
-                    elif collection_name == 'camiones':
-                        self.db[collection_name].create_index([('matricula', 1)], unique=True)
-                        self.db[collection_name].create_index([('estado', 1)])
-                    elif collection_name == 'reparaciones':
-                        self.db[collection_name].create_index([('id_camion', 1)])
-                        self.db[collection_name].create_index([('id_mecanico', 1)])
-                    elif collection_name == 'usuarios':
-                        self.db[collection_name].create_index([('username', 1)], unique=True)
-                    elif collection_name == 'preventivas':
-                        self.db[collection_name].create_index([('matricula', 1)])
-                        self.db[collection_name].create_index([('estado', 1)])
-                        self.db[collection_name].create_index([('nivel_urgencia', 1)])
+            
+            # Crear los índices declarados que falten y eliminar los obsoletos
+            self.informe_indices = reconciliar(self.db)
             
         except Exception as e:
             logging.error(f"Error al verificar/crear colecciones: {str(e)}")
@@ -150,16 +340,60 @@ class DatabaseConnection:
     def close(self):
         """Cierra la conexión a MongoDB"""
         if self.client:
+            logging.info(f"Estadísticas del pool de conexiones: {self.get_pool_stats()}")
             self.client.close()
             self.client = None
             self.db = None
             logging.info("Conexión a MongoDB cerrada")
     
-    def get_collection(self, collection_name):
-        """Obtiene una colección de la base de datos"""
+    @property
+    def conectado(self):
+        """Indica si hay un cliente conectado al servidor"""
+        return self.db is not None
+    
+    def get_pool_stats(self):
+        """
+        Obtiene los contadores de uso del pool de conexiones compartido.
+        
+        Returns:
+            dict: Checkouts, conexiones abiertas y tiempo de espera acumulado
+        """
+        return self.pool_stats.estadisticas()
+    
+    def get_database(self):
+        """Obtiene la base de datos de la conexión compartida"""
         if self.db is None:
             self.connect()
-        return self.db[collection_name]
+        return self.db
+    
+    def get_collection(self, collection_name):
+        """
+        Obtiene una colección de la base de datos.
+        
+        Las colecciones replicadas devuelven una ColeccionLocal, que no
+        necesita conexión para leer ni para escribir documentos sueltos.
+        """
+        if collection_name in COLECCIONES:
+            coleccion = self._colecciones_locales.get(collection_name)
+            if coleccion is None:
+                coleccion = ColeccionLocal(collection_name, self.replica,
+                                           lambda: self._coleccion_remota(collection_name))
+                self._colecciones_locales[collection_name] = coleccion
+            return coleccion
+        return self.get_database()[collection_name]
+    
+    def _coleccion_remota(self, collection_name):
+        """
+        Colección del servidor, o None si no hay conexión (sin intentar conectar).
+        
+        Durante la conexión del arranque, las colecciones que nunca se han
+        descargado esperan a que termine el intento; las demás se leen de
+        la réplica mientras tanto.
+        """
+        if self.db is None and not self.replica.sincronizada(collection_name):
+            self._conexion_inicial.wait()
+        db = self.db
+        return db[collection_name] if db is not None else None
     
     def get_mecanicos_collection(self):
         """Obtiene la colección de mecánicos"""
@@ -0,0 +1,621 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Evaluación en Python de filtros, órdenes, proyecciones, actualizaciones y
+agregaciones de MongoDB.
+
+La réplica local responde a las mismas consultas que los DAO envían al
+servidor. Se implementa el subconjunto de operadores que usa la aplicación;
+``validar`` y ``validar_agregacion`` lanzan ``OperadorNoAdmitido`` para
+cualquier otro, y en ese caso la consulta se envía al servidor.
+"""
+
+import copy
+import datetime
+import functools
+import itertools
+import numbers
+import re
+from bson import ObjectId
+
+# Marca de campo inexistente (distinto de un campo con valor None)
+_FALTA = object()
+
+_OPCIONES_REGEX = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}
+
+_COMPARACIONES = {
+    '$gt': lambda c: c > 0,
+    '$gte': lambda c: c >= 0,
+    '$lt': lambda c: c < 0,
+    '$lte': lambda c: c <= 0,
+}
+
+_OPERADORES_CAMPO = {'$eq', '$ne', '$in', '$nin', '$exists', '$all', '$regex', '$options', '$not'} | set(_COMPARACIONES)
+
+_OPERADORES_LOGICOS = ('$and', '$or', '$nor')
+
+
+class OperadorNoAdmitido(ValueError):
+    """El filtro o la actualización usa un operador que no se evalúa en local"""
+
+
+@functools.lru_cache(maxsize=256)
+def _compilar(patron, opciones=''):
+    """Compila (una sola vez) la expresión regular de un filtro $regex"""
+    flags = 0
+    for opcion in opciones:
+        flags |= _OPCIONES_REGEX.get(opcion, 0)
+    return re.compile(patron, flags)
+
+
+def rango_tipo(valor):
+    """Posición del tipo del valor en el orden de tipos de BSON"""
+    if valor is None or valor is _FALTA:
+        return 1
+    if isinstance(valor, bool):
+        return 8
+    if isinstance(valor, numbers.Number):
+        return 2
+    if isinstance(valor, str):
+        return 3
+    if isinstance(valor, dict):
+        return 4
+    if isinstance(valor, list):
+        return 5
+    if isinstance(valor, bytes):
+        return 6
+    if isinstance(valor, ObjectId):
+        return 7
+    if isinstance(valor, datetime.datetime):
+        return 9
+    return 10
+
+
+def valor_campo(documento, campo):
+    """
+    Obtiene el valor de un campo, admitiendo rutas con puntos.
+
+    Args:
+        documento (dict): Documento
+        campo (str): Nombre o ruta del campo
+
+    Returns:
+        object: Valor del campo, o _FALTA si no existe
+    """
+    valor = documento
+    for parte in campo.split('.'):
+        if isinstance(valor, dict):
+            valor = valor.get(parte, _FALTA)
+        elif isinstance(valor, list) and parte.isdigit() and int(parte) < len(valor):
+            valor = valor[int(parte)]
+        else:
+            return _FALTA
+        if valor is _FALTA:
+            return _FALTA
+    return valor
+
+
+def _candidatos(valor):
+    """Valores a comparar: en un array, el array completo y cada elemento"""
+    if isinstance(valor, list):
+        return [valor] + valor
+    return [valor]
+
+
+def _iguales(a, b):
+    """Igualdad de MongoDB: los valores de tipos distintos nunca son iguales"""
+    return rango_tipo(a) == rango_tipo(b) and a == b
+
+
+def _comparar(a, b):
+    """Compara dos valores del mismo tipo; None si no son comparables"""
+    if a is _FALTA:
+        a = None
+    if rango_tipo(a) != rango_tipo(b):
+        return None
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return None
+
+
+def _igual(valor, esperado):
+    """Condición de igualdad sobre el valor de un campo"""
+    if esperado is None:
+        # {campo: None} coincide con el campo nulo o inexistente
+        return valor is _FALTA or valor is None or (isinstance(valor, list) and None in valor)
+    if valor is _FALTA:
+        return False
+    return any(_iguales(v, esperado) for v in _candidatos(valor))
+
+
+def _regex(valor, patron):
+    """Condición $regex: algún valor de texto contiene el patrón"""
+    return any(isinstance(v, str) and patron.search(v) for v in _candidatos(valor))
+
+
+def _operador(valor, operador, argumento, condicion):
+    """Evalúa un operador de campo"""
+    if operador == '$eq':
+        return _igual(valor, argumento)
+    if operador == '$ne':
+        return not _igual(valor, argumento)
+    if operador in _COMPARACIONES:
+        if valor is _FALTA and argumento is not None:
+            return False
+        prueba = _COMPARACIONES[operador]
+        return any(
+            c is not None and prueba(c)
+            for c in (_comparar(v, argumento) for v in _candidatos(valor))
+        )
+    if operador == '$in':
+        return any(
+            _regex(valor, a) if isinstance(a, re.Pattern) else _igual(valor, a)
+            for a in argumento
+        )
+    if operador == '$nin':
+        return not _operador(valor, '$in', argumento, condicion)
+    if operador == '$exists':
+        return (valor is not _FALTA) == bool(argumento)
+    if operador == '$all':
+        return bool(argumento) and all(_igual(valor, a) for a in argumento)
+    if operador == '$regex':
+        if not isinstance(argumento, re.Pattern):
+            argumento = _compilar(argumento, condicion.get('$options', ''))
+        return _regex(valor, argumento)
+    if operador == '$options':
+        return True
+    if operador == '$not':
+        return not _cumple(valor, argumento)
+    raise OperadorNoAdmitido(operador)
+
+
+def _es_operadores(condicion):
+    """Indica si la condición de un campo es un dict de operadores"""
+    return isinstance(condicion, dict) and bool(condicion) and all(
+        isinstance(clave, str) and clave.startswith('$') for clave in condicion
+    )
+
+
+def _cumple(valor, condicion):
+    """Evalúa la condición de un campo sobre su valor"""
+    if _es_operadores(condicion):
+        return all(_operador(valor, op, arg, condicion) for op, arg in condicion.items())
+    if isinstance(condicion, re.Pattern):
+        return _regex(valor, condicion)
+    return _igual(valor, condicion)
+
+
+def validar(filtro):
+    """
+    Comprueba que todos los operadores del filtro se pueden evaluar en local.
+
+    Args:
+        filtro (dict): Filtro de MongoDB
+
+    Raises:
+        OperadorNoAdmitido: Si el filtro usa otro operador
+    """
+    for clave, condicion in (filtro or {}).items():
+        if clave in _OPERADORES_LOGICOS:
+            for subfiltro in condicion:
+                validar(subfiltro)
+        elif clave.startswith('$'):
+            raise OperadorNoAdmitido(clave)
+        elif _es_operadores(condicion):
+            for operador, argumento in condicion.items():
+                if operador not in _OPERADORES_CAMPO:
+                    raise OperadorNoAdmitido(operador)
+                if operador == '$not':
+                    validar({clave: argumento})
+
+
+def coincide(documento, filtro):
+    """
+    Indica si un documento cumple un filtro de MongoDB.
+
+    Args:
+        documento (dict): Documento
+        filtro (dict): Filtro (validado con ``validar``)
+
+    Returns:
+        bool: True si el documento cumple el filtro
+    """
+    for clave, condicion in (filtro or {}).items():
+        if clave == '$and':
+            cumple = all(coincide(documento, f) for f in condicion)
+        elif clave == '$or':
+            cumple = any(coincide(documento, f) for f in condicion)
+        elif clave == '$nor':
+            cumple = not any(coincide(documento, f) for f in condicion)
+        elif clave.startswith('$'):
+            raise OperadorNoAdmitido(clave)
+        else:
+            cumple = _cumple(valor_campo(documento, clave), condicion)
+        if not cumple:
+            return False
+    return True
+
+
+def normalizar_orden(clave, direccion=None):
+    """
+    Convierte los argumentos de ``sort`` en una lista de (campo, dirección).
+
+    Args:
+        clave (str, list or dict): Campo, o lista de tuplas (campo, dirección)
+        direccion (int, optional): Dirección si la clave es un solo campo
+
+    Returns:
+        list: Tuplas (campo, dirección)
+    """
+    if isinstance(clave, str):
+        return [(clave, 1 if direccion is None else direccion)]
+    if isinstance(clave, dict):
+        return list(clave.items())
+    return [(campo, dir_campo) for campo, dir_campo in clave]
+
+
+def _clave_orden(valor):
+    """Clave de ordenación compatible entre valores de tipos distintos"""
+    rango = rango_tipo(valor)
+    if rango == 1:
+        return (rango, 0)
+    if rango in (4, 5, 10):
+        return (rango, str(valor))
+    return (rango, valor)
+
+
+def ordenar(elementos, orden, documento=None):
+    """
+    Ordena la lista en el sitio como lo haría MongoDB.
+
+    Los nulos y campos inexistentes van primero en orden ascendente.
+
+    Args:
+        elementos (list): Documentos, o elementos que los contienen
+        orden (list): Tuplas (campo, dirección)
+        documento (callable, optional): Obtiene el documento de cada elemento
+    """
+    documento = documento or (lambda elemento: elemento)
+    # Ordenaciones estables desde la última clave hasta la primera
+    for campo, direccion in reversed(orden):
+        elementos.sort(key=lambda e: _clave_orden(valor_campo(documento(e), campo)), reverse=direccion < 0)
+
+
+def proyectar(documento, proyeccion):
+    """
+    Aplica una proyección de MongoDB (de inclusión o de exclusión).
+
+    Args:
+        documento (dict): Documento
+        proyeccion (dict or list): Campos a incluir o excluir
+
+    Returns:
+        dict: Nuevo documento con los campos proyectados
+    """
+    if not proyeccion:
+        return dict(documento)
+    if isinstance(proyeccion, (list, tuple)):
+        proyeccion = {campo: 1 for campo in proyeccion}
+
+    incluir_id = proyeccion.get('_id', 1)
+    campos = {c: v for c, v in proyeccion.items() if c != '_id'}
+
+    if any(campos.values()):
+        resultado = {}
+        if incluir_id and '_id' in documento:
+            resultado['_id'] = documento['_id']
+        for campo in campos:
+            raiz = campo.split('.')[0]
+            if raiz in documento:
+                resultado[raiz] = documento[raiz]
+        return resultado
+
+    resultado = {c: v for c, v in documento.items() if c not in campos}
+    if not incluir_id:
+        resultado.pop('_id', None)
+    return resultado
+
+
+def _asignar(documento, campo, valor):
+    """Asigna un campo, creando los subdocumentos de la ruta"""
+    partes = campo.split('.')
+    destino = documento
+    for parte in partes[:-1]:
+        destino = destino.setdefault(parte, {})
+        if not isinstance(destino, dict):
+            raise OperadorNoAdmitido(f"$set sobre {campo}")
+    destino[partes[-1]] = valor
+
+
+def _quitar(documento, campo):
+    """Elimina un campo si existe"""
+    partes = campo.split('.')
+    destino = documento
+    for parte in partes[:-1]:
+        destino = destino.get(parte) if isinstance(destino, dict) else None
+        if destino is None:
+            return
+    if isinstance(destino, dict):
+        destino.pop(partes[-1], None)
+
+
+def validar_actualizacion(actualizacion):
+    """
+    Comprueba que la actualización se puede aplicar en local.
+
+    Se admiten $set, $unset, $setOnInsert e $inc; las actualizaciones con
+    pipeline de agregación solo las evalúa el servidor.
+
+    Raises:
+        OperadorNoAdmitido: Si la actualización usa otra forma u operador
+    """
+    if not isinstance(actualizacion, dict) or not _es_operadores(actualizacion):
+        raise OperadorNoAdmitido('actualización sin operadores o con pipeline')
+    for operador in actualizacion:
+        if operador not in ('$set', '$unset', '$setOnInsert', '$inc'):
+            raise OperadorNoAdmitido(operador)
+
+
+def aplicar_actualizacion(documento, actualizacion, insercion=False):
+    """
+    Aplica una actualización de MongoDB a una copia del documento.
+
+    Args:
+        documento (dict): Documento original (no se modifica)
+        actualizacion (dict): Operadores de actualización (validados)
+        insercion (bool, optional): True si es la inserción de un upsert
+
+    Returns:
+        dict: Documento actualizado
+    """
+    nuevo = copy.deepcopy(documento)
+    for operador, campos in actualizacion.items():
+        if operador == '$set' or (operador == '$setOnInsert' and insercion):
+            for campo, valor in campos.items():
+                _asignar(nuevo, campo, copy.deepcopy(valor))
+        elif operador == '$unset':
+            for campo in campos:
+                _quitar(nuevo, campo)
+        elif operador == '$inc':
+            for campo, incremento in campos.items():
+                actual = valor_campo(nuevo, campo)
+                _asignar(nuevo, campo, (0 if actual is _FALTA or actual is None else actual) + incremento)
+    return nuevo
+
+
+def igualdades(filtro):
+    """
+    Extrae los campos con igualdad simple de un filtro (para los upsert).
+
+    Args:
+        filtro (dict): Filtro de MongoDB
+
+    Returns:
+        dict: Campos y valores
+    """
+    return {
+        campo: valor for campo, valor in (filtro or {}).items()
+        if not campo.startswith('$') and not _es_operadores(valor) and not isinstance(valor, re.Pattern)
+    }
+
+
+# Agregaciones
+#
+# Se evalúan las etapas y expresiones que usan las estadísticas de la
+# aplicación; ``validar_agregacion`` rechaza el resto antes de empezar.
+
+_ETAPAS = {'$match', '$group', '$sort', '$limit', '$skip', '$project', '$count', '$facet'}
+
+_ACUMULADORES = {'$sum', '$avg'}
+
+_EXPRESIONES = {'$eq', '$ne', '$and', '$or', '$cond', '$subtract', '$divide'}
+
+
+def _validar_expresion(expresion):
+    """Comprueba que la expresión solo usa operadores evaluables en local"""
+    if isinstance(expresion, list):
+        for elemento in expresion:
+            _validar_expresion(elemento)
+    elif isinstance(expresion, dict):
+        for clave, argumento in expresion.items():
+            if clave.startswith('$') and clave not in _EXPRESIONES:
+                raise OperadorNoAdmitido(clave)
+            _validar_expresion(argumento)
+
+
+def validar_agregacion(pipeline):
+    """
+    Comprueba que todas las etapas del pipeline se pueden evaluar en local.
+
+    Args:
+        pipeline (list): Etapas de la agregación
+
+    Raises:
+        OperadorNoAdmitido: Si el pipeline usa otra etapa, acumulador u operador
+    """
+    for etapa in pipeline:
+        if len(etapa) != 1:
+            raise OperadorNoAdmitido('etapa con varios operadores')
+        nombre, argumento = next(iter(etapa.items()))
+        if nombre not in _ETAPAS:
+            raise OperadorNoAdmitido(nombre)
+        if nombre == '$match':
+            validar(argumento)
+        elif nombre == '$group':
+            _validar_expresion(argumento.get('_id'))
+            for campo, acumulador in argumento.items():
+                if campo == '_id':
+                    continue
+                if not isinstance(acumulador, dict) or len(acumulador) != 1:
+                    raise OperadorNoAdmitido(f"acumulador de {campo}")
+                operador, expresion = next(iter(acumulador.items()))
+                if operador not in _ACUMULADORES:
+                    raise OperadorNoAdmitido(operador)
+                _validar_expresion(expresion)
+        elif nombre == '$project':
+            for campo, valor in argumento.items():
+                if campo != '_id' and (valor is False or valor == 0) and not isinstance(valor, dict):
+                    raise OperadorNoAdmitido('$project de exclusión')
+                _validar_expresion(valor)
+        elif nombre == '$facet':
+            for subpipeline in argumento.values():
+                validar_agregacion(subpipeline)
+
+
+def _es_numero(valor):
+    """Los booleanos no cuentan como números en las agregaciones"""
+    return isinstance(valor, numbers.Number) and not isinstance(valor, bool)
+
+
+def _evaluar(expresion, documento):
+    """
+    Evalúa una expresión de agregación sobre un documento.
+
+    Los campos inexistentes valen None.
+    """
+    if isinstance(expresion, str) and expresion.startswith('$'):
+        valor = valor_campo(documento, expresion[1:])
+        return None if valor is _FALTA else valor
+    if isinstance(expresion, list):
+        return [_evaluar(elemento, documento) for elemento in expresion]
+    if not isinstance(expresion, dict):
+        return expresion
+    if not _es_operadores(expresion):
+        return {campo: _evaluar(valor, documento) for campo, valor in expresion.items()}
+
+    operador, argumentos = next(iter(expresion.items()))
+    if operador == '$cond':
+        if isinstance(argumentos, dict):
+            argumentos = [argumentos.get('if'), argumentos.get('then'), argumentos.get('else')]
+        condicion, entonces, si_no = argumentos
+        return _evaluar(entonces if _verdadero(_evaluar(condicion, documento)) else si_no, documento)
+
+    valores = [_evaluar(argumento, documento) for argumento in argumentos]
+    if operador == '$eq':
+        return _iguales(valores[0], valores[1])
+    if operador == '$ne':
+        return not _iguales(valores[0], valores[1])
+    if operador == '$and':
+        return all(_verdadero(valor) for valor in valores)
+    if operador == '$or':
+        return any(_verdadero(valor) for valor in valores)
+    if None in valores:
+        return None
+    if operador == '$subtract':
+        diferencia = valores[0] - valores[1]
+        if isinstance(diferencia, datetime.timedelta):
+            # Entre fechas, en milisegundos como en MongoDB
+            return int(diferencia / datetime.timedelta(milliseconds=1))
+        return diferencia
+    if operador == '$divide':
+        return valores[0] / valores[1]
+    raise OperadorNoAdmitido(operador)
+
+
+def _verdadero(valor):
+    """Valor de verdad de una expresión: None, False y 0 son falsos"""
+    return valor is not None and valor is not False and not (_es_numero(valor) and valor == 0)
+
+
+def _clave_grupo(valor):
+    """Clave hashable del _id de un grupo"""
+    try:
+        hash(valor)
+        return (rango_tipo(valor), valor)
+    except TypeError:
+        return (rango_tipo(valor), repr(valor))
+
+
+def _agrupar(documentos, especificacion):
+    """Etapa $group: un documento por cada valor distinto de _id"""
+    acumuladores = [(campo, *next(iter(acumulador.items())))
+                    for campo, acumulador in especificacion.items() if campo != '_id']
+    grupos = {}
+    for documento in documentos:
+        valor_id = _evaluar(especificacion['_id'], documento)
+        clave = _clave_grupo(valor_id)
+        grupo = grupos.get(clave)
+        if grupo is None:
+            # Por acumulador: [suma, número de valores]
+            grupo = grupos[clave] = (valor_id, [[0, 0] for _ in acumuladores])
+        for (_, _, expresion), estado in zip(acumuladores, grupo[1]):
+            valor = _evaluar(expresion, documento)
+            if _es_numero(valor):
+                estado[0] += valor
+                estado[1] += 1
+
+    resultados = []
+    for valor_id, estados in grupos.values():
+        resultado = {'_id': valor_id}
+        for (campo, operador, _), (suma, cantidad) in zip(acumuladores, estados):
+            if operador == '$sum':
+                resultado[campo] = suma
+            else:
+                resultado[campo] = suma / cantidad if cantidad else None
+        resultados.append(resultado)
+    return resultados
+
+
+def _proyectar_etapa(documento, especificacion):
+    """Etapa $project de inclusión, con campos calculados"""
+    resultado = {}
+    # El _id se incluye salvo que se excluya expresamente
+    for campo, valor in {'_id': 1, **especificacion}.items():
+        if isinstance(valor, bool) or (_es_numero(valor) and valor in (0, 1)):
+            existente = valor_campo(documento, campo)
+            if valor and existente is not _FALTA:
+                _asignar(resultado, campo, existente)
+        else:
+            resultado[campo] = _evaluar(valor, documento)
+    return resultado
+
+
+def _etapa(fuente, nombre, argumento):
+    """Devuelve la fuente de documentos resultante de aplicar una etapa"""
+    if nombre == '$match':
+        return lambda: (documento for documento in fuente() if coincide(documento, argumento))
+    if nombre == '$project':
+        return lambda: (_proyectar_etapa(documento, argumento) for documento in fuente())
+    if nombre == '$limit':
+        return lambda: itertools.islice(fuente(), argumento)
+    if nombre == '$skip':
+        return lambda: itertools.islice(fuente(), argumento, None)
+    if nombre == '$group':
+        return lambda: iter(_agrupar(fuente(), argumento))
+    if nombre == '$count':
+        def contar():
+            cantidad = sum(1 for _ in fuente())
+            # Sin documentos, MongoDB no devuelve ninguno
+            return iter([{argumento: cantidad}] if cantidad else [])
+        return contar
+    if nombre == '$sort':
+        def ordenados():
+            documentos = list(fuente())
+            ordenar(documentos, normalizar_orden(argumento))
+            return iter(documentos)
+        return ordenados
+    if nombre == '$facet':
+        return lambda: iter([{campo: agregar(fuente, subpipeline) for campo, subpipeline in argumento.items()}])
+    raise OperadorNoAdmitido(nombre)
+
+
+def agregar(fuente, pipeline):
+    """
+    Evalúa un pipeline de agregación.
+
+    Los documentos se recorren sin cargarlos todos en memoria, salvo en
+    $sort; cada subpipeline de $facet vuelve a recorrer la fuente.
+
+    Args:
+        fuente (callable): Devuelve un iterador nuevo con los documentos de entrada
+        pipeline (list): Etapas (validadas con ``validar_agregacion``)
+
+    Returns:
+        list: Documentos resultantes
+    """
+    for etapa in pipeline:
+        nombre, argumento = next(iter(etapa.items()))
+        fuente = _etapa(fuente, nombre, argumento)
+    return list(fuente())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Caché de documentos por _id compartida por los DAO de cada colección.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class EntityCache:
+    """
+    Caché LRU de lectura (read-through) de documentos indexados por ``_id``.
+
+    Hay una instancia por colección, compartida por todos los DAO y
+    controladores que la usan. Las escrituras propias invalidan la entrada
+    afectada y el ChangeWatcher invalida las modificadas desde fuera.
+
+    Cada invalidación incrementa una generación; un documento leído antes de
+    una invalidación no se guarda, así una lectura lenta no puede volver a
+    meter en la caché un dato que ya se sabe obsoleto.
+    """
+
+    # Número máximo de documentos por colección
+    CAPACIDAD = 2000
+
+    _instancias = {}
+    _lock_instancias = threading.Lock()
+
+    def __init__(self, nombre, capacidad=None):
+        """
+        Inicializa la caché.
+
+        Args:
+            nombre (str): Nombre de la colección
+            capacidad (int, optional): Número máximo de documentos
+        """
+        self.nombre = nombre
+        self.capacidad = capacidad or self.CAPACIDAD
+        self._documentos = OrderedDict()
+        self._lock = threading.Lock()
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    @classmethod
+    def de_coleccion(cls, nombre):
+        """
+        Devuelve la caché compartida de una colección.
+
+        Args:
+            nombre (str): Nombre de la colección
+
+        Returns:
+            EntityCache: Caché de la colección
+        """
+        with cls._lock_instancias:
+            cache = cls._instancias.get(nombre)
+            if cache is None:
+                cache = cls._instancias[nombre] = cls(nombre)
+            return cache
+
+    @classmethod
+    def invalidar_en(cls, nombre, documento_id=None):
+        """
+        Invalida un documento (o toda la colección si no se indica) si hay caché.
+
+        Args:
+            nombre (str): Nombre de la colección
+            documento_id (optional): ID del documento; None invalida todo
+        """
+        with cls._lock_instancias:
+            cache = cls._instancias.get(nombre)
+        if cache is None:
+            return
+        if documento_id is None:
+            cache.limpiar()
+        else:
+            cache.invalidar(documento_id)
+
+    @staticmethod
+    def _clave(documento_id):
+        """Normaliza el ID para que str y ObjectId compartan entrada"""
+        if isinstance(documento_id, str):
+            try:
+                return ObjectId(documento_id)
+            except InvalidId:
+                return documento_id
+        return documento_id
+
+    def obtener(self, documento_id):
+        """
+        Devuelve el documento en caché sin consultar la base de datos.
+
+        Returns:
+            dict: Documento o None si no está en caché
+        """
+        clave = self._clave(documento_id)
+        with self._lock:
+            documento = self._documentos.get(clave)
+            if documento is None:
+                self.fallos += 1
+                return None
+            self._documentos.move_to_end(clave)
+            self.aciertos += 1
+            return documento
+
+    def leer(self, collection, documento_id):
+        """
+        Devuelve el documento desde la caché o, si no está, desde la colección.
+
+        Args:
+            collection: Colección de MongoDB
+            documento_id (str or ObjectId): ID del documento
+
+        Returns:
+            dict: Documento o None si no existe
+        """
+        documento = self.obtener(documento_id)
+        if documento is not None:
+            return documento
+
+        clave = self._clave(documento_id)
+        with self._lock:
+            generacion = self._generacion
+
+        documento = collection.find_one({'_id': clave})
+        if documento is not None:
+            self.guardar(documento, generacion)
+        return documento
+
+    def guardar(self, documento, generacion=None):
+        """
+        Guarda un documento completo.
+
+        Args:
+            documento (dict): Documento con '_id'
+            generacion (int, optional): Generación en la que se leyó; si hubo
+                                        invalidaciones después, no se guarda
+        """
+        clave = self._clave(documento.get('_id'))
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            self._documentos[clave] = documento
+            self._documentos.move_to_end(clave)
+            while len(self._documentos) > self.capacidad:
+                self._documentos.popitem(last=False)
+
+    def invalidar(self, documento_id):
+        """
+        Elimina un documento de la caché.
+
+        Args:
+            documento_id (str or ObjectId): ID del documento
+        """
+        clave = self._clave(documento_id)
+        with self._lock:
+            self._generacion += 1
+            self._documentos.pop(clave, None)
+
+    def limpiar(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._generacion += 1
+            self._documentos.clear()
+        logging.debug(f"EntityCache: Caché de '{self.nombre}' vaciada")
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de uso de la caché.
+
+        Returns:
+            dict: Documentos guardados, aciertos y fallos
+        """
+        with self._lock:
+            return {
+                'documentos': len(self._documentos),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos
+            }
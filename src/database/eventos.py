@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bus de eventos de cambios en las entidades.
+
+Los DAO y los controladores publican un ``CambioEntidad`` después de cada
+escritura; los cambios que llegan del servidor (change streams y
+sincronizador de la réplica) se publican igual. Cada vista se suscribe solo
+a las entidades que muestra y actualiza las filas afectadas en lugar de
+recargar la lista entera.
+
+Se puede publicar desde cualquier hilo: los suscriptores que son métodos de
+un QObject reciben los cambios en el hilo de ese objeto.
+"""
+
+import threading
+from collections import namedtuple
+from bson import ObjectId
+from PyQt5.QtCore import QCoreApplication, QObject, pyqtSignal, pyqtSlot
+
+# Tipos de cambio, con los mismos nombres que las operaciones de los change streams
+INSERCION = 'insert'
+ACTUALIZACION = 'update'
+ELIMINACION = 'delete'
+
+# A partir de cuántos documentos de una misma escritura se publica un único
+# cambio de la colección entera
+MAXIMO_CAMBIOS = 50
+
+
+class CambioEntidad(namedtuple('CambioEntidad', ['entidad', 'id', 'tipo'])):
+    """
+    Cambio en una entidad.
+
+    ``entidad`` es el nombre de la colección; ``id`` es None cuando cambiaron
+    varios documentos o no se sabe cuáles.
+    """
+
+    __slots__ = ()
+
+
+class BusEventos(QObject):
+    """Bus de cambios compartido por todo el proceso, con una señal por entidad"""
+
+    camiones = pyqtSignal(object)
+    mecanicos = pyqtSignal(object)
+    reparaciones = pyqtSignal(object)
+    preventivas = pyqtSignal(object)
+    usuarios = pyqtSignal(object)
+
+    ENTIDADES = ('camiones', 'mecanicos', 'reparaciones', 'preventivas', 'usuarios')
+
+    _instancia = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def instancia(cls):
+        """Devuelve el bus compartido, creándolo si hace falta"""
+        with cls._lock:
+            if cls._instancia is None:
+                bus = cls()
+                # Los cambios conectados al propio bus se reciben en el hilo de la interfaz
+                aplicacion = QCoreApplication.instance()
+                if aplicacion is not None:
+                    bus.moveToThread(aplicacion.thread())
+                cls._instancia = bus
+            return cls._instancia
+
+    def suscribir(self, entidad, receptor):
+        """
+        Conecta un receptor a los cambios de una entidad.
+
+        Args:
+            entidad (str): Nombre de la colección
+            receptor (callable): Función CambioEntidad -> None; si es un método
+                                 de un QObject se desconecta al destruirse
+        """
+        getattr(self, entidad).connect(receptor)
+
+    @pyqtSlot(str, str, object)
+    def publicar(self, entidad, tipo, documento_id=None):
+        """
+        Publica un cambio.
+
+        Args:
+            entidad (str): Nombre de la colección
+            tipo (str): Tipo de cambio (INSERCION, ACTUALIZACION, ELIMINACION...)
+            documento_id (optional): ID del documento, o None si cambiaron varios
+        """
+        if entidad not in self.ENTIDADES:
+            return
+        if isinstance(documento_id, str) and ObjectId.is_valid(documento_id):
+            documento_id = ObjectId(documento_id)
+        getattr(self, entidad).emit(CambioEntidad(entidad, documento_id, tipo))
+
+    def publicar_varios(self, entidad, tipo, documento_ids):
+        """
+        Publica el cambio de varios documentos escritos a la vez.
+
+        Si son más de MAXIMO_CAMBIOS se publica un solo cambio sin ID.
+
+        Args:
+            entidad (str): Nombre de la colección
+            tipo (str): Tipo de cambio
+            documento_ids (list): IDs de los documentos
+        """
+        documento_ids = list(documento_ids)
+        if len(documento_ids) > MAXIMO_CAMBIOS:
+            self.publicar(entidad, tipo)
+            return
+        for documento_id in documento_ids:
+            self.publicar(entidad, tipo, documento_id)
+
+
+def publicar(entidad, tipo, documento_id=None):
+    """Publica un cambio en el bus compartido (ver BusEventos.publicar)"""
+    BusEventos.instancia().publicar(entidad, tipo, documento_id)
+
+
+def publicar_varios(entidad, tipo, documento_ids):
+    """Publica el cambio de varios documentos (ver BusEventos.publicar_varios)"""
+    BusEventos.instancia().publicar_varios(entidad, tipo, documento_ids)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Exportación a CSV directamente desde un cursor, sin cargar los datos en memoria.
+
+Las filas se escriben a medida que llegan del cursor (en lotes de
+``TAMANO_LOTE`` documentos) a un archivo con búfer, opcionalmente comprimido
+con gzip. Se escribe primero en un archivo temporal que solo sustituye al
+destino si la exportación termina; al cancelar, el destino queda como estaba.
+"""
+
+import csv
+import gzip
+import logging
+import os
+
+# Documentos por lote del cursor y filas entre avisos de progreso
+TAMANO_LOTE = 1000
+
+# Búfer del archivo de salida sin comprimir
+TAMANO_BUFFER = 1024 * 1024
+
+# Extensión que activa la compresión si no se indica otra cosa
+EXTENSION_GZIP = '.gz'
+
+
+def _abrir_salida(ruta_archivo, comprimir):
+    """Abre el archivo de salida en modo texto, comprimido o con búfer"""
+    if comprimir:
+        return gzip.open(ruta_archivo, 'wt', newline='', encoding='utf-8', compresslevel=6)
+    return open(ruta_archivo, 'w', newline='', encoding='utf-8', buffering=TAMANO_BUFFER)
+
+
+def _valor(documento, campo):
+    """Valor de una columna: nombre de campo o función que recibe el documento"""
+    if callable(campo):
+        return campo(documento)
+    valor = documento.get(campo)
+    return '' if valor is None else valor
+
+
+def exportar_csv(ruta_archivo, documentos, columnas, total=None, progreso=None,
+                 cancelacion=None, comprimir=None):
+    """
+    Escribe documentos en un archivo CSV a medida que se leen.
+
+    Args:
+        ruta_archivo (str): Ruta del archivo destino
+        documentos (iterable): Cursor o iterable de documentos
+        columnas (list): Tuplas (encabezado, campo o función documento -> valor)
+        total (int, optional): Número estimado de documentos, para el progreso
+        progreso (callable, optional): Función (escritas, total) llamada cada
+                                       TAMANO_LOTE filas y al terminar
+        cancelacion (threading.Event, optional): Si se activa, la exportación
+                                                 se detiene y no se escribe nada
+        comprimir (bool, optional): Comprime con gzip; por defecto, si la ruta
+                                    termina en '.gz'
+
+    Returns:
+        dict: 'filas' escritas, 'cancelada' y 'ruta' del archivo
+    """
+    if comprimir is None:
+        comprimir = ruta_archivo.endswith(EXTENSION_GZIP)
+
+    temporal = f"{ruta_archivo}.parcial"
+    escritas = 0
+    cancelada = False
+
+    try:
+        with _abrir_salida(temporal, comprimir) as archivo:
+            writer = csv.writer(archivo)
+            writer.writerow([encabezado for encabezado, _ in columnas])
+
+            for documento in documentos:
+                writer.writerow([_valor(documento, campo) for _, campo in columnas])
+                escritas += 1
+
+                if escritas % TAMANO_LOTE == 0:
+                    if cancelacion is not None and cancelacion.is_set():
+                        cancelada = True
+                        break
+                    if progreso:
+                        progreso(escritas, total or escritas)
+
+        if cancelada:
+            os.remove(temporal)
+            logging.info(f"Exportación a {ruta_archivo} cancelada tras {escritas} filas")
+        else:
+            os.replace(temporal, ruta_archivo)
+            if progreso:
+                progreso(escritas, escritas)
+            logging.info(f"Exportadas {escritas} filas a {ruta_archivo}")
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    finally:
+        # Libera el cursor en el servidor si se salió antes de agotarlo
+        cerrar = getattr(documentos, 'close', None)
+        if cerrar is not None:
+            cerrar()
+
+    return {'filas': escritas, 'cancelada': cancelada, 'ruta': ruta_archivo}
+
+
+def exportar_coleccion(ruta_archivo, collection, columnas, filtro=None, orden=None,
+                       progreso=None, cancelacion=None, comprimir=None):
+    """
+    Exporta los documentos de una colección leyendo el cursor por lotes.
+
+    Args:
+        ruta_archivo (str): Ruta del archivo destino
+        collection: Colección de MongoDB
+        columnas (list): Tuplas (encabezado, campo o función documento -> valor)
+        filtro (dict, optional): Filtro de la consulta
+        orden (list, optional): Orden de la consulta
+        progreso (callable, optional): Función (escritas, total)
+        cancelacion (threading.Event, optional): Evento de cancelación
+        comprimir (bool, optional): Comprime con gzip
+
+    Returns:
+        dict: 'filas' escritas, 'cancelada' y 'ruta' del archivo
+    """
+    filtro = filtro or {}
+    total = collection.estimated_document_count() if not filtro else None
+    cursor = collection.find(filtro).batch_size(TAMANO_LOTE)
+    if orden:
+        cursor = cursor.sort(orden)
+    return exportar_csv(ruta_archivo, cursor, columnas, total, progreso, cancelacion, comprimir)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Importación de archivos CSV por lotes y sin cargarlos en memoria.
+
+El archivo se lee fila a fila; cada fila se valida y se convierte en un
+documento, y los documentos se insertan en lotes de ``TAMANO_LOTE`` con una
+sola escritura en bloque sin orden. La memoria usada depende del tamaño del
+lote, no del archivo.
+
+Las filas que no pasan la validación o que el servidor rechaza (por ejemplo,
+duplicados en un índice único) se escriben en un archivo de rechazos con el
+número de línea y el motivo, listo para corregirlo y volver a importarlo.
+"""
+
+import csv
+import logging
+import os
+from database.bulk import ResultadoLote, ejecutar_lote, operacion_insertar
+from database.eventos import INSERCION, publicar
+from utils.texto import clave_busqueda
+
+# Filas por escritura en bloque
+TAMANO_LOTE = 1000
+
+# Columnas añadidas al archivo de rechazos
+COLUMNA_LINEA = 'linea'
+COLUMNA_MOTIVO = 'motivo'
+
+
+def ruta_rechazos_por_defecto(ruta_archivo):
+    """
+    Devuelve la ruta del archivo de rechazos de una importación.
+
+    Args:
+        ruta_archivo (str): Ruta del CSV importado
+
+    Returns:
+        str: Ruta junto al original con el sufijo '.rechazos.csv'
+    """
+    base, _ = os.path.splitext(ruta_archivo)
+    return f"{base}.rechazos.csv"
+
+
+class _Rechazos:
+    """Archivo de rechazos que se crea con la primera fila rechazada"""
+
+    def __init__(self, ruta, encabezados):
+        self.ruta = ruta
+        self.encabezados = list(encabezados) + [COLUMNA_LINEA, COLUMNA_MOTIVO]
+        self.total = 0
+        self._archivo = None
+        self._writer = None
+
+    def escribir(self, fila, linea, motivo):
+        if self._writer is None:
+            self._archivo = open(self.ruta, 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._archivo, fieldnames=self.encabezados, extrasaction='ignore')
+            self._writer.writeheader()
+        registro = dict(fila)
+        registro[COLUMNA_LINEA] = linea
+        registro[COLUMNA_MOTIVO] = motivo
+        self._writer.writerow(registro)
+        self.total += 1
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+def importar_csv(ruta_archivo, collection, columnas, preparar, progreso=None,
+                 ruta_rechazos=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa un archivo CSV a una colección.
+
+    Los encabezados se comparan normalizados (sin mayúsculas, acentos ni
+    espacios): 'Matrícula', 'matricula' y 'MATRICULA' son la misma columna.
+    Las columnas que no están en ``columnas`` se ignoran.
+
+    Args:
+        ruta_archivo (str): Ruta del CSV (UTF-8, con o sin BOM)
+        collection: Colección de MongoDB destino
+        columnas (dict): Encabezado normalizado -> campo de los datos
+        preparar (callable): Recibe el dict de datos de la fila y devuelve el
+                             documento a insertar; lanza ValueError si la
+                             fila no es válida
+        progreso (callable, optional): Función (leidas, importadas, rechazadas,
+                                       fracción leída del archivo) llamada
+                                       tras cada lote
+        ruta_rechazos (str, optional): Archivo de rechazos; por defecto junto
+                                       al original
+        tamano_lote (int, optional): Filas por escritura en bloque
+
+    Returns:
+        dict: 'leidas', 'importadas', 'rechazadas' y 'ruta_rechazos' (None si
+              no hubo rechazos)
+    """
+    ruta_rechazos = ruta_rechazos or ruta_rechazos_por_defecto(ruta_archivo)
+    tamano_archivo = os.path.getsize(ruta_archivo) or 1
+    leidas = importadas = 0
+    lote = []
+
+    with open(ruta_archivo, newline='', encoding='utf-8-sig') as archivo:
+        lector = csv.DictReader(archivo)
+        encabezados = lector.fieldnames or []
+        campos = {
+            encabezado: columnas[clave_busqueda(encabezado, '_')]
+            for encabezado in encabezados
+            if clave_busqueda(encabezado, '_') in columnas
+        }
+        rechazos = _Rechazos(ruta_rechazos, encabezados)
+
+        def escribir_lote():
+            nonlocal importadas
+            resultado = ResultadoLote(len(lote))
+            operaciones = [(indice, *operacion_insertar(documento)) for indice, (_, _, documento) in enumerate(lote)]
+            ejecutar_lote(collection, operaciones, resultado, ordered=False)
+            for elemento, (linea, fila, _) in zip(resultado.elementos, lote):
+                if elemento['estado'] == ResultadoLote.INSERTADO:
+                    importadas += 1
+                elif elemento['estado'] == ResultadoLote.DUPLICADO:
+                    rechazos.escribir(fila, linea, "Registro duplicado")
+                else:
+                    rechazos.escribir(fila, linea, elemento['error'] or "No se pudo escribir")
+            lote.clear()
+            if progreso:
+                progreso(leidas, importadas, rechazos.total, archivo.buffer.tell() / tamano_archivo)
+
+        try:
+            for fila in lector:
+                leidas += 1
+                # La línea 1 es la de encabezados
+                linea = lector.line_num
+                datos = {
+                    campo: fila[encabezado].strip()
+                    for encabezado, campo in campos.items()
+                    if fila.get(encabezado) and fila[encabezado].strip()
+                }
+                try:
+                    documento = preparar(datos)
+                except ValueError as e:
+                    rechazos.escribir(fila, linea, str(e))
+                    continue
+
+                lote.append((linea, fila, documento))
+                if len(lote) >= tamano_lote:
+                    escribir_lote()
+
+            if lote:
+                escribir_lote()
+            elif progreso:
+                progreso(leidas, importadas, rechazos.total, 1.0)
+        finally:
+            rechazos.cerrar()
+
+    logging.info(
+        f"Importación de {ruta_archivo} en {collection.name}: {leidas} filas, "
+        f"{importadas} importadas, {rechazos.total} rechazadas"
+    )
+    if importadas:
+        # Un solo aviso para todo el archivo: las vistas recargan la lista
+        publicar(collection.name, INSERCION)
+    return {
+        'leidas': leidas,
+        'importadas': importadas,
+        'rechazadas': rechazos.total,
+        'ruta_rechazos': ruta_rechazos if rechazos.total else None
+    }
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Registro declarativo de los índices de MongoDB.
+
+Cada índice que necesitan las consultas de los DAO y controladores se declara
+aquí una sola vez. Al conectar, ``reconciliar`` solo crea los que falten e
+informa del resto; recrear los que tienen otra unicidad y eliminar los
+obsoletos se hace únicamente desde la línea de comandos. ``verificar_consultas``
+ejecuta ``explain()`` sobre las formas de consulta conocidas e informa de las
+que acabarían en un COLLSCAN.
+
+Uso desde la línea de comandos (desde el directorio src)::
+
+    python -m database.indices              # reconcilia (recrea y elimina) y muestra el resultado
+    python -m database.indices --verificar  # además, comprueba los planes
+"""
+
+import argparse
+import datetime
+import logging
+import sys
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+
+class Indice:
+    """Declaración de un índice de una colección"""
+
+    def __init__(self, coleccion, claves, unique=False):
+        """
+        Inicializa la declaración.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            claves (list): Lista de tuplas (campo, dirección)
+            unique (bool, optional): Si el índice es único
+        """
+        self.coleccion = coleccion
+        self.claves = list(claves)
+        self.unique = unique
+
+    @property
+    def nombre(self):
+        """Nombre que MongoDB asigna por defecto al índice"""
+        return '_'.join(f"{campo}_{direccion}" for campo, direccion in self.claves)
+
+    def __repr__(self):
+        return f"{self.coleccion}.{self.nombre}{' (único)' if self.unique else ''}"
+
+
+# Índices que usan las consultas de la aplicación
+INDICES = (
+    # Camiones: búsqueda por matrícula (exacta y por prefijo), filtro por
+    # estado, actividad reciente y paginación por matrícula
+    Indice('camiones', [('matricula', ASCENDING)], unique=True),
+    Indice('camiones', [('estado', ASCENDING)]),
+    Indice('camiones', [('ultima_actualizacion', DESCENDING)]),
+    Indice('camiones', [('matricula', ASCENDING), ('_id', ASCENDING)]),
+    Indice('camiones', [('matricula_busqueda', ASCENDING)]),
+
+    # Mecánicos: orden y paginación por apellidos, nombre completo único,
+    # filtro por actividad, sondeo de cambios y búsqueda libre
+    Indice('mecanicos', [('apellidos', ASCENDING)]),
+    Indice('mecanicos', [('actividad', ASCENDING)]),
+    Indice('mecanicos', [('apellidos', ASCENDING), ('_id', ASCENDING)]),
+    Indice('mecanicos', [('nombre', ASCENDING), ('apellidos', ASCENDING)], unique=True),
+    Indice('mecanicos', [('ultima_actualizacion', DESCENDING)]),
+    Indice('mecanicos', [('busqueda', ASCENDING), ('apellidos', ASCENDING), ('_id', ASCENDING)]),
+    Indice('mecanicos', [('nombre_busqueda', ASCENDING)]),
+    Indice('mecanicos', [('apellidos_busqueda', ASCENDING)]),
+
+    # Reparaciones: todas las listas se ordenan por fecha de entrada
+    # descendente, con o sin filtro por camión, mecánico, estado o texto
+    Indice('reparaciones', [('fecha_entrada', DESCENDING), ('_id', DESCENDING)]),
+    Indice('reparaciones', [('camion_id', ASCENDING), ('fecha_entrada', DESCENDING)]),
+    Indice('reparaciones', [('mecanico_id', ASCENDING), ('fecha_entrada', DESCENDING)]),
+    Indice('reparaciones', [('estado', ASCENDING), ('fecha_entrada', DESCENDING)]),
+    Indice('reparaciones', [('ultima_actualizacion', DESCENDING)]),
+    Indice('reparaciones', [('busqueda', ASCENDING), ('fecha_entrada', DESCENDING), ('_id', DESCENDING)]),
+    Indice('reparaciones', [('id_falla_busqueda', ASCENDING)]),
+
+    # Usuarios: autenticación por nombre de usuario y filtro por rol
+    Indice('usuarios', [('usuario', ASCENDING)], unique=True),
+    Indice('usuarios', [('rol', ASCENDING)]),
+
+    # Preventivas: búsqueda por matrícula, filtros, ventana de estadísticas,
+    # sondeo de cambios y descarga incremental de la réplica
+    Indice('preventivas', [('matricula', ASCENDING)]),
+    Indice('preventivas', [('estado', ASCENDING)]),
+    Indice('preventivas', [('nivel_urgencia', ASCENDING)]),
+    Indice('preventivas', [('fecha_registro', DESCENDING)]),
+    Indice('preventivas', [('ultima_actualizacion_reparacion', DESCENDING)]),
+    Indice('preventivas', [('ultima_actualizacion', DESCENDING)]),
+    Indice('preventivas', [('matricula_busqueda', ASCENDING)]),
+)
+
+# Índices creados por versiones anteriores sobre campos que ya no existen
+INDICES_OBSOLETOS = (
+    # El campo es 'usuario'; al ser único sobre un campo ausente, impedía
+    # registrar más de un usuario
+    ('usuarios', 'username_1'),
+    # Los campos son 'camion_id' y 'mecanico_id'
+    ('reparaciones', 'id_camion_1'),
+    ('reparaciones', 'id_mecanico_1'),
+)
+
+# Formas de consulta de los DAO que deben resolverse con un índice.
+# Los valores son de ejemplo: solo importa la forma del filtro y del orden.
+# Las búsquedas con expresiones regulares sin anclar quedan fuera a propósito.
+_ID = ObjectId('000000000000000000000000')
+_FECHA = datetime.datetime(2000, 1, 1)
+
+CONSULTAS = (
+    ('camiones', 'obtener_por_matricula', {'matricula': 'X'}, None),
+    ('camiones', 'obtener_por_estado', {'estado': 'X'}, None),
+    ('camiones', 'buscar_filas (matrícula)', {'matricula_busqueda': {'$regex': '^x'}}, None),
+    ('camiones', 'obtener_actividad_reciente', {}, [('ultima_actualizacion', DESCENDING)]),
+    ('camiones', 'buscar_filas', {}, [('matricula', ASCENDING), ('_id', ASCENDING)]),
+    ('camiones', 'buscar_filas (estado)', {'estado': 'X'},
+     [('matricula', ASCENDING), ('_id', ASCENDING)]),
+
+    ('mecanicos', 'obtener_por_nombre', {'nombre': 'X', 'apellidos': 'X'}, None),
+    ('mecanicos', 'obtener_todos', {}, [('apellidos', ASCENDING)]),
+    ('mecanicos', 'buscar_filas', {}, [('apellidos', ASCENDING), ('_id', ASCENDING)]),
+    ('mecanicos', 'buscar (actividad)', {'actividad': 'X'}, None),
+    ('mecanicos', 'obtener_mecanicos (nombre)',
+     {'$or': [{'nombre_busqueda': {'$regex': '^x'}}, {'apellidos_busqueda': {'$regex': '^x'}}]}, None),
+    ('mecanicos', 'buscar_filas (texto)', {'busqueda': 'xx'},
+     [('apellidos', ASCENDING), ('_id', ASCENDING)]),
+
+    ('reparaciones', 'obtener_todas', {}, [('fecha_entrada', DESCENDING)]),
+    ('reparaciones', 'obtener_por_camion', {'camion_id': _ID}, [('fecha_entrada', DESCENDING)]),
+    ('reparaciones', 'obtener_por_mecanico', {'mecanico_id': _ID}, [('fecha_entrada', DESCENDING)]),
+    ('reparaciones', 'obtener_por_estado', {'estado': 'X'}, [('fecha_entrada', DESCENDING)]),
+    ('reparaciones', 'buscar_filas', {},
+     [('fecha_entrada', DESCENDING), ('_id', DESCENDING)]),
+    ('reparaciones', 'buscar_filas (texto)', {'busqueda': {'$all': ['xxx', 'xx']}},
+     [('fecha_entrada', DESCENDING), ('_id', DESCENDING)]),
+    ('reparaciones', 'buscar (id_falla)', {'id_falla_busqueda': {'$regex': '^x'}}, None),
+    ('reparaciones', 'obtener_estadisticas (fechas)', {'fecha_entrada': {'$gte': _FECHA}}, None),
+    ('reparaciones', 'obtener_actividad_reciente', {}, [('ultima_actualizacion', DESCENDING)]),
+
+    ('usuarios', 'obtener_por_usuario', {'usuario': 'X'}, None),
+    ('usuarios', 'obtener_por_rol', {'rol': 'X'}, None),
+
+    ('preventivas', 'obtener_por_matricula', {'matricula': 'X'}, None),
+    ('preventivas', 'obtener_por_estado', {'estado': 'X'}, None),
+    ('preventivas', 'obtener_todas_preventivas (matrícula)', {'matricula_busqueda': {'$regex': '^x'}}, None),
+    ('preventivas', 'obtener_estadisticas (fechas)', {'fecha_registro': {'$gte': _FECHA}}, None),
+)
+
+
+def _duplicados(collection, indice, limite=5):
+    """
+    Busca valores repetidos en los campos de un índice que debe ser único.
+
+    Returns:
+        list: Hasta ``limite`` combinaciones de valores repetidas
+    """
+    grupos = collection.aggregate([
+        {'$group': {'_id': {campo: f'${campo}' for campo, _ in indice.claves}, 'n': {'$sum': 1}}},
+        {'$match': {'n': {'$gt': 1}}},
+        {'$limit': limite},
+    ], allowDiskUse=True)
+    return [grupo['_id'] for grupo in grupos]
+
+
+def _recrear(collection, indice, actual):
+    """
+    Sustituye un índice existente por el declarado, con otra unicidad.
+
+    MongoDB no admite dos índices con las mismas claves que solo se
+    distinguen en la unicidad, así que primero se crea uno temporal con
+    ``_id`` como última clave, que sirve a las mismas consultas mientras
+    tanto. El índice antiguo solo se elimina después; si el nuevo no se
+    puede crear, se restaura el antiguo. El temporal se elimina al final.
+
+    Raises:
+        PyMongoError: Si falla la creación del nuevo índice (el antiguo se restaura)
+    """
+    temporal = f"{indice.nombre}_temporal"
+    collection.create_index(indice.claves + [('_id', ASCENDING)], name=temporal)
+    collection.drop_index(indice.nombre)
+    try:
+        collection.create_index(indice.claves, unique=indice.unique)
+    except PyMongoError:
+        # Si tampoco se puede restaurar, el temporal se queda
+        collection.create_index(indice.claves, unique=bool(actual.get('unique')))
+        collection.drop_index(temporal)
+        raise
+    collection.drop_index(temporal)
+
+
+def reconciliar(db, destructivo=False):
+    """
+    Crea los índices declarados que falten y, en modo destructivo, recrea los
+    que tienen otra unicidad y elimina los obsoletos.
+
+    Sin el modo destructivo (al conectar cada cliente) no se elimina nada:
+    los índices con otra unicidad se informan en 'distintos'. Antes de
+    recrear uno como único se buscan valores repetidos; si los hay se
+    informan en 'duplicados' y el índice se deja como está. Los índices que
+    no están declarados ni marcados como obsoletos nunca se tocan.
+
+    Args:
+        db: Base de datos de MongoDB
+        destructivo (bool, optional): Recrea y elimina índices (solo desde la
+                                      línea de comandos)
+
+    Returns:
+        dict: Listas 'creados', 'eliminados', 'distintos', 'duplicados',
+              'sobrantes' y 'errores'
+    """
+    informe = {'creados': [], 'eliminados': [], 'distintos': [], 'duplicados': [],
+               'sobrantes': [], 'errores': []}
+
+    colecciones = []
+    for indice in INDICES:
+        if indice.coleccion not in colecciones:
+            colecciones.append(indice.coleccion)
+
+    for nombre_coleccion in colecciones:
+        collection = db[nombre_coleccion]
+        try:
+            existentes = collection.index_information()
+        except PyMongoError as e:
+            informe['errores'].append(f"{nombre_coleccion}: {str(e)}")
+            logging.error(f"Error al leer los índices de {nombre_coleccion}: {str(e)}")
+            continue
+
+        if destructivo:
+            for coleccion, nombre in INDICES_OBSOLETOS:
+                if coleccion == nombre_coleccion and nombre in existentes:
+                    try:
+                        collection.drop_index(nombre)
+                        informe['eliminados'].append(f"{coleccion}.{nombre}")
+                        logging.info(f"Índice obsoleto {coleccion}.{nombre} eliminado")
+                    except PyMongoError as e:
+                        informe['errores'].append(f"{coleccion}.{nombre}: {str(e)}")
+                        logging.error(f"Error al eliminar el índice {coleccion}.{nombre}: {str(e)}")
+
+        declarados = {'_id_'}
+        for indice in INDICES:
+            if indice.coleccion != nombre_coleccion:
+                continue
+            declarados.add(indice.nombre)
+
+            actual = existentes.get(indice.nombre)
+            if actual is not None and bool(actual.get('unique')) == indice.unique:
+                continue
+
+            if actual is not None and not destructivo:
+                informe['distintos'].append(repr(indice))
+                logging.warning(f"El índice {indice!r} existe con otra unicidad; "
+                                f"ejecute 'python -m database.indices' para recrearlo")
+                continue
+
+            try:
+                if indice.unique:
+                    repetidos = _duplicados(collection, indice)
+                    if repetidos:
+                        informe['duplicados'].append(f"{indice!r}: {repetidos}")
+                        logging.error(f"No se crea el índice {indice!r}: hay valores repetidos {repetidos}")
+                        continue
+                if actual is not None:
+                    _recrear(collection, indice, actual)
+                else:
+                    collection.create_index(indice.claves, unique=indice.unique)
+                informe['creados'].append(repr(indice))
+                logging.info(f"Índice {indice!r} creado")
+            except PyMongoError as e:
+                informe['errores'].append(f"{indice!r}: {str(e)}")
+                logging.error(f"Error al crear el índice {indice!r}: {str(e)}")
+
+        obsoletos = {nombre for coleccion, nombre in INDICES_OBSOLETOS if coleccion == nombre_coleccion}
+        for nombre in existentes:
+            if nombre not in declarados and not (destructivo and nombre in obsoletos):
+                informe['sobrantes'].append(f"{nombre_coleccion}.{nombre}")
+
+    return informe
+
+
+def _etapas(plan):
+    """Devuelve los nombres de todas las etapas de un plan de ejecución"""
+    etapas = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            etapas.append(plan['stage'])
+        for valor in plan.values():
+            etapas.extend(_etapas(valor))
+    elif isinstance(plan, list):
+        for valor in plan:
+            etapas.extend(_etapas(valor))
+    return etapas
+
+
+def verificar_consultas(db):
+    """
+    Comprueba con explain() el plan ganador de cada forma de consulta conocida.
+
+    Args:
+        db: Base de datos de MongoDB
+
+    Returns:
+        list: Tuplas (colección, consulta, etapas) de las que hacen COLLSCAN
+    """
+    sin_indice = []
+    for coleccion, descripcion, filtro, orden in CONSULTAS:
+        try:
+            cursor = db[coleccion].find(filtro)
+            if orden:
+                cursor = cursor.sort(orden)
+            plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        except PyMongoError as e:
+            logging.error(f"Error al obtener el plan de {coleccion}.{descripcion}: {str(e)}")
+            continue
+
+        etapas = _etapas(plan)
+        if 'COLLSCAN' in etapas:
+            sin_indice.append((coleccion, descripcion, etapas))
+    return sin_indice
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Reconcilia los índices de MongoDB con el registro de la aplicación"
+    )
+    parser.add_argument('--verificar', action='store_true',
+                        help="Comprueba con explain() las consultas de los DAO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    from database.connection import DatabaseConnection
+    try:
+        conexion = DatabaseConnection()
+        db = conexion.get_database()
+    except Exception as e:
+        print(f"No se pudo conectar a MongoDB: {str(e)}", file=sys.stderr)
+        return 2
+
+    # La conexión solo crea los que faltan; aquí también se recrean y eliminan
+    informe = reconciliar(db, destructivo=True)
+    for clave in ('creados', 'eliminados', 'distintos', 'duplicados', 'sobrantes', 'errores'):
+        print(f"{clave.capitalize()}: {len(informe[clave])}")
+        for elemento in informe[clave]:
+            print(f"  {elemento}")
+
+    codigo = 1 if informe['errores'] or informe['duplicados'] else 0
+
+    if args.verificar:
+        sin_indice = verificar_consultas(db)
+        print(f"Consultas con COLLSCAN: {len(sin_indice)}")
+        for coleccion, descripcion, etapas in sin_indice:
+            print(f"  {coleccion}.{descripcion}: {' <- '.join(etapas)}")
+        if sin_indice:
+            codigo = 1
+
+    return codigo
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Almacenamiento en disco basado en un diario de solo anexado (write-ahead log)
+con compactación periódica a una instantánea.
+"""
+
+import os
+import json
+import logging
+import threading
+
+
+class JournalStore:
+    """
+    Almacén de registros en disco formado por una instantánea y un diario.
+
+    Cada mutación se anexa como una línea JSON al diario y se sincroniza con
+    ``fsync``, de modo que el coste de escribir no depende del número de
+    registros. Un paso de compactación en segundo plano vuelca el estado a una
+    nueva instantánea y descarta el diario ya aplicado.
+
+    Todas las operaciones del diario son idempotentes (``put`` reemplaza el
+    registro completo y ``del`` lo elimina), por lo que repetirlas tras una
+    caída siempre produce el mismo estado.
+    """
+
+    # Número de entradas del diario a partir del cual se compacta
+    UMBRAL_COMPACTACION = 500
+
+    def __init__(self, ruta_instantanea, clave_registros='registros', campo_id='id',
+                 umbral_compactacion=None):
+        """
+        Inicializa el almacén.
+
+        Args:
+            ruta_instantanea (str): Ruta del archivo JSON con la instantánea
+            clave_registros (str, optional): Clave de la lista de registros en la instantánea
+            campo_id (str, optional): Campo que identifica cada registro
+            umbral_compactacion (int, optional): Entradas del diario antes de compactar
+        """
+        self.ruta_instantanea = ruta_instantanea
+        self.ruta_diario = ruta_instantanea + '.journal'
+        self.ruta_diario_compactando = ruta_instantanea + '.journal.compacting'
+        self.clave_registros = clave_registros
+        self.campo_id = campo_id
+        self.umbral_compactacion = umbral_compactacion or self.UMBRAL_COMPACTACION
+
+        self._lock = threading.RLock()
+        self._archivo_diario = None
+        self._entradas_diario = 0
+        self._hilo_compactacion = None
+
+    def cargar(self):
+        """
+        Reconstruye el estado a partir de la instantánea y del diario.
+
+        Returns:
+            tuple: (dict de registros por ID en orden de inserción, ultimo_id)
+        """
+        with self._lock:
+            directorio = os.path.dirname(self.ruta_instantanea)
+            if directorio and not os.path.exists(directorio):
+                os.makedirs(directorio)
+
+            registros, ultimo_id = self._leer_instantanea()
+
+            # Un diario en compactación indica que la última compactación no
+            # terminó; se vuelve a aplicar antes que el diario activo
+            ultimo_id, _ = self._reproducir(self.ruta_diario_compactando, registros, ultimo_id)
+            ultimo_id, self._entradas_diario = self._reproducir(self.ruta_diario, registros, ultimo_id)
+
+            self._abrir_diario()
+
+            if os.path.exists(self.ruta_diario_compactando) or self._entradas_diario >= self.umbral_compactacion:
+                self.compactar_en_segundo_plano()
+
+            return registros, ultimo_id
+
+    def _leer_instantanea(self):
+        """
+        Lee la instantánea actual.
+
+        Returns:
+            tuple: (dict de registros por ID, ultimo_id)
+        """
+        registros = {}
+        ultimo_id = 0
+
+        if os.path.exists(self.ruta_instantanea):
+            with open(self.ruta_instantanea, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for registro in data.get(self.clave_registros, []):
+                registros[registro.get(self.campo_id)] = registro
+            ultimo_id = data.get('ultimo_id', 0)
+
+        return registros, ultimo_id
+
+    def _reproducir(self, ruta, registros, ultimo_id):
+        """
+        Aplica las entradas de un diario sobre el estado indicado.
+
+        Una línea final incompleta (escritura interrumpida) se descarta y se
+        trunca el archivo hasta la última entrada válida.
+
+        Returns:
+            tuple: (ultimo_id, número de entradas aplicadas)
+        """
+        if not os.path.exists(ruta):
+            return ultimo_id, 0
+
+        aplicadas = 0
+        posicion_valida = 0
+
+        with open(ruta, 'rb') as f:
+            for linea in f:
+                if not linea.endswith(b'\n'):
+                    break
+                try:
+                    entrada = json.loads(linea.decode('utf-8'))
+                except ValueError:
+                    break
+
+                self._aplicar(entrada, registros)
+                ultimo_id = max(ultimo_id, entrada.get('ultimo_id', 0))
+                posicion_valida += len(linea)
+                aplicadas += 1
+
+        if posicion_valida < os.path.getsize(ruta):
+            logging.warning(f"JournalStore: Entrada incompleta descartada en {ruta}")
+            with open(ruta, 'r+b') as f:
+                f.truncate(posicion_valida)
+
+        return ultimo_id, aplicadas
+
+    def _aplicar(self, entrada, registros):
+        """Aplica una entrada del diario sobre un diccionario de registros"""
+        if entrada.get('op') == 'put':
+            registro = entrada['registro']
+            registros[registro.get(self.campo_id)] = registro
+        elif entrada.get('op') == 'del':
+            registros.pop(entrada.get('id'), None)
+
+    def _abrir_diario(self):
+        """Abre el diario activo en modo anexado"""
+        if self._archivo_diario is None:
+            self._archivo_diario = open(self.ruta_diario, 'ab')
+
+    def _anexar(self, entrada):
+        """Anexa una entrada al diario y la sincroniza con el disco"""
+        linea = json.dumps(entrada, ensure_ascii=False, default=str) + '\n'
+
+        with self._lock:
+            self._abrir_diario()
+            self._archivo_diario.write(linea.encode('utf-8'))
+            self._archivo_diario.flush()
+            os.fsync(self._archivo_diario.fileno())
+            self._entradas_diario += 1
+
+            if self._entradas_diario >= self.umbral_compactacion:
+                self.compactar_en_segundo_plano()
+
+    def guardar(self, registro, ultimo_id=0):
+        """
+        Registra la creación o actualización de un registro.
+
+        Args:
+            registro (dict): Registro completo ya serializable
+            ultimo_id (int, optional): Último ID asignado
+        """
+        self._anexar({'op': 'put', 'registro': registro, 'ultimo_id': ultimo_id})
+
+    def eliminar(self, id_registro):
+        """
+        Registra la eliminación de un registro.
+
+        Args:
+            id_registro: ID del registro eliminado
+        """
+        self._anexar({'op': 'del', 'id': id_registro})
+
+    def compactar_en_segundo_plano(self):
+        """Lanza la compactación en un hilo si no hay otra en curso"""
+        with self._lock:
+            if self._hilo_compactacion is not None and self._hilo_compactacion.is_alive():
+                return
+            self._hilo_compactacion = threading.Thread(
+                target=self.compactar,
+                name='JournalStoreCompactacion',
+                daemon=True
+            )
+            self._hilo_compactacion.start()
+
+    def compactar(self):
+        """
+        Vuelca la instantánea y el diario a una nueva instantánea.
+
+        El diario activo se rota al empezar, de forma que las mutaciones
+        concurrentes se anexan a un diario nuevo y no se pierden. La nueva
+        instantánea se construye desde disco (instantánea anterior + diario
+        rotado), se escribe en un archivo temporal y se sustituye de forma
+        atómica; solo entonces se elimina el diario rotado.
+        """
+        try:
+            with self._lock:
+                if self._archivo_diario is not None:
+                    self._archivo_diario.close()
+                    self._archivo_diario = None
+
+                if os.path.exists(self.ruta_diario):
+                    if os.path.exists(self.ruta_diario_compactando):
+                        # Compactación previa interrumpida: conservar ambas
+                        # partes en el diario rotado para no perder entradas
+                        with open(self.ruta_diario_compactando, 'ab') as destino, \
+                                open(self.ruta_diario, 'rb') as origen:
+                            destino.write(origen.read())
+                            destino.flush()
+                            os.fsync(destino.fileno())
+                        os.remove(self.ruta_diario)
+                    else:
+                        os.replace(self.ruta_diario, self.ruta_diario_compactando)
+
+                self._abrir_diario()
+                self._entradas_diario = 0
+
+            registros, ultimo_id = self._leer_instantanea()
+            ultimo_id, _ = self._reproducir(self.ruta_diario_compactando, registros, ultimo_id)
+
+            self._escribir_instantanea(list(registros.values()), ultimo_id)
+
+            if os.path.exists(self.ruta_diario_compactando):
+                os.remove(self.ruta_diario_compactando)
+        except Exception as e:
+            logging.error(f"JournalStore: Error al compactar {self.ruta_instantanea}: {str(e)}")
+
+    def reemplazar(self, registros, ultimo_id):
+        """
+        Sustituye todo el contenido por el estado indicado.
+
+        Args:
+            registros (list): Lista completa de registros serializables
+            ultimo_id (int): Último ID asignado
+        """
+        # Esperar fuera del bloqueo: la compactación lo necesita para rotar
+        hilo = self._hilo_compactacion
+        if hilo is not None and hilo.is_alive() and hilo is not threading.current_thread():
+            hilo.join()
+
+        with self._lock:
+            self._escribir_instantanea(registros, ultimo_id)
+
+            # El estado completo ya está en la instantánea
+            if self._archivo_diario is not None:
+                self._archivo_diario.close()
+                self._archivo_diario = None
+            for ruta in (self.ruta_diario, self.ruta_diario_compactando):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            self._entradas_diario = 0
+            self._abrir_diario()
+
+    def _escribir_instantanea(self, registros, ultimo_id):
+        """Escribe la instantánea de forma atómica"""
+        ruta_temporal = self.ruta_instantanea + '.tmp'
+        data = {
+            self.clave_registros: registros,
+            'ultimo_id': ultimo_id
+        }
+
+        with open(ruta_temporal, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(ruta_temporal, self.ruta_instantanea)
+
+    def cerrar(self):
+        """Espera a que termine la compactación en curso y cierra el diario"""
+        hilo = self._hilo_compactacion
+        if hilo is not None:
+            hilo.join()
+
+        with self._lock:
+            if self._archivo_diario is not None:
+                self._archivo_diario.close()
+                self._archivo_diario = None
@@ -8,19 +8,31 @@ Objeto de Acceso a Datos (DAO) para mecánicos.
 import logging
 from datetime import datetime
 from bson.objectid import ObjectId
-from pymongo.errors import PyMongoError
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
 
+from database.bulk import ResultadoLote, convertir_ids, ejecutar_lote, operacion_actualizar, operacion_guardar
+from database.busqueda import reconstruir_busqueda, valor_busqueda
 from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar, publicar_varios
+from database.paginacion import Pagina, TAMANO_PAGINA, obtener_pagina
 from models.mecanico import Mecanico
+from models.filas import FilaMecanico
+from utils.texto import CAMPO_BUSQUEDA, filtro_busqueda, filtro_prefijo
 
 class MecanicosDAO:
     """Clase para manejar operaciones de base de datos relacionadas con mecánicos"""
     
+    # Campos de texto incluidos en la búsqueda libre
+    CAMPOS_BUSQUEDA = ('nombre', 'apellidos')
+    
     def __init__(self):
         """Inicializa la conexión a la base de datos"""
         try:
             self.db_connection = DatabaseConnection()
             self.collection = self.db_connection.get_mecanicos_collection()
+            self.cache = EntityCache.de_coleccion('mecanicos')
         except Exception as e:
             logging.error(f"MecanicosDAO: Error al conectar a la base de datos: {str(e)}")
             raise
@@ -44,6 +56,19 @@ class MecanicosDAO:
             logging.error(f"MecanicosDAO: Error al obtener todos los mecánicos: {str(e)}")
             return []
     
+    def obtener_pagina(self, token=None, tamano=TAMANO_PAGINA):
+        """
+        Obtiene una página de mecánicos ordenados por apellidos.
+        
+        Args:
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de mecánicos
+            
+        Returns:
+            Pagina: Mecánicos de la página y token de la siguiente
+        """
+        return self.buscar_pagina(None, token, tamano)
+    
     def obtener_por_id(self, id):
         """
         Obtiene un mecánico por su ID.
@@ -59,7 +84,7 @@ class MecanicosDAO:
             if isinstance(id, str):
                 id = ObjectId(id)
             
-            doc = self.collection.find_one({'_id': id})
+            doc = self.cache.leer(self.collection, id)
             
             if doc:
                 return Mecanico.from_dict(doc)
@@ -69,6 +94,19 @@ class MecanicosDAO:
             logging.error(f"MecanicosDAO: Error al obtener mecánico por ID: {str(e)}")
             return None
     
+    def obtener_en_cache(self, id):
+        """
+        Obtiene el mecánico si ya está en la caché, sin consultar la base de datos.
+        
+        Args:
+            id (str or ObjectId): ID del mecánico
+            
+        Returns:
+            Mecanico: Objeto Mecanico si está en caché, None en caso contrario
+        """
+        doc = self.cache.obtener(id)
+        return Mecanico.from_dict(doc) if doc else None
+    
     def obtener_por_nombre_completo(self, nombre, apellidos):
         """
         Obtiene un mecánico por su nombre y apellidos.
@@ -105,13 +143,16 @@ class MecanicosDAO:
             bool: True si la inserción fue exitosa, False en caso contrario
         """
         try:
-            # Verificar si ya existe un mecánico con el mismo nombre completo
-            if self.obtener_por_nombre_completo(mecanico.nombre, mecanico.apellidos):
-                logging.warning(f"Ya existe un mecánico con nombre {mecanico.nombre} {mecanico.apellidos}")
-                return False
-                
-            resultado = self.collection.insert_one(mecanico.to_dict())
+            mecanico_dict = mecanico.to_dict()
+            mecanico_dict[CAMPO_BUSQUEDA] = valor_busqueda(mecanico_dict, self.CAMPOS_BUSQUEDA)
+            
+            # El índice único de nombre y apellidos rechaza los duplicados
+            resultado = self.collection.insert_one(mecanico_dict)
+            publicar('mecanicos', INSERCION, resultado.inserted_id)
             return resultado.acknowledged
+        except DuplicateKeyError:
+            logging.warning(f"Ya existe un mecánico con nombre {mecanico.nombre} {mecanico.apellidos}")
+            return False
         except PyMongoError as e:
             logging.error(f"MecanicosDAO: Error al insertar mecánico: {str(e)}")
             return False
@@ -127,18 +168,27 @@ class MecanicosDAO:
             bool: True si la actualización fue exitosa, False en caso contrario
         """
         try:
-            # Actualizar la fecha de última actualización
+            # Solo se envían los campos modificados desde la carga
+            cambios = mecanico.cambios()
+            if not cambios:
+                return True
+
             mecanico.ultima_actualizacion = datetime.now()
-            
-            # Convertir a diccionario
-            mecanico_dict = mecanico.to_dict()
-            
+            cambios['ultima_actualizacion'] = mecanico.ultima_actualizacion
+            if any(campo in cambios for campo in self.CAMPOS_BUSQUEDA):
+                cambios[CAMPO_BUSQUEDA] = valor_busqueda(mecanico.to_dict(), self.CAMPOS_BUSQUEDA)
+
             resultado = self.collection.update_one(
                 {'_id': mecanico.id},
-                {'$set': mecanico_dict}
+                {'$set': cambios}
             )
-            
-            return resultado.modified_count > 0
+
+            self.cache.invalidar(mecanico.id)
+            mecanico.marcar_sin_cambios()
+            if resultado.matched_count:
+                publicar('mecanicos', ACTUALIZACION, mecanico.id)
+
+            return resultado.matched_count > 0
         except PyMongoError as e:
             logging.error(f"MecanicosDAO: Error al actualizar mecánico: {str(e)}")
             return False
@@ -159,6 +209,10 @@ class MecanicosDAO:
                 id = ObjectId(id)
             
             resultado = self.collection.delete_one({'_id': id})
+            
+            self.cache.invalidar(id)
+            if resultado.deleted_count:
+                publicar('mecanicos', ELIMINACION, id)
             return resultado.deleted_count > 0
         except PyMongoError as e:
             logging.error(f"MecanicosDAO: Error al eliminar mecánico: {str(e)}")
@@ -175,24 +229,8 @@ class MecanicosDAO:
             list: Lista de objetos Mecanico que coinciden con los filtros
         """
         try:
-            # Inicializar consulta
-            query = {}
-            
-            # Aplicar filtros si existen
-            if filtros:
-                # Filtro por nombre
-                if 'nombre' in filtros and filtros['nombre']:
-                    query['$or'] = [
-                        {'nombre': {'$regex': filtros['nombre'], '$options': 'i'}},
-                        {'apellidos': {'$regex': filtros['nombre'], '$options': 'i'}}
-                    ]
-                
-                # Filtro por actividad
-                if 'actividad' in filtros and filtros['actividad']:
-                    query['actividad'] = filtros['actividad']
-            
             # Ejecutar consulta
-            mecanicos_docs = self.collection.find(query).sort('apellidos', 1)
+            mecanicos_docs = self.collection.find(self._construir_consulta(filtros)).sort('apellidos', 1)
             mecanicos = []
             
             for doc in mecanicos_docs:
@@ -203,6 +241,125 @@ class MecanicosDAO:
             logging.error(f"MecanicosDAO: Error al buscar mecánicos: {str(e)}")
             return []
     
+    def buscar_pagina(self, filtros=None, token=None, tamano=TAMANO_PAGINA):
+        """
+        Busca una página de mecánicos ordenados por apellidos.
+        
+        Args:
+            filtros: Diccionario con criterios de búsqueda (como en buscar)
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de mecánicos
+            
+        Returns:
+            Pagina: Mecánicos de la página y token de la siguiente
+        """
+        try:
+            documentos, siguiente = obtener_pagina(
+                self.collection, self._construir_consulta(filtros),
+                'apellidos', ASCENDING, token, tamano
+            )
+            return Pagina([Mecanico.from_dict(doc) for doc in documentos], siguiente)
+        except (PyMongoError, ValueError) as e:
+            logging.error(f"MecanicosDAO: Error al buscar la página de mecánicos: {str(e)}")
+            return Pagina([])
+    
+    def buscar_filas(self, filtros=None, token=None, tamano=TAMANO_PAGINA):
+        """
+        Busca una página de filas ligeras de mecánicos ordenados por apellidos.
+        
+        Solo se transfieren los campos que muestra la tabla.
+        
+        Args:
+            filtros: Diccionario con criterios de búsqueda
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de filas
+            
+        Returns:
+            Pagina: Objetos FilaMecanico de la página y token de la siguiente
+        """
+        try:
+            documentos, siguiente = obtener_pagina(
+                self.collection, self._construir_consulta(filtros),
+                'apellidos', ASCENDING, token, tamano, FilaMecanico.PROYECCION
+            )
+            return Pagina([FilaMecanico.desde_documento(doc) for doc in documentos], siguiente)
+        except (PyMongoError, ValueError) as e:
+            logging.error(f"MecanicosDAO: Error al buscar las filas de mecánicos: {str(e)}")
+            return Pagina([])
+    
+    def obtener_fila(self, mecanico_id, filtros=None):
+        """
+        Obtiene la fila ligera de un mecánico si cumple los filtros de la lista.
+        
+        Se usa para actualizar una sola fila de la tabla tras un cambio.
+        
+        Args:
+            mecanico_id (str or ObjectId): ID del mecánico
+            filtros (dict, optional): Criterios de búsqueda de la lista
+            
+        Returns:
+            FilaMecanico: Fila si existe y cumple los filtros, None en caso contrario
+        """
+        try:
+            if isinstance(mecanico_id, str):
+                mecanico_id = ObjectId(mecanico_id)
+            
+            consulta = {**self._construir_consulta(filtros), '_id': mecanico_id}
+            documento = self.collection.find_one(consulta, FilaMecanico.PROYECCION)
+            return FilaMecanico.desde_documento(documento) if documento else None
+        except PyMongoError as e:
+            logging.error(f"MecanicosDAO: Error al obtener la fila del mecánico {mecanico_id}: {str(e)}")
+            return None
+    
+    def _construir_consulta(self, filtros):
+        """
+        Construye la consulta de MongoDB a partir de los filtros de búsqueda.
+        
+        Args:
+            filtros: Diccionario con criterios de búsqueda
+            
+        Returns:
+            dict: Consulta de MongoDB
+        """
+        # Inicializar consulta
+        query = {}
+        
+        # Aplicar filtros si existen
+        if filtros:
+            # Búsqueda libre por prefijos de nombre y apellidos (usa el índice)
+            if filtros.get('texto'):
+                query.update(filtro_busqueda(filtros['texto']))
+            
+            # Filtro por prefijo del nombre completo o de los apellidos (usa los índices)
+            if 'nombre' in filtros and filtros['nombre']:
+                condiciones = [
+                    filtro_prefijo('nombre_busqueda', filtros['nombre']),
+                    filtro_prefijo('apellidos_busqueda', filtros['nombre'])
+                ]
+                if all(condiciones):
+                    query['$or'] = condiciones
+            
+            # Filtro por actividad
+            if 'actividad' in filtros and filtros['actividad']:
+                query['actividad'] = filtros['actividad']
+        
+        return query
+    
+    def reconstruir_busqueda(self, todos=False):
+        """
+        Calcula los campos de búsqueda de los mecánicos que no los tienen.
+        
+        Args:
+            todos (bool, optional): Recalcula también los que ya lo tienen
+            
+        Returns:
+            int: Número de mecánicos actualizados
+        """
+        return reconstruir_busqueda(
+            self.collection, self.CAMPOS_BUSQUEDA,
+            Mecanico.claves_busqueda, ('nombre', 'apellidos'), todos
+        )
+    
     def obtener_por_actividad(self, actividad):
         """
         Obtiene todos los mecánicos con una actividad específica.
@@ -259,7 +416,77 @@ class MecanicosDAO:
                     'ultima_actualizacion': datetime.now()
                 }}
             )
+                
+            self.cache.invalidar(mecanico_id)
+            if resultado.modified_count:
+                publicar('mecanicos', ACTUALIZACION, mecanico_id)
             return resultado.modified_count > 0
         except PyMongoError as e:
             logging.error(f"MecanicosDAO: Error al cambiar la actividad del mecánico {mecanico_id}: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def bulk_upsert(self, mecanicos, ordered=False, actualizar_existentes=True):
+        """
+        Inserta o actualiza varios mecánicos, identificados por nombre y
+        apellidos, con una sola escritura en bloque.
+        
+        Los mecánicos que ya existían conservan su _id y su fecha de registro;
+        el atributo id del objeto solo es válido para los insertados.
+        
+        Args:
+            mecanicos (list): Objetos Mecanico
+            ordered (bool, optional): Si se detiene en el primer error
+            actualizar_existentes (bool, optional): False solo inserta; los
+                                                    existentes se informan
+                                                    como duplicados
+            
+        Returns:
+            ResultadoLote: Resultado global y por mecánico
+        """
+        resultado = ResultadoLote(len(mecanicos))
+        ahora = datetime.now()
+        operaciones = []
+        for indice, mecanico in enumerate(mecanicos):
+            mecanico.ultima_actualizacion = ahora
+            mecanico_dict = mecanico.to_dict()
+            mecanico_dict[CAMPO_BUSQUEDA] = valor_busqueda(mecanico_dict, self.CAMPOS_BUSQUEDA)
+            operaciones.append(
+                (indice, *operacion_guardar(mecanico_dict, ('nombre', 'apellidos'), actualizar_existentes))
+            )
+        
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        # Los upserts por nombre no devuelven el _id de los existentes
+        self.cache.limpiar()
+        if resultado.correctos:
+            publicar('mecanicos', ACTUALIZACION)
+        return resultado
+    
+    def bulk_cambiar_actividad(self, mecanico_ids, nueva_actividad, ordered=False):
+        """
+        Cambia la actividad de varios mecánicos con una sola escritura en bloque.
+        
+        Args:
+            mecanico_ids (list): IDs de los mecánicos (str u ObjectId)
+            nueva_actividad (str): Nueva actividad
+            ordered (bool, optional): Si se detiene en el primer error
+            
+        Returns:
+            ResultadoLote: Resultado global y por mecánico
+        """
+        resultado = ResultadoLote(len(mecanico_ids))
+        if nueva_actividad not in Mecanico.ACTIVIDADES_VALIDAS:
+            logging.warning(f"Actividad no válida: {nueva_actividad}")
+            resultado.rechazar(f"Actividad no válida: {nueva_actividad}")
+            return resultado
+        
+        cambios = {'$set': {'actividad': nueva_actividad, 'ultima_actualizacion': datetime.now()}}
+        ids = convertir_ids(mecanico_ids, resultado)
+        operaciones = [(indice, *operacion_actualizar({'_id': mecanico_id}, cambios)) for indice, mecanico_id in ids]
+        
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        for _, mecanico_id in ids:
+            self.cache.invalidar(mecanico_id)
+        correctos = set(resultado.correctos)
+        publicar_varios('mecanicos', ACTUALIZACION,
+                        [mecanico_id for indice, mecanico_id in ids if indice in correctos])
+        return resultado
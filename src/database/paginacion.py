@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Paginación por clave (keyset) para las consultas de listas.
+
+En lugar de saltar documentos con ``skip``, cada página continúa a partir del
+último documento de la anterior usando el campo de ordenación y el ``_id``
+como desempate. Con un índice compuesto sobre ambos campos el coste de cada
+página es constante, sin importar cuántas se hayan leído antes.
+"""
+
+import base64
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING
+
+# Número de documentos por página por defecto
+TAMANO_PAGINA = 100
+
+
+class Pagina:
+    """Resultado de una consulta paginada"""
+
+    def __init__(self, elementos, siguiente=None):
+        """
+        Inicializa la página.
+
+        Args:
+            elementos (list): Objetos de la página
+            siguiente (str, optional): Token de la página siguiente o None si es la última
+        """
+        self.elementos = elementos
+        self.siguiente = siguiente
+
+    @property
+    def hay_mas(self):
+        """True si existen más páginas después de esta"""
+        return self.siguiente is not None
+
+    def __iter__(self):
+        return iter(self.elementos)
+
+    def __len__(self):
+        return len(self.elementos)
+
+
+def codificar_token(valor, documento_id):
+    """
+    Codifica la posición de un documento como token opaco.
+
+    Args:
+        valor: Valor del campo de ordenación del documento
+        documento_id (ObjectId): ID del documento
+
+    Returns:
+        str: Token de página
+    """
+    datos = json_util.dumps({'v': valor, 'id': documento_id})
+    return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii')
+
+
+def decodificar_token(token):
+    """
+    Decodifica un token generado por codificar_token.
+
+    Returns:
+        tuple: (valor, documento_id)
+
+    Raises:
+        ValueError: Si el token no es válido
+    """
+    try:
+        datos = json_util.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        return datos['v'], datos['id']
+    except Exception as e:
+        raise ValueError(f"Token de página no válido: {str(e)}")
+
+
+def filtro_continuacion(campo, direccion, valor, documento_id):
+    """
+    Construye el filtro de los documentos posteriores a una posición.
+
+    MongoDB ordena los valores nulos antes que cualquier otro, por lo que se
+    tratan aparte: no se pueden comparar con $gt/$lt.
+
+    Args:
+        campo (str): Campo de ordenación
+        direccion (int): ASCENDING o DESCENDING
+        valor: Valor del campo en el último documento de la página anterior
+        documento_id (ObjectId): ID del último documento de la página anterior
+
+    Returns:
+        dict: Filtro de MongoDB
+    """
+    op = '$gt' if direccion == ASCENDING else '$lt'
+    mismo_valor = {campo: valor, '_id': {op: documento_id}}
+
+    if valor is None:
+        if direccion == ASCENDING:
+            return {'$or': [mismo_valor, {campo: {'$ne': None}}]}
+        return mismo_valor
+
+    condiciones = [{campo: {op: valor}}, mismo_valor]
+    if direccion == DESCENDING:
+        condiciones.append({campo: None})
+    return {'$or': condiciones}
+
+
+def obtener_pagina(collection, filtro, campo, direccion, token=None,
+                   tamano=TAMANO_PAGINA, proyeccion=None):
+    """
+    Lee una página de documentos ordenados por un campo y por _id.
+
+    Args:
+        collection: Colección de MongoDB
+        filtro (dict): Filtro de la consulta
+        campo (str): Campo de ordenación
+        direccion (int): ASCENDING o DESCENDING
+        token (str, optional): Token devuelto por la página anterior
+        tamano (int, optional): Número máximo de documentos
+        proyeccion (dict, optional): Campos a devolver
+
+    Returns:
+        tuple: (lista de documentos, token de la página siguiente o None)
+    """
+    consulta = dict(filtro or {})
+    if token:
+        valor, documento_id = decodificar_token(token)
+        continuacion = filtro_continuacion(campo, direccion, valor, documento_id)
+        consulta = {'$and': [consulta, continuacion]} if consulta else continuacion
+
+    # Se pide un documento de más para saber si hay otra página
+    cursor = collection.find(consulta, proyeccion).sort(
+        [(campo, direccion), ('_id', direccion)]
+    ).limit(tamano + 1)
+    documentos = list(cursor)
+
+    siguiente = None
+    if len(documentos) > tamano:
+        documentos = documentos[:tamano]
+        ultimo = documentos[-1]
+        siguiente = codificar_token(ultimo.get(campo), ultimo['_id'])
+
+    return documentos, siguiente
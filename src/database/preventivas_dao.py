@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Data Access Object (DAO) para operaciones CRUD con tareas de mantenimiento preventivo.
+"""
+
+import logging
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from database.bulk import ResultadoLote, convertir_ids, ejecutar_lote, operacion_actualizar, operacion_guardar
+from database.busqueda import reconstruir_busqueda
+from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar, publicar_varios
+from database.query_cache import QueryCache
+from models.preventiva import Preventiva
+from models.filas import FilaPreventiva
+
+class PreventivasDAO:
+    """Clase para operaciones CRUD con tareas preventivas en MongoDB"""
+
+    def __init__(self):
+        """Inicializa el DAO conectándose a la base de datos"""
+        self.db_connection = DatabaseConnection()
+        self.collection = self.db_connection.get_preventivas_collection()
+        self.cache = EntityCache.de_coleccion('preventivas')
+        self.cache_consultas = QueryCache.de_coleccion('preventivas')
+
+    def obtener_todas(self):
+        """
+        Obtiene todas las tareas preventivas de la base de datos.
+
+        Returns:
+            list: Lista de objetos Preventiva
+        """
+        try:
+            preventivas = self.collection.find()
+            return [Preventiva.from_dict(p) for p in preventivas]
+        except PyMongoError as e:
+            logging.error(f"Error al obtener las preventivas: {str(e)}")
+            return []
+
+    def obtener_filas(self):
+        """
+        Obtiene todas las tareas preventivas como filas ligeras para la tabla.
+        
+        Returns:
+            list: Lista de objetos FilaPreventiva
+        """
+        try:
+            preventivas = self.collection.find({}, FilaPreventiva.PROYECCION)
+            return [FilaPreventiva.desde_documento(p) for p in preventivas]
+        except PyMongoError as e:
+            logging.error(f"Error al obtener las filas de preventivas: {str(e)}")
+            return []
+
+    def obtener_fila(self, preventiva_id):
+        """
+        Obtiene la fila ligera de una tarea preventiva.
+
+        Se usa para actualizar una sola fila de la tabla tras un cambio.
+
+        Args:
+            preventiva_id (str or ObjectId): ID de la tarea preventiva
+
+        Returns:
+            FilaPreventiva: Fila si existe, None en caso contrario
+        """
+        try:
+            if isinstance(preventiva_id, str):
+                preventiva_id = ObjectId(preventiva_id)
+
+            documento = self.collection.find_one({'_id': preventiva_id}, FilaPreventiva.PROYECCION)
+            return FilaPreventiva.desde_documento(documento) if documento else None
+        except PyMongoError as e:
+            logging.error(f"Error al obtener la fila de la preventiva {preventiva_id}: {str(e)}")
+            return None
+
+    def obtener_por_id(self, preventiva_id):
+        """
+        Obtiene una tarea preventiva por su ID.
+
+        Args:
+            preventiva_id (str or ObjectId): ID de la tarea preventiva
+
+        Returns:
+            Preventiva: Objeto Preventiva si existe, None en caso contrario
+        """
+        try:
+            if isinstance(preventiva_id, str):
+                preventiva_id = ObjectId(preventiva_id)
+
+            preventiva = self.cache.leer(self.collection, preventiva_id)
+            if preventiva:
+                return Preventiva.from_dict(preventiva)
+            return None
+        except PyMongoError as e:
+            logging.error(f"Error al obtener la preventiva {preventiva_id}: {str(e)}")
+            return None
+
+    def obtener_en_cache(self, preventiva_id):
+        """
+        Obtiene la tarea preventiva si ya está en la caché, sin consultar la base de datos.
+        
+        Args:
+            preventiva_id (str or ObjectId): ID de la tarea preventiva
+            
+        Returns:
+            Preventiva: Objeto Preventiva si está en caché, None en caso contrario
+        """
+        doc = self.cache.obtener(preventiva_id)
+        return Preventiva.from_dict(doc) if doc else None
+    
+    def obtener_por_matricula(self, matricula):
+        """
+        Obtiene las tareas preventivas de un camión por su matrícula.
+
+        Args:
+            matricula (str): Matrícula del camión
+
+        Returns:
+            list: Lista de objetos Preventiva
+        """
+        try:
+            preventivas = self.collection.find({'matricula': matricula})
+            return [Preventiva.from_dict(p) for p in preventivas]
+        except PyMongoError as e:
+            logging.error(f"Error al obtener las preventivas de la matrícula {matricula}: {str(e)}")
+            return []
+
+    def reconstruir_busqueda(self, todos=False):
+        """
+        Calcula la clave de búsqueda de las tareas preventivas que no la tienen.
+
+        Args:
+            todos (bool, optional): Recalcula también las que ya la tienen
+
+        Returns:
+            int: Número de tareas preventivas actualizadas
+        """
+        return reconstruir_busqueda(self.collection, (), Preventiva.claves_busqueda, ('matricula',), todos)
+
+    def obtener_por_estado(self, estado):
+        """
+        Obtiene las tareas preventivas que tienen un estado específico.
+
+        Args:
+            estado (str): Estado de la tarea preventiva
+
+        Returns:
+            list: Lista de objetos Preventiva
+        """
+        try:
+            preventivas = self.collection.find({'estado': estado})
+            return [Preventiva.from_dict(p) for p in preventivas]
+        except PyMongoError as e:
+            logging.error(f"Error al obtener las preventivas por estado {estado}: {str(e)}")
+            return []
+
+    def insertar(self, preventiva):
+        """
+        Inserta una nueva tarea preventiva en la base de datos.
+
+        Args:
+            preventiva (Preventiva): Objeto Preventiva a insertar
+
+        Returns:
+            bool: True si se insertó correctamente, False en caso contrario
+        """
+        try:
+            result = self.collection.insert_one(preventiva.to_dict())
+            self.cache_consultas.limpiar()
+            publicar('preventivas', INSERCION, result.inserted_id)
+            return result.acknowledged
+        except PyMongoError as e:
+            logging.error(f"Error al insertar la preventiva: {str(e)}")
+            return False
+
+    def actualizar(self, preventiva):
+        """
+        Actualiza una tarea preventiva existente en la base de datos.
+
+        Args:
+            preventiva (Preventiva): Objeto Preventiva con los datos actualizados
+
+        Returns:
+            bool: True si se actualizó correctamente, False en caso contrario
+        """
+        try:
+            cambios = preventiva.cambios()
+            if not cambios:
+                return True
+
+            preventiva.ultima_actualizacion = datetime.now()
+            cambios['ultima_actualizacion'] = preventiva.ultima_actualizacion
+
+            result = self.collection.update_one(
+                {'_id': preventiva.id},
+                {'$set': cambios}
+            )
+            self.cache.invalidar(preventiva.id)
+            self.cache_consultas.limpiar()
+            preventiva.marcar_sin_cambios()
+            if result.matched_count:
+                publicar('preventivas', ACTUALIZACION, preventiva.id)
+            return result.matched_count > 0
+        except PyMongoError as e:
+            logging.error(f"Error al actualizar la preventiva {preventiva.id}: {str(e)}")
+            return False
+
+    def eliminar(self, preventiva_id):
+        """
+        Elimina una tarea preventiva de la base de datos.
+
+        Args:
+            preventiva_id (str or ObjectId): ID de la tarea preventiva a eliminar
+
+        Returns:
+            bool: True si se eliminó correctamente, False en caso contrario
+        """
+        try:
+            if isinstance(preventiva_id, str):
+                preventiva_id = ObjectId(preventiva_id)
+
+            result = self.collection.delete_one({'_id': preventiva_id})
+
+            self.cache.invalidar(preventiva_id)
+            self.cache_consultas.limpiar()
+            if result.deleted_count:
+                publicar('preventivas', ELIMINACION, preventiva_id)
+            return result.deleted_count > 0
+        except PyMongoError as e:
+            logging.error(f"Error al eliminar la preventiva {preventiva_id}: {str(e)}")
+            return False
+
+    def bulk_upsert(self, preventivas, ordered=False, actualizar_existentes=True):
+        """
+        Inserta o actualiza varias tareas preventivas, identificadas por _id,
+        con una sola escritura en bloque.
+
+        Args:
+            preventivas (list): Objetos Preventiva
+            ordered (bool, optional): Si se detiene en el primer error
+            actualizar_existentes (bool, optional): False solo inserta; los
+                                                    _id existentes se informan
+                                                    como duplicados
+
+        Returns:
+            ResultadoLote: Resultado global y por preventiva
+        """
+        resultado = ResultadoLote(len(preventivas))
+        ahora = datetime.now()
+        for preventiva in preventivas:
+            preventiva.ultima_actualizacion = ahora
+        operaciones = [
+            (indice, *operacion_guardar(preventiva.to_dict(), ('_id',), actualizar_existentes))
+            for indice, preventiva in enumerate(preventivas)
+        ]
+
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        for preventiva in preventivas:
+            self.cache.invalidar(preventiva.id)
+        self.cache_consultas.limpiar()
+        publicar_varios('preventivas', ACTUALIZACION,
+                        [preventivas[indice].id for indice in resultado.correctos])
+        return resultado
+
+    def bulk_cambiar_estado(self, preventiva_ids, nuevo_estado, ordered=False):
+        """
+        Cambia el estado de varias tareas preventivas con una sola escritura en bloque.
+
+        Args:
+            preventiva_ids (list): IDs de las preventivas (str u ObjectId)
+            nuevo_estado (str): Nuevo estado
+            ordered (bool, optional): Si se detiene en el primer error
+
+        Returns:
+            ResultadoLote: Resultado global y por preventiva
+        """
+        resultado = ResultadoLote(len(preventiva_ids))
+        if nuevo_estado not in Preventiva.ESTADOS_VALIDOS:
+            logging.warning(f"Estado no válido: {nuevo_estado}")
+            resultado.rechazar(f"Estado no válido: {nuevo_estado}")
+            return resultado
+
+        cambios = {'$set': {'estado': nuevo_estado, 'ultima_actualizacion': datetime.now()}}
+        ids = convertir_ids(preventiva_ids, resultado)
+        operaciones = [(indice, *operacion_actualizar({'_id': preventiva_id}, cambios)) for indice, preventiva_id in ids]
+
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        for _, preventiva_id in ids:
+            self.cache.invalidar(preventiva_id)
+        self.cache_consultas.limpiar()
+        correctos = set(resultado.correctos)
+        publicar_varios('preventivas', ACTUALIZACION,
+                        [preventiva_id for indice, preventiva_id in ids if indice in correctos])
+        return resultado
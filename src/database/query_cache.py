@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Caché de resultados de consultas agregadas con caducidad por tiempo.
+"""
+
+import threading
+import time
+
+
+class QueryCache:
+    """
+    Caché de resultados de consultas (estadísticas, resúmenes) de una colección.
+
+    Cada resultado caduca a los ``TTL`` segundos. Cualquier escritura en la
+    colección vacía la caché entera: un resultado agregado depende de todos
+    los documentos, así que no se puede invalidar por ``_id``.
+
+    Igual que en EntityCache, un resultado calculado antes de una
+    invalidación no se guarda.
+    """
+
+    # Segundos que un resultado se considera válido
+    TTL = 30
+
+    _instancias = {}
+    _lock_instancias = threading.Lock()
+
+    def __init__(self, nombre, ttl=None):
+        """
+        Inicializa la caché.
+
+        Args:
+            nombre (str): Nombre de la colección
+            ttl (float, optional): Segundos de validez de cada resultado
+        """
+        self.nombre = nombre
+        self.ttl = ttl if ttl is not None else self.TTL
+        self._resultados = {}
+        self._lock = threading.Lock()
+        self._generacion = 0
+
+    @classmethod
+    def de_coleccion(cls, nombre):
+        """
+        Devuelve la caché de consultas compartida de una colección.
+
+        Args:
+            nombre (str): Nombre de la colección
+
+        Returns:
+            QueryCache: Caché de la colección
+        """
+        with cls._lock_instancias:
+            cache = cls._instancias.get(nombre)
+            if cache is None:
+                cache = cls._instancias[nombre] = cls(nombre)
+            return cache
+
+    @classmethod
+    def invalidar_en(cls, nombre):
+        """
+        Vacía la caché de una colección si existe.
+
+        Args:
+            nombre (str): Nombre de la colección
+        """
+        with cls._lock_instancias:
+            cache = cls._instancias.get(nombre)
+        if cache is not None:
+            cache.limpiar()
+
+    def generacion(self):
+        """
+        Devuelve la generación actual, para pasarla a guardar().
+
+        Returns:
+            int: Número de invalidaciones hasta ahora
+        """
+        with self._lock:
+            return self._generacion
+
+    def obtener(self, clave):
+        """
+        Devuelve un resultado si está en caché y no ha caducado.
+
+        Args:
+            clave (hashable): Clave de la consulta
+
+        Returns:
+            Resultado guardado o None
+        """
+        with self._lock:
+            entrada = self._resultados.get(clave)
+            if entrada is None:
+                return None
+            caduca, resultado = entrada
+            if time.monotonic() >= caduca:
+                del self._resultados[clave]
+                return None
+            return resultado
+
+    def guardar(self, clave, resultado, generacion=None):
+        """
+        Guarda el resultado de una consulta.
+
+        Args:
+            clave (hashable): Clave de la consulta
+            resultado: Resultado a guardar
+            generacion (int, optional): Generación en la que se calculó; si
+                                        hubo invalidaciones después, no se guarda
+        """
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            self._resultados[clave] = (time.monotonic() + self.ttl, resultado)
+
+    def limpiar(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._generacion += 1
+            self._resultados.clear()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ejecución de consultas a la base de datos fuera del hilo de la interfaz.
+"""
+
+import logging
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal, pyqtSlot
+
+
+class _SenalesTarea(QObject):
+    """Señales de una tarea; se entregan en el hilo del QueryRunner"""
+
+    # (clave, generación, resultado)
+    terminada = pyqtSignal(str, int, object)
+
+    # (clave, generación, mensaje de error)
+    fallida = pyqtSignal(str, int, str)
+
+
+class _TareaConsulta(QRunnable):
+    """Tarea del pool que ejecuta una función y publica su resultado"""
+
+    def __init__(self, clave, generacion, funcion, args, kwargs):
+        super().__init__()
+        self.clave = clave
+        self.generacion = generacion
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.senales = _SenalesTarea()
+        self.en_cola = False
+
+    def run(self):
+        self.en_cola = False
+        try:
+            resultado = self.funcion(*self.args, **self.kwargs)
+        except Exception as e:
+            logging.error(f"QueryRunner: Error en la consulta '{self.clave}': {str(e)}")
+            self.senales.fallida.emit(self.clave, self.generacion, str(e))
+        else:
+            self.senales.terminada.emit(self.clave, self.generacion, resultado)
+
+
+class QueryRunner(QObject):
+    """
+    Ejecuta consultas en un QThreadPool y devuelve los resultados por señales.
+
+    Cada consulta se identifica con una clave (por ejemplo ``'camiones'``).
+    Al enviar una consulta con una clave que ya tiene otra pendiente, la
+    anterior se retira del pool si aún no había empezado y, si ya estaba en
+    marcha, su resultado se descarta al llegar. Así solo se entrega el
+    resultado de la última consulta de cada clave.
+    """
+
+    # Señal emitida con (clave, resultado) de la última consulta de cada clave
+    resultado = pyqtSignal(str, object)
+
+    # Señal emitida con (clave, mensaje) si la última consulta falla
+    error = pyqtSignal(str, str)
+
+    # Señal emitida con (clave, True/False) al empezar y terminar de cargar
+    cargando = pyqtSignal(str, bool)
+
+    # Hilos del pool compartido por todas las vistas
+    MAX_HILOS = 4
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    def __init__(self, parent=None):
+        """
+        Inicializa el ejecutor.
+
+        Args:
+            parent (QObject, optional): Objeto padre
+        """
+        super().__init__(parent)
+        self._generaciones = {}
+        self._pendientes = {}
+        self._callbacks = {}
+        self._temporizadores = {}
+
+    @classmethod
+    def pool(cls):
+        """Devuelve el QThreadPool compartido para consultas"""
+        with cls._pool_lock:
+            if cls._pool is None:
+                cls._pool = QThreadPool()
+                cls._pool.setMaxThreadCount(cls.MAX_HILOS)
+            return cls._pool
+
+    def ejecutar(self, clave, funcion, *args, al_terminar=None, al_fallar=None,
+                 retardo_ms=0, **kwargs):
+        """
+        Envía una consulta al pool.
+
+        Args:
+            clave (str): Identificador de la consulta; las anteriores con la
+                         misma clave quedan obsoletas
+            funcion (callable): Función a ejecutar en segundo plano
+            *args: Argumentos posicionales de la función
+            al_terminar (callable, optional): Función resultado -> None llamada
+                                              en el hilo de la interfaz
+            al_fallar (callable, optional): Función mensaje -> None llamada en
+                                            el hilo de la interfaz
+            retardo_ms (int, optional): Espera antes de lanzar la consulta; los
+                                        envíos repetidos dentro de ese margen se
+                                        agrupan en uno solo
+            **kwargs: Argumentos con nombre de la función
+
+        Returns:
+            int: Generación asignada a la consulta
+        """
+        ya_cargando = self._pendientes_de(clave)
+        generacion = self._invalidar(clave)
+        self._callbacks[clave] = (al_terminar, al_fallar)
+
+        if not ya_cargando:
+            self.cargando.emit(clave, True)
+
+        tarea = _TareaConsulta(clave, generacion, funcion, args, kwargs)
+        tarea.senales.terminada.connect(self._on_terminada)
+        tarea.senales.fallida.connect(self._on_fallida)
+        self._pendientes[clave] = tarea
+
+        if retardo_ms > 0:
+            temporizador = QTimer(self)
+            temporizador.setSingleShot(True)
+            temporizador.timeout.connect(lambda: self._lanzar(clave, tarea))
+            self._temporizadores[clave] = temporizador
+            temporizador.start(retardo_ms)
+        else:
+            self._lanzar(clave, tarea)
+
+        return generacion
+
+    def cancelar(self, clave):
+        """
+        Cancela la consulta pendiente de una clave.
+
+        Si ya se está ejecutando no se interrumpe, pero su resultado se descarta.
+
+        Args:
+            clave (str): Identificador de la consulta
+        """
+        estaba_cargando = self._pendientes_de(clave)
+        self._invalidar(clave)
+        self._callbacks.pop(clave, None)
+        if estaba_cargando:
+            self.cargando.emit(clave, False)
+
+    def cancelar_todo(self):
+        """Cancela todas las consultas pendientes"""
+        for clave in list(self._generaciones):
+            if self._pendientes_de(clave):
+                self.cancelar(clave)
+
+    def en_curso(self, clave):
+        """
+        Indica si hay una consulta vigente sin terminar para la clave.
+
+        Returns:
+            bool: True si la clave está cargando
+        """
+        return self._pendientes_de(clave)
+
+    def esperar(self, msecs=-1):
+        """
+        Espera a que terminen las tareas del pool.
+
+        Returns:
+            bool: True si terminaron todas antes del tiempo límite
+        """
+        return self.pool().waitForDone(msecs)
+
+    # --- Utilidades internas ---
+
+    def _pendientes_de(self, clave):
+        """True si la última consulta de la clave todavía no ha respondido"""
+        return clave in self._pendientes
+
+    def _invalidar(self, clave):
+        """Deja obsoletas las consultas anteriores de la clave y devuelve la nueva generación"""
+        temporizador = self._temporizadores.pop(clave, None)
+        if temporizador is not None:
+            temporizador.stop()
+            temporizador.deleteLater()
+
+        anterior = self._pendientes.pop(clave, None)
+        if anterior is not None and anterior.en_cola:
+            # Si aún no ha empezado se retira de la cola del pool
+            try:
+                self.pool().tryTake(anterior)
+            except RuntimeError:
+                # El pool ya la ejecutó y liberó entre tanto
+                pass
+
+        generacion = self._generaciones.get(clave, 0) + 1
+        self._generaciones[clave] = generacion
+        return generacion
+
+    def _lanzar(self, clave, tarea):
+        """Pone la tarea en la cola del pool si sigue siendo la vigente"""
+        temporizador = self._temporizadores.pop(clave, None)
+        if temporizador is not None:
+            temporizador.deleteLater()
+        if self._pendientes.get(clave) is not tarea:
+            return
+        tarea.en_cola = True
+        self.pool().start(tarea)
+
+    def _es_vigente(self, clave, generacion):
+        """True si la generación es la última enviada para la clave"""
+        return self._generaciones.get(clave) == generacion
+
+    def _finalizar(self, clave, generacion):
+        """
+        Libera la tarea terminada.
+
+        Returns:
+            tuple: (al_terminar, al_fallar) si el resultado es vigente, None si no
+        """
+        if not self._es_vigente(clave, generacion):
+            return None
+
+        self._pendientes.pop(clave, None)
+        self.cargando.emit(clave, False)
+        return self._callbacks.pop(clave, (None, None))
+
+    @pyqtSlot(str, int, object)
+    def _on_terminada(self, clave, generacion, resultado):
+        callbacks = self._finalizar(clave, generacion)
+        if callbacks is None:
+            return
+
+        al_terminar, _ = callbacks
+        if al_terminar is not None:
+            al_terminar(resultado)
+        self.resultado.emit(clave, resultado)
+
+    @pyqtSlot(str, int, str)
+    def _on_fallida(self, clave, generacion, mensaje):
+        callbacks = self._finalizar(clave, generacion)
+        if callbacks is None:
+            return
+
+        _, al_fallar = callbacks
+        if al_fallar is not None:
+            al_fallar(mensaje)
+        self.error.emit(clave, mensaje)
@@ -8,19 +8,32 @@ Objeto de Acceso a Datos (DAO) para reparaciones.
 import logging
 from datetime import datetime
 from bson.objectid import ObjectId
+from pymongo import DESCENDING, ReturnDocument
 from pymongo.errors import PyMongoError
 
+from database.bulk import ResultadoLote, convertir_ids, ejecutar_lote, operacion_actualizar, operacion_guardar
+from database.busqueda import reconstruir_busqueda, valor_busqueda
 from database.connection import DatabaseConnection
+from database.entity_cache import EntityCache
+from database.eventos import ACTUALIZACION, ELIMINACION, INSERCION, publicar, publicar_varios
+from database.paginacion import Pagina, TAMANO_PAGINA, obtener_pagina
+from models.actividad import Actividad
 from models.reparacion import Reparacion
+from models.filas import FilaReparacion
+from utils.texto import CAMPO_BUSQUEDA, filtro_busqueda, filtro_prefijo
 
 class ReparacionesDAO:
     """Clase para manejar operaciones de base de datos relacionadas con reparaciones"""
     
+    # Campos de texto incluidos en la búsqueda libre
+    CAMPOS_BUSQUEDA = ('id_falla', 'motivo_falla', 'descripcion')
+    
     def __init__(self):
         """Inicializa la conexión a la base de datos"""
         try:
             self.db_connection = DatabaseConnection()
             self.collection = self.db_connection.get_reparaciones_collection()
+            self.cache = EntityCache.de_coleccion('reparaciones')
             
             logging.info(f"ReparacionesDAO: Conexión establecida a la colección de reparaciones")
         except Exception as e:
@@ -46,6 +59,19 @@ class ReparacionesDAO:
             logging.error(f"ReparacionesDAO: Error al obtener todas las reparaciones: {str(e)}")
             return []
     
+    def obtener_pagina(self, token=None, tamano=TAMANO_PAGINA):
+        """
+        Obtiene una página de reparaciones ordenadas por fecha de entrada descendente.
+        
+        Args:
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de reparaciones
+            
+        Returns:
+            Pagina: Reparaciones de la página y token de la siguiente
+        """
+        return self.buscar_pagina(None, token, tamano)
+    
     def obtener_por_id(self, id):
         """
         Obtiene una reparación por su ID.
@@ -61,7 +87,7 @@ class ReparacionesDAO:
             if isinstance(id, str):
                 id = ObjectId(id)
             
-            doc = self.collection.find_one({'_id': id})
+            doc = self.cache.leer(self.collection, id)
             
             if doc:
                 return Reparacion.from_dict(doc)
@@ -71,6 +97,19 @@ class ReparacionesDAO:
             logging.error(f"ReparacionesDAO: Error al obtener reparación por ID: {str(e)}")
             return None
     
+    def obtener_en_cache(self, id):
+        """
+        Obtiene la reparación si ya está en la caché, sin consultar la base de datos.
+        
+        Args:
+            id (str or ObjectId): ID de la reparación
+            
+        Returns:
+            Reparacion: Objeto Reparacion si está en caché, None en caso contrario
+        """
+        doc = self.cache.obtener(id)
+        return Reparacion.from_dict(doc) if doc else None
+    
     def obtener_por_camion(self, camion_id):
         """
         Obtiene todas las reparaciones de un camión.
@@ -163,7 +202,11 @@ class ReparacionesDAO:
             if not hasattr(reparacion, 'ultima_actualizacion') or reparacion.ultima_actualizacion is None:
                 reparacion.ultima_actualizacion = datetime.now()
             
-            resultado = self.collection.insert_one(reparacion.to_dict())
+            reparacion_dict = reparacion.to_dict()
+            reparacion_dict[CAMPO_BUSQUEDA] = valor_busqueda(reparacion_dict, self.CAMPOS_BUSQUEDA)
+            
+            resultado = self.collection.insert_one(reparacion_dict)
+            publicar('reparaciones', INSERCION, resultado.inserted_id)
             return resultado.acknowledged
         except PyMongoError as e:
             logging.error(f"ReparacionesDAO: Error al insertar reparación: {str(e)}")
@@ -180,18 +223,27 @@ class ReparacionesDAO:
             bool: True si la actualización fue exitosa, False en caso contrario
         """
         try:
-            # Asegurar que se actualice la fecha de última actualización
+            # Solo se envían los campos modificados desde la carga
+            cambios = reparacion.cambios()
+            if not cambios:
+                return True
+
             reparacion.ultima_actualizacion = datetime.now()
-            
-            # Convertir a diccionario
-            reparacion_dict = reparacion.to_dict()
-            
+            cambios['ultima_actualizacion'] = reparacion.ultima_actualizacion
+            if any(campo in cambios for campo in self.CAMPOS_BUSQUEDA):
+                cambios[CAMPO_BUSQUEDA] = valor_busqueda(reparacion.to_dict(), self.CAMPOS_BUSQUEDA)
+
             resultado = self.collection.update_one(
                 {'_id': reparacion.id},
-                {'$set': reparacion_dict}
+                {'$set': cambios}
             )
-            
-            return resultado.modified_count > 0
+
+            self.cache.invalidar(reparacion.id)
+            reparacion.marcar_sin_cambios()
+            if resultado.matched_count:
+                publicar('reparaciones', ACTUALIZACION, reparacion.id)
+
+            return resultado.matched_count > 0
         except PyMongoError as e:
             logging.error(f"ReparacionesDAO: Error al actualizar reparación: {str(e)}")
             return False
@@ -212,11 +264,116 @@ class ReparacionesDAO:
                 id = ObjectId(id)
             
             resultado = self.collection.delete_one({'_id': id})
+            
+            self.cache.invalidar(id)
+            if resultado.deleted_count:
+                publicar('reparaciones', ELIMINACION, id)
             return resultado.deleted_count > 0
         except PyMongoError as e:
             logging.error(f"ReparacionesDAO: Error al eliminar reparación: {str(e)}")
             return False
     
+    def _transicion(self, reparacion_id, estados_permitidos, cambios, nota=None):
+        """
+        Aplica un cambio de estado en una sola operación atómica.
+        
+        La reparación solo se modifica si su estado actual está entre los
+        permitidos, así dos usuarios que cambian la misma reparación a la vez
+        no se pisan: el segundo no encuentra el estado que esperaba.
+        
+        Args:
+            reparacion_id (str or ObjectId): ID de la reparación
+            estados_permitidos (list): Estados desde los que se permite el cambio
+            cambios (dict): Campos a asignar (valores o expresiones de agregación)
+            nota (str, optional): Texto a añadir al final de las notas adicionales
+            
+        Returns:
+            dict: Documento actualizado o None si no existe o su estado no lo permite
+        """
+        if isinstance(reparacion_id, str):
+            reparacion_id = ObjectId(reparacion_id)
+        
+        documento = self.collection.find_one_and_update(
+            {'_id': reparacion_id, 'estado': {'$in': estados_permitidos}},
+            self._actualizacion(cambios, nota),
+            return_document=ReturnDocument.AFTER
+        )
+        # El documento devuelto ya es el actualizado: la siguiente lectura
+        # por ID no necesita volver al servidor
+        self.cache.invalidar(reparacion_id)
+        
+        if documento is None:
+            logging.warning(
+                f"ReparacionesDAO: La reparación {reparacion_id} no existe o su estado no permite el cambio"
+            )
+        else:
+            self.cache.guardar(documento)
+            publicar('reparaciones', ACTUALIZACION, reparacion_id)
+        return documento
+    
+    @staticmethod
+    def _actualizacion(cambios, nota=None):
+        """
+        Construye la actualización (pipeline) de un cambio de estado.
+        
+        Args:
+            cambios (dict): Campos a asignar (valores o expresiones de agregación)
+            nota (str, optional): Texto a añadir al final de las notas adicionales
+            
+        Returns:
+            list: Pipeline de actualización
+        """
+        cambios = dict(cambios)
+        cambios['ultima_actualizacion'] = datetime.now()
+        if nota:
+            # Si ya hay notas, la nueva se añade separada por una línea en blanco
+            cambios['notas_adicionales'] = {'$cond': [
+                {'$eq': [{'$ifNull': ['$notas_adicionales', '']}, '']},
+                {'$literal': nota},
+                {'$concat': ['$notas_adicionales', {'$literal': f"\n\n{nota}"}]}
+            ]}
+        return [{'$set': cambios}]
+    
+    @classmethod
+    def _regla_estado(cls, nuevo_estado, notas=None):
+        """
+        Devuelve cómo se pasa una reparación a un estado.
+        
+        Args:
+            nuevo_estado (str): Estado destino (válido)
+            notas (str, optional): Notas adicionales sobre el cambio de estado
+            
+        Returns:
+            tuple: (estados permitidos, cambios, nota)
+        """
+        if nuevo_estado == Reparacion.ESTADO_REPARADO:
+            return (
+                [e for e in Reparacion.ESTADOS_VALIDOS if e != Reparacion.ESTADO_REPARADO],
+                {'estado': nuevo_estado, 'fecha_salida': datetime.now()},
+                cls._nota("Notas de completado", notas) if notas else None
+            )
+        
+        if nuevo_estado == Reparacion.ESTADO_CANCELADO:
+            # No se cancela lo que ya está cancelado o reparado
+            return (
+                [Reparacion.ESTADO_EN_ESPERA, Reparacion.ESTADO_EN_REPARACION],
+                {'estado': nuevo_estado},
+                cls._nota("Motivo de cancelación", notas) if notas else None
+            )
+        
+        # Para otros estados, basta con que cambie
+        return (
+            [e for e in Reparacion.ESTADOS_VALIDOS if e != nuevo_estado],
+            {'estado': nuevo_estado},
+            cls._nota(f"Cambio a estado {nuevo_estado}", notas) if notas else None
+        )
+    
+    @staticmethod
+    def _nota(titulo, texto=None):
+        """Formatea una entrada de las notas adicionales con la fecha actual"""
+        encabezado = f"{titulo} ({datetime.now().strftime('%d/%m/%Y %H:%M')})"
+        return f"{encabezado}:\n{texto}" if texto else encabezado
+    
     def cambiar_estado(self, reparacion_id, nuevo_estado, notas=None):
         """
         Cambia el estado de una reparación.
@@ -230,42 +387,14 @@ class ReparacionesDAO:
             bool: True si se cambió correctamente, False en caso contrario
         """
         try:
-            if isinstance(reparacion_id, str):
-                reparacion_id = ObjectId(reparacion_id)
-                
-            # Obtener la reparación actual
-            reparacion = self.obtener_por_id(reparacion_id)
-            if not reparacion:
-                logging.warning(f"No se encontró la reparación {reparacion_id}")
-                return False
-                
             # Verificar que el estado sea válido
             if nuevo_estado not in Reparacion.ESTADOS_VALIDOS:
                 logging.warning(f"Estado no válido: {nuevo_estado}")
                 return False
-                
-            # Actualizar estado según la lógica del modelo
-            if nuevo_estado == Reparacion.ESTADO_REPARADO:
-                resultado = reparacion.completar_reparacion(notas=notas)
-            elif nuevo_estado == Reparacion.ESTADO_CANCELADO:
-                resultado = reparacion.cancelar_reparacion(motivo=notas)
-            else:
-                # Para otros estados, usar actualizar directamente
-                resultado = reparacion.actualizar(estado=nuevo_estado)
-                
-                # Añadir notas si se proporcionaron
-                if notas and resultado:
-                    fecha_nota = datetime.now().strftime('%d/%m/%Y %H:%M')
-                    if reparacion.notas_adicionales:
-                        reparacion.notas_adicionales += f"\n\nCambio a estado {nuevo_estado} ({fecha_nota}):\n{notas}"
-                    else:
-                        reparacion.notas_adicionales = f"Cambio a estado {nuevo_estado} ({fecha_nota}):\n{notas}"
-            
-            # Si se actualizó el estado, guardar en la base de datos
-            if resultado:
-                return self.actualizar(reparacion)
             
-            return False
+            estados_permitidos, cambios, nota = self._regla_estado(nuevo_estado, notas)
+            documento = self._transicion(reparacion_id, estados_permitidos, cambios, nota)
+            return documento is not None
         except PyMongoError as e:
             logging.error(f"ReparacionesDAO: Error al cambiar el estado de la reparación {reparacion_id}: {str(e)}")
             return False
@@ -282,23 +411,19 @@ class ReparacionesDAO:
             bool: True si se asignó correctamente, False en caso contrario
         """
         try:
-            if isinstance(reparacion_id, str):
-                reparacion_id = ObjectId(reparacion_id)
-                
-            # Obtener la reparación actual
-            reparacion = self.obtener_por_id(reparacion_id)
-            if not reparacion:
-                logging.warning(f"No se encontró la reparación {reparacion_id}")
-                return False
-            
-            # Usar el método del modelo para asignar mecánico
-            resultado = reparacion.asignar_mecanico(mecanico_id)
-            
-            # Si se asignó correctamente, actualizar en la base de datos
-            if resultado:
-                return self.actualizar(reparacion)
+            if isinstance(mecanico_id, str):
+                mecanico_id = ObjectId(mecanico_id)
             
-            return False
+            # Una reparación en espera pasa a estar en reparación
+            documento = self._transicion(
+                reparacion_id,
+                [Reparacion.ESTADO_EN_ESPERA, Reparacion.ESTADO_EN_REPARACION],
+                {
+                    'mecanico_id': mecanico_id,
+                    'estado': Reparacion.ESTADO_EN_REPARACION
+                }
+            )
+            return documento is not None
         except PyMongoError as e:
             logging.error(f"ReparacionesDAO: Error al asignar mecánico a la reparación {reparacion_id}: {str(e)}")
             return False
@@ -316,23 +441,12 @@ class ReparacionesDAO:
             bool: True si se completó correctamente, False en caso contrario
         """
         try:
-            if isinstance(reparacion_id, str):
-                reparacion_id = ObjectId(reparacion_id)
-                
-            # Obtener la reparación actual
-            reparacion = self.obtener_por_id(reparacion_id)
-            if not reparacion:
-                logging.warning(f"No se encontró la reparación {reparacion_id}")
-                return False
+            estados_permitidos, cambios, nota = self._regla_estado(Reparacion.ESTADO_REPARADO, notas)
+            if costo is not None:
+                cambios['costo'] = costo
             
-            # Completar la reparación
-            resultado = reparacion.completar_reparacion(costo=costo, notas=notas)
-            
-            # Si se completó correctamente, actualizar en la base de datos
-            if resultado:
-                return self.actualizar(reparacion)
-            
-            return False
+            documento = self._transicion(reparacion_id, estados_permitidos, cambios, nota)
+            return documento is not None
         except PyMongoError as e:
             logging.error(f"ReparacionesDAO: Error al completar la reparación {reparacion_id}: {str(e)}")
             return False
@@ -348,27 +462,101 @@ class ReparacionesDAO:
             bool: True si se reabrió correctamente, False en caso contrario
         """
         try:
-            if isinstance(reparacion_id, str):
-                reparacion_id = ObjectId(reparacion_id)
-                
-            # Obtener la reparación actual
-            reparacion = self.obtener_por_id(reparacion_id)
-            if not reparacion:
-                logging.warning(f"No se encontró la reparación {reparacion_id}")
-                return False
-            
-            # Reabrir la reparación
-            resultado = reparacion.reabrir_reparacion()
-            
-            # Si se reabrió correctamente, actualizar en la base de datos
-            if resultado:
-                return self.actualizar(reparacion)
-            
-            return False
+            # Con mecánico asignado vuelve a En Reparación; sin él, a En Espera
+            documento = self._transicion(
+                reparacion_id,
+                [Reparacion.ESTADO_REPARADO, Reparacion.ESTADO_CANCELADO],
+                {
+                    'estado': {'$cond': [
+                        {'$ifNull': ['$mecanico_id', False]},
+                        Reparacion.ESTADO_EN_REPARACION,
+                        Reparacion.ESTADO_EN_ESPERA
+                    ]},
+                    'fecha_salida': None
+                },
+                self._nota("Reparación reabierta")
+            )
+            return documento is not None
         except PyMongoError as e:
             logging.error(f"ReparacionesDAO: Error al reabrir la reparación {reparacion_id}: {str(e)}")
             return False
     
+    def bulk_upsert(self, reparaciones, ordered=False, actualizar_existentes=True):
+        """
+        Inserta o actualiza varias reparaciones, identificadas por _id, con
+        una sola escritura en bloque.
+        
+        Args:
+            reparaciones (list): Objetos Reparacion
+            ordered (bool, optional): Si se detiene en el primer error
+            actualizar_existentes (bool, optional): False solo inserta; los
+                                                    _id existentes se informan
+                                                    como duplicados
+            
+        Returns:
+            ResultadoLote: Resultado global y por reparación
+        """
+        resultado = ResultadoLote(len(reparaciones))
+        ahora = datetime.now()
+        operaciones = []
+        for indice, reparacion in enumerate(reparaciones):
+            if reparacion.fecha_entrada is None:
+                reparacion.fecha_entrada = ahora
+            reparacion.ultima_actualizacion = ahora
+            reparacion_dict = reparacion.to_dict()
+            reparacion_dict[CAMPO_BUSQUEDA] = valor_busqueda(reparacion_dict, self.CAMPOS_BUSQUEDA)
+            operaciones.append(
+                (indice, *operacion_guardar(reparacion_dict, ('_id',), actualizar_existentes))
+            )
+        
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        for reparacion in reparaciones:
+            self.cache.invalidar(reparacion.id)
+        publicar_varios('reparaciones', ACTUALIZACION,
+                        [reparaciones[indice].id for indice in resultado.correctos])
+        return resultado
+    
+    def bulk_cambiar_estado(self, reparacion_ids, nuevo_estado, notas=None, ordered=False):
+        """
+        Cambia el estado de varias reparaciones con una sola escritura en bloque.
+        
+        Se aplican las mismas reglas que en cambiar_estado: las reparaciones
+        cuyo estado actual no permite el cambio no se modifican y solo se
+        reflejan en los totales del resultado (coincidentes).
+        
+        Args:
+            reparacion_ids (list): IDs de las reparaciones (str u ObjectId)
+            nuevo_estado (str): Nuevo estado
+            notas (str, optional): Notas adicionales sobre el cambio de estado
+            ordered (bool, optional): Si se detiene en el primer error
+            
+        Returns:
+            ResultadoLote: Resultado global y por reparación
+        """
+        resultado = ResultadoLote(len(reparacion_ids))
+        if nuevo_estado not in Reparacion.ESTADOS_VALIDOS:
+            logging.warning(f"Estado no válido: {nuevo_estado}")
+            resultado.rechazar(f"Estado no válido: {nuevo_estado}")
+            return resultado
+        
+        estados_permitidos, cambios, nota = self._regla_estado(nuevo_estado, notas)
+        actualizacion = self._actualizacion(cambios, nota)
+        ids = convertir_ids(reparacion_ids, resultado)
+        operaciones = [
+            (indice, *operacion_actualizar(
+                {'_id': reparacion_id, 'estado': {'$in': estados_permitidos}}, actualizacion
+            ))
+            for indice, reparacion_id in ids
+        ]
+        
+        ejecutar_lote(self.collection, operaciones, resultado, ordered)
+        for _, reparacion_id in ids:
+            self.cache.invalidar(reparacion_id)
+        correctos = set(resultado.correctos)
+        publicar_varios('reparaciones', ACTUALIZACION,
+                        [reparacion_id for indice, reparacion_id in ids if indice in correctos])
+        return resultado
+    
     def buscar(self, filtros=None):
         """
         Busca reparaciones según los filtros especificados.
@@ -380,55 +568,8 @@ class ReparacionesDAO:
             list: Lista de objetos Reparacion que coinciden con los filtros
         """
         try:
-            # Inicializar consulta
-            query = {}
-            
-            # Aplicar filtros si existen
-            if filtros:
-                # Filtro por ID de falla
-                if 'id_falla' in filtros and filtros['id_falla']:
-                    query['id_falla'] = {'$regex': filtros['id_falla'], '$options': 'i'}
-                
-                # Filtro por motivo de falla
-                if 'motivo_falla' in filtros and filtros['motivo_falla']:
-                    query['motivo_falla'] = {'$regex': filtros['motivo_falla'], '$options': 'i'}
-                
-                # Filtro por descripción
-                if 'descripcion' in filtros and filtros['descripcion']:
-                    query['descripcion'] = {'$regex': filtros['descripcion'], '$options': 'i'}
-                
-                # Filtro por estado
-                if 'estado' in filtros and filtros['estado']:
-                    query['estado'] = filtros['estado']
-                
-                # Filtro por camión
-                if 'camion_id' in filtros and filtros['camion_id']:
-                    # Convertir a ObjectId si es string
-                    if isinstance(filtros['camion_id'], str):
-                        query['camion_id'] = ObjectId(filtros['camion_id'])
-                    else:
-                        query['camion_id'] = filtros['camion_id']
-                
-                # Filtro por mecánico
-                if 'mecanico_id' in filtros and filtros['mecanico_id']:
-                    # Convertir a ObjectId si es string
-                    if isinstance(filtros['mecanico_id'], str):
-                        query['mecanico_id'] = ObjectId(filtros['mecanico_id'])
-                    else:
-                        query['mecanico_id'] = filtros['mecanico_id']
-                
-                # Filtro por fecha (rango)
-                if 'fecha_desde' in filtros and filtros['fecha_desde']:
-                    if 'fecha_hasta' in filtros and filtros['fecha_hasta']:
-                        query['fecha_entrada'] = {
-                            '$gte': filtros['fecha_desde'],
-                            '$lte': filtros['fecha_hasta']
-                        }
-                    else:
-                        query['fecha_entrada'] = {'$gte': filtros['fecha_desde']}
-            
             # Ejecutar consulta
-            reparaciones_docs = self.collection.find(query).sort('fecha_entrada', -1)
+            reparaciones_docs = self.collection.find(self._construir_consulta(filtros)).sort('fecha_entrada', -1)
             reparaciones = []
             
             for doc in reparaciones_docs:
@@ -439,6 +580,164 @@ class ReparacionesDAO:
             logging.error(f"ReparacionesDAO: Error al buscar reparaciones: {str(e)}")
             return []
     
+    def buscar_pagina(self, filtros=None, token=None, tamano=TAMANO_PAGINA):
+        """
+        Busca una página de reparaciones ordenadas por fecha de entrada descendente.
+        
+        Args:
+            filtros: Diccionario con criterios de búsqueda (como en buscar)
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de reparaciones
+            
+        Returns:
+            Pagina: Reparaciones de la página y token de la siguiente
+        """
+        try:
+            documentos, siguiente = obtener_pagina(
+                self.collection, self._construir_consulta(filtros),
+                'fecha_entrada', DESCENDING, token, tamano
+            )
+            return Pagina([Reparacion.from_dict(doc) for doc in documentos], siguiente)
+        except (PyMongoError, ValueError) as e:
+            logging.error(f"ReparacionesDAO: Error al buscar la página de reparaciones: {str(e)}")
+            return Pagina([])
+    
+    def buscar_filas(self, filtros=None, token=None, tamano=TAMANO_PAGINA):
+        """
+        Busca una página de filas ligeras de reparaciones ordenadas por fecha de entrada descendente.
+        
+        Solo se transfieren los campos que muestra la tabla.
+        
+        Args:
+            filtros: Diccionario con criterios de búsqueda
+            token (str, optional): Token de la página anterior
+            tamano (int, optional): Número máximo de filas
+            
+        Returns:
+            Pagina: Objetos FilaReparacion de la página y token de la siguiente
+        """
+        try:
+            documentos, siguiente = obtener_pagina(
+                self.collection, self._construir_consulta(filtros),
+                'fecha_entrada', DESCENDING, token, tamano, FilaReparacion.PROYECCION
+            )
+            return Pagina([FilaReparacion.desde_documento(doc) for doc in documentos], siguiente)
+        except (PyMongoError, ValueError) as e:
+            logging.error(f"ReparacionesDAO: Error al buscar las filas de reparaciones: {str(e)}")
+            return Pagina([])
+    
+    def _construir_consulta(self, filtros):
+        """
+        Construye la consulta de MongoDB a partir de los filtros de búsqueda.
+        
+        Args:
+            filtros: Diccionario con criterios de búsqueda
+            
+        Returns:
+            dict: Consulta de MongoDB
+        """
+        # Inicializar consulta
+        query = {}
+        
+        # Aplicar filtros si existen
+        if filtros:
+            # Búsqueda libre por prefijos de ID, motivo y descripción (usa el índice).
+            # Los filtros de motivo y descripción se resuelven con el mismo campo
+            textos = [filtros[campo] for campo in ('texto', 'motivo_falla', 'descripcion') if filtros.get(campo)]
+            if textos:
+                query.update(filtro_busqueda(' '.join(textos)))
+            
+            # Filtro por prefijo del ID de falla (sobre la clave normalizada)
+            if 'id_falla' in filtros and filtros['id_falla']:
+                query.update(filtro_prefijo('id_falla_busqueda', filtros['id_falla'], ''))
+            
+            # Filtro por estado
+            if 'estado' in filtros and filtros['estado']:
+                query['estado'] = filtros['estado']
+            
+            # Filtro por camión
+            if 'camion_id' in filtros and filtros['camion_id']:
+                # Convertir a ObjectId si es string
+                if isinstance(filtros['camion_id'], str):
+                    query['camion_id'] = ObjectId(filtros['camion_id'])
+                else:
+                    query['camion_id'] = filtros['camion_id']
+            
+            # Filtro por mecánico
+            if 'mecanico_id' in filtros and filtros['mecanico_id']:
+                # Convertir a ObjectId si es string
+                if isinstance(filtros['mecanico_id'], str):
+                    query['mecanico_id'] = ObjectId(filtros['mecanico_id'])
+                else:
+                    query['mecanico_id'] = filtros['mecanico_id']
+            
+            # Filtro por fecha (rango)
+            if 'fecha_desde' in filtros and filtros['fecha_desde']:
+                if 'fecha_hasta' in filtros and filtros['fecha_hasta']:
+                    query['fecha_entrada'] = {
+                        '$gte': filtros['fecha_desde'],
+                        '$lte': filtros['fecha_hasta']
+                    }
+                else:
+                    query['fecha_entrada'] = {'$gte': filtros['fecha_desde']}
+        
+        return query
+    
+    def reconstruir_busqueda(self, todos=False):
+        """
+        Calcula los campos de búsqueda de las reparaciones que no los tienen.
+        
+        Args:
+            todos (bool, optional): Recalcula también las que ya lo tienen
+            
+        Returns:
+            int: Número de reparaciones actualizadas
+        """
+        return reconstruir_busqueda(
+            self.collection, self.CAMPOS_BUSQUEDA,
+            Reparacion.claves_busqueda, ('id_falla',), todos
+        )
+    
+    def obtener_actividad_reciente(self, limite=20):
+        """
+        Obtiene las reparaciones modificadas más recientemente.
+        
+        Usa el índice sobre 'ultima_actualizacion' y solo transfiere los
+        campos necesarios para mostrar la actividad.
+        
+        Args:
+            limite (int, optional): Número máximo de reparaciones a devolver
+            
+        Returns:
+            list: Lista de diccionarios con id_falla, motivo_falla, estado y fechas
+        """
+        try:
+            cursor = self.collection.find(
+                {}, Actividad.PROYECCION_REPARACION
+            ).sort('ultima_actualizacion', -1).limit(limite)
+            return list(cursor)
+        except PyMongoError as e:
+            logging.error(f"ReparacionesDAO: Error al obtener la actividad reciente: {str(e)}")
+            return []
+    
+    def obtener_actividad(self, reparacion_id):
+        """
+        Obtiene los campos de actividad de una reparación tras un cambio.
+        
+        Args:
+            reparacion_id (str or ObjectId): ID de la reparación
+            
+        Returns:
+            dict: Documento con los campos de Actividad.PROYECCION_REPARACION, o None
+        """
+        try:
+            if isinstance(reparacion_id, str):
+                reparacion_id = ObjectId(reparacion_id)
+            return self.collection.find_one({'_id': reparacion_id}, Actividad.PROYECCION_REPARACION)
+        except PyMongoError as e:
+            logging.error(f"ReparacionesDAO: Error al obtener la actividad de {reparacion_id}: {str(e)}")
+            return None
+    
     def obtener_estadisticas(self, fecha_desde=None, fecha_hasta=None):
         """
         Obtiene estadísticas de reparaciones.
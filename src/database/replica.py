@@ -0,0 +1,1326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Réplica local en SQLite de las colecciones principales.
+
+Las lecturas de una colección se responden desde la réplica en cuanto se ha
+descargado entera una vez (el ``Sincronizador`` y el observador de cambios la
+mantienen al día); antes, solo sin conexión. Con conexión las escrituras van
+al servidor y los documentos escritos se copian en la réplica. Sin conexión
+(o mientras la colección tiene escrituras locales sin subir) las escrituras
+de un documento se aplican en la réplica y se anotan en una cola de salida
+(tabla ``pendientes``) que el ``Sincronizador`` envía después a MongoDB. Así
+la aplicación arranca y sigue funcionando sin conexión.
+
+Los documentos se guardan codificados en BSON, con los mismos tipos que en
+MongoDB. Los campos de los índices declarados en ``database.indices`` (los
+que usan los filtros y órdenes de los DAO) se copian además en la tabla
+``valores``, indexada en SQLite: con ella se eligen los documentos candidatos
+de un filtro y se recorre una colección en el orden de un campo, de modo que
+una página solo decodifica los documentos que devuelve. El filtro completo se
+evalúa después en Python (ver ``consulta_local``). Las operaciones que la
+réplica no implementa (escrituras en bloque, actualizaciones con pipeline) se
+envían al servidor y después se copian en local los documentos afectados.
+"""
+
+import calendar
+import itertools
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import bson
+from bson import ObjectId
+from pymongo import InsertOne, ReturnDocument
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, PyMongoError
+from pymongo.results import DeleteResult, InsertOneResult, UpdateResult
+
+from database.bulk import CODIGO_DUPLICADO
+from database.consulta_local import (
+    OperadorNoAdmitido, agregar, aplicar_actualizacion, coincide, igualdades, normalizar_orden,
+    ordenar, proyectar, rango_tipo, validar, validar_actualizacion, validar_agregacion, valor_campo
+)
+from database.indices import INDICES
+
+# Colecciones replicadas y campos de fecha que identifican la versión de cada
+# documento: se usan para descargar solo lo modificado y para detectar
+# conflictos al subir los cambios locales. Las colecciones sin campos de
+# versión se replican solo para lectura; sus escrituras van al servidor.
+COLECCIONES = {
+    'camiones': ('ultima_actualizacion',),
+    'mecanicos': ('ultima_actualizacion',),
+    'reparaciones': ('ultima_actualizacion',),
+    'preventivas': ('ultima_actualizacion',),
+    'usuarios': (),
+}
+
+# Campos de cada colección copiados en la tabla ``valores``: los de los
+# índices declarados para el servidor, que son los que usan los filtros y
+# órdenes de los DAO
+CAMPOS_INDEXADOS = {
+    coleccion: tuple(dict.fromkeys(
+        campo for indice in INDICES if indice.coleccion == coleccion
+        for campo, _ in indice.claves if campo != '_id'
+    ))
+    for coleccion in COLECCIONES
+}
+
+# Rango de los valores que no se copian en ``valores`` (subdocumentos,
+# arrays vacíos, binarios...): sus documentos son candidatos de cualquier filtro
+SIN_INDICE = 0
+
+# Operaciones de la cola de salida
+INSERTAR = 'insertar'
+ACTUALIZAR = 'actualizar'
+ELIMINAR = 'eliminar'
+
+# _id por consulta al copiar del servidor los documentos de una escritura delegada
+TAMANO_REFRESCO = 500
+
+# Documentos leídos o guardados en SQLite de cada vez
+TAMANO_LOTE = 500
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    coleccion TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    datos BLOB NOT NULL,
+    PRIMARY KEY (coleccion, clave)
+) WITHOUT ROWID;
+
+-- Valores de los campos indexados: una fila por valor (por elemento en los
+-- arrays), con el rango de su tipo en el orden de BSON
+CREATE TABLE IF NOT EXISTS valores (
+    coleccion TEXT NOT NULL,
+    campo TEXT NOT NULL,
+    rango INTEGER NOT NULL,
+    valor NOT NULL,
+    clave TEXT NOT NULL,
+    PRIMARY KEY (coleccion, campo, rango, valor, clave)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS valores_documento ON valores (coleccion, clave);
+
+CREATE TABLE IF NOT EXISTS campos_indexados (
+    coleccion TEXT PRIMARY KEY,
+    campos TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pendientes (
+    secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+    coleccion TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    operacion TEXT NOT NULL,
+    datos BLOB NOT NULL,
+    creado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pendientes_documento ON pendientes (coleccion, clave);
+
+CREATE TABLE IF NOT EXISTS marcas (
+    coleccion TEXT PRIMARY KEY,
+    marca BLOB,
+    sincronizada REAL
+);
+
+CREATE TABLE IF NOT EXISTS conflictos (
+    secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+    coleccion TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    operacion TEXT NOT NULL,
+    motivo TEXT NOT NULL,
+    datos BLOB NOT NULL,
+    fecha REAL NOT NULL
+);
+"""
+
+
+class OperacionNoDisponible(ConnectionFailure):
+    """La operación necesita el servidor y no hay conexión"""
+
+
+def clave_documento(documento_id):
+    """Clave de un documento en la réplica a partir de su _id"""
+    return str(documento_id)
+
+
+def valor_indice(valor):
+    """
+    Representación de un valor en la tabla ``valores``.
+
+    Dentro de un mismo rango, SQLite ordena los valores igual que MongoDB:
+    los textos por sus bytes UTF-8, los ObjectId por sus bytes y las fechas
+    por milisegundos.
+
+    Returns:
+        tuple: (rango del tipo, valor para SQLite)
+    """
+    rango = rango_tipo(valor)
+    if rango == 1:
+        return (1, 0)
+    if rango == 2 and isinstance(valor, (int, float)) and not (isinstance(valor, float) and math.isnan(valor)) \
+            and -2 ** 63 <= valor < 2 ** 63:
+        return (2, valor)
+    if rango == 3:
+        return (3, valor)
+    if rango == 7:
+        return (7, valor.binary)
+    if rango == 8:
+        return (8, int(valor))
+    if rango == 9:
+        return (9, calendar.timegm(valor.utctimetuple()) * 1000 + valor.microsecond // 1000)
+    return (SIN_INDICE, 0)
+
+
+def valores_indice(valor):
+    """Filas (rango, valor) de un campo: una por elemento si es un array"""
+    if isinstance(valor, list):
+        if not valor:
+            return {(SIN_INDICE, 0)}
+        return {valor_indice(elemento) if not isinstance(elemento, list) else (SIN_INDICE, 0)
+                for elemento in valor}
+    return {valor_indice(valor)}
+
+
+def _prefijo_regex(patron, opciones=''):
+    """Prefijo fijo de una expresión regular anclada ('^abc...'), o None"""
+    if isinstance(patron, re.Pattern):
+        if patron.flags & (re.IGNORECASE | re.MULTILINE | re.VERBOSE):
+            return None
+        patron = patron.pattern
+    if not isinstance(patron, str) or set(opciones) & set('imx') or not patron.startswith('^') or '|' in patron:
+        return None
+    prefijo = []
+    for caracter in patron[1:]:
+        if caracter in '*?{':
+            # Cuantificador: el carácter anterior puede no aparecer
+            if prefijo:
+                prefijo.pop()
+            break
+        if caracter in '.^$+[]()\\':
+            break
+        prefijo.append(caracter)
+    return ''.join(prefijo) or None
+
+
+def _es_operadores(condicion):
+    """Indica si la condición de un campo es un dict de operadores"""
+    return isinstance(condicion, dict) and bool(condicion) and all(
+        isinstance(clave, str) and clave.startswith('$') for clave in condicion
+    )
+
+
+def _igualdad_sql(valor):
+    """Condición SQL de igualdad con un valor, o None si no se puede usar"""
+    if isinstance(valor, (list, dict)):
+        return None
+    if isinstance(valor, re.Pattern):
+        return _prefijo_sql(_prefijo_regex(valor))
+    rango, valor = valor_indice(valor)
+    if rango == SIN_INDICE:
+        return None
+    return '(rango = ? AND valor = ?)', [rango, valor]
+
+
+def _prefijo_sql(prefijo):
+    """Condición SQL de los textos que empiezan por el prefijo, o None"""
+    if prefijo is None:
+        return None
+    if ord(prefijo[-1]) < 0x10FFFF:
+        return '(rango = 3 AND valor >= ? AND valor < ?)', [prefijo, prefijo[:-1] + chr(ord(prefijo[-1]) + 1)]
+    return '(rango = 3 AND valor >= ?)', [prefijo]
+
+
+def _condicion_sql(condicion):
+    """
+    Condición SQL sobre las filas de ``valores`` de un campo que incluye a
+    todos los documentos que cumplen la condición del filtro.
+
+    Con varios operadores basta con uno: el filtro completo se comprueba
+    después en Python.
+
+    Returns:
+        tuple: (prioridad, sql, parámetros), o None si no se puede usar;
+               las igualdades tienen prioridad 0 y los rangos y prefijos 1
+    """
+    if not _es_operadores(condicion):
+        sql = _igualdad_sql(condicion)
+        return (0 if not isinstance(condicion, re.Pattern) else 1, *sql) if sql else None
+
+    candidatas = []
+    for operador, argumento in condicion.items():
+        sql = None
+        if operador == '$eq':
+            sql = _igualdad_sql(argumento)
+            prioridad = 0 if not isinstance(argumento, re.Pattern) else 1
+        elif operador == '$in' and isinstance(argumento, (list, tuple)) and argumento:
+            partes = [_igualdad_sql(valor) for valor in argumento]
+            if all(partes):
+                sql = (' OR '.join(parte for parte, _ in partes), [p for _, ps in partes for p in ps])
+            prioridad = 0
+        elif operador == '$all' and isinstance(argumento, (list, tuple)) and argumento:
+            sql = _igualdad_sql(argumento[0])
+            prioridad = 0
+        elif operador == '$regex':
+            sql = _prefijo_sql(_prefijo_regex(argumento, condicion.get('$options', '')))
+            prioridad = 1
+        elif operador in ('$gt', '$gte', '$lt', '$lte') and argumento is not None:
+            rango, valor = valor_indice(argumento)
+            if rango != SIN_INDICE:
+                # Límites inclusivos: las fechas se comparan por milisegundos
+                comparacion = '>=' if operador in ('$gt', '$gte') else '<='
+                sql = (f'(rango = ? AND valor {comparacion} ?)', [rango, valor])
+            prioridad = 1
+        if sql:
+            candidatas.append((prioridad, *sql))
+    return min(candidatas, key=lambda c: c[0]) if candidatas else None
+
+
+def lotes(elementos, tamano=TAMANO_LOTE):
+    """Divide un iterable en listas de como mucho ``tamano`` elementos"""
+    iterador = iter(elementos)
+    while True:
+        lote = list(itertools.islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+class ReplicaLocal:
+    """
+    Almacén SQLite con los documentos replicados y la cola de salida.
+
+    Cada escritura local actualiza el documento y anota la operación en la
+    cola dentro de la misma transacción, de modo que una caída nunca deja
+    un cambio aplicado sin su entrada pendiente ni al revés.
+    """
+
+    def __init__(self, ruta):
+        """
+        Abre (o crea) la réplica.
+
+        Args:
+            ruta (str): Ruta del archivo SQLite
+        """
+        self.ruta = ruta
+        self.lock = threading.RLock()
+        # Función sin argumentos llamada tras cada escritura local (el
+        # sincronizador la usa para subir el cambio sin esperar al ciclo)
+        self.al_escribir = None
+        # False desde que falla una operación en el servidor hasta que el
+        # sincronizador vuelve a conectar: mientras, se usa la réplica
+        self.en_linea = True
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute('PRAGMA journal_mode=WAL')
+        self._conexion.execute('PRAGMA synchronous=NORMAL')
+        self._conexion.executescript(_ESQUEMA)
+        self._indexar()
+
+    def _transaccion(self, sentencias):
+        """Ejecuta las sentencias (sql, parámetros) en una sola transacción"""
+        cursor = self._conexion.cursor()
+        cursor.execute('BEGIN')
+        try:
+            for sql, parametros in sentencias:
+                cursor.execute(sql, parametros)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+
+    def _sentencias_valores(self, coleccion, clave, documento):
+        """Sentencias que copian en ``valores`` los campos indexados de un documento"""
+        return [
+            ('INSERT OR IGNORE INTO valores (coleccion, campo, rango, valor, clave) VALUES (?, ?, ?, ?, ?)',
+             (coleccion, campo, rango, valor, clave))
+            for campo in CAMPOS_INDEXADOS.get(coleccion, ())
+            for rango, valor in valores_indice(valor_campo(documento, campo))
+        ]
+
+    def _indexar(self):
+        """
+        Rellena la tabla ``valores`` de las colecciones cuyos campos indexados
+        han cambiado desde la última vez (o que aún no se habían indexado).
+        """
+        for coleccion, campos in CAMPOS_INDEXADOS.items():
+            firma = ','.join(campos)
+            fila = self._conexion.execute(
+                'SELECT campos FROM campos_indexados WHERE coleccion = ?', (coleccion,)
+            ).fetchone()
+            if fila is not None and fila[0] == firma:
+                continue
+
+            sentencias = [('DELETE FROM valores WHERE coleccion = ?', (coleccion,))]
+            for clave, datos in self._conexion.execute(
+                'SELECT clave, datos FROM documentos WHERE coleccion = ?', (coleccion,)
+            ).fetchall():
+                sentencias.extend(self._sentencias_valores(coleccion, clave, bson.decode(datos)))
+            sentencias.append((
+                'INSERT OR REPLACE INTO campos_indexados (coleccion, campos) VALUES (?, ?)', (coleccion, firma)
+            ))
+            self._transaccion(sentencias)
+
+    def plan(self, coleccion, filtro):
+        """
+        Subconsulta SQL con las claves candidatas de un filtro.
+
+        Se usa la condición más selectiva (una igualdad antes que un rango)
+        sobre un campo indexado; un $or se resuelve si todas sus ramas
+        tienen una. Incluye a todos los documentos que cumplen el filtro y
+        puede incluir otros, así que el filtro se comprueba después.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            filtro (dict): Filtro de MongoDB (validado)
+
+        Returns:
+            tuple: (sql, parámetros), o None si hay que recorrer la colección
+        """
+        campos = CAMPOS_INDEXADOS.get(coleccion, ())
+        condiciones = list((filtro or {}).items())
+        mejor = None
+        for campo, condicion in condiciones:
+            if campo == '$and':
+                condiciones.extend(item for subfiltro in condicion for item in subfiltro.items())
+            elif campo == '$or':
+                ramas = [self.plan(coleccion, subfiltro) for subfiltro in condicion]
+                if ramas and all(ramas) and mejor is None:
+                    mejor = (1, ' UNION '.join(sql for sql, _ in ramas), [p for _, ps in ramas for p in ps])
+            elif campo in campos:
+                candidata = _condicion_sql(condicion)
+                if candidata and (mejor is None or candidata[0] < mejor[0]):
+                    prioridad, sql, parametros = candidata
+                    mejor = (prioridad,
+                             f'SELECT clave FROM valores WHERE coleccion = ? AND campo = ? '
+                             f'AND ({sql} OR rango = {SIN_INDICE})',
+                             [coleccion, campo, *parametros])
+        return mejor[1:] if mejor else None
+
+    def en_orden(self, coleccion, campo, direccion):
+        """
+        Recorre los documentos de la colección en el orden de un campo indexado.
+
+        Un documento cuyo campo es un array aparece una sola vez, en la
+        posición de su menor elemento (orden ascendente) o del mayor
+        (descendente), como en MongoDB.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            campo (str): Campo indexado
+            direccion (int): 1 ascendente, -1 descendente
+
+        Returns:
+            iterator: Tuplas ((rango, valor), documento), o None si el campo
+                      no está indexado o tiene valores sin indexar
+        """
+        if campo not in CAMPOS_INDEXADOS.get(coleccion, ()):
+            return None
+        with self.lock:
+            if self._conexion.execute(
+                'SELECT 1 FROM valores WHERE coleccion = ? AND campo = ? AND rango = ? LIMIT 1',
+                (coleccion, campo, SIN_INDICE)
+            ).fetchone() is not None:
+                return None
+        return self._recorrer_orden(coleccion, campo, direccion)
+
+    def _recorrer_orden(self, coleccion, campo, direccion):
+        """Generador de ``en_orden``: lee por lotes, continuando tras la última fila"""
+        comparacion, sentido = ('>', 'ASC') if direccion > 0 else ('<', 'DESC')
+        vistos = set()
+        ultima = None
+        while True:
+            continuacion = f' AND (v.rango, v.valor, v.clave) {comparacion} (?, ?, ?)' if ultima else ''
+            with self.lock:
+                filas = self._conexion.execute(
+                    'SELECT v.rango, v.valor, v.clave, d.datos FROM valores v '
+                    'JOIN documentos d ON d.coleccion = v.coleccion AND d.clave = v.clave '
+                    f'WHERE v.coleccion = ? AND v.campo = ?{continuacion} '
+                    f'ORDER BY v.rango {sentido}, v.valor {sentido}, v.clave {sentido} LIMIT ?',
+                    (coleccion, campo, *(ultima or ()), TAMANO_LOTE)
+                ).fetchall()
+            for rango, valor, clave, datos in filas:
+                if clave in vistos:
+                    continue
+                vistos.add(clave)
+                yield (rango, valor), bson.decode(datos)
+            if len(filas) < TAMANO_LOTE:
+                return
+            ultima = filas[-1][:3]
+
+    def _por_claves(self, columnas, tabla, coleccion, claves):
+        """Filas de la tabla con las claves indicadas (como mucho TAMANO_LOTE)"""
+        marcas = ', '.join('?' * len(claves))
+        return self._conexion.execute(
+            f'SELECT {columnas} FROM {tabla} WHERE coleccion = ? AND clave IN ({marcas})',
+            (coleccion, *claves)
+        ).fetchall()
+
+    def documentos(self, coleccion, plan=None):
+        """
+        Recorre los documentos de la colección, leyéndolos de SQLite por lotes.
+
+        Cada documento es una copia nueva. El bloqueo solo se mantiene
+        mientras se lee cada lote.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            plan (tuple, optional): Claves candidatas (ver ``plan``); sin él, todos
+
+        Returns:
+            iterator: Documentos (dict), ordenados por clave
+        """
+        sql, parametros = plan or (None, ())
+        restriccion = f' AND clave IN ({sql})' if sql else ''
+        ultima = ''
+        while True:
+            with self.lock:
+                filas = self._conexion.execute(
+                    f'SELECT clave, datos FROM documentos WHERE coleccion = ? AND clave > ?{restriccion} '
+                    'ORDER BY clave LIMIT ?', (coleccion, ultima, *parametros, TAMANO_LOTE)
+                ).fetchall()
+            for _, datos in filas:
+                yield bson.decode(datos)
+            if len(filas) < TAMANO_LOTE:
+                return
+            ultima = filas[-1][0]
+
+    def obtener(self, coleccion, documento_id):
+        """
+        Obtiene un documento por su _id.
+
+        Returns:
+            dict: Documento o None si no está en la réplica
+        """
+        with self.lock:
+            fila = self._conexion.execute(
+                'SELECT datos FROM documentos WHERE coleccion = ? AND clave = ?',
+                (coleccion, clave_documento(documento_id))
+            ).fetchone()
+        return bson.decode(fila[0]) if fila else None
+
+    def contar(self, coleccion, plan=None):
+        """Número de documentos de la colección en la réplica (o de candidatos del plan)"""
+        with self.lock:
+            if plan is not None:
+                return self._conexion.execute(
+                    f'SELECT COUNT(*) FROM (SELECT DISTINCT clave FROM ({plan[0]}))', plan[1]
+                ).fetchone()[0]
+            return self._conexion.execute(
+                'SELECT COUNT(*) FROM documentos WHERE coleccion = ?', (coleccion,)
+            ).fetchone()[0]
+
+    def _sentencias_documento(self, coleccion, clave, documento, datos=None):
+        """Sentencias que guardan o eliminan (documento None) un documento y sus valores indexados"""
+        sentencias = [('DELETE FROM valores WHERE coleccion = ? AND clave = ?', (coleccion, clave))]
+        if documento is None:
+            sentencias.append(('DELETE FROM documentos WHERE coleccion = ? AND clave = ?', (coleccion, clave)))
+            return sentencias
+        sentencias.append((
+            'INSERT OR REPLACE INTO documentos (coleccion, clave, datos) VALUES (?, ?, ?)',
+            (coleccion, clave, datos if datos is not None else bson.encode(documento))
+        ))
+        sentencias.extend(self._sentencias_valores(coleccion, clave, documento))
+        return sentencias
+
+    def escribir_local(self, coleccion, documento_id, documento, operacion, datos):
+        """
+        Aplica un cambio local y lo anota en la cola de salida.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            documento_id: _id del documento
+            documento (dict): Documento resultante, o None si se elimina
+            operacion (str): INSERTAR, ACTUALIZAR o ELIMINAR
+            datos (dict): Datos necesarios para repetir la operación en el servidor
+        """
+        clave = clave_documento(documento_id)
+        datos = dict(datos, _id=documento_id)
+        with self.lock:
+            self._transaccion(self._sentencias_documento(coleccion, clave, documento) + [
+                ('INSERT INTO pendientes (coleccion, clave, operacion, datos, creado) VALUES (?, ?, ?, ?, ?)',
+                 (coleccion, clave, operacion, bson.encode(datos), time.time()))
+            ])
+        if self.al_escribir:
+            self.al_escribir()
+
+    def hay_pendientes(self, coleccion):
+        """Indica si la colección tiene cambios locales sin subir"""
+        with self.lock:
+            return self._conexion.execute(
+                'SELECT 1 FROM pendientes WHERE coleccion = ? LIMIT 1', (coleccion,)
+            ).fetchone() is not None
+
+    def guardar_remotos(self, coleccion, documentos=(), eliminados=(), forzar=False):
+        """
+        Copia en la réplica documentos leídos del servidor.
+
+        Se procesan por lotes, comparando cada uno con el BSON guardado, así
+        que ``documentos`` puede ser directamente un cursor del servidor. Los
+        documentos con cambios locales pendientes no se tocan: el
+        sincronizador resolverá el conflicto, si lo hay, al subirlos.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            documentos (iterable): Documentos del servidor
+            eliminados (iterable): _id de documentos que ya no existen en el servidor
+            forzar (bool, optional): Sobrescribe también los documentos con cambios pendientes
+
+        Returns:
+            list: Tuplas (operación, _id) de los documentos que cambiaron
+        """
+        cambios = []
+
+        for lote in lotes(documentos):
+            claves = [clave_documento(documento['_id']) for documento in lote]
+            with self.lock:
+                pendientes = set() if forzar else {
+                    clave for clave, in self._por_claves('DISTINCT clave', 'pendientes', coleccion, claves)
+                }
+                actuales = dict(self._por_claves('clave, datos', 'documentos', coleccion, claves))
+                sentencias = []
+                for documento, clave in zip(lote, claves):
+                    if clave in pendientes:
+                        continue
+                    datos = bson.encode(documento)
+                    anterior = actuales.get(clave)
+                    if anterior is not None and bytes(anterior) == datos:
+                        continue
+                    sentencias.extend(self._sentencias_documento(coleccion, clave, documento, datos))
+                    cambios.append(('update' if anterior is not None else 'insert', documento['_id']))
+                if sentencias:
+                    self._transaccion(sentencias)
+
+        for lote in lotes(eliminados):
+            claves = [clave_documento(documento_id) for documento_id in lote]
+            with self.lock:
+                pendientes = set() if forzar else {
+                    clave for clave, in self._por_claves('DISTINCT clave', 'pendientes', coleccion, claves)
+                }
+                existentes = {clave for clave, in self._por_claves('clave', 'documentos', coleccion, claves)}
+                sentencias = []
+                for documento_id, clave in zip(lote, claves):
+                    if clave in pendientes or clave not in existentes:
+                        continue
+                    sentencias.extend(self._sentencias_documento(coleccion, clave, None))
+                    cambios.append(('delete', documento_id))
+                if sentencias:
+                    self._transaccion(sentencias)
+
+        return cambios
+
+    def comparar_ids(self, coleccion, ids):
+        """
+        Compara los _id de una colección del servidor con los de la réplica.
+
+        Los _id del servidor se anotan por lotes en una tabla temporal, sin
+        tenerlos todos en memoria. Solo la usa el hilo del sincronizador.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            ids (iterable): _id de todos los documentos del servidor
+
+        Returns:
+            tuple: (_id que faltan en la réplica, _id de la réplica que ya no están en el servidor)
+        """
+        with self.lock:
+            self._conexion.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS remotos (clave TEXT PRIMARY KEY, datos BLOB NOT NULL) WITHOUT ROWID'
+            )
+            self._conexion.execute('DELETE FROM temp.remotos')
+        for lote in lotes(ids):
+            with self.lock:
+                self._transaccion([
+                    ('INSERT OR IGNORE INTO temp.remotos (clave, datos) VALUES (?, ?)',
+                     (clave_documento(documento_id), bson.encode({'_id': documento_id})))
+                    for documento_id in lote
+                ])
+        with self.lock:
+            nuevos = [bson.decode(datos)['_id'] for datos, in self._conexion.execute(
+                'SELECT datos FROM temp.remotos r WHERE NOT EXISTS '
+                '(SELECT 1 FROM documentos d WHERE d.coleccion = ? AND d.clave = r.clave)', (coleccion,)
+            )]
+            eliminados = [bson.decode(datos)['_id'] for datos, in self._conexion.execute(
+                'SELECT datos FROM documentos d WHERE d.coleccion = ? AND NOT EXISTS '
+                '(SELECT 1 FROM temp.remotos r WHERE r.clave = d.clave)', (coleccion,)
+            )]
+            self._conexion.execute('DELETE FROM temp.remotos')
+        return nuevos, eliminados
+
+    def pendientes(self, limite=100):
+        """
+        Devuelve las primeras operaciones de la cola de salida, en orden.
+
+        Returns:
+            list: Tuplas (secuencia, colección, operación, datos)
+        """
+        with self.lock:
+            filas = self._conexion.execute(
+                'SELECT secuencia, coleccion, operacion, datos FROM pendientes ORDER BY secuencia LIMIT ?',
+                (limite,)
+            ).fetchall()
+        return [(secuencia, coleccion, operacion, bson.decode(datos))
+                for secuencia, coleccion, operacion, datos in filas]
+
+    def numero_pendientes(self):
+        """Número de operaciones en la cola de salida"""
+        with self.lock:
+            return self._conexion.execute('SELECT COUNT(*) FROM pendientes').fetchone()[0]
+
+    def confirmar(self, secuencia):
+        """Quita de la cola una operación ya aplicada en el servidor"""
+        with self.lock:
+            self._conexion.execute('DELETE FROM pendientes WHERE secuencia = ?', (secuencia,))
+
+    def registrar_conflicto(self, secuencia, coleccion, operacion, datos, motivo, documento_remoto):
+        """
+        Descarta una operación local en conflicto y adopta la versión del servidor.
+
+        La operación descartada se guarda en la tabla ``conflictos`` para que
+        no se pierda el cambio.
+
+        Args:
+            secuencia (int): Secuencia de la operación en la cola
+            coleccion (str): Nombre de la colección
+            operacion (str): Operación en conflicto
+            datos (dict): Datos de la operación
+            motivo (str): Descripción del conflicto
+            documento_remoto (dict): Documento en el servidor, o None si no existe
+        """
+        clave = clave_documento(datos['_id'])
+        with self.lock:
+            self._transaccion([
+                ('INSERT INTO conflictos (coleccion, clave, operacion, motivo, datos, fecha) '
+                 'VALUES (?, ?, ?, ?, ?, ?)',
+                 (coleccion, clave, operacion, motivo, bson.encode(datos), time.time())),
+                ('DELETE FROM pendientes WHERE secuencia = ?', (secuencia,)),
+            ] + self._sentencias_documento(coleccion, clave, documento_remoto))
+
+    def conflictos(self, limite=100):
+        """
+        Devuelve los últimos conflictos registrados.
+
+        Returns:
+            list: Diccionarios con colección, clave, operación, motivo, datos y fecha
+        """
+        with self.lock:
+            filas = self._conexion.execute(
+                'SELECT coleccion, clave, operacion, motivo, datos, fecha FROM conflictos '
+                'ORDER BY secuencia DESC LIMIT ?', (limite,)
+            ).fetchall()
+        return [
+            {'coleccion': coleccion, 'clave': clave, 'operacion': operacion, 'motivo': motivo,
+             'datos': bson.decode(datos), 'fecha': fecha}
+            for coleccion, clave, operacion, motivo, datos, fecha in filas
+        ]
+
+    def numero_conflictos(self):
+        """Número de conflictos registrados y aún no descartados"""
+        with self.lock:
+            return self._conexion.execute('SELECT COUNT(*) FROM conflictos').fetchone()[0]
+
+    def descartar_conflictos(self):
+        """Elimina los conflictos registrados (una vez revisados)"""
+        with self.lock:
+            self._conexion.execute('DELETE FROM conflictos')
+
+    def marca(self, coleccion):
+        """
+        Devuelve la marca de la última descarga de la colección.
+
+        Returns:
+            tuple: (fecha de versión más reciente descargada o None,
+                    hora de la última descarga completa o None)
+        """
+        with self.lock:
+            fila = self._conexion.execute(
+                'SELECT marca, sincronizada FROM marcas WHERE coleccion = ?', (coleccion,)
+            ).fetchone()
+        if fila is None:
+            return None, None
+        marca = bson.decode(fila[0])['marca'] if fila[0] is not None else None
+        return marca, fila[1]
+
+    def fijar_marca(self, coleccion, marca, completa=False):
+        """
+        Guarda la marca de la última descarga de la colección.
+
+        Args:
+            coleccion (str): Nombre de la colección
+            marca: Fecha de versión más reciente descargada
+            completa (bool, optional): True tras descargar la colección entera
+        """
+        datos = bson.encode({'marca': marca})
+        with self.lock:
+            if completa:
+                self._conexion.execute(
+                    'INSERT OR REPLACE INTO marcas (coleccion, marca, sincronizada) VALUES (?, ?, ?)',
+                    (coleccion, datos, time.time())
+                )
+            else:
+                self._conexion.execute(
+                    'UPDATE marcas SET marca = ? WHERE coleccion = ?', (datos, coleccion)
+                )
+
+    def sincronizada(self, coleccion):
+        """Indica si la colección se ha descargado entera alguna vez"""
+        return self.marca(coleccion)[1] is not None
+
+    def cerrar(self):
+        """Cierra el archivo de la réplica"""
+        with self.lock:
+            self._conexion.close()
+
+
+class CursorLocal:
+    """
+    Cursor con la parte de la interfaz de pymongo que se usa.
+
+    La consulta se resuelve al empezar a iterar: en el servidor o en la
+    réplica, según el estado de la réplica y la conexión en ese momento.
+    """
+
+    def __init__(self, coleccion, filtro, proyeccion, opciones=None):
+        self._coleccion = coleccion
+        self._filtro = filtro
+        self._proyeccion = proyeccion
+        self._opciones = opciones or {}
+        self._orden = None
+        self._salto = 0
+        self._limite = 0
+        self._lote = 0
+        self._resultados = None
+
+    def sort(self, clave, direccion=None):
+        """Ordena por un campo o por una lista de (campo, dirección)"""
+        self._orden = normalizar_orden(clave, direccion)
+        return self
+
+    def skip(self, salto):
+        """Omite los primeros documentos"""
+        self._salto = salto
+        return self
+
+    def limit(self, limite):
+        """Limita el número de documentos (0 sin límite)"""
+        self._limite = limite
+        return self
+
+    def batch_size(self, tamano):
+        """Documentos por lote en el servidor (la réplica ya lee por lotes)"""
+        self._lote = tamano
+        return self
+
+    def close(self):
+        """Descarta los resultados restantes"""
+        self._resultados = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._resultados is None:
+            self._resultados = self._coleccion._abrir(
+                self._filtro, self._proyeccion, self._orden, self._salto, self._limite,
+                self._lote, self._opciones
+            )
+        return next(self._resultados)
+
+    next = __next__
+
+
+class ColeccionLocal:
+    """
+    Colección replicada con la interfaz de una colección de pymongo.
+
+    Las lecturas se responden desde la réplica una vez descargada la
+    colección (antes, solo sin conexión o con cambios locales sin subir).
+    Con conexión las escrituras van al servidor y los documentos escritos se
+    copian en la réplica. Sin conexión, o mientras la colección tiene
+    cambios locales sin subir, las escrituras de un documento en colecciones
+    con campos de versión se aplican en local y quedan pendientes de subir.
+    """
+
+    def __init__(self, nombre, replica, remota):
+        """
+        Inicializa la colección.
+
+        Args:
+            nombre (str): Nombre de la colección
+            replica (ReplicaLocal): Réplica local
+            remota (callable): Devuelve la colección de pymongo, o None sin conexión
+        """
+        self.name = nombre
+        self.replica = replica
+        self.campos_version = COLECCIONES.get(nombre, ())
+        self._remota = remota
+        self._unicos = [
+            [campo for campo, _ in indice.claves]
+            for indice in INDICES if indice.coleccion == nombre and indice.unique
+        ]
+
+    def __getattr__(self, nombre):
+        # Índices, escrituras múltiples, etc.: siempre en el servidor
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self._servidor(), nombre)
+
+    def _servidor(self):
+        """Devuelve la colección del servidor o lanza OperacionNoDisponible"""
+        remota = self._remota()
+        if remota is None:
+            raise OperacionNoDisponible(f"Sin conexión: la operación sobre {self.name} necesita el servidor")
+        return remota
+
+    def _sin_conexion(self):
+        """Indica si no hay conexión con el servidor"""
+        return not self.replica.en_linea or self._remota() is None
+
+    def _usar_replica(self):
+        """
+        Decide si la colección trabaja sobre la réplica.
+
+        Sin conexión, y también mientras hay cambios locales sin subir: el
+        servidor aún no los tiene y la réplica es la versión más reciente.
+        """
+        return self._sin_conexion() or self.replica.hay_pendientes(self.name)
+
+    def _leer_en_local(self, filtro, validacion=validar):
+        """
+        Decide si una consulta se responde desde la réplica.
+
+        Sí cuando la colección ya se ha descargado entera: desde entonces el
+        sincronizador y el observador de cambios la mantienen al día, y las
+        escrituras de la aplicación se copian en ella al hacerlas. Antes,
+        solo sin conexión o con cambios locales sin subir.
+
+        Args:
+            filtro: Filtro (o pipeline) de la consulta
+            validacion (callable, optional): Comprueba que se puede evaluar en local
+        """
+        if not self.replica.sincronizada(self.name) and not self._usar_replica():
+            return False
+        try:
+            validacion(filtro)
+        except OperadorNoAdmitido as e:
+            if self._sin_conexion():
+                raise OperacionNoDisponible(f"Consulta no admitida sin conexión en {self.name}: {str(e)}")
+            return False
+        return True
+
+    def _con_respaldo(self, lectura):
+        """
+        Ejecuta una lectura; si el servidor no responde, la repite en la réplica.
+
+        La réplica queda marcada sin conexión hasta que el sincronizador
+        vuelva a conectar.
+
+        Args:
+            lectura (callable): Función sin argumentos que hace la lectura
+        """
+        try:
+            return lectura()
+        except OperacionNoDisponible:
+            raise
+        except ConnectionFailure as e:
+            if not self.replica.en_linea:
+                raise
+            logging.warning(f"Réplica: Sin conexión con el servidor, se lee {self.name} en local: {str(e)}")
+            self.replica.en_linea = False
+            return lectura()
+
+    def version(self, documento):
+        """Valores de los campos de versión de un documento"""
+        return {campo: valor_campo(documento, campo) if campo in documento else None
+                for campo in self.campos_version}
+
+    def _coincidentes(self, filtro):
+        """Recorre los documentos de la réplica que cumplen el filtro"""
+        ids = self._ids_de_filtro(filtro)
+        if ids is not None:
+            # Búsqueda por _id: sin recorrer la colección
+            candidatos = (self.replica.obtener(self.name, documento_id) for documento_id in dict.fromkeys(ids))
+        else:
+            # Solo los candidatos de la tabla de valores, si el filtro usa un campo indexado
+            candidatos = self.replica.documentos(self.name, self.replica.plan(self.name, filtro))
+        return (documento for documento in candidatos
+                if documento is not None and coincide(documento, filtro))
+
+    def _en_orden(self, filtro, orden):
+        """
+        Documentos que cumplen el filtro, en el orden indicado, recorriendo la
+        tabla de valores del primer campo del orden.
+
+        Returns:
+            iterator: Documentos, o None si el primer campo no permite el recorrido
+        """
+        recorrido = self.replica.en_orden(self.name, *orden[0])
+        if recorrido is None:
+            return None
+
+        def documentos():
+            # Los empates en el primer campo se ordenan por el resto del orden
+            grupo, valor_grupo = [], None
+            for valor, documento in recorrido:
+                if valor != valor_grupo:
+                    ordenar(grupo, orden)
+                    yield from grupo
+                    grupo, valor_grupo = [], valor
+                if coincide(documento, filtro):
+                    grupo.append(documento)
+            ordenar(grupo, orden)
+            yield from grupo
+        return documentos()
+
+    def _consultar(self, filtro, proyeccion, orden, salto, limite):
+        """
+        Ejecuta una consulta sobre la réplica.
+
+        Con orden, si el filtro deja pocos candidatos se ordenan en memoria;
+        si no, se recorre la colección en el orden del primer campo (cuando
+        está indexado) y una página termina al completarse. En otro caso
+        solo se conservan los ``salto + limite`` primeros: se ordena y se
+        recorta a medida que se leen, así la memoria no depende del tamaño
+        de la colección.
+        """
+        fin = salto + limite if limite else None
+        if orden and self._ids_de_filtro(filtro) is None:
+            plan = self.replica.plan(self.name, filtro)
+            if plan is None or (fin and self.replica.contar(self.name, plan) > TAMANO_LOTE):
+                en_orden = self._en_orden(filtro, orden)
+                if en_orden is not None:
+                    return (proyectar(documento, proyeccion)
+                            for documento in itertools.islice(en_orden, salto, fin))
+
+        coincidentes = self._coincidentes(filtro)
+        if not orden:
+            resultados = itertools.islice(coincidentes, salto, fin)
+        else:
+            resultados = []
+            for documento in coincidentes:
+                resultados.append(documento)
+                if fin and len(resultados) >= max(2 * fin, TAMANO_LOTE):
+                    ordenar(resultados, orden)
+                    del resultados[fin:]
+            ordenar(resultados, orden)
+            resultados = resultados[salto:fin]
+        return (proyectar(documento, proyeccion) for documento in resultados)
+
+    def _abrir(self, filtro, proyeccion, orden, salto, limite, lote, opciones):
+        """Iterador con los resultados de una consulta, del servidor o de la réplica"""
+        def abrir():
+            if self._leer_en_local(filtro):
+                return self._consultar(filtro, proyeccion, orden, salto, limite)
+            cursor = self._servidor().find(filtro, proyeccion, skip=salto, limit=limite, **opciones)
+            if orden:
+                cursor = cursor.sort(orden)
+            if lote:
+                cursor = cursor.batch_size(lote)
+            # El primer lote se pide ya: si el servidor no responde, se lee en local
+            primero = next(cursor, None)
+            return itertools.chain([primero], cursor) if primero is not None else iter(())
+        return self._con_respaldo(abrir)
+
+    @staticmethod
+    def _como_filtro(filtro):
+        """pymongo admite un _id en lugar de un filtro en find_one"""
+        if filtro is not None and not isinstance(filtro, dict):
+            return {'_id': filtro}
+        return filtro or {}
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, **kwargs):
+        """Busca documentos (en el servidor o en la réplica al iterar el cursor)"""
+        cursor = CursorLocal(self, filter or {}, projection, kwargs).skip(skip).limit(limit)
+        if sort is not None:
+            cursor.sort(sort)
+        return cursor
+
+    def find_one(self, filter=None, projection=None, *args, **kwargs):
+        """Busca un documento"""
+        for documento in self.find(self._como_filtro(filter), projection, *args, limit=1, **kwargs):
+            return documento
+        return None
+
+    def count_documents(self, filter, **kwargs):
+        """Cuenta los documentos que cumplen el filtro"""
+        def contar():
+            if not self._leer_en_local(filter):
+                return self._servidor().count_documents(filter, **kwargs)
+            if not filter:
+                return self.replica.contar(self.name)
+            return sum(1 for _ in self._coincidentes(filter))
+        return self._con_respaldo(contar)
+
+    def estimated_document_count(self, **kwargs):
+        """Número de documentos de la colección"""
+        def contar():
+            if not self._leer_en_local({}):
+                return self._servidor().estimated_document_count(**kwargs)
+            return self.replica.contar(self.name)
+        return self._con_respaldo(contar)
+
+    def aggregate(self, pipeline, **kwargs):
+        """
+        Ejecuta una agregación.
+
+        Mientras las lecturas van a la réplica se evalúa en ella, para que
+        las estadísticas coincidan con los listados.
+
+        Returns:
+            iterator: Documentos resultantes
+        """
+        def agregacion():
+            if not self._leer_en_local(pipeline, validar_agregacion):
+                return self._servidor().aggregate(pipeline, **kwargs)
+            # Un $match inicial aprovecha la búsqueda por _id de la réplica
+            filtro, etapas = {}, pipeline
+            if pipeline and '$match' in pipeline[0]:
+                filtro, etapas = pipeline[0]['$match'], pipeline[1:]
+            return iter(agregar(lambda: self._coincidentes(filtro), etapas))
+        return self._con_respaldo(agregacion)
+
+    def _comprobar_unicos(self, documento):
+        """Lanza DuplicateKeyError si el documento repite un índice único en la réplica"""
+        for campos in self._unicos:
+            valores = [valor_campo(documento, campo) for campo in campos]
+            # Candidatos por la tabla de valores del primer campo
+            candidatos = self.replica.documentos(
+                self.name, self.replica.plan(self.name, {campos[0]: documento.get(campos[0])})
+            )
+            for otro in candidatos:
+                if otro['_id'] != documento['_id'] and [valor_campo(otro, c) for c in campos] == valores:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} "
+                        f"index: {'_'.join(campos)} (réplica local)", CODIGO_DUPLICADO
+                    )
+
+    def _insertar_local(self, documento):
+        """Inserta un documento en la réplica y lo deja pendiente de subir"""
+        with self.replica.lock:
+            if self.replica.obtener(self.name, documento['_id']) is not None:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: _id_ (réplica local)",
+                    CODIGO_DUPLICADO
+                )
+            self._comprobar_unicos(documento)
+            self.replica.escribir_local(self.name, documento['_id'], documento, INSERTAR,
+                                        {'documento': documento})
+
+    def _escritura_local(self, filtro, actualizacion=None):
+        """Indica si una escritura de un documento se aplica en la réplica"""
+        if not self.campos_version or not self._usar_replica():
+            return False
+        try:
+            validar(filtro)
+            if actualizacion is not None:
+                validar_actualizacion(actualizacion)
+        except OperadorNoAdmitido:
+            return False
+        return True
+
+    def insert_one(self, document, *args, **kwargs):
+        """Inserta un documento (en local si la colección tiene versión)"""
+        if not self._escritura_local({}):
+            return self._delegar_escritura(
+                'insert_one', lambda resultado: [document['_id']] if '_id' in document else [],
+                document, *args, **kwargs
+            )
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        self._insertar_local(bson.decode(bson.encode(document)))
+        return InsertOneResult(document['_id'], True)
+
+    def update_one(self, filter, update, upsert=False, *args, **kwargs):
+        """Actualiza un documento (en local si la colección tiene versión)"""
+        if not self._escritura_local(filter, update):
+            previos = self._ids_afectados(filter, uno=True)
+
+            def escritos(resultado):
+                if resultado is not None and resultado.upserted_id is not None:
+                    return previos + [resultado.upserted_id]
+                return previos
+            return self._delegar_escritura('update_one', escritos,
+                                           filter, update, upsert, *args, **kwargs)
+
+        with self.replica.lock:
+            actual = next(self._coincidentes(filter), None)
+            if actual is None:
+                if not upsert:
+                    return UpdateResult({'n': 0, 'nModified': 0}, True)
+                nuevo = aplicar_actualizacion(igualdades(filter), update, insercion=True)
+                nuevo.setdefault('_id', ObjectId())
+                self._insertar_local(nuevo)
+                return UpdateResult({'n': 1, 'nModified': 0, 'upserted': nuevo['_id']}, True)
+
+            nuevo = aplicar_actualizacion(actual, update)
+            if nuevo == actual:
+                return UpdateResult({'n': 1, 'nModified': 0}, True)
+
+            self._comprobar_unicos(nuevo)
+            self.replica.escribir_local(self.name, actual['_id'], nuevo, ACTUALIZAR,
+                                        {'actualizacion': update, 'version': self.version(actual)})
+            return UpdateResult({'n': 1, 'nModified': 1}, True)
+
+    def delete_one(self, filter, *args, **kwargs):
+        """Elimina un documento (en local si la colección tiene versión)"""
+        if not self._escritura_local(filter):
+            previos = self._ids_afectados(filter, uno=True)
+            return self._delegar_escritura('delete_one', lambda resultado: previos,
+                                           filter, *args, **kwargs)
+
+        with self.replica.lock:
+            actual = next(self._coincidentes(filter), None)
+            if actual is None:
+                return DeleteResult({'n': 0}, True)
+            self.replica.escribir_local(self.name, actual['_id'], None, ELIMINAR,
+                                        {'version': self.version(actual)})
+            return DeleteResult({'n': 1}, True)
+
+    def bulk_write(self, requests, *args, afectados=None, **kwargs):
+        """
+        Escritura en bloque en el servidor; los documentos afectados se copian en local.
+
+        Los _id afectados salen de los objetivos de las operaciones: los
+        documentos insertados, los filtros que fijan el _id y una sola
+        consulta previa con el $or del resto de filtros (p. ej. por
+        matrícula). Los documentos creados por upsert salen del resultado.
+
+        Args:
+            requests (list): Operaciones de pymongo
+            afectados (list, optional): Objetivo de cada operación (ver
+                                        ``database.bulk``); sin ellos solo se
+                                        copian los documentos creados por upsert
+        """
+        requests = list(requests)
+        insertados, previos, filtros = [], [], []
+        for operacion, objetivo in zip(requests, afectados or ()):
+            if isinstance(operacion, InsertOne):
+                insertados.append(objetivo)
+                continue
+            ids = self._ids_de_filtro(objetivo)
+            if ids is not None:
+                previos.extend(ids)
+            else:
+                filtros.append(objetivo)
+        for lote in lotes(filtros, TAMANO_REFRESCO):
+            previos.extend(self._ids_afectados({'$or': lote}))
+
+        def escritos(resultado):
+            # pymongo asigna el _id de las inserciones al ejecutarlas
+            ids = previos + [documento['_id'] for documento in insertados if '_id' in documento]
+            if resultado is not None and resultado.acknowledged:
+                ids.extend(resultado.upserted_ids.values())
+            return ids
+        return self._delegar_escritura('bulk_write', escritos, requests, *args, **kwargs)
+
+    def find_one_and_update(self, filter, update, *args, **kwargs):
+        """
+        Actualización atómica en el servidor; el documento se copia en local.
+
+        Si el servidor devuelve el documento completo ya actualizado, se
+        guarda tal cual, sin volver a leerlo.
+        """
+        previos = self._ids_afectados(filter, uno=True)
+        completo = (not args and not kwargs.get('projection')
+                    and kwargs.get('return_document') == ReturnDocument.AFTER)
+        remota = self._servidor()
+        documento = None
+        try:
+            documento = remota.find_one_and_update(filter, update, *args, **kwargs)
+            return documento
+        except ConnectionFailure:
+            self.replica.en_linea = False
+            raise
+        finally:
+            if documento is not None and completo:
+                self.replica.guardar_remotos(self.name, [documento])
+            elif self.replica.en_linea:
+                self.refrescar(remota, previos + ([documento['_id']] if documento else []))
+
+    @staticmethod
+    def _ids_de_filtro(filtro):
+        """_id que fija un filtro (igualdad, $eq o $in), o None si no los fija"""
+        documento_id = filtro.get('_id') if isinstance(filtro, dict) else None
+        if documento_id is None:
+            return None
+        if isinstance(documento_id, dict):
+            if set(documento_id) == {'$eq'}:
+                return [documento_id['$eq']]
+            if set(documento_id) == {'$in'}:
+                return list(documento_id['$in'])
+            return None
+        return [documento_id]
+
+    def _ids_afectados(self, filtro, uno=False):
+        """
+        _id de los documentos a los que se refiere un filtro de escritura.
+
+        Se obtienen antes de escribir: tras la escritura el filtro puede no
+        coincidir ya (por ejemplo, si exige el estado que se está cambiando).
+        Si el filtro no fija el _id se consultan al servidor.
+
+        Args:
+            filtro (dict): Filtro de la escritura
+            uno (bool, optional): La escritura afecta como mucho a un documento
+
+        Returns:
+            list: _id de los documentos
+        """
+        ids = self._ids_de_filtro(filtro)
+        if ids is None:
+            ids = [d['_id'] for d in self._servidor().find(filtro, {'_id': 1}, limit=1 if uno else 0)]
+        return ids
+
+    def _delegar_escritura(self, metodo, escritos, *args, **kwargs):
+        """
+        Ejecuta una escritura en el servidor y copia en la réplica los documentos afectados.
+
+        Args:
+            metodo (str): Método de la colección de pymongo
+            escritos (callable): Recibe el resultado (None si la escritura falló)
+                                 y devuelve los _id de los documentos afectados
+        """
+        remota = self._servidor()
+        resultado = None
+        try:
+            resultado = getattr(remota, metodo)(*args, **kwargs)
+            return resultado
+        except ConnectionFailure:
+            # Las siguientes operaciones usan la réplica hasta que el sincronizador reconecte
+            self.replica.en_linea = False
+            raise
+        finally:
+            if self.replica.en_linea:
+                self.refrescar(remota, escritos(resultado))
+
+    def refrescar(self, remota, ids):
+        """
+        Copia en la réplica los documentos del servidor con los _id indicados.
+
+        Los que ya no están en el servidor se eliminan de la réplica.
+
+        Args:
+            remota: Colección del servidor
+            ids (iterable): _id de los documentos
+
+        Returns:
+            list: Tuplas (operación, _id) de los documentos que cambiaron
+        """
+        ids = list(dict.fromkeys(ids))
+        cambios = []
+        try:
+            for inicio in range(0, len(ids), TAMANO_REFRESCO):
+                lote = ids[inicio:inicio + TAMANO_REFRESCO]
+                documentos = list(remota.find({'_id': {'$in': lote}}))
+                encontrados = {documento['_id'] for documento in documentos}
+                eliminados = [documento_id for documento_id in lote if documento_id not in encontrados]
+                cambios.extend(self.replica.guardar_remotos(self.name, documentos, eliminados))
+        except PyMongoError as e:
+            logging.warning(f"Réplica: No se pudieron copiar los cambios de {self.name}: {str(e)}")
+        return cambios
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Sincronización en segundo plano entre la réplica local y MongoDB.
+
+Las operaciones pendientes se suben en el orden en que se hicieron. Cada
+actualización o eliminación lleva la versión (campos de fecha) que tenía el
+documento en local antes del cambio y solo se aplica si el servidor conserva
+esa misma versión. Si no, otro usuario lo modificó entretanto: gana la
+versión del servidor y el cambio local se guarda en la tabla ``conflictos``
+de la réplica.
+"""
+
+import datetime
+import logging
+import threading
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, PyMongoError
+
+from database.connection import DatabaseConnection
+from database.consulta_local import aplicar_actualizacion
+from database.entity_cache import EntityCache
+from database.query_cache import QueryCache
+from database.replica import ACTUALIZAR, COLECCIONES, ELIMINAR, INSERTAR, TAMANO_LOTE, lotes
+
+
+# Margen con el que se vuelve a pedir lo modificado antes de la marca, para
+# no perder cambios de equipos con el reloj algo atrasado
+MARGEN_RELOJ = datetime.timedelta(minutes=5)
+
+
+def _version_maxima(documentos, campos, marca=None):
+    """
+    Fecha de versión más reciente entre los documentos y la marca.
+
+    Las fechas futuras (equipos con el reloj adelantado) no cuentan: la
+    marca se quedaría por delante de los cambios de los demás.
+    """
+    ahora = datetime.datetime.now()
+    for documento in documentos:
+        for campo in campos:
+            valor = documento.get(campo)
+            if isinstance(valor, datetime.datetime) and valor <= ahora and (marca is None or valor > marca):
+                marca = valor
+    return marca
+
+
+class Sincronizador(threading.Thread):
+    """
+    Hilo que mantiene la réplica local al día con el servidor.
+
+    En cada ciclo conecta si no hay conexión, sube las operaciones pendientes
+    y descarga lo modificado en el servidor desde la última marca de cada
+    colección. Sin conexión solo reintenta conectar; mientras tanto la
+    aplicación trabaja sobre la réplica.
+    """
+
+    # Segundos entre ciclos con conexión y sin ella
+    INTERVALO = 5
+    INTERVALO_SIN_CONEXION = 30
+
+    # Cada cuántos ciclos se descarga cada colección entera: recoge las
+    # eliminaciones y los cambios que no actualizan los campos de fecha
+    CICLOS_DESCARGA_COMPLETA = 60
+
+    # Operaciones pendientes leídas de la réplica de cada vez
+    LOTE_PENDIENTES = 100
+
+    # A partir de cuántos documentos cambiados se notifica la colección entera
+    MAXIMO_NOTIFICACIONES = 50
+
+    def __init__(self, conexion=None):
+        """
+        Inicializa el sincronizador.
+
+        Args:
+            conexion (DatabaseConnection, optional): Conexión compartida
+        """
+        super().__init__(name='Sincronizador', daemon=True)
+        self.conexion = conexion or DatabaseConnection()
+        self.replica = self.conexion.replica
+        self.en_linea = self.conexion.db is not None
+        self._detener = threading.Event()
+        self._despertar = threading.Event()
+        self._ciclos = 0
+        self._observadores_cambios = []
+        self._observadores_estado = []
+        self.replica.al_escribir = self.despertar
+
+    def suscribir(self, cambios=None, estado=None):
+        """
+        Registra funciones a las que avisar desde el hilo del sincronizador.
+
+        Args:
+            cambios (callable, optional): Función (colección, operación, id o None)
+                                          por cada cambio descargado
+            estado (callable, optional): Función (en_linea, pendientes, conflictos)
+                                         tras cada ciclo
+        """
+        if cambios:
+            self._observadores_cambios.append(cambios)
+        if estado:
+            self._observadores_estado.append(estado)
+
+    def despertar(self):
+        """Adelanta el siguiente ciclo"""
+        self._despertar.set()
+
+    def detener(self, espera=None):
+        """
+        Solicita la parada del hilo y espera a que termine.
+
+        Args:
+            espera (float, optional): Segundos máximos de espera
+        """
+        self._detener.set()
+        self._despertar.set()
+        if self.is_alive():
+            self.join(espera)
+
+    def run(self):
+        """Bucle principal del hilo"""
+        while not self._detener.is_set():
+            self._despertar.clear()
+            en_linea = self.sincronizar()
+            self._despertar.wait(self.INTERVALO if en_linea else self.INTERVALO_SIN_CONEXION)
+
+    def sincronizar(self):
+        """
+        Ejecuta un ciclo de sincronización.
+
+        Returns:
+            bool: True si el ciclo terminó con conexión
+        """
+        db = self._base_de_datos()
+        if db is None:
+            self._cambiar_estado(False)
+            return False
+
+        try:
+            self.subir(db)
+            completa = self._ciclos % self.CICLOS_DESCARGA_COMPLETA == 0
+            for coleccion in COLECCIONES:
+                if self._detener.is_set():
+                    break
+                self.bajar(db, coleccion, completa)
+            self._ciclos += 1
+            self._cambiar_estado(True)
+            return True
+        except ConnectionFailure as e:
+            logging.warning(f"Sincronizador: Conexión perdida con el servidor: {str(e)}")
+            self._cambiar_estado(False)
+            return False
+        except PyMongoError as e:
+            logging.error(f"Sincronizador: Error al sincronizar: {str(e)}")
+            self._cambiar_estado(True)
+            return True
+
+    def _base_de_datos(self):
+        """Devuelve la base de datos, intentando conectar si no hay conexión"""
+        if self.conexion.db is None:
+            try:
+                self.conexion.connect()
+            except Exception:
+                return None
+        return self.conexion.db
+
+    def _cambiar_estado(self, en_linea):
+        """Avisa a los observadores del estado de la conexión, de la cola y de los conflictos"""
+        if en_linea and not self.en_linea:
+            logging.info("Sincronizador: Conexión con el servidor restablecida")
+        self.en_linea = en_linea
+        self.replica.en_linea = en_linea
+        pendientes = self.replica.numero_pendientes()
+        conflictos = self.replica.numero_conflictos()
+        for observador in self._observadores_estado:
+            observador(en_linea, pendientes, conflictos)
+
+    def _acumular(self, cambios, nuevos):
+        """
+        Añade cambios a la lista que se notificará.
+
+        Pasado MAXIMO_NOTIFICACIONES se notificará la colección entera, así
+        que no hace falta guardar más.
+        """
+        cambios.extend(nuevos[:max(0, self.MAXIMO_NOTIFICACIONES + 1 - len(cambios))])
+
+    def _notificar(self, coleccion, cambios):
+        """Invalida las cachés y avisa de los documentos descargados"""
+        if not cambios:
+            return
+        if len(cambios) > self.MAXIMO_NOTIFICACIONES:
+            cambios = [('update', None)]
+        QueryCache.invalidar_en(coleccion)
+        for operacion, documento_id in cambios:
+            EntityCache.invalidar_en(coleccion, documento_id)
+            for observador in self._observadores_cambios:
+                observador(coleccion, operacion, documento_id)
+
+    def subir(self, db):
+        """
+        Sube al servidor las operaciones pendientes, en orden.
+
+        Args:
+            db: Base de datos de MongoDB
+
+        Raises:
+            ConnectionFailure: Si se pierde la conexión (lo pendiente se conserva)
+        """
+        while not self._detener.is_set():
+            lote = self.replica.pendientes(self.LOTE_PENDIENTES)
+            if not lote:
+                return
+            for secuencia, coleccion, operacion, datos in lote:
+                self._subir(db[coleccion], secuencia, coleccion, operacion, datos)
+
+    def _subir(self, collection, secuencia, coleccion, operacion, datos):
+        """Aplica una operación pendiente en el servidor"""
+        documento_id = datos['_id']
+        try:
+            if operacion == INSERTAR:
+                aplicada = self._subir_insercion(collection, datos)
+            elif operacion == ACTUALIZAR:
+                resultado = collection.update_one({'_id': documento_id, **datos['version']},
+                                                  datos['actualizacion'])
+                aplicada = resultado.matched_count > 0
+            elif operacion == ELIMINAR:
+                resultado = collection.delete_one({'_id': documento_id, **datos['version']})
+                aplicada = resultado.deleted_count > 0
+            else:
+                aplicada = False
+            motivo = None if aplicada else 'modificado o eliminado en el servidor'
+        except ConnectionFailure:
+            raise
+        except DuplicateKeyError:
+            aplicada, motivo = False, 'clave única repetida en el servidor'
+        except PyMongoError as e:
+            aplicada, motivo = False, str(e)
+
+        if aplicada:
+            self.replica.confirmar(secuencia)
+            return
+
+        remoto = collection.find_one({'_id': documento_id})
+        if self._ya_aplicada(operacion, datos, remoto):
+            # Se subió en un ciclo anterior que no llegó a confirmarla
+            self.replica.confirmar(secuencia)
+            return
+
+        logging.warning(
+            f"Sincronizador: Conflicto al {operacion} {documento_id} en {coleccion} ({motivo}); "
+            f"se conserva la versión del servidor"
+        )
+        self.replica.registrar_conflicto(secuencia, coleccion, operacion, datos, motivo, remoto)
+        self._notificar(coleccion, [('delete' if remoto is None else 'update', documento_id)])
+
+    @staticmethod
+    def _subir_insercion(collection, datos):
+        """Inserta un documento creado en local"""
+        try:
+            collection.insert_one(datos['documento'])
+            return True
+        except DuplicateKeyError:
+            # Puede ser el mismo documento, subido en un ciclo anterior
+            if collection.find_one({'_id': datos['_id']}, {'_id': 1}) is not None:
+                return True
+            raise
+
+    @staticmethod
+    def _ya_aplicada(operacion, datos, remoto):
+        """Comprueba si el servidor ya refleja la operación"""
+        if operacion == ELIMINAR:
+            return remoto is None
+        if remoto is None:
+            return False
+        if operacion == ACTUALIZAR:
+            return aplicar_actualizacion(remoto, datos['actualizacion']) == remoto
+        return False
+
+    def bajar(self, db, coleccion, completa=False):
+        """
+        Descarga en la réplica los cambios del servidor en una colección.
+
+        Los documentos se leen y se guardan por lotes, sin tener la
+        colección entera en memoria.
+
+        Args:
+            db: Base de datos de MongoDB
+            coleccion (str): Nombre de la colección
+            completa (bool, optional): Descarga la colección entera
+        """
+        campos = COLECCIONES[coleccion]
+        collection = db[coleccion]
+        marca, sincronizada = self.replica.marca(coleccion)
+        cambios = []
+
+        if completa or sincronizada is None:
+            nueva_marca = None
+            for lote in lotes(collection.find().batch_size(TAMANO_LOTE)):
+                self._acumular(cambios, self.replica.guardar_remotos(coleccion, lote))
+                nueva_marca = _version_maxima(lote, campos, nueva_marca)
+            self._acumular(cambios, self._comparar(collection, coleccion))
+            self.replica.fijar_marca(coleccion, nueva_marca, completa=True)
+            self._notificar(coleccion, cambios)
+            return
+
+        if not campos:
+            return
+
+        if marca is None:
+            filtro = {'$or': [{campo: {'$ne': None}} for campo in campos]}
+        else:
+            # Con margen por los relojes atrasados; lo que no cambió no se reescribe
+            filtro = {'$or': [{campo: {'$gte': marca - MARGEN_RELOJ}} for campo in campos]}
+        nueva_marca = marca
+        for lote in lotes(collection.find(filtro).batch_size(TAMANO_LOTE)):
+            self._acumular(cambios, self.replica.guardar_remotos(coleccion, lote))
+            nueva_marca = _version_maxima(lote, campos, nueva_marca)
+        self.replica.fijar_marca(coleccion, nueva_marca)
+
+        # Las eliminaciones no dejan marca de tiempo: se detectan por el
+        # conteo, y con él también las altas que la marca no recogió
+        if collection.estimated_document_count() != self.replica.contar(coleccion):
+            self._acumular(cambios, self._comparar(collection, coleccion))
+
+        self._notificar(coleccion, cambios)
+
+    def _comparar(self, collection, coleccion):
+        """
+        Descarga los documentos que faltan en la réplica y quita los eliminados en el servidor.
+
+        Returns:
+            list: Tuplas (operación, _id) de los documentos que cambiaron
+        """
+        remotos = (d['_id'] for d in collection.find({}, {'_id': 1}).batch_size(TAMANO_LOTE))
+        nuevos, eliminados = self.replica.comparar_ids(coleccion, remotos)
+        cambios = []
+        for lote in lotes(nuevos):
+            self._acumular(cambios, self.replica.guardar_remotos(
+                coleccion, collection.find({'_id': {'$in': lote}})
+            ))
+        self._acumular(cambios, self.replica.guardar_remotos(coleccion, eliminados=eliminados))
+        return cambios
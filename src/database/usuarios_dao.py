@@ -7,7 +7,8 @@ Data Access Object (DAO) para operaciones CRUD con usuarios.
 
 import logging
 from bson import ObjectId
-from pymongo.errors import PyMongoError
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from database.bulk import ResultadoLote, convertir_ids, ejecutar_lote, operacion_actualizar, operacion_guardar
 from database.connection import DatabaseConnection
 from models.usuario import Usuario
 
@@ -105,14 +106,12 @@ class UsuariosDAO:
             bool: True si se insertó correctamente, False en caso contrario
         """
         try:
-            # Verificar si ya existe un usuario con el mismo nombre de usuario
-            if self.obtener_por_usuario(usuario.usuario):
-                logging.warning(f"Ya existe un usuario con nombre de usuario {usuario.usuario}")
-                return False
-            
-            # Insertar el usuario
+            # El índice único de nombre de usuario rechaza los duplicados
             result = self.collection.insert_one(usuario.to_dict())
             return result.acknowledged
+        except DuplicateKeyError:
+            logging.warning(f"Ya existe un usuario con nombre de usuario {usuario.usuario}")
+            return False
         except PyMongoError as e:
             logging.error(f"Error al insertar el usuario: {str(e)}")
             return False
@@ -128,10 +127,15 @@ class UsuariosDAO:
             bool: True si se actualizó correctamente, False en caso contrario
         """
         try:
+            cambios = usuario.cambios()
+            if not cambios:
+                return True
+
             result = self.collection.update_one(
                 {'_id': usuario.id},
-                {'$set': usuario.to_dict()}
+                {'$set': cambios}
             )
+            usuario.marcar_sin_cambios()
             return result.matched_count > 0
         except PyMongoError as e:
             logging.error(f"Error al actualizar el usuario {usuario.id}: {str(e)}")
@@ -229,6 +233,48 @@ class UsuariosDAO:
             logging.error(f"Error al cambiar el estado del usuario {usuario_id}: {str(e)}")
             return False
     
+    def bulk_upsert(self, usuarios, ordered=False, actualizar_existentes=True):
+        """
+        Inserta o actualiza varios usuarios, identificados por nombre de
+        usuario, con una sola escritura en bloque.
+        
+        Args:
+            usuarios (list): Objetos Usuario
+            ordered (bool, optional): Si se detiene en el primer error
+            actualizar_existentes (bool, optional): False solo inserta; los
+                                                    existentes se informan
+                                                    como duplicados
+            
+        Returns:
+            ResultadoLote: Resultado global y por usuario
+        """
+        resultado = ResultadoLote(len(usuarios))
+        operaciones = [
+            (indice, *operacion_guardar(usuario.to_dict(), ('usuario',), actualizar_existentes))
+            for indice, usuario in enumerate(usuarios)
+        ]
+        return ejecutar_lote(self.collection, operaciones, resultado, ordered)
+    
+    def bulk_cambiar_estado(self, usuario_ids, activo, ordered=False):
+        """
+        Activa o desactiva varios usuarios con una sola escritura en bloque.
+        
+        Args:
+            usuario_ids (list): IDs de los usuarios (str u ObjectId)
+            activo (bool): Nuevo estado de activación
+            ordered (bool, optional): Si se detiene en el primer error
+            
+        Returns:
+            ResultadoLote: Resultado global y por usuario
+        """
+        resultado = ResultadoLote(len(usuario_ids))
+        cambios = {'$set': {'activo': activo}}
+        operaciones = [
+            (indice, *operacion_actualizar({'_id': usuario_id}, cambios))
+            for indice, usuario_id in convertir_ids(usuario_ids, resultado)
+        ]
+        return ejecutar_lote(self.collection, operaciones, resultado, ordered)
+    
     def tiene_admin(self):
         """
         Verifica si existe al menos un usuario administrador.
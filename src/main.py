@@ -8,14 +8,17 @@ Punto de entrada principal para la aplicación.
 
 import sys
 import os
+
+# Agregar directorio raíz al path para importaciones
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Medir las fases del arranque desde aquí (con TIEMPOS_ARRANQUE=1)
+from utils import arranque
+
 import logging
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QFont
-import qdarkstyle
-
-# Agregar directorio raíz al path para importaciones
-sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 # Configurar logging
 logging.basicConfig(
@@ -27,12 +30,15 @@ logging.basicConfig(
     ]
 )
 
-# Importar después de configurar el path
+# Importar después de configurar el path. La ventana principal (y con ella
+# las pestañas y los controladores) se importa tras iniciar sesión
 from views.login_dialog import LoginDialog
-from views.main_window import MainWindow
 from database.connection import DatabaseConnection
+from database.sincronizacion import Sincronizador
 from config import Config
 
+arranque.terminar('importaciones')
+
 def excepthook(exc_type, exc_value, exc_traceback):
     """Manejador global de excepciones no capturadas"""
     logging.error("Excepción no capturada:", exc_info=(exc_type, exc_value, exc_traceback))
@@ -131,37 +137,52 @@ def main():
     if os.path.exists(icon_path):
         app.setWindowIcon(QIcon(icon_path))
     
-    # Inicializar conexión a la base de datos
-    try:
-        db_connection = DatabaseConnection()
-        db_connection.connect()
-        logging.info("Conexión a la base de datos establecida correctamente")
-    except Exception as e:
-        logging.error(f"Error al conectar a la base de datos: {str(e)}")
-        # Aquí podrías mostrar un diálogo de error y salir de la aplicación
-        sys.exit(1)
+    # Conectar a la base de datos en segundo plano, mientras se muestra el
+    # inicio de sesión. Sin conexión la aplicación trabaja sobre la réplica
+    # local y el sincronizador reintenta conectar
+    db_connection = DatabaseConnection()
+    db_connection.conectar_en_segundo_plano()
+    
+    # Sincronizar la réplica local con el servidor en segundo plano
+    sincronizador = Sincronizador(db_connection)
+    sincronizador.start()
     
     # Mostrar diálogo de inicio de sesión
+    arranque.iniciar('dialogo_login')
     login_dialog = LoginDialog()
-    if login_dialog.exec_() == LoginDialog.Accepted:
+    arranque.al_primer_pintado(login_dialog, 'dialogo_login')
+    
+    arranque.iniciar('inicio_sesion')
+    aceptado = login_dialog.exec_() == LoginDialog.Accepted
+    arranque.terminar('inicio_sesion')
+    
+    if aceptado:
         # Inicio de sesión exitoso, obtener usuario actual
         current_user = login_dialog.get_current_user()
         
         # Crear y mostrar la ventana principal
-        main_window = MainWindow(current_user)
+        with arranque.fase('ventana_principal'):
+            from views.main_window import MainWindow
+            main_window = MainWindow(current_user, sincronizador=sincronizador)
+        
+        arranque.iniciar('primer_pintado')
+        arranque.al_primer_pintado(main_window, 'primer_pintado', informe=True)
         main_window.show()
         
         # Ejecutar el bucle de eventos
         return_code = app.exec_()
-        
-        # Cerrar conexión a la base de datos al salir
-        db_connection.close()
-        
-        return return_code
     else:
         # El usuario canceló el inicio de sesión
-        db_connection.close()
-        return 0
+        arranque.informar()
+        return_code = 0
+    
+    # Lo que quede pendiente se conserva en la réplica y se sube en el
+    # siguiente arranque
+    sincronizador.detener()
+    db_connection.close()
+    db_connection.replica.cerrar()
+    
+    return return_code
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Actividad reciente del panel de control.
+
+Cada ``Actividad`` es una namedtuple con lo que muestra una línea del panel.
+``ActividadReciente`` guarda solo las ``limite`` más recientes, una por
+entidad: la actividad nueva de un camión o una reparación sustituye a la
+anterior. Añadir o quitar una actividad cuesta O(limite), sea cual sea el
+tamaño de la flota.
+"""
+
+from bisect import insort
+from collections import namedtuple
+from datetime import datetime
+from itertools import count
+
+
+class Actividad(namedtuple('Actividad', ['fecha', 'tipo', 'id', 'estado', 'accion', 'descripcion'])):
+    """Línea de la actividad reciente"""
+
+    __slots__ = ()
+
+    # Campos que se consultan para mostrar la actividad de cada colección
+    PROYECCION_CAMION = {'matricula': 1, 'modelo': 1, 'estado': 1, 'ultima_actualizacion': 1}
+    PROYECCION_REPARACION = {'id_falla': 1, 'motivo_falla': 1, 'estado': 1,
+                             'fecha_entrada': 1, 'ultima_actualizacion': 1}
+
+    @property
+    def clave(self):
+        """Entidad a la que se refiere la actividad: (tipo, id)"""
+        return (self.tipo, str(self.id))
+
+    @classmethod
+    def desde_camion(cls, doc, accion="Registro existente"):
+        """
+        Crea la actividad a partir de un documento de camión proyectado.
+
+        Args:
+            doc (dict): Documento con los campos de PROYECCION_CAMION
+            accion (str, optional): Descripción de la acción
+
+        Returns:
+            Actividad: Actividad del camión, o None si no tiene fecha
+        """
+        if not doc.get('ultima_actualizacion'):
+            return None
+        return cls(
+            fecha=doc['ultima_actualizacion'],
+            tipo='camion',
+            id=doc['_id'],
+            estado=doc.get('estado'),
+            accion=accion,
+            descripcion=f"Camión {doc.get('matricula')} - {doc.get('modelo')}"
+        )
+
+    @classmethod
+    def desde_reparacion(cls, doc, accion="Registro existente"):
+        """
+        Crea la actividad a partir de un documento de reparación proyectado.
+
+        Args:
+            doc (dict): Documento con los campos de PROYECCION_REPARACION
+            accion (str, optional): Descripción de la acción
+
+        Returns:
+            Actividad: Actividad de la reparación, o None si no tiene fecha
+        """
+        fecha = doc.get('ultima_actualizacion') or doc.get('fecha_entrada')
+        if not fecha:
+            return None
+        return cls(
+            fecha=fecha,
+            tipo='reparacion',
+            id=doc['_id'],
+            estado=doc.get('estado'),
+            accion=accion,
+            descripcion=f"Reparación {doc.get('id_falla')} - {(doc.get('motivo_falla') or '')[:30]}..."
+        )
+
+    @classmethod
+    def desde_objeto(cls, tipo, objeto, accion):
+        """
+        Crea la actividad de una acción que acaba de hacer el usuario.
+
+        Args:
+            tipo (str): 'camion', 'reparacion' o 'preventiva'
+            objeto: Objeto Camion, Reparacion o Preventiva
+            accion (str): Descripción de la acción
+
+        Returns:
+            Actividad: Actividad con la fecha actual
+        """
+        if tipo == 'camion':
+            descripcion = f"{objeto.matricula} - {objeto.modelo}"
+        elif tipo == 'preventiva':
+            descripcion = f"{objeto.matricula} - {objeto.tipo}"
+        else:  # reparacion
+            descripcion = f"{objeto.id_falla} - {(objeto.motivo_falla or '')[:30]}..."
+        return cls(
+            fecha=datetime.now(),
+            tipo=tipo,
+            id=objeto.id,
+            estado=objeto.estado,
+            accion=accion,
+            descripcion=descripcion
+        )
+
+
+class ActividadReciente:
+    """
+    Las actividades más recientes, como máximo una por entidad.
+
+    Se mantienen ordenadas por fecha en una lista de tamaño acotado; las
+    más antiguas que la última se descartan al llegar.
+    """
+
+    def __init__(self, limite=20):
+        """
+        Inicializa la actividad vacía.
+
+        Args:
+            limite (int, optional): Número máximo de actividades
+        """
+        self.limite = limite
+        # (fecha, orden de llegada, clave), de la más antigua a la más reciente
+        self._orden = []
+        self._por_clave = {}
+        self._llegada = count()
+
+    def __len__(self):
+        return len(self._por_clave)
+
+    def elementos(self):
+        """
+        Devuelve las actividades de la más reciente a la más antigua.
+
+        Returns:
+            list: Objetos Actividad
+        """
+        return [self._por_clave[clave][0] for _, _, clave in reversed(self._orden)]
+
+    def obtener(self, tipo, entidad_id):
+        """
+        Devuelve la actividad guardada de una entidad.
+
+        Returns:
+            Actividad: Actividad de la entidad, o None si no está
+        """
+        guardada = self._por_clave.get((tipo, str(entidad_id)))
+        return guardada[0] if guardada else None
+
+    def agregar(self, actividad):
+        """
+        Añade una actividad, sustituyendo la anterior de la misma entidad.
+
+        Se ignora si es más antigua que la que ya hay de la entidad o, con la
+        lista llena, que todas las guardadas.
+
+        Args:
+            actividad (Actividad): Actividad nueva (None se ignora)
+
+        Returns:
+            bool: True si cambió la lista de actividades
+        """
+        if actividad is None:
+            return False
+
+        clave = actividad.clave
+        anterior = self._por_clave.get(clave)
+        if anterior is not None:
+            if actividad.fecha < anterior[0].fecha:
+                return False
+            if actividad == anterior[0]:
+                return False
+            self._orden.remove(anterior[1])
+        elif len(self._orden) >= self.limite and actividad.fecha < self._orden[0][0]:
+            return False
+
+        entrada = (actividad.fecha, next(self._llegada), clave)
+        insort(self._orden, entrada)
+        self._por_clave[clave] = (actividad, entrada)
+
+        if len(self._orden) > self.limite:
+            _, _, descartada = self._orden.pop(0)
+            del self._por_clave[descartada]
+        return True
+
+    def cargar(self, actividades):
+        """
+        Añade varias actividades.
+
+        Args:
+            actividades (iterable): Objetos Actividad (los None se ignoran)
+
+        Returns:
+            bool: True si cambió la lista de actividades
+        """
+        cambio = False
+        for actividad in actividades:
+            cambio = self.agregar(actividad) or cambio
+        return cambio
+
+    def eliminar(self, tipo, entidad_id):
+        """
+        Quita la actividad de una entidad.
+
+        Returns:
+            bool: True si estaba en la lista
+        """
+        guardada = self._por_clave.pop((tipo, str(entidad_id)), None)
+        if guardada is None:
+            return False
+        self._orden.remove(guardada[1])
+        return True
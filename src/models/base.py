@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Seguimiento de cambios para los modelos persistidos en MongoDB.
+"""
+
+import copy
+
+
+class SeguimientoCambios:
+    """
+    Mixin que detecta qué campos del documento cambiaron desde la carga.
+
+    ``from_dict`` guarda una copia de ``to_dict()`` al crear el objeto; al
+    actualizar, el DAO envía en ``$set`` solo los campos que difieren de esa
+    copia (las claves de búsqueda derivadas incluidas) y no escribe nada si
+    no cambió ninguno.
+    """
+
+    _original = None
+
+    def marcar_sin_cambios(self):
+        """Toma el estado actual como el guardado en la base de datos"""
+        # Copia profunda: las listas y dicts del modelo se modifican en el sitio
+        self._original = copy.deepcopy(self.to_dict())
+
+    def cambios(self):
+        """
+        Devuelve los campos del documento modificados desde la carga.
+
+        Un objeto que no se cargó con from_dict devuelve todos sus campos.
+
+        Returns:
+            dict: Campos modificados y sus nuevos valores (sin '_id')
+        """
+        actual = self.to_dict()
+        actual.pop('_id', None)
+        if self._original is None:
+            return actual
+        return {
+            campo: valor for campo, valor in actual.items()
+            if campo not in self._original or self._original[campo] != valor
+        }
+
+    def tiene_cambios(self):
+        """
+        Indica si hay campos modificados desde la carga.
+
+        Returns:
+            bool: True si algún campo cambió
+        """
+        return bool(self.cambios())
@@ -7,8 +7,10 @@ Modelo para representar un camión en el sistema.
 
 from datetime import datetime
 from bson import ObjectId
+from models.base import SeguimientoCambios
+from utils.texto import clave_busqueda
 
-class Camion:
+class Camion(SeguimientoCambios):
     """Clase que representa un camión en el sistema"""
     
     # Estados posibles para un camión
@@ -55,7 +57,7 @@ class Camion:
         Returns:
             Camion: Instancia de Camion
         """
-        return cls(
+        camion = cls(
             matricula=data.get('matricula'),
             modelo=data.get('modelo'),
             año=data.get('año'),
@@ -64,6 +66,8 @@ class Camion:
             fecha_registro=data.get('fecha_registro'),
             ultima_actualizacion=data.get('ultima_actualizacion')
         )
+        camion.marcar_sin_cambios()
+        return camion
     
     def to_dict(self):
         """
@@ -72,15 +76,31 @@ class Camion:
         Returns:
             dict: Diccionario con los datos del camión
         """
-        return {
+        datos = {
             '_id': self.id,
             'matricula': self.matricula,
             'modelo': self.modelo,
             'año': self.año,
             'estado': self.estado,
             'fecha_registro': self.fecha_registro,
-            'ultima_actualizacion': datetime.now()  # Actualizar la fecha
+            'ultima_actualizacion': self.ultima_actualizacion
         }
+        datos.update(self.claves_busqueda(datos))
+        return datos
+    
+    @staticmethod
+    def claves_busqueda(datos):
+        """
+        Calcula las claves normalizadas para buscar por prefijo.
+        
+        Args:
+            datos (dict): Datos del camión con 'matricula'
+            
+        Returns:
+            dict: {'matricula_busqueda': str}
+        """
+        # Sin separadores: "1234-ABC" se encuentra escribiendo "1234abc"
+        return {'matricula_busqueda': clave_busqueda(datos.get('matricula'), '')}
     
     def __str__(self):
         """
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Filas ligeras para las tablas de listas.
+
+Cada clase es una namedtuple con solo las columnas que muestra su tabla y la
+proyección de MongoDB que trae esos campos. Se construyen directamente desde
+el documento, sin pasar por el constructor del modelo completo; el modelo se
+carga por ID cuando se abre un diálogo de detalle o edición.
+"""
+
+from collections import namedtuple
+from utils.texto import clave_busqueda
+
+
+class FilaCamion(namedtuple('FilaCamion', [
+        'id', 'matricula', 'modelo', 'año', 'estado', 'ultima_actualizacion'])):
+    """Fila de la tabla de camiones"""
+
+    __slots__ = ()
+
+    PROYECCION = {
+        'matricula': 1, 'modelo': 1, 'año': 1, 'estado': 1, 'ultima_actualizacion': 1
+    }
+
+    @classmethod
+    def desde_documento(cls, doc):
+        """
+        Crea la fila a partir de un documento proyectado.
+
+        Args:
+            doc (dict): Documento de MongoDB
+
+        Returns:
+            FilaCamion: Fila con los datos del documento
+        """
+        return cls(
+            id=doc['_id'],
+            matricula=doc.get('matricula'),
+            modelo=doc.get('modelo'),
+            año=doc.get('año'),
+            estado=doc.get('estado'),
+            ultima_actualizacion=doc.get('ultima_actualizacion')
+        )
+
+
+class FilaMecanico(namedtuple('FilaMecanico', ['id', 'nombre', 'apellidos', 'actividad'])):
+    """Fila de la tabla de mecánicos"""
+
+    __slots__ = ()
+
+    PROYECCION = {'nombre': 1, 'apellidos': 1, 'actividad': 1}
+
+    @classmethod
+    def desde_documento(cls, doc):
+        """
+        Crea la fila a partir de un documento proyectado.
+
+        Args:
+            doc (dict): Documento de MongoDB
+
+        Returns:
+            FilaMecanico: Fila con los datos del documento
+        """
+        return cls(
+            id=doc['_id'],
+            nombre=doc.get('nombre'),
+            apellidos=doc.get('apellidos'),
+            actividad=doc.get('actividad')
+        )
+
+
+class FilaReparacion(namedtuple('FilaReparacion', [
+        'id', 'id_falla', 'motivo_falla', 'estado', 'camion_id', 'mecanico_id',
+        'fecha_entrada', 'fecha_salida'])):
+    """Fila de una tabla de reparaciones (sin descripción ni notas)"""
+
+    __slots__ = ()
+
+    PROYECCION = {
+        'id_falla': 1, 'motivo_falla': 1, 'estado': 1, 'camion_id': 1,
+        'mecanico_id': 1, 'fecha_entrada': 1, 'fecha_salida': 1
+    }
+
+    @classmethod
+    def desde_documento(cls, doc):
+        """
+        Crea la fila a partir de un documento proyectado.
+
+        Args:
+            doc (dict): Documento de MongoDB
+
+        Returns:
+            FilaReparacion: Fila con los datos del documento
+        """
+        return cls(
+            id=doc['_id'],
+            id_falla=doc.get('id_falla'),
+            motivo_falla=doc.get('motivo_falla'),
+            estado=doc.get('estado'),
+            camion_id=doc.get('camion_id'),
+            mecanico_id=doc.get('mecanico_id'),
+            fecha_entrada=doc.get('fecha_entrada'),
+            fecha_salida=doc.get('fecha_salida')
+        )
+
+
+class FilaPreventiva(namedtuple('FilaPreventiva', [
+        'id', 'matricula', 'modelo', 'tipo', 'estado', 'nivel_urgencia',
+        'ultima_actualizacion_reparacion', 'matricula_busqueda'])):
+    """Fila de la tabla de tareas preventivas (filtrada en el cliente)"""
+
+    __slots__ = ()
+
+    PROYECCION = {
+        'matricula': 1, 'modelo': 1, 'tipo': 1, 'estado': 1, 'nivel_urgencia': 1,
+        'ultima_actualizacion_reparacion': 1, 'matricula_busqueda': 1
+    }
+
+    @classmethod
+    def desde_documento(cls, doc):
+        """
+        Crea la fila a partir de un documento proyectado.
+
+        Args:
+            doc (dict): Documento de MongoDB
+
+        Returns:
+            FilaPreventiva: Fila con los datos del documento
+        """
+        return cls(
+            id=doc['_id'],
+            matricula=doc.get('matricula'),
+            modelo=doc.get('modelo'),
+            tipo=doc.get('tipo'),
+            estado=doc.get('estado'),
+            nivel_urgencia=doc.get('nivel_urgencia'),
+            ultima_actualizacion_reparacion=doc.get('ultima_actualizacion_reparacion'),
+            # Los documentos anteriores a la clave la calculan al cargarse
+            matricula_busqueda=doc.get('matricula_busqueda') or clave_busqueda(doc.get('matricula'), '')
+        )
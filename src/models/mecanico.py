@@ -7,8 +7,10 @@ Modelo para representar un mecánico en el sistema.
 
 from datetime import datetime
 from bson import ObjectId
+from models.base import SeguimientoCambios
+from utils.texto import clave_busqueda
 
-class Mecanico:
+class Mecanico(SeguimientoCambios):
     """Clase que representa un mecánico en el sistema"""
     
     # Actividades posibles para un mecánico
@@ -58,7 +60,7 @@ class Mecanico:
         Returns:
             Mecanico: Instancia de Mecanico
         """
-        return cls(
+        mecanico = cls(
             nombre=data.get('nombre'),
             apellidos=data.get('apellidos'),
             actividad=data.get('actividad'),
@@ -67,6 +69,8 @@ class Mecanico:
             ultima_actualizacion=data.get('ultima_actualizacion'),
             fecha_contratacion=data.get('fecha_contratacion')
         )
+        mecanico.marcar_sin_cambios()
+        return mecanico
     
     def to_dict(self):
         """
@@ -75,15 +79,33 @@ class Mecanico:
         Returns:
             dict: Diccionario con los datos del mecánico
         """
-        return {
+        datos = {
             '_id': self.id,
             'nombre': self.nombre,
             'apellidos': self.apellidos,
             'actividad': self.actividad,
             'fecha_registro': self.fecha_registro,
-            'ultima_actualizacion': datetime.now(),  # Actualizar la fecha
+            'ultima_actualizacion': self.ultima_actualizacion,
             'fecha_contratacion': self.fecha_contratacion
         }
+        datos.update(self.claves_busqueda(datos))
+        return datos
+    
+    @staticmethod
+    def claves_busqueda(datos):
+        """
+        Calcula las claves normalizadas para buscar por prefijo.
+        
+        Args:
+            datos (dict): Datos del mecánico con 'nombre' y 'apellidos'
+            
+        Returns:
+            dict: {'nombre_busqueda': str, 'apellidos_busqueda': str}
+        """
+        return {
+            'nombre_busqueda': clave_busqueda(f"{datos.get('nombre') or ''} {datos.get('apellidos') or ''}"),
+            'apellidos_busqueda': clave_busqueda(datos.get('apellidos'))
+        }
     
     def __str__(self):
         """
@@ -7,8 +7,10 @@ Modelo de datos para tareas de mantenimiento preventivo.
 
 from datetime import datetime
 from bson import ObjectId
+from models.base import SeguimientoCambios
+from utils.texto import clave_busqueda
 
-class Preventiva:
+class Preventiva(SeguimientoCambios):
     """
     Clase que representa una tarea de mantenimiento preventivo de camiones
     """
@@ -74,6 +76,8 @@ class Preventiva:
         self.nivel_urgencia = nivel_urgencia if nivel_urgencia in self.NIVELES_URGENCIA else self.URGENCIA_MEDIA
         self.fecha_registro = datetime.now()
         self.ultima_actualizacion_reparacion = None
+        # Fecha de la última escritura del documento (versión para la réplica)
+        self.ultima_actualizacion = self.fecha_registro
     
     def actualizar(self, matricula=None, modelo=None, tipo=None, estado=None, nivel_urgencia=None):
         """
@@ -103,6 +107,7 @@ class Preventiva:
         
         # Actualizar fecha de última actualización
         self.ultima_actualizacion_reparacion = datetime.now()
+        self.ultima_actualizacion = self.ultima_actualizacion_reparacion
     
     def to_dict(self):
         """
@@ -111,7 +116,7 @@ class Preventiva:
         Returns:
             dict: Representación en diccionario de la tarea preventiva.
         """
-        return {
+        datos = {
             "_id": self.id,
             "matricula": self.matricula,
             "modelo": self.modelo,
@@ -119,8 +124,24 @@ class Preventiva:
             "estado": self.estado,
             "nivel_urgencia": self.nivel_urgencia,
             "fecha_registro": self.fecha_registro,
-            "ultima_actualizacion_reparacion": self.ultima_actualizacion_reparacion
+            "ultima_actualizacion_reparacion": self.ultima_actualizacion_reparacion,
+            "ultima_actualizacion": self.ultima_actualizacion
         }
+        datos.update(self.claves_busqueda(datos))
+        return datos
+    
+    @staticmethod
+    def claves_busqueda(datos):
+        """
+        Calcula las claves normalizadas para buscar por prefijo.
+        
+        Args:
+            datos (dict): Datos de la tarea preventiva con "matricula".
+        
+        Returns:
+            dict: {"matricula_busqueda": str}
+        """
+        return {"matricula_busqueda": clave_busqueda(datos.get("matricula"), "")}
     
     @classmethod
     def from_dict(cls, data):
@@ -152,4 +173,10 @@ class Preventiva:
         if "ultima_actualizacion_reparacion" in data:
             preventiva.ultima_actualizacion_reparacion = data["ultima_actualizacion_reparacion"]
         
-        return preventiva
\ No newline at end of file
+        # Los documentos anteriores al campo toman la fecha más reciente que tengan
+        preventiva.ultima_actualizacion = (data.get("ultima_actualizacion")
+                                           or preventiva.ultima_actualizacion_reparacion
+                                           or preventiva.fecha_registro)
+        
+        preventiva.marcar_sin_cambios()
+        return preventiva
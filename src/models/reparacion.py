@@ -7,8 +7,10 @@ Modelo para representar una reparación en el sistema.
 
 from datetime import datetime
 from bson import ObjectId
+from models.base import SeguimientoCambios
+from utils.texto import clave_busqueda
 
-class Reparacion:
+class Reparacion(SeguimientoCambios):
     """Clase que representa una reparación en el sistema"""
     
     # Estados posibles para una reparación
@@ -102,7 +104,7 @@ class Reparacion:
         Returns:
             Reparacion: Instancia de Reparacion
         """
-        return cls(
+        reparacion = cls(
             camion_id=data.get('camion_id'),
             id_falla=data.get('id_falla'),
             motivo_falla=data.get('motivo_falla'),
@@ -116,6 +118,8 @@ class Reparacion:
             costo=data.get('costo', 0.0),
             id=data.get('_id')
         )
+        reparacion.marcar_sin_cambios()
+        return reparacion
     
     def to_dict(self):
         """
@@ -124,7 +128,7 @@ class Reparacion:
         Returns:
             dict: Diccionario con los datos de la reparación
         """
-        return {
+        datos = {
             '_id': self.id,
             'camion_id': self.camion_id,
             'id_falla': self.id_falla,
@@ -139,6 +143,21 @@ class Reparacion:
             'costo': self.costo,
             'ultima_actualizacion': self.ultima_actualizacion
         }
+        datos.update(self.claves_busqueda(datos))
+        return datos
+    
+    @staticmethod
+    def claves_busqueda(datos):
+        """
+        Calcula las claves normalizadas para buscar por prefijo.
+        
+        Args:
+            datos (dict): Datos de la reparación con 'id_falla'
+            
+        Returns:
+            dict: {'id_falla_busqueda': str}
+        """
+        return {'id_falla_busqueda': clave_busqueda(datos.get('id_falla'), '')}
     
     def __str__(self):
         """
@@ -8,8 +8,9 @@ Modelo para representar un usuario en el sistema.
 import hashlib
 from datetime import datetime
 from bson import ObjectId
+from models.base import SeguimientoCambios
 
-class Usuario:
+class Usuario(SeguimientoCambios):
     """Clase que representa un usuario en el sistema"""
     
     # Roles posibles para un usuario
@@ -100,7 +101,7 @@ class Usuario:
         Returns:
             Usuario: Instancia de Usuario
         """
-        return cls(
+        usuario = cls(
             nombre=data.get('nombre'),
             apellido=data.get('apellido'),
             usuario=data.get('usuario'),
@@ -109,6 +110,8 @@ class Usuario:
             activo=data.get('activo', True),
             id=data.get('_id')
         )
+        usuario.marcar_sin_cambios()
+        return usuario
     
     def to_dict(self):
         """
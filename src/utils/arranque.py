@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Medición de las fases del arranque de la aplicación.
+
+Con la variable de entorno ``TIEMPOS_ARRANQUE=1`` se registra el inicio y el
+fin de cada fase (importaciones, conexión, inicio de sesión, primer pintado
+de la ventana principal) y se escribe un informe en el log. Sin la variable
+las funciones no hacen nada.
+
+Los instantes se miden con ``time.perf_counter`` desde que se importa este
+módulo, que ``main.py`` importa antes que cualquier otro.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Variable de entorno que activa la medición
+VARIABLE_ENTORNO = 'TIEMPOS_ARRANQUE'
+
+ACTIVO = os.environ.get(VARIABLE_ENTORNO, '').strip().lower() in ('1', 'true', 'si', 'sí')
+
+# Instante de referencia de todas las fases
+INICIO = time.perf_counter()
+
+_lock = threading.Lock()
+_fases = {}
+
+
+def iniciar(fase):
+    """
+    Marca el inicio de una fase.
+
+    Args:
+        fase (str): Nombre de la fase
+    """
+    if not ACTIVO:
+        return
+    with _lock:
+        _fases[fase] = [time.perf_counter(), None]
+
+
+def terminar(fase):
+    """
+    Marca el fin de una fase. Si no se inició, cuenta desde el arranque.
+
+    Args:
+        fase (str): Nombre de la fase
+    """
+    if not ACTIVO:
+        return
+    with _lock:
+        _fases.setdefault(fase, [INICIO, None])[1] = time.perf_counter()
+
+
+@contextmanager
+def fase(nombre):
+    """
+    Mide el bloque como una fase.
+
+    Args:
+        nombre (str): Nombre de la fase
+    """
+    iniciar(nombre)
+    try:
+        yield
+    finally:
+        terminar(nombre)
+
+
+def al_primer_pintado(widget, nombre, informe=False):
+    """
+    Termina una fase cuando el widget se pinta por primera vez.
+
+    Args:
+        widget (QWidget): Widget observado
+        nombre (str): Nombre de la fase
+        informe (bool, optional): Escribe el informe al terminar la fase
+    """
+    if not ACTIVO:
+        return
+
+    # PyQt se importa aquí: el módulo se carga antes que cualquier otro
+    from PyQt5.QtCore import QEvent, QObject
+
+    class _FiltroPintado(QObject):
+        def eventFilter(self, objeto, evento):
+            if evento.type() == QEvent.Paint:
+                objeto.removeEventFilter(self)
+                terminar(nombre)
+                if informe:
+                    informar()
+            return False
+
+    widget.installEventFilter(_FiltroPintado(widget))
+
+
+def tiempos():
+    """
+    Devuelve las fases registradas, en orden de inicio.
+
+    Returns:
+        list: Tuplas (fase, inicio_ms, duracion_ms); la duración es None si
+              la fase no ha terminado
+    """
+    with _lock:
+        fases = sorted(_fases.items(), key=lambda elemento: elemento[1][0])
+    return [
+        (nombre, round((inicio - INICIO) * 1000.0, 1),
+         round((fin - inicio) * 1000.0, 1) if fin is not None else None)
+        for nombre, (inicio, fin) in fases
+    ]
+
+
+def informar():
+    """Escribe en el log el informe de las fases registradas"""
+    if not ACTIVO:
+        return
+    lineas = [
+        f"  {nombre:<20} inicio {inicio:>9.1f} ms  "
+        + (f"duración {duracion:>9.1f} ms" if duracion is not None else "sin terminar")
+        for nombre, inicio, duracion in tiempos()
+    ]
+    logging.info("Tiempos de arranque:\n" + "\n".join(lineas))
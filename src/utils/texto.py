@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Normalización de texto, claves y n-gramas para las búsquedas.
+
+Las búsquedas de texto libre no usan expresiones regulares sin anclar, que
+obligan a recorrer toda la colección. En su lugar cada documento guarda en el
+campo ``busqueda`` los prefijos (n-gramas de borde) de las palabras de sus
+campos de texto, normalizadas sin mayúsculas ni acentos. Buscar es entonces
+una igualdad sobre un índice multiclave: "mec" encuentra "Mecánico".
+
+Los campos que se buscan por prefijo (matrícula, nombre) guardan además una
+clave normalizada (``matricula_busqueda``...). Una expresión regular anclada
+al inicio y sin la opción 'i' sobre esa clave es un recorrido por rango del
+índice, y en el cliente basta con comparar cadenas.
+"""
+
+import re
+import unicodedata
+
+# Campo de los documentos con los n-gramas de búsqueda
+CAMPO_BUSQUEDA = 'busqueda'
+
+# Longitud mínima y máxima de los prefijos que se guardan.
+# Las palabras buscadas más largas que el máximo se recortan.
+LONGITUD_MINIMA = 2
+LONGITUD_MAXIMA = 15
+
+_SEPARADORES = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """
+    Pasa el texto a minúsculas y elimina los acentos y la tilde de la ñ.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        str: Texto normalizado
+    """
+    if not texto:
+        return ''
+    return ''.join(
+        c for c in unicodedata.normalize('NFKD', str(texto).casefold())
+        if not unicodedata.combining(c)
+    )
+
+
+def palabras(texto):
+    """
+    Divide el texto normalizado en palabras.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        list: Palabras normalizadas
+    """
+    return [p for p in _SEPARADORES.split(normalizar(texto)) if p]
+
+
+def clave_busqueda(texto, separador=' '):
+    """
+    Calcula la clave normalizada de un campo para búsquedas por prefijo.
+
+    Args:
+        texto (str): Texto original
+        separador (str, optional): Texto entre palabras; '' las une (matrículas)
+
+    Returns:
+        str: Clave normalizada
+    """
+    return separador.join(palabras(texto))
+
+
+def filtro_prefijo(campo, texto, separador=' '):
+    """
+    Construye el filtro de MongoDB de una búsqueda por prefijo.
+
+    Args:
+        campo (str): Campo con la clave normalizada
+        texto (str): Texto escrito por el usuario
+        separador (str, optional): El mismo usado al calcular la clave
+
+    Returns:
+        dict: Filtro con una expresión regular anclada, o {} si no hay texto
+    """
+    clave = clave_busqueda(texto, separador)
+    if not clave:
+        return {}
+    return {campo: {'$regex': '^' + re.escape(clave)}}
+
+
+def ngramas(*textos):
+    """
+    Calcula los prefijos de todas las palabras de los textos.
+
+    Args:
+        *textos (str): Textos a indexar (se ignoran los vacíos)
+
+    Returns:
+        list: Prefijos distintos, ordenados
+    """
+    prefijos = set()
+    for texto in textos:
+        for palabra in palabras(texto):
+            for longitud in range(LONGITUD_MINIMA, min(len(palabra), LONGITUD_MAXIMA) + 1):
+                prefijos.add(palabra[:longitud])
+    return sorted(prefijos)
+
+
+def terminos_busqueda(texto):
+    """
+    Convierte el texto de una búsqueda en los términos a consultar.
+
+    Las palabras más cortas que LONGITUD_MINIMA se descartan y las más
+    largas que LONGITUD_MAXIMA se recortan.
+
+    Args:
+        texto (str): Texto escrito por el usuario
+
+    Returns:
+        list: Términos distintos, los más largos primero
+    """
+    terminos = {p[:LONGITUD_MAXIMA] for p in palabras(texto) if len(p) >= LONGITUD_MINIMA}
+    # El término más largo suele ser el más selectivo: va primero para que
+    # MongoDB lo use como límite del índice
+    return sorted(terminos, key=lambda t: (-len(t), t))
+
+
+def filtro_busqueda(texto):
+    """
+    Construye el filtro de MongoDB para una búsqueda de texto libre.
+
+    Args:
+        texto (str): Texto escrito por el usuario
+
+    Returns:
+        dict: Filtro sobre CAMPO_BUSQUEDA, o {} si no hay términos válidos
+    """
+    terminos = terminos_busqueda(texto)
+    if not terminos:
+        return {}
+    if len(terminos) == 1:
+        return {CAMPO_BUSQUEDA: terminos[0]}
+    return {CAMPO_BUSQUEDA: {'$all': terminos}}
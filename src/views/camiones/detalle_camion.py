@@ -5,7 +5,7 @@ from PyQt5.QtCore import QDate, Qt
 from PyQt5.QtGui import QFont, QColor
 from models.camion import Camion
 from database.camiones_dao import CamionesDAO
-from src.controllers.reparacion_controller import ReparacionController
+from controllers.reparacion_controller import ReparacionController
 from bson import ObjectId
 import importlib
 
@@ -244,14 +244,8 @@ class DetalleCamionDialog(QDialog):
             if main_window:
                 if hasattr(main_window, 'dashboard'):
                     main_window.dashboard.agregar_actividad('camion', self.camion, "Cambio de estado")
-                    
-                if hasattr(main_window, 'refresh_data'):
-                    print("Actualizando datos en la ventana principal...")
-                    main_window.refresh_data()
-                    
-                if hasattr(main_window, 'reparaciones_widget') and main_window.reparaciones_widget:
-                    print("Actualizando lista de reparaciones en la ventana principal...")
-                    main_window.reparaciones_widget.cargarReparaciones()
+                
+                # Las listas se actualizan con el cambio que publica el DAO
         except Exception as e:
             print(f"Error al actualizar UI después de cambio de estado: {str(e)}")
             # No mostrar este error al usuario, solo registrarlo
@@ -301,8 +295,8 @@ class DetalleCamionDialog(QDialog):
                 'fecha_ingreso': QDate.currentDate().toString('yyyy-MM-dd')
             }
             
-            # Instanciar el controlador de reparaciones
-            controller = ReparacionController()
+            # Usar el controlador compartido con la ventana principal
+            controller = ReparacionController.compartido()
             
             # Mostrar el formulario (pasando los datos iniciales)
             dialog = FormReparaciones(controller, datos_reparacion, self)
@@ -344,14 +338,8 @@ class DetalleCamionDialog(QDialog):
             if main_window:
                 if hasattr(main_window, 'dashboard'):
                     main_window.dashboard.agregar_actividad('camion', self.camion, "Cambio de estado")
-                    
-                if hasattr(main_window, 'refresh_data'):
-                    print("Actualizando datos en la ventana principal...")
-                    main_window.refresh_data()
-                    
-                if hasattr(main_window, 'reparaciones_widget') and main_window.reparaciones_widget:
-                    print("Actualizando lista de reparaciones en la ventana principal...")
-                    main_window.reparaciones_widget.cargarReparaciones()
+                
+                # Las listas se actualizan con el cambio que publica el DAO
         except Exception as e:
             print(f"Error al actualizar UI después de cambio de estado: {str(e)}")
             # No mostrar este error al usuario, solo registrarlo
\ No newline at end of file
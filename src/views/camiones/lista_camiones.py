@@ -6,23 +6,36 @@ Widget para mostrar la lista de camiones.
 """
 
 import logging
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                            QTableWidgetItem, QPushButton, QLabel, QLineEdit,
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, 
+                            QPushButton, QLabel, QLineEdit,
                             QComboBox, QHeaderView, QMessageBox, QMenu)
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
-from PyQt5.QtGui import QColor, QBrush, QFont
+from PyQt5.QtGui import QColor, QFont
 
 from database.camiones_dao import CamionesDAO
+from database.eventos import ELIMINACION
+from database.query_runner import QueryRunner
+from database.paginacion import TAMANO_PAGINA
 from models.camion import Camion
 from models.usuario import Usuario
 from views.camiones.detalle_camion import DetalleCamionDialog
 from views.camiones.form_camion import FormCamionDialog
+from views.widgets.receptor_cambios import ReceptorCambios
+from views.widgets.table_models import Columna, EntityTableModel, FiltroProxyModel
+
+# Colores de fondo según el estado
+COLORES_ESTADO = {
+    Camion.ESTADO_OPERATIVO: QColor(200, 255, 200),  # Verde claro
+    Camion.ESTADO_EN_REPARACION: QColor(255, 200, 200),  # Rojo claro
+    Camion.ESTADO_FUERA_SERVICIO: QColor(200, 200, 200)  # Gris claro
+}
 
 class ListaCamionesWidget(QWidget):
     """Widget para mostrar y gestionar la lista de camiones"""
     
     # Señales
-    camion_seleccionado = pyqtSignal(Camion)
+    # Emitida con la fila (FilaCamion) seleccionada
+    camion_seleccionado = pyqtSignal(object)
     
     def __init__(self, current_user=None, parent=None):
         """Inicializa el widget de lista de camiones"""
@@ -30,9 +43,16 @@ class ListaCamionesWidget(QWidget):
         
         self.current_user = current_user
         self.camiones_dao = CamionesDAO()
+        self.query_runner = QueryRunner(self)
+        self.query_runner.cargando.connect(self.on_cargando)
         self.camiones = []
+        self._siguiente_pagina = None
         
         self.setup_ui()
+        
+        # Cambios publicados por otras vistas, otros usuarios o la sincronización
+        self.receptor = ReceptorCambios(self, ('camiones',), self.refresh_data, self.aplicar_cambio)
+        
         self.refresh_data()
     
     def setup_ui(self):
@@ -97,14 +117,34 @@ class ListaCamionesWidget(QWidget):
         
         main_layout.addLayout(button_layout)
         
+        # Modelo de datos de la tabla
+        self.model = EntityTableModel([
+            Columna("Matrícula", lambda c: c.matricula),
+            Columna("Modelo", lambda c: c.modelo),
+            Columna("Año", lambda c: c.año, orden=lambda c: c.año or 0),
+            Columna("Estado", lambda c: c.estado, fondo=lambda c: COLORES_ESTADO.get(c.estado)),
+            Columna("Última Actualización",
+                    lambda c: c.ultima_actualizacion.strftime("%d/%m/%Y %H:%M") if c.ultima_actualizacion else "",
+                    orden=lambda c: c.ultima_actualizacion)
+        ], clave=lambda c: c.id, parent=self)
+        
+        # Proxy para ordenar y filtrar sin reconstruir la tabla
+        self.proxy = FiltroProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        
+        # Cargar la siguiente página al llegar al final de la tabla
+        self.model.mas_filas_solicitadas.connect(self.cargar_mas)
+        
         # Tabla de camiones
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Matrícula", "Modelo", "Año", "Estado", "Última Actualización"])
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.AscendingOrder)
+        self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.setAlternatingRowColors(True)
         self.table.doubleClicked.connect(self.on_table_double_clicked)
         self.table.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -124,7 +164,7 @@ class ListaCamionesWidget(QWidget):
             self.delete_button.setEnabled(False)
         
         # Conectar señal de selección
-        self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
         # Etiqueta de información
         self.info_label = QLabel("Haga doble clic en un camión para ver sus detalles")
@@ -136,87 +176,170 @@ class ListaCamionesWidget(QWidget):
         main_layout.setSpacing(10)
     
     def refresh_data(self):
-        """Actualiza los datos de la tabla"""
-        self.camiones = self.camiones_dao.obtener_todos()
-        self.populate_table(self.camiones)
-    
-    def populate_table(self, camiones):
-        """Rellena la tabla con los datos de los camiones"""
-        self.table.setRowCount(0)
-        
-        for camion in camiones:
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
-            
-            # Matrícula
-            item_matricula = QTableWidgetItem(camion.matricula)
-            item_matricula.setData(Qt.UserRole, camion.id)
-            self.table.setItem(row_position, 0, item_matricula)
-            
-            # Modelo
-            self.table.setItem(row_position, 1, QTableWidgetItem(camion.modelo))
-            
-            # Año
-            self.table.setItem(row_position, 2, QTableWidgetItem(str(camion.año)))
-            
-            # Estado
-            item_estado = QTableWidgetItem(camion.estado)
-            
-            # Colorear según el estado
-            if camion.estado == Camion.ESTADO_OPERATIVO:
-                item_estado.setBackground(QBrush(QColor(200, 255, 200)))  # Verde claro
-            elif camion.estado == Camion.ESTADO_EN_REPARACION:
-                item_estado.setBackground(QBrush(QColor(255, 200, 200)))  # Rojo claro
-            elif camion.estado == Camion.ESTADO_FUERA_SERVICIO:
-                item_estado.setBackground(QBrush(QColor(200, 200, 200)))  # Gris claro
-            
-            self.table.setItem(row_position, 3, item_estado)
-            
-            # Última actualización
-            fecha_str = camion.ultima_actualizacion.strftime("%d/%m/%Y %H:%M")
-            self.table.setItem(row_position, 4, QTableWidgetItem(fecha_str))
-        
-        self.info_label.setText(f"Total: {len(camiones)} camiones")
+        """Recarga en segundo plano las filas ya cargadas (al menos una página)"""
+        self._cargar_primera_pagina(max(TAMANO_PAGINA, self.model.rowCount()))
     
-
-
+    def _filtros(self):
+        """Devuelve los filtros de la lista para la consulta al servidor"""
+        return {
+            'matricula': self.matricula_filter.text().strip(),
+            'estado': self.estado_filter.currentData()
+        }
     
-    def apply_filters(self):
-        """Aplica los filtros a la tabla"""
-        matricula_filter = self.matricula_filter.text().strip().lower()
-        estado_filter = self.estado_filter.currentData()
-        
-        filtered_camiones = []
+    def _cargar_primera_pagina(self, tamano=TAMANO_PAGINA, retardo_ms=0):
+        """
+        Consulta la primera página con los filtros actuales.
+        
+        Args:
+            tamano (int, optional): Número de filas a cargar
+            retardo_ms (int, optional): Espera para agrupar cambios seguidos de los filtros
+        """
+        # Una página siguiente pedida con los datos anteriores ya no sirve
+        self.query_runner.cancelar('camiones_mas')
+        self.query_runner.ejecutar(
+            'camiones',
+            self.camiones_dao.buscar_filas,
+            self._filtros(),
+            None,
+            tamano,
+            al_terminar=self.populate_table,
+            retardo_ms=retardo_ms
+        )
+    
+    def cargar_mas(self):
+        """Carga en segundo plano la siguiente página de camiones"""
+        if not self._siguiente_pagina:
+            self.model.establecer_hay_mas(False)
+            return
         
-        for camion in self.camiones:
-            # Filtrar por matrícula
-            if matricula_filter and matricula_filter not in camion.matricula.lower():
-                continue
-            
-            # Filtrar por estado
-            if estado_filter and camion.estado != estado_filter:
-                continue
-            
-            filtered_camiones.append(camion)
+        self.query_runner.ejecutar(
+            'camiones_mas',
+            self.camiones_dao.buscar_filas,
+            self._filtros(),
+            self._siguiente_pagina,
+            TAMANO_PAGINA,
+            al_terminar=self.anadir_pagina,
+            al_fallar=lambda mensaje: self.model.establecer_hay_mas(False)
+        )
+    
+    def on_cargando(self, clave, cargando):
+        """Muestra el estado de carga mientras hay una consulta en curso"""
+        if clave != 'camiones':
+            return
+        if cargando:
+            self.info_label.setText("Cargando camiones...")
+        else:
+            self.actualizar_info()
+    
+    def populate_table(self, pagina):
+        """Carga la primera página en el modelo de la tabla aplicando solo los cambios"""
+        self._siguiente_pagina = pagina.siguiente
+        self.model.establecer_filas(pagina.elementos)
+        self.model.establecer_hay_mas(pagina.hay_mas)
+        self.camiones = self.model.filas()
+        self.actualizar_info()
+    
+    def anadir_pagina(self, pagina):
+        """Añade al final de la tabla una página siguiente"""
+        self._siguiente_pagina = pagina.siguiente
+        self.model.anadir_filas(pagina.elementos, pagina.hay_mas)
+        self.camiones = self.model.filas()
+        self.actualizar_info()
+    
+    def actualizar_info(self):
+        """Actualiza la etiqueta con el número de camiones cargados"""
+        if self.model.hay_mas():
+            self.info_label.setText(
+                f"Mostrando {self.proxy.rowCount()} camiones (desplácese para cargar más)"
+            )
+        else:
+            self.info_label.setText(f"Total: {self.proxy.rowCount()} camiones")
+    
+    def aplicar_cambio(self, cambio):
+        """
+        Actualiza en segundo plano solo la fila del documento que cambió.
+        
+        Args:
+            cambio (CambioEntidad): Cambio recibido del bus de eventos
+        """
+        if cambio.tipo == ELIMINACION:
+            self.quitar_fila(cambio.id)
+            return
         
-        self.populate_table(filtered_camiones)
+        self.query_runner.ejecutar(
+            f'fila:{cambio.id}',
+            self.camiones_dao.obtener_fila,
+            cambio.id, self._filtros(),
+            al_terminar=lambda fila: self.actualizar_fila(cambio.id, fila)
+        )
+    
+    def actualizar_fila(self, camion_id, fila):
+        """Sustituye la fila del camión, o la quita si ya no existe o no cumple los filtros"""
+        if fila is None:
+            self.quitar_fila(camion_id)
+            return
+        self.model.actualizar_fila(fila)
+        self.camiones = self.model.filas()
+        self.actualizar_info()
+    
+    def quitar_fila(self, camion_id):
+        """Quita de la tabla la fila del camión"""
+        if self.model.eliminar_clave(camion_id):
+            self.camiones = self.model.filas()
+            self.actualizar_info()
+    
+    def apply_filters(self):
+        """Aplica los filtros consultando de nuevo al servidor"""
+        # El retardo agrupa las pulsaciones seguidas en una sola consulta
+        self._cargar_primera_pagina(retardo_ms=300)
     
     def clear_filters(self):
         """Limpia los filtros"""
         self.matricula_filter.clear()
         self.estado_filter.setCurrentIndex(0)
-        self.populate_table(self.camiones)
+        self.apply_filters()
     
     def get_selected_camion(self):
-        """Obtiene el camión seleccionado"""
+        """Obtiene la fila (FilaCamion) seleccionada"""
         selected_rows = self.table.selectionModel().selectedRows()
         if not selected_rows:
             return None
         
-        index = selected_rows[0].row()
-        camion_id = self.table.item(index, 0).data(Qt.UserRole)
+        return self.proxy.fila(selected_rows[0])
+    
+    def abrir_camion_seleccionado(self, accion):
+        """
+        Carga en segundo plano el camión completo seleccionado y ejecuta una acción con él.
+        
+        La tabla solo tiene las columnas visibles; el modelo completo se
+        toma de la caché de entidades o se consulta al abrir un diálogo.
+        
+        Args:
+            accion (callable): Función Camion -> None
+        """
+        fila = self.get_selected_camion()
+        if fila is None:
+            return
+        
+        # Si ya se cargó antes y no ha cambiado, se resuelve desde memoria
+        en_cache = self.camiones_dao.obtener_en_cache(fila.id)
+        if en_cache is not None:
+            accion(en_cache)
+            return
+        
+        def al_cargar(camion):
+            if camion:
+                accion(camion)
+            else:
+                QMessageBox.warning(self, "No encontrado", "El registro seleccionado ya no existe.")
+                self.refresh_data()
         
-        return self.camiones_dao.obtener_por_id(camion_id)
+        self.query_runner.ejecutar(
+            'abrir_camion',
+            self.camiones_dao.obtener_por_id,
+            fila.id,
+            al_terminar=al_cargar
+        )
     
     def on_selection_changed(self):
         """Maneja el evento de cambio de selección"""
@@ -234,31 +357,27 @@ class ListaCamionesWidget(QWidget):
     
     def on_table_double_clicked(self, index):
         """Maneja el evento de doble clic en la tabla"""
-        camion = self.get_selected_camion()
-        if camion:
-            self.show_camion_details(camion)
+        self.abrir_camion_seleccionado(self.show_camion_details)
     
     def on_add_button_clicked(self):
         """Maneja el evento de clic en el botón de agregar"""
         dialog = FormCamionDialog(parent=self)
-        if dialog.exec_():
-            # Refrescar datos después de agregar
-            self.refresh_data()
+        # La tabla se actualiza con el cambio que publica el DAO al guardar
+        dialog.exec_()
     
     def on_edit_button_clicked(self):
         """Maneja el evento de clic en el botón de editar"""
-        camion = self.get_selected_camion()
-        if camion:
-            dialog = FormCamionDialog(camion=camion, parent=self)
-            if dialog.exec_():
-                # Refrescar datos después de editar
-                self.refresh_data()
+        self.abrir_camion_seleccionado(self.editar_camion)
+    
+    def editar_camion(self, camion):
+        """Muestra el formulario de edición de un camión"""
+        dialog = FormCamionDialog(camion=camion, parent=self)
+        # La tabla se actualiza con el cambio que publica el DAO al guardar
+        dialog.exec_()
     
     def on_details_button_clicked(self):
         """Maneja el evento de clic en el botón de detalles"""
-        camion = self.get_selected_camion()
-        if camion:
-            self.show_camion_details(camion)
+        self.abrir_camion_seleccionado(self.show_camion_details)
     
     def on_delete_button_clicked(self):
         """Maneja el evento de clic en el botón de eliminar"""
@@ -275,20 +394,28 @@ class ListaCamionesWidget(QWidget):
         )
         
         if reply == QMessageBox.Yes:
-            # Eliminar el camión
-            if self.camiones_dao.eliminar(camion.id):
-                QMessageBox.information(
-                    self,
-                    "Eliminación exitosa",
-                    f"El camión {camion.matricula} ha sido eliminado correctamente."
-                )
-                self.refresh_data()
-            else:
-                QMessageBox.warning(
-                    self,
-                    "Error al eliminar",
-                    f"No se pudo eliminar el camión {camion.matricula}."
-                )
+            # Eliminar el camión en segundo plano
+            self.query_runner.ejecutar(
+                f'eliminar:{camion.id}',
+                self.camiones_dao.eliminar,
+                camion.id,
+                al_terminar=lambda eliminado: self.on_camion_eliminado(camion, eliminado)
+            )
+    
+    def on_camion_eliminado(self, camion, eliminado):
+        """Informa del resultado de eliminar el camión"""
+        if eliminado:
+            QMessageBox.information(
+                self,
+                "Eliminación exitosa",
+                f"El camión {camion.matricula} ha sido eliminado correctamente."
+            )
+        else:
+            QMessageBox.warning(
+                self,
+                "Error al eliminar",
+                f"No se pudo eliminar el camión {camion.matricula}."
+            )
     
     def show_camion_details(self, camion):
         """Muestra el diálogo de detalles de un camión"""
@@ -315,11 +442,9 @@ class ListaCamionesWidget(QWidget):
         action = context_menu.exec_(self.table.mapToGlobal(position))
         
         if action == ver_action:
-            self.show_camion_details(camion)
+            self.abrir_camion_seleccionado(self.show_camion_details)
         elif action == editar_action:
-            dialog = FormCamionDialog(camion=camion, parent=self)
-            if dialog.exec_():
-                self.refresh_data()
+            self.abrir_camion_seleccionado(self.editar_camion)
         elif self.current_user and self.current_user.rol == Usuario.ROL_ADMIN and action == eliminar_action:
             self.on_delete_button_clicked()
 
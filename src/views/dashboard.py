@@ -13,12 +13,50 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
 from PyQt5.QtCore import Qt, pyqtSlot, QTimer
 from PyQt5.QtGui import QFont, QColor
 
+from bson import ObjectId
+
 from database.camiones_dao import CamionesDAO
+from database.eventos import ELIMINACION, INSERCION
 from database.reparaciones_dao import ReparacionesDAO
+from database.query_runner import QueryRunner
+from views.widgets.receptor_cambios import ReceptorCambios
+from models.actividad import Actividad, ActividadReciente
 from models.camion import Camion
 from models.reparacion import Reparacion
 from models.usuario import Usuario
 
+# Estilo base de las líneas de actividad
+ESTILO_ACTIVIDAD = "QLabel { padding: 8px; border-radius: 4px; margin-bottom: 4px; font-size: 14px; }"
+
+
+def _estilo_actividad(actividad):
+    """Hoja de estilo de la línea de una actividad según su tipo y estado"""
+    if actividad.tipo == 'camion':
+        if actividad.estado == Camion.ESTADO_OPERATIVO:
+            return ESTILO_ACTIVIDAD + "background-color: #d5f5e3;"  # Verde claro
+        if actividad.estado == Camion.ESTADO_EN_REPARACION:
+            return ESTILO_ACTIVIDAD + "background-color: #fadbd8;"  # Rojo claro
+        return ESTILO_ACTIVIDAD + "background-color: #f2f3f4;"  # Gris claro
+    
+    # Reparaciones y preventivas
+    if actividad.estado == "Pendiente":
+        return ESTILO_ACTIVIDAD + "background-color: #fdebd0;"  # Naranja claro
+    if actividad.estado in ["En Diagnóstico", "Esperando Repuestos", "En Reparación"]:
+        return ESTILO_ACTIVIDAD + "background-color: #ebf5fb;"  # Azul claro
+    if actividad.estado in ["Reparado", "Entregado"]:
+        return ESTILO_ACTIVIDAD + "background-color: #d5f5e3;"  # Verde claro
+    if actividad.estado == "Cancelado":
+        return ESTILO_ACTIVIDAD + "background-color: #fadbd8;"  # Rojo claro
+    return ESTILO_ACTIVIDAD + "background-color: #f2f3f4;"  # Gris claro
+
+
+def _texto_actividad(actividad):
+    """Texto de la línea de una actividad"""
+    fecha_str = actividad.fecha.strftime("%d/%m/%Y %H:%M")
+    accion_str = actividad.accion or 'Actualización'
+    return f"[{fecha_str}] {accion_str}: {actividad.descripcion} - Estado: {actividad.estado}"
+
+
 class DashboardWidget(QWidget):
     """Widget que muestra el panel de control con resúmenes y estadísticas"""
     
@@ -29,25 +67,28 @@ class DashboardWidget(QWidget):
         self.current_user = current_user
         self.camiones_dao = CamionesDAO()
         self.reparaciones_dao = ReparacionesDAO()
+        self.query_runner = QueryRunner(self)
+        self.query_runner.cargando.connect(self.on_cargando)
         
         # Variables para almacenar datos
-        self.camiones = []
-        self.reparaciones = []
+        self.total_camiones = 0
         self.camiones_operativos = 0
         self.camiones_en_reparacion = 0
         self.camiones_fuera_servicio = 0
         
-        # Variables para almacenar actividad reciente
-        self.actividades_recientes = []
+        # Actividad reciente: las más recientes, una por camión o reparación
         self.max_actividades = 20  # Máximo número de actividades a mostrar
+        self.actividad = ActividadReciente(self.max_actividades)
         
         self.setup_ui()
-        self.refresh_data()
         
-        # Configurar timer para actualizar datos cada 30 segundos
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.refresh_data)
-        self.timer.start(30000)  # 30000 ms = 30 segundos
+        # Cada cambio en camiones o reparaciones actualiza su línea de
+        # actividad y, si es un camión, los conteos; solo con el panel visible
+        self.receptor = ReceptorCambios(
+            self, ('camiones', 'reparaciones'), self.refresh_data, self.aplicar_cambio
+        )
+        
+        self.refresh_data()
         
         # Aplicar estilo base a todo el widget
         self.setStyleSheet("""
@@ -175,6 +216,18 @@ class DashboardWidget(QWidget):
         self.no_actividad_label.setStyleSheet("color: #888; font-style: italic;")
         self.actividad_container.addWidget(self.no_actividad_label)
         
+        # Etiquetas de actividad creadas una sola vez y reutilizadas; se
+        # guarda lo que muestra cada una para no repetir setText/setStyleSheet
+        self.actividad_labels = []
+        self._contenido_labels = []
+        for _ in range(self.max_actividades):
+            actividad_label = QLabel()
+            actividad_label.setWordWrap(True)
+            actividad_label.setVisible(False)
+            self.actividad_container.addWidget(actividad_label)
+            self.actividad_labels.append(actividad_label)
+            self._contenido_labels.append(None)
+        
         # Añadir widget al área de scroll
         scroll_area.setWidget(self.actividad_container_widget)
         activity_layout.addWidget(scroll_area)
@@ -228,37 +281,129 @@ class DashboardWidget(QWidget):
         self.fecha_label.setText(fecha_actual)
     
     def refresh_data(self):
-        """Actualiza los datos mostrados en el dashboard"""
+        """Actualiza los datos mostrados en el dashboard en segundo plano"""
+        self.query_runner.ejecutar(
+            'dashboard',
+            self._consultar_datos,
+            al_terminar=self.mostrar_datos
+        )
+    
+    def _consultar_datos(self):
+        """
+        Consulta los datos del dashboard (se ejecuta fuera del hilo de la interfaz).
+        
+        Returns:
+            dict: Resumen de estados y actividad reciente de camiones y reparaciones
+        """
+        return {
+            # Conteos por estado calculados en el servidor
+            'resumen': self.camiones_dao.obtener_resumen_estados(),
+            # Solo los registros más recientes para la actividad
+            'camiones_recientes': self.camiones_dao.obtener_actividad_reciente(self.max_actividades),
+            'reparaciones_recientes': self.reparaciones_dao.obtener_actividad_reciente(self.max_actividades)
+        }
+    
+    def on_cargando(self, clave, cargando):
+        """Muestra el cursor de espera mientras se consultan los datos"""
+        if cargando:
+            self.setCursor(Qt.BusyCursor)
+        else:
+            self.unsetCursor()
+    
+    def mostrar_datos(self, datos):
+        """
+        Muestra los datos consultados.
+        
+        Args:
+            datos (dict): Resultado de _consultar_datos
+        """
         try:
-            # Obtener datos actualizados
-            self.camiones = self.camiones_dao.obtener_todos()
-            self.reparaciones = self.reparaciones_dao.obtener_todas()
+            self.mostrar_resumen(datos['resumen'])
             
-            # Calcular estadísticas de camiones
-            self.camiones_operativos = sum(1 for c in self.camiones if c.estado == Camion.ESTADO_OPERATIVO)
-            self.camiones_en_reparacion = sum(1 for c in self.camiones if c.estado == Camion.ESTADO_EN_REPARACION)
-            self.camiones_fuera_servicio = sum(1 for c in self.camiones if c.estado == Camion.ESTADO_FUERA_SERVICIO)
+            # Mezclar los registros más recientes con la actividad ya mostrada
+            cambio = self.actividad.cargar(
+                Actividad.desde_camion(camion) for camion in datos['camiones_recientes']
+            )
+            cambio = self.actividad.cargar(
+                Actividad.desde_reparacion(reparacion) for reparacion in datos['reparaciones_recientes']
+            ) or cambio
             
-            # Actualizar widgets de resumen
-            self.actualizar_widgets_camiones()
-            
-            # Calcular estadísticas de reparaciones
-            # Ajustar estos conteos según los estados usados en el sistema actualizado
-            
-            # Mostrar actividad reciente
-            self.actualizar_actividad_reciente()
+            if cambio:
+                self.actualizar_actividad_reciente()
             
         except Exception as e:
             logging.error(f"Error al actualizar el dashboard: {str(e)}")
     
+    def mostrar_resumen(self, resumen):
+        """
+        Muestra los conteos de camiones por estado.
+        
+        Args:
+            resumen (dict): Resultado de CamionesDAO.obtener_resumen_estados
+        """
+        por_estado = resumen['por_estado']
+        
+        self.total_camiones = resumen['total']
+        self.camiones_operativos = por_estado.get(Camion.ESTADO_OPERATIVO, 0)
+        self.camiones_en_reparacion = por_estado.get(Camion.ESTADO_EN_REPARACION, 0)
+        self.camiones_fuera_servicio = por_estado.get(Camion.ESTADO_FUERA_SERVICIO, 0)
+        
+        # Actualizar widgets de resumen
+        self.actualizar_widgets_camiones()
+    
+    def aplicar_cambio(self, cambio):
+        """
+        Actualiza la actividad del documento que cambió y, si es un camión, los conteos.
+        
+        Args:
+            cambio (CambioEntidad): Cambio recibido del bus de eventos
+        """
+        if cambio.entidad == 'camiones':
+            self.query_runner.ejecutar(
+                'resumen',
+                self.camiones_dao.obtener_resumen_estados,
+                al_terminar=self.mostrar_resumen
+            )
+        
+        # Las reparaciones del archivo local (ID entero) no están en MongoDB
+        if not isinstance(cambio.id, ObjectId):
+            return
+        
+        if cambio.entidad == 'camiones':
+            tipo, dao, crear = 'camion', self.camiones_dao, Actividad.desde_camion
+        else:
+            tipo, dao, crear = 'reparacion', self.reparaciones_dao, Actividad.desde_reparacion
+        
+        if cambio.tipo == ELIMINACION:
+            anterior = self.actividad.obtener(tipo, cambio.id)
+            if anterior is not None:
+                self.agregar(anterior._replace(fecha=datetime.now(), accion="Registro eliminado"))
+            return
+        
+        accion = "Nuevo registro" if cambio.tipo == INSERCION else "Registro actualizado"
+        self.query_runner.ejecutar(
+            f'actividad:{cambio.id}',
+            dao.obtener_actividad,
+            cambio.id,
+            al_terminar=lambda doc: self.agregar(crear(doc, accion) if doc else None)
+        )
+    
+    def agregar(self, actividad):
+        """
+        Añade una actividad y actualiza las líneas si cambió la lista.
+        
+        Args:
+            actividad (Actividad): Actividad nueva (None se ignora)
+        """
+        if self.actividad.agregar(actividad):
+            self.actualizar_actividad_reciente()
+    
     def actualizar_widgets_camiones(self):
         """Actualiza los widgets con la información de camiones"""
         # Actualizar widgets con los números obtenidos
-        total_camiones = len(self.camiones)
-        
         # Encuentra todos los QLabels dentro de cada widget y actualiza el segundo (el valor)
         total_label = self.total_camiones_widget.findChildren(QLabel)[1]
-        total_label.setText(str(total_camiones))
+        total_label.setText(str(self.total_camiones))
         
         operativos_label = self.operativos_widget.findChildren(QLabel)[1]
         operativos_label.setText(str(self.camiones_operativos))
@@ -270,93 +415,24 @@ class DashboardWidget(QWidget):
         fuera_servicio_label.setText(str(self.camiones_fuera_servicio))
     
     def actualizar_actividad_reciente(self):
-        """Actualiza la sección de actividad reciente"""
-        # Limpiar widgets existentes excepto el label de "no hay actividad"
-        self.no_actividad_label.setVisible(False)
-        for i in reversed(range(self.actividad_container.count())):
-            if self.actividad_container.itemAt(i).widget() != self.no_actividad_label:
-                widget = self.actividad_container.itemAt(i).widget()
-                if widget:
-                    widget.deleteLater()
-        
-        # Combinamos actividades recientes registradas con las actuales
-        actividades = self.actividades_recientes.copy()
-        
-        # Si no hay actividades registradas, crear unas basadas en los datos actuales
-        if not actividades:
-            # Añadir actividades de reparaciones
-            for reparacion in self.reparaciones:
-                fecha_act = reparacion.fecha_entrada
-                if hasattr(reparacion, 'fecha_actualizacion') and reparacion.fecha_actualizacion:
-                    fecha_act = reparacion.fecha_actualizacion
-                
-                # Crear un objeto de actividad
-                actividad = {
-                    'fecha': fecha_act,
-                    'tipo': 'reparacion',
-                    'id': str(reparacion.id),
-                    'estado': reparacion.estado,
-                    'accion': 'Registro existente',
-                    'descripcion': f"Reparación {reparacion.id_falla} - {reparacion.motivo_falla[:30]}..."
-                }
-                actividades.append(actividad)
-            
-            # Añadir actividades de camiones
-            for camion in self.camiones:
-                # Crear un objeto de actividad
-                actividad = {
-                    'fecha': camion.ultima_actualizacion,
-                    'tipo': 'camion',
-                    'id': str(camion.id),
-                    'estado': camion.estado,
-                    'accion': 'Registro existente',
-                    'descripcion': f"Camión {camion.matricula} - {camion.modelo}"
-                }
-                actividades.append(actividad)
-        
-        # Ordenar actividades por fecha (más reciente primero)
-        actividades.sort(key=lambda x: x['fecha'], reverse=True)
-        
-        # Limitar a las últimas actividades según max_actividades
-        actividades = actividades[:self.max_actividades]
-        
-        if not actividades:
-            self.no_actividad_label.setVisible(True)
-            return
-        
-        # Añadir actividades al contenedor
-        for actividad in actividades:
-            fecha_str = actividad['fecha'].strftime("%d/%m/%Y %H:%M")
-            
-            # Definir el estilo basado en el tipo y estado
-            estilo = "QLabel { padding: 8px; border-radius: 4px; margin-bottom: 4px; font-size: 14px; }"
-            if actividad['tipo'] == 'camion':
-                if actividad['estado'] == Camion.ESTADO_OPERATIVO:
-                    estilo += "background-color: #d5f5e3;" # Verde claro
-                elif actividad['estado'] == Camion.ESTADO_EN_REPARACION:
-                    estilo += "background-color: #fadbd8;" # Rojo claro
-                else:
-                    estilo += "background-color: #f2f3f4;" # Gris claro
-            else:  # reparacion
-                if actividad['estado'] == "Pendiente":
-                    estilo += "background-color: #fdebd0;" # Naranja claro
-                elif actividad['estado'] in ["En Diagnóstico", "Esperando Repuestos", "En Reparación"]:
-                    estilo += "background-color: #ebf5fb;" # Azul claro
-                elif actividad['estado'] in ["Reparado", "Entregado"]:
-                    estilo += "background-color: #d5f5e3;" # Verde claro
-                elif actividad['estado'] == "Cancelado":
-                    estilo += "background-color: #fadbd8;" # Rojo claro
-                else:
-                    estilo += "background-color: #f2f3f4;" # Gris claro
-            
-            # Crear etiqueta con la actividad y acción
-            accion_str = actividad.get('accion', 'Actualización')
-            texto_actividad = f"[{fecha_str}] {accion_str}: {actividad['descripcion']} - Estado: {actividad['estado']}"
-            actividad_label = QLabel(texto_actividad)
-            actividad_label.setStyleSheet(estilo)
-            actividad_label.setWordWrap(True)
+        """Muestra la actividad reciente en las etiquetas ya creadas"""
+        actividades = self.actividad.elementos()
+        self.no_actividad_label.setVisible(not actividades)
+        
+        for i, actividad_label in enumerate(self.actividad_labels):
+            if i >= len(actividades):
+                actividad_label.setVisible(False)
+                continue
             
-            self.actividad_container.addWidget(actividad_label)
+            # Solo se tocan las etiquetas cuyo contenido cambió
+            contenido = (_texto_actividad(actividades[i]), _estilo_actividad(actividades[i]))
+            if contenido != self._contenido_labels[i]:
+                texto, estilo = contenido
+                if self._contenido_labels[i] is None or estilo != self._contenido_labels[i][1]:
+                    actividad_label.setStyleSheet(estilo)
+                actividad_label.setText(texto)
+                self._contenido_labels[i] = contenido
+            actividad_label.setVisible(True)
     
     @pyqtSlot()
     def on_nuevo_camion(self):
@@ -379,39 +455,8 @@ class DashboardWidget(QWidget):
         Agrega una nueva actividad al historial
         
         Args:
-            tipo (str): 'camion' o 'reparacion'
-            objeto: Objeto camion o reparacion
+            tipo (str): 'camion', 'reparacion' o 'preventiva'
+            objeto: Objeto camion, reparacion o preventiva
             accion (str): Descripción de la acción realizada
         """
-        # Crear una nueva actividad
-        if tipo == 'camion':
-            actividad = {
-                'fecha': datetime.now(),
-                'tipo': 'camion',
-                'id': str(objeto.id),
-                'estado': objeto.estado,
-                'accion': accion,
-                'descripcion': f"{objeto.matricula} - {objeto.modelo}"
-            }
-        else:  # reparacion
-            actividad = {
-                'fecha': datetime.now(),
-                'tipo': 'reparacion',
-                'id': str(objeto.id),
-                'estado': objeto.estado,
-                'accion': accion,
-                'descripcion': f"{objeto.id_falla} - {objeto.motivo_falla[:30]}..."
-            }
-        
-        # Agregar al inicio de la lista de actividades
-        self.actividades_recientes.insert(0, actividad)
-        
-        # Limitar el número de actividades
-        if len(self.actividades_recientes) > self.max_actividades:
-            self.actividades_recientes = self.actividades_recientes[:self.max_actividades]
-        
-        # Actualizar la visualización
-        self.actualizar_actividad_reciente()
-        
-        # También actualizamos los conteos y datos
-        self.refresh_data()
\ No newline at end of file
+        self.agregar(Actividad.desde_objeto(tipo, objeto, accion))
@@ -6,11 +6,13 @@ Diálogo de inicio de sesión para la aplicación.
 """
 
 import logging
+import threading
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                             QLineEdit, QPushButton, QMessageBox, QFrame, QSpacerItem, QSizePolicy)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QPixmap, QFont
 from database.usuarios_dao import UsuariosDAO
+from database.query_runner import QueryRunner
 
 class LoginDialog(QDialog):
     """Diálogo de inicio de sesión"""
@@ -21,11 +23,27 @@ class LoginDialog(QDialog):
         
         self.usuarios_dao = UsuariosDAO()
         self.current_user = None
+        self.query_runner = QueryRunner(self)
         
-        # Crear el admin por defecto si no existe ninguno
-        self.usuarios_dao.crear_admin_default()
+        # Crear el admin por defecto si no existe ninguno. Se hace en segundo
+        # plano: en el primer arranque necesita la conexión al servidor
+        self._admin_comprobado = threading.Event()
+        self.query_runner.ejecutar('admin_default', self._crear_admin_default)
         
         self.setup_ui()
+    
+    def _crear_admin_default(self):
+        """Crea el admin por defecto (en segundo plano)"""
+        try:
+            return self.usuarios_dao.crear_admin_default()
+        finally:
+            self._admin_comprobado.set()
+    
+    def _autenticar(self, usuario, password):
+        """Autentica al usuario (en segundo plano)"""
+        # El admin por defecto tiene que existir antes de comprobar credenciales
+        self._admin_comprobado.wait()
+        return self.usuarios_dao.autenticar(usuario, password)
 
     def setup_ui(self):
         """Configura la interfaz de usuario"""
@@ -154,8 +172,17 @@ class LoginDialog(QDialog):
             )
             return
         
-        # Autenticar usuario
-        user = self.usuarios_dao.autenticar(usuario, password)
+        # Autenticar usuario sin bloquear el diálogo
+        self.login_button.setEnabled(False)
+        self.query_runner.ejecutar(
+            'autenticar', self._autenticar, usuario, password,
+            al_terminar=self._on_autenticado,
+            al_fallar=self._on_error_autenticacion
+        )
+    
+    def _on_autenticado(self, user):
+        """Recibe el resultado de la autenticación"""
+        self.login_button.setEnabled(True)
         if user:
             self.current_user = user
             self.accept()
@@ -167,6 +194,16 @@ class LoginDialog(QDialog):
             )
             self.password_input.clear()
             self.password_input.setFocus()
+    
+    def _on_error_autenticacion(self, mensaje):
+        """Muestra el error si la autenticación no pudo completarse"""
+        self.login_button.setEnabled(True)
+        logging.error(f"Error al autenticar: {mensaje}")
+        QMessageBox.critical(
+            self,
+            "Error",
+            f"No se pudo comprobar el usuario: {mensaje}"
+        )
 
     def get_current_user(self):
         """
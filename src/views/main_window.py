@@ -7,46 +7,94 @@ Ventana principal de la aplicación.
 
 import sys
 import os
+import importlib
 import logging
+import threading
 from PyQt5.QtWidgets import (QMainWindow, QTabWidget, QWidget, QVBoxLayout, 
                             QHBoxLayout, QAction, QToolBar, QStatusBar, QLabel, 
-                            QMessageBox, QFileDialog, QDesktopWidget, QPushButton)
+                            QMessageBox, QFileDialog, QDesktopWidget, QPushButton,
+                            QProgressDialog)
 from PyQt5.QtCore import Qt, QSize, QDateTime, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QIcon, QFont, QPixmap, QColor
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog, QPrintPreviewDialog
 
 from models.usuario import Usuario
-from controllers.reparacion_controller import ReparacionController
-from controllers.camion_controller import CamionController
-from controllers.mecanico_controller import MecanicoController
-from controllers.preventiva_controller import PreventivaController
-from views.camiones.lista_camiones import ListaCamionesWidget
-from views.mecanicos.lista_mecanicos import ListaMecanicosWidget
-from views.reparaciones.lista_reparaciones import ListaReparaciones
-from views.preventivas.lista_preventivas import ListaPreventivasWidget
-from views.dashboard import DashboardWidget
+from database.change_watcher import ChangeWatcher
+from database.eventos import BusEventos
+from database.camiones_dao import CamionesDAO
+from database.mecanicos_dao import MecanicosDAO
+from database.preventivas_dao import PreventivasDAO
+from database.reparaciones_dao import ReparacionesDAO
+from database.query_runner import QueryRunner
+from utils import arranque
 
 class MainWindow(QMainWindow):
     """Ventana principal de la aplicación"""
     
-    # Señal para notificar cambios en los datos
-    data_changed = pyqtSignal()
+    # Progreso de la importación en curso: (leídas, importadas, rechazadas, fracción)
+    # Se emite desde el hilo de la importación y se recibe en el de la interfaz
+    progreso_importacion = pyqtSignal(int, int, int, float)
     
-    def __init__(self, current_user=None, parent=None):
+    # Progreso de la exportación en curso: (filas escritas, total estimado)
+    progreso_exportacion = pyqtSignal(int, int)
+    
+    # Estado de la réplica local tras cada ciclo: (con conexión, cambios pendientes, conflictos)
+    estado_sincronizacion = pyqtSignal(bool, int, int)
+    
+    # Filtro del diálogo de guardar para la exportación comprimida
+    FILTRO_CSV_GZIP = "CSV comprimido (*.csv.gz)"
+    
+    # Pestañas de datos: (atributo, módulo, clase, título). El módulo se importa
+    # y el widget se crea la primera vez que se activa la pestaña
+    PESTANAS = (
+        ('dashboard', 'views.dashboard', 'DashboardWidget', "Panel de Control"),
+        ('camiones_widget', 'views.camiones.lista_camiones', 'ListaCamionesWidget', "Camiones"),
+        ('mecanicos_widget', 'views.mecanicos.lista_mecanicos', 'ListaMecanicosWidget', "Mecánicos"),
+        ('reparaciones_widget', 'views.reparaciones.lista_reparaciones', 'ListaReparaciones', "Reparaciones"),
+        ('preventivas_widget', 'views.preventivas.lista_preventivas', 'ListaPreventivasWidget', "Preventivas")
+    )
+    
+    def __init__(self, current_user=None, parent=None, sincronizador=None):
         """Inicializa la ventana principal"""
         super().__init__(parent)
         
         self.current_user = current_user
-        self.reparacion_controller = ReparacionController()
-        self.camion_controller = CamionController()
-        self.mecanico_controller = MecanicoController()
-        self.preventiva_controller = PreventivaController()
+        self.sincronizador = sincronizador
+        # Controladores, creados al usarse por primera vez
+        self._controladores = {}
+        self.query_runner = QueryRunner(self)
+        
+        # Bus de cambios: cada pestaña se suscribe a las entidades que muestra
+        self.eventos = BusEventos.instancia()
         
         self.setupUI()
         self.centerOnScreen()
         
         # Conectar señales para comunicación entre componentes
-        self.data_changed.connect(self.refresh_data)
+        self.progreso_importacion.connect(self._on_progreso_importacion)
+        self._dialogo_importacion = None
+        self.progreso_exportacion.connect(self._on_progreso_exportacion)
+        self._dialogo_exportacion = None
+        self._cancelacion_exportacion = threading.Event()
+        
+        # Los cambios hechos por otros usuarios se publican en el bus como los propios
+        self.change_watcher = ChangeWatcher(parent=self)
+        self.change_watcher.cambio_detectado.connect(self.eventos.publicar)
+        self.change_watcher.start()
+        
+        # Cambios y estado de la réplica local, recibidos desde el hilo del sincronizador
+        self.estado_sincronizacion.connect(self._on_estado_sincronizacion)
+        if self.sincronizador:
+            self.sincronizador.suscribir(
+                cambios=self.eventos.publicar,
+                estado=self.estado_sincronizacion.emit
+            )
+            self._on_estado_sincronizacion(self.sincronizador.en_linea,
+                                           self.sincronizador.replica.numero_pendientes(),
+                                           self.sincronizador.replica.numero_conflictos())
+        
+        # Completar los campos de búsqueda de los documentos anteriores a ellos
+        self.query_runner.ejecutar('reconstruir_busqueda', self._reconstruir_busqueda)
         
         # Mostrar mensaje de bienvenida
         if self.current_user:
@@ -89,6 +137,16 @@ class MainWindow(QMainWindow):
         self.setStatusBar(self.statusBar)
         self.statusBar.showMessage("Sistema listo")
         
+        # Estado de la conexión y de los cambios sin subir al servidor
+        self.etiqueta_sincronizacion = QLabel()
+        self.statusBar.addPermanentWidget(self.etiqueta_sincronizacion)
+        
+        # Conflictos de sincronización: el enlace abre la lista
+        self.etiqueta_conflictos = QLabel()
+        self.etiqueta_conflictos.linkActivated.connect(self.mostrar_conflictos)
+        self.etiqueta_conflictos.hide()
+        self.statusBar.addPermanentWidget(self.etiqueta_conflictos)
+        
         # Widget central con pestañas
         self.tabs = QTabWidget()
         self.tabs.setStyleSheet("""
@@ -106,56 +164,112 @@ class MainWindow(QMainWindow):
                 color: white;
             }
         """)
-        self.tabs.currentChanged.connect(self.on_tab_changed)
-        
-        # Pestaña del panel de control (dashboard)
-        self.dashboard = DashboardWidget(self.current_user, self)
-        self.tabs.addTab(self.dashboard, "Panel de Control")
-        
-        # Conectar los botones del dashboard con acciones en MainWindow
-        if hasattr(self.dashboard, 'nuevo_camion_btn'):
-            self.dashboard.nuevo_camion_btn.clicked.disconnect()
-            self.dashboard.nuevo_camion_btn.clicked.connect(self.on_new_truck)
-            
-        if hasattr(self.dashboard, 'nueva_reparacion_btn'):
-            self.dashboard.nueva_reparacion_btn.clicked.disconnect()
-            self.dashboard.nueva_reparacion_btn.clicked.connect(self.on_new_repair)
         
-        # Pestaña de camiones
-        self.camiones_widget = ListaCamionesWidget(self.current_user)
-        self.tabs.addTab(self.camiones_widget, "Camiones")
-        
-        # Conectar señales del widget de camiones
-        if hasattr(self.camiones_widget, 'camion_seleccionado'):
-            self.camiones_widget.camion_seleccionado.connect(self.on_camion_seleccionado)
-        
-        # Pestaña de mecánicos
-        self.mecanicos_widget = ListaMecanicosWidget(self.current_user)
-        self.tabs.addTab(self.mecanicos_widget, "Mecánicos")
-        
-        # Conectar señales del widget de mecánicos
-        if hasattr(self.mecanicos_widget, 'mecanico_seleccionado'):
-            self.mecanicos_widget.mecanico_seleccionado.connect(self.on_mecanico_seleccionado)
-        
-        # Pestaña de reparaciones
-        self.reparaciones_widget = ListaReparaciones(self.reparacion_controller)
-        self.tabs.addTab(self.reparaciones_widget, "Reparaciones")
-        
-        # Pestaña de preventivas
-        self.preventivas_widget = ListaPreventivasWidget(self.current_user)
-        self.tabs.addTab(self.preventivas_widget, "Preventivas")
-        
-        # Conectar señales del widget de preventivas
-        if hasattr(self.preventivas_widget, 'preventiva_seleccionada'):
-            self.preventivas_widget.preventiva_seleccionada.connect(self.on_preventiva_seleccionada)
+        # Pestañas de datos, vacías hasta que se activan por primera vez
+        for _, _, _, titulo in self.PESTANAS:
+            contenedor = QWidget()
+            layout = QVBoxLayout(contenedor)
+            layout.setContentsMargins(0, 0, 0, 0)
+            self.tabs.addTab(contenedor, titulo)
         
         # Si el usuario es administrador, añadir pestaña de administración
         if self.current_user and self.current_user.rol == Usuario.ROL_ADMIN:
             self.create_admin_tab()
         
+        # Solo se crea la pestaña visible (el panel de control)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        self._crear_pestana(self.tabs.currentIndex())
+        
         # Configurar el widget central
         self.setCentralWidget(self.tabs)
     
+    def _crear_pestana(self, index):
+        """
+        Importa el módulo de una pestaña de datos y crea su widget si aún no existe.
+        
+        Args:
+            index (int): Índice de la pestaña
+            
+        Returns:
+            QWidget: Widget de la pestaña, o None si no es una pestaña de datos
+        """
+        if not 0 <= index < len(self.PESTANAS):
+            return None
+        atributo, modulo, clase, _ = self.PESTANAS[index]
+        widget = getattr(self, atributo, None)
+        if widget is not None:
+            return widget
+        
+        try:
+            with arranque.fase(f"pestana_{atributo}"):
+                widget_class = getattr(importlib.import_module(modulo), clase)
+                if atributo == 'dashboard':
+                    widget = widget_class(self.current_user, self)
+                elif atributo == 'reparaciones_widget':
+                    widget = widget_class(self.reparacion_controller)
+                else:
+                    widget = widget_class(self.current_user)
+        except Exception as e:
+            logging.error(f"Error al crear la pestaña {atributo}: {str(e)}")
+            return None
+        
+        self.tabs.widget(index).layout().addWidget(widget)
+        setattr(self, atributo, widget)
+        self._conectar_pestana(widget)
+        return widget
+    
+    def _conectar_pestana(self, widget):
+        """Conecta las señales y botones de una pestaña recién creada"""
+        # Conectar los botones del dashboard con acciones en MainWindow
+        if hasattr(widget, 'nuevo_camion_btn'):
+            widget.nuevo_camion_btn.clicked.disconnect()
+            widget.nuevo_camion_btn.clicked.connect(self.on_new_truck)
+            
+        if hasattr(widget, 'nueva_reparacion_btn'):
+            widget.nueva_reparacion_btn.clicked.disconnect()
+            widget.nueva_reparacion_btn.clicked.connect(self.on_new_repair)
+        
+        # Conectar señales de selección de las listas
+        if hasattr(widget, 'camion_seleccionado'):
+            widget.camion_seleccionado.connect(self.on_camion_seleccionado)
+        if hasattr(widget, 'mecanico_seleccionado'):
+            widget.mecanico_seleccionado.connect(self.on_mecanico_seleccionado)
+        if hasattr(widget, 'preventiva_seleccionada'):
+            widget.preventiva_seleccionada.connect(self.on_preventiva_seleccionada)
+    
+    def _controlador(self, modulo, clase):
+        """Devuelve el controlador compartido de la clase, creándolo si hace falta"""
+        controlador = self._controladores.get(clase)
+        if controlador is None:
+            controlador = getattr(importlib.import_module(modulo), clase)()
+            self._controladores[clase] = controlador
+        return controlador
+    
+    @property
+    def reparacion_controller(self):
+        """Controlador de reparaciones (compartido con los diálogos de detalle)"""
+        controlador = self._controladores.get('ReparacionController')
+        if controlador is None:
+            clase = importlib.import_module('controllers.reparacion_controller').ReparacionController
+            controlador = clase.compartido()
+            self._controladores['ReparacionController'] = controlador
+        return controlador
+    
+    @property
+    def camion_controller(self):
+        """Controlador de camiones"""
+        return self._controlador('controllers.camion_controller', 'CamionController')
+    
+    @property
+    def mecanico_controller(self):
+        """Controlador de mecánicos"""
+        return self._controlador('controllers.mecanico_controller', 'MecanicoController')
+    
+    @property
+    def preventiva_controller(self):
+        """Controlador de preventivas"""
+        return self._controlador('controllers.preventiva_controller', 'PreventivaController')
+    
     def create_admin_tab(self):
         """Crea la pestaña de administración"""
         admin_widget = QWidget()
@@ -201,6 +315,11 @@ class MainWindow(QMainWindow):
         
         file_menu.addSeparator()
         
+        import_action = QAction("I&mportar Datos", self)
+        import_action.setStatusTip("Importar datos desde un archivo CSV")
+        import_action.triggered.connect(self.import_data)
+        file_menu.addAction(import_action)
+        
         export_action = QAction("&Exportar Datos", self)
         export_action.setStatusTip("Exportar datos a un archivo CSV")
         export_action.triggered.connect(self.export_data)
@@ -312,20 +431,7 @@ class MainWindow(QMainWindow):
         
         dialog = FormCamionDialog(parent=self)
         if dialog.exec_():
-            # Notificar cambio en los datos
-            self.data_changed.emit()
-            
-            # Registrar actividad en el dashboard
-            if hasattr(self, 'dashboard') and hasattr(self.dashboard, 'agregar_actividad'):
-                # Obtener el camión recién creado
-                try:
-                    nuevos_camiones = self.camiones_widget.camiones_dao.obtener_todos()
-                    if nuevos_camiones:
-                        nuevo_camion = nuevos_camiones[-1]  # Asumiendo que el último es el recién creado
-                        self.dashboard.agregar_actividad('camion', nuevo_camion, "Nuevo camión creado")
-                except Exception as e:
-                    logging.error(f"Error al registrar actividad de nuevo camión: {str(e)}")
-            
+            # El dashboard recibe la inserción por el bus de eventos
             self.statusBar.showMessage("Nuevo camión registrado correctamente", 3000)
 
     @pyqtSlot()
@@ -335,8 +441,6 @@ class MainWindow(QMainWindow):
         
         dialog = FormMecanicoDialog(parent=self)
         if dialog.exec_():
-            # Notificar cambio en los datos
-            self.data_changed.emit()
             self.statusBar.showMessage("Nuevo mecánico registrado correctamente", 3000)
     
     @pyqtSlot()
@@ -345,17 +449,13 @@ class MainWindow(QMainWindow):
         from views.reparaciones.form_reparacion import FormReparaciones        
         dialog = FormReparaciones(self.reparacion_controller, parent=self)
         if dialog.exec_():
-            # Notificar cambio en los datos
-            self.data_changed.emit()
-            
             # Registrar actividad en el dashboard
             if hasattr(self, 'dashboard') and hasattr(self.dashboard, 'agregar_actividad'):
                 try:
-                    # Obtener la reparación recién creada
-                    nuevas_reparaciones = self.reparacion_controller.obtener_todas_reparaciones()
-                    if nuevas_reparaciones:
-                        nueva_reparacion = nuevas_reparaciones[-1]  # Asumiendo que la última es la recién creada
-                        
+                    # Obtener la reparación recién creada (la del último ID asignado)
+                    controller = self.reparacion_controller
+                    nueva_reparacion = controller.obtener_reparacion(controller.ultimo_id)
+                    if nueva_reparacion:
                         # Crear un objeto Reparacion básico con los datos mínimos necesarios
                         from models.reparacion import Reparacion
                         from bson import ObjectId
@@ -383,73 +483,99 @@ class MainWindow(QMainWindow):
         
         dialog = FormPreventivaDialog(parent=self)
         if dialog.exec_():
-            # Notificar cambio en los datos
-            self.data_changed.emit()
-            
-            # Registrar actividad en el dashboard
-            if hasattr(self, 'dashboard') and hasattr(self.dashboard, 'agregar_actividad'):
-                try:
-                    # Obtener la preventiva recién creada
-                    nuevas_preventivas = self.preventivas_widget.preventivas_dao.obtener_todas()
-                    if nuevas_preventivas:
-                        nueva_preventiva = nuevas_preventivas[-1]  # Asumiendo que la última es la recién creada
-                        self.dashboard.agregar_actividad('preventiva', nueva_preventiva, "Nueva tarea preventiva creada")
-                except Exception as e:
-                    logging.error(f"Error al registrar actividad de nueva preventiva: {str(e)}")
-            
             self.statusBar.showMessage("Nueva tarea preventiva registrada correctamente", 3000)
 
+    def _reconstruir_busqueda(self):
+        """Calcula los campos de búsqueda de los documentos que no los tienen"""
+        for dao in (CamionesDAO, MecanicosDAO, ReparacionesDAO, PreventivasDAO):
+            dao().reconstruir_busqueda()
+    
     @pyqtSlot()
     def refresh_data(self):
-        """Actualiza los datos en todas las pestañas"""
-        if hasattr(self, 'dashboard') and hasattr(self.dashboard, 'refresh_data'):
-            self.dashboard.refresh_data()
-        
-        camiones_widget_names = ['camiones_widget', 'camionesWidget', 'lista_camiones']
-        for widget_name in camiones_widget_names:
-            if hasattr(self, widget_name):
-                widget = getattr(self, widget_name)
-                if hasattr(widget, 'refresh_data'):
-                    widget.refresh_data()
-                break
-        
-        # Actualizar mecánicos
-        mecanicos_widget_names = ['mecanicos_widget', 'mecanicosWidget', 'lista_mecanicos']
-        for widget_name in mecanicos_widget_names:
-            if hasattr(self, widget_name):
-                widget = getattr(self, widget_name)
-                if hasattr(widget, 'refresh_data'):
-                    widget.refresh_data()
-                break
-        
-        reparaciones_widget_names = ['reparaciones_widget', 'reparacionesWidget', 'lista_reparaciones']
-        for widget_name in reparaciones_widget_names:
-            if hasattr(self, widget_name):
-                widget = getattr(self, widget_name)
-                if hasattr(widget, 'cargarReparaciones'):
-                    widget.cargarReparaciones()
-                break
-        
-        # Actualizar preventivas
-        preventivas_widget_names = ['preventivas_widget', 'preventivasWidget', 'lista_preventivas']
-        for widget_name in preventivas_widget_names:
-            if hasattr(self, widget_name):
-                widget = getattr(self, widget_name)
-                if hasattr(widget, 'refresh_data'):
-                    widget.refresh_data()
-                break
+        """
+        Recarga a petición del usuario los datos de la pestaña visible.
+        
+        Los cambios en los datos no pasan por aquí: cada pestaña recibe del
+        bus de eventos los de las entidades que muestra.
+        """
+        widget = self._widget_actual()
+        if widget is not None:
+            self._refrescar_widget(widget)
     
     @pyqtSlot(int)
     def on_tab_changed(self, index):
         """Maneja el evento de cambio de pestaña"""
-        # Actualizar datos cuando se cambia de pestaña
-        self.refresh_data()
+        # La primera vez se crea la pestaña; los cambios recibidos mientras
+        # estaba oculta los aplica la propia pestaña al mostrarse
+        self._crear_pestana(index)
+    
+    def _on_estado_sincronizacion(self, en_linea, pendientes, conflictos):
+        """
+        Muestra en la barra de estado si hay conexión, los cambios pendientes
+        y los conflictos
+        
+        Args:
+            en_linea (bool): Si el último ciclo de sincronización tuvo conexión
+            pendientes (int): Cambios locales aún no subidos al servidor
+            conflictos (int): Cambios locales descartados por un conflicto
+        """
+        texto = "En línea" if en_linea else "Sin conexión (réplica local)"
+        if pendientes:
+            texto += f" · {pendientes} cambios pendientes"
+        self.etiqueta_sincronizacion.setText(texto)
+        
+        self.etiqueta_conflictos.setText(
+            f'<a href="conflictos" style="color: #c0392b;">'
+            f'{conflictos} {"conflicto" if conflictos == 1 else "conflictos"}</a>'
+        )
+        self.etiqueta_conflictos.setVisible(conflictos > 0)
+    
+    def mostrar_conflictos(self, _enlace=None):
+        """Abre la lista de conflictos de sincronización"""
+        if not self.sincronizador:
+            return
+        from views.widgets.dialogo_conflictos import DialogoConflictos
+        replica = self.sincronizador.replica
+        DialogoConflictos(replica, self).exec_()
+        self._on_estado_sincronizacion(self.sincronizador.en_linea, replica.numero_pendientes(),
+                                       replica.numero_conflictos())
+    
+    def _widget_actual(self):
+        """Widget de la pestaña de datos visible, o None"""
+        index = self.tabs.currentIndex()
+        if 0 <= index < len(self.PESTANAS):
+            return getattr(self, self.PESTANAS[index][0], None)
+        return None
+    
+    def _refrescar_widget(self, widget):
+        """Vuelve a cargar los datos de una pestaña"""
+        try:
+            if hasattr(widget, 'refresh_data'):
+                widget.refresh_data()
+            elif hasattr(widget, 'cargarReparaciones'):
+                widget.cargarReparaciones()
+        except Exception as e:
+            logging.error(f"Error al refrescar la pestaña: {str(e)}")
+    
+    def closeEvent(self, event):
+        """Detiene el observador de cambios y las consultas al cerrar la ventana"""
+        if hasattr(self, 'change_watcher'):
+            self.change_watcher.detener()
+        
+        # Una exportación en marcha se detiene en el siguiente lote
+        self._cancelacion_exportacion.set()
+        
+        # Descartar las consultas en cola y esperar a las que están en marcha
+        QueryRunner.pool().clear()
+        QueryRunner.pool().waitForDone(3000)
+        
+        # Cerrar el diario de reparaciones tras la última compactación
+        if 'ReparacionController' in self._controladores:
+            importlib.import_module('controllers.reparacion_controller').ReparacionController.cerrar_compartidos()
+        super().closeEvent(event)
     
     def on_camion_actualizado(self, camion):
         """Maneja el evento de actualización de un camión"""
-        # Notificar cambio en los datos
-        self.data_changed.emit()
-        
         # Registrar actividad en el dashboard
         if hasattr(self, 'dashboard') and hasattr(self.dashboard, 'agregar_actividad'):
             self.dashboard.agregar_actividad('camion', camion, "Camión actualizado")
@@ -458,9 +584,6 @@ class MainWindow(QMainWindow):
 
     def on_reparacion_actualizada(self, reparacion):
         """Maneja el evento de actualización de una reparación"""
-        # Notificar cambio en los datos
-        self.data_changed.emit()
-        
         # Registrar actividad en el dashboard
         if hasattr(self, 'dashboard') and hasattr(self.dashboard, 'agregar_actividad'):
             self.dashboard.agregar_actividad('reparacion', reparacion, "Reparación actualizada")
@@ -469,9 +592,6 @@ class MainWindow(QMainWindow):
     
     def on_preventiva_actualizada(self, preventiva):
         """Maneja el evento de actualización de una preventiva"""
-        # Notificar cambio en los datos
-        self.data_changed.emit()
-        
         # Registrar actividad en el dashboard
         if hasattr(self, 'dashboard') and hasattr(self.dashboard, 'agregar_actividad'):
             self.dashboard.agregar_actividad('preventiva', preventiva, "Preventiva actualizada")
@@ -496,6 +616,95 @@ class MainWindow(QMainWindow):
         if preventiva:
             self.statusBar.showMessage(f"Preventiva seleccionada: {preventiva.matricula} ({preventiva.tipo})", 3000)
     
+    def import_data(self):
+        """Importa datos desde un archivo CSV a la pestaña actual"""
+        current_index = self.tabs.currentIndex()
+        
+        if current_index == 1:  # Pestaña de camiones
+            self._importar_csv("Camiones", self.camion_controller)
+        elif current_index == 2:  # Pestaña de mecánicos
+            self._importar_csv("Mecánicos", self.mecanico_controller)
+        elif current_index == 4:  # Pestaña de preventivas
+            self._importar_csv("Preventivas", self.preventiva_controller)
+        else:
+            QMessageBox.information(
+                self,
+                "Importar Datos",
+                "Por favor, seleccione la pestaña de Camiones, Mecánicos o Preventivas para importar datos."
+            )
+    
+    def _importar_csv(self, titulo, controller):
+        """
+        Importa un CSV en segundo plano mostrando el progreso
+        
+        Args:
+            titulo (str): Nombre de los datos para los mensajes
+            controller: Controlador con el método importar_desde_csv
+        """
+        if self.query_runner.en_curso('importar'):
+            QMessageBox.information(self, "Importar Datos", "Ya hay una importación en curso.")
+            return
+        
+        filename, _ = QFileDialog.getOpenFileName(
+            self,
+            f"Importar Datos de {titulo}",
+            "",
+            "Archivos CSV (*.csv);;Todos los archivos (*)"
+        )
+        if not filename:
+            return
+        
+        # Sin botón de cancelar: los lotes ya escritos no se deshacen
+        self._dialogo_importacion = QProgressDialog(f"Importando {titulo.lower()}...", None, 0, 100, self)
+        self._dialogo_importacion.setWindowTitle("Importar Datos")
+        self._dialogo_importacion.setWindowModality(Qt.WindowModal)
+        self._dialogo_importacion.setMinimumDuration(0)
+        self._dialogo_importacion.setValue(0)
+        
+        self.query_runner.ejecutar(
+            'importar',
+            controller.importar_desde_csv,
+            filename,
+            progreso=self.progreso_importacion.emit,
+            al_terminar=self._importacion_terminada,
+            al_fallar=self._importacion_fallida
+        )
+    
+    @pyqtSlot(int, int, int, float)
+    def _on_progreso_importacion(self, leidas, importadas, rechazadas, fraccion):
+        """Actualiza el diálogo de progreso de la importación"""
+        if self._dialogo_importacion is None:
+            return
+        self._dialogo_importacion.setValue(min(99, int(fraccion * 100)))
+        self._dialogo_importacion.setLabelText(
+            f"Filas leídas: {leidas}\nImportadas: {importadas}\nRechazadas: {rechazadas}"
+        )
+    
+    def _cerrar_dialogo_importacion(self):
+        """Cierra el diálogo de progreso de la importación"""
+        if self._dialogo_importacion is not None:
+            self._dialogo_importacion.close()
+            self._dialogo_importacion.deleteLater()
+            self._dialogo_importacion = None
+    
+    def _importacion_terminada(self, resumen):
+        """Muestra el resumen de la importación (la pestaña se recarga con el cambio publicado)"""
+        self._cerrar_dialogo_importacion()
+        
+        mensaje = (
+            f"Filas leídas: {resumen['leidas']}\n"
+            f"Importadas: {resumen['importadas']}\n"
+            f"Rechazadas: {resumen['rechazadas']}"
+        )
+        if resumen['ruta_rechazos']:
+            mensaje += f"\n\nLas filas rechazadas y su motivo están en:\n{resumen['ruta_rechazos']}"
+        QMessageBox.information(self, "Importar Datos", mensaje)
+    
+    def _importacion_fallida(self, mensaje):
+        """Informa de un error que ha detenido la importación"""
+        self._cerrar_dialogo_importacion()
+        QMessageBox.critical(self, "Error", f"Error al importar datos: {mensaje}")
+    
     def export_data(self):
         """Exporta los datos a un archivo CSV"""
         current_index = self.tabs.currentIndex()
@@ -517,103 +726,102 @@ class MainWindow(QMainWindow):
     
     def export_trucks_data(self):
         """Exporta los datos de camiones a un archivo CSV"""
-        filename, _ = QFileDialog.getSaveFileName(
-            self, 
-            "Exportar Datos de Camiones", 
-            "", 
-            "Archivos CSV (*.csv);;Todos los archivos (*)"
-        )
-        
-        if filename:
-            try:
-                # Implementar la exportación de datos de camiones
-                self.camion_controller.exportar_a_csv(filename)
-                QMessageBox.information(
-                    self,
-                    "Exportar Datos",
-                    f"Los datos se han exportado correctamente a: {filename}"
-                )
-            except Exception as e:
-                QMessageBox.critical(
-                    self,
-                    "Error",
-                    f"Error al exportar datos: {str(e)}"
-                )
+        self._exportar_csv("Camiones", self.camion_controller)
     
     def export_mechanics_data(self):
         """Exporta los datos de mecánicos a un archivo CSV"""
-        filename, _ = QFileDialog.getSaveFileName(
-            self, 
-            "Exportar Datos de Mecánicos", 
-            "", 
-            "Archivos CSV (*.csv);;Todos los archivos (*)"
-        )
-        
-        if filename:
-            try:
-                # Implementar la exportación de datos de mecánicos
-                self.mecanico_controller.exportar_a_csv(filename)
-                QMessageBox.information(
-                    self,
-                    "Exportar Datos",
-                    f"Los datos se han exportado correctamente a: {filename}"
-                )
-            except Exception as e:
-                QMessageBox.critical(
-                    self,
-                    "Error",
-                    f"Error al exportar datos: {str(e)}"
-                )
+        self._exportar_csv("Mecánicos", self.mecanico_controller)
     
     def export_repairs_data(self):
         """Exporta los datos de reparaciones a un archivo CSV"""
-        filename, _ = QFileDialog.getSaveFileName(
-            self, 
-            "Exportar Datos de Reparaciones", 
-            "", 
-            "Archivos CSV (*.csv);;Todos los archivos (*)"
-        )
-        
-        if filename:
-            try:
-                # Implementar la exportación de datos de reparaciones
-                self.reparacion_controller.exportar_a_csv(filename)
-                QMessageBox.information(
-                    self,
-                    "Exportar Datos",
-                    f"Los datos se han exportado correctamente a: {filename}"
-                )
-            except Exception as e:
-                QMessageBox.critical(
-                    self,
-                    "Error",
-                    f"Error al exportar datos: {str(e)}"
-                )
+        self._exportar_csv("Reparaciones", self.reparacion_controller)
     
     def export_preventivas_data(self):
         """Exporta los datos de preventivas a un archivo CSV"""
-        filename, _ = QFileDialog.getSaveFileName(
+        self._exportar_csv("Preventivas", self.preventiva_controller)
+    
+    def _exportar_csv(self, titulo, controller):
+        """
+        Exporta a CSV en segundo plano con progreso y opción de cancelar
+        
+        Args:
+            titulo (str): Nombre de los datos para los mensajes
+            controller: Controlador con el método exportar_a_csv
+        """
+        if self.query_runner.en_curso('exportar'):
+            QMessageBox.information(self, "Exportar Datos", "Ya hay una exportación en curso.")
+            return
+        
+        filename, filtro = QFileDialog.getSaveFileName(
             self, 
-            "Exportar Datos de Preventivas", 
+            f"Exportar Datos de {titulo}", 
             "", 
-            "Archivos CSV (*.csv);;Todos los archivos (*)"
+            f"Archivos CSV (*.csv);;{self.FILTRO_CSV_GZIP};;Todos los archivos (*)"
+        )
+        if not filename:
+            return
+        if filtro == self.FILTRO_CSV_GZIP and not filename.endswith('.gz'):
+            filename += '.gz'
+        
+        self._cancelacion_exportacion = threading.Event()
+        self._dialogo_exportacion = QProgressDialog(
+            f"Exportando {titulo.lower()}...", "Cancelar", 0, 100, self)
+        self._dialogo_exportacion.setWindowTitle("Exportar Datos")
+        self._dialogo_exportacion.setWindowModality(Qt.WindowModal)
+        self._dialogo_exportacion.setMinimumDuration(500)
+        self._dialogo_exportacion.canceled.connect(self._cancelacion_exportacion.set)
+        
+        self.query_runner.ejecutar(
+            'exportar',
+            controller.exportar_a_csv,
+            filename,
+            progreso=self.progreso_exportacion.emit,
+            cancelacion=self._cancelacion_exportacion,
+            al_terminar=lambda resumen: self._exportacion_terminada(resumen, filename),
+            al_fallar=self._exportacion_fallida
+        )
+    
+    @pyqtSlot(int, int)
+    def _on_progreso_exportacion(self, escritas, total):
+        """Actualiza el diálogo de progreso de la exportación"""
+        if self._dialogo_exportacion is None or self._cancelacion_exportacion.is_set():
+            return
+        if total:
+            self._dialogo_exportacion.setValue(min(99, escritas * 100 // total))
+        self._dialogo_exportacion.setLabelText(f"Filas exportadas: {escritas}")
+    
+    def _cerrar_dialogo_exportacion(self):
+        """Cierra el diálogo de progreso de la exportación"""
+        if self._dialogo_exportacion is not None:
+            # Cerrar el diálogo emite canceled: se desconecta antes
+            self._dialogo_exportacion.canceled.disconnect()
+            self._dialogo_exportacion.close()
+            self._dialogo_exportacion.deleteLater()
+            self._dialogo_exportacion = None
+    
+    def _exportacion_terminada(self, resumen, filename):
+        """Informa del resultado de la exportación"""
+        self._cerrar_dialogo_exportacion()
+        
+        if not resumen:
+            self._exportacion_fallida("no se pudo escribir el archivo")
+        elif resumen['cancelada']:
+            self.statusBar.showMessage("Exportación cancelada", 3000)
+        else:
+            QMessageBox.information(
+                self,
+                "Exportar Datos",
+                f"Se han exportado {resumen['filas']} registros a: {filename}"
+            )
+    
+    def _exportacion_fallida(self, mensaje):
+        """Informa de un error que ha detenido la exportación"""
+        self._cerrar_dialogo_exportacion()
+        QMessageBox.critical(
+            self,
+            "Error",
+            f"Error al exportar datos: {mensaje}"
         )
-        
-        if filename:
-            try:
-                # Implementar la exportación de datos de preventivas
-                self.preventiva_controller.exportar_a_csv(filename)
-                QMessageBox.information(
-                    self,
-                    "Exportar Datos",
-                    f"Los datos se han exportado correctamente a: {filename}"
-                )
-            except Exception as e:
-                QMessageBox.critical(
-                    self,
-                    "Error",
-                    f"Error al exportar datos: {str(e)}"
-                )
     
     def print_list(self):
         """Imprime la lista actual"""
@@ -625,30 +833,14 @@ class MainWindow(QMainWindow):
     def handle_print_request(self, printer):
         """Maneja la solicitud de impresión"""
         current_index = self.tabs.currentIndex()
-        
-        if current_index == 1:  # Pestaña de camiones
-            # Si el widget de camiones implementa una función para imprimir
-            if hasattr(self.camiones_widget, 'print_data'):
-                self.camiones_widget.print_data(printer)
-            else:
-                self.statusBar.showMessage("La funcionalidad de impresión para camiones no está implementada", 3000)
-        elif current_index == 2:  # Pestaña de mecánicos
-            # Si el widget de mecánicos implementa una función para imprimir
-            if hasattr(self.mecanicos_widget, 'print_data'):
-                self.mecanicos_widget.print_data(printer)
-            else:
-                self.statusBar.showMessage("La funcionalidad de impresión para mecánicos no está implementada", 3000)
-        elif current_index == 3:  # Pestaña de reparaciones
-            # Si el widget de reparaciones implementa una función para imprimir
-            if hasattr(self.reparaciones_widget, 'print_data'):
-                self.reparaciones_widget.print_data(printer)
-            else:
-                self.statusBar.showMessage("La funcionalidad de impresión para reparaciones no está implementada", 3000)
-        elif current_index == 4:  # Pestaña de preventivas
-            # Si el widget de preventivas implementa una función para imprimir
-            if hasattr(self.preventivas_widget, 'print_data'):
-                self.preventivas_widget.print_data(printer)
-            else:
-                self.statusBar.showMessage("La funcionalidad de impresión para preventivas no está implementada", 3000)
+        # Las pestañas se crean al mostrarse: se usa solo la que existe
+        widget = self._widget_actual()
+        
+        if current_index == 0 or widget is None:
+            self.statusBar.showMessage("No hay datos para imprimir en esta pestaña", 3000)
+        elif hasattr(widget, 'print_data'):
+            # Si el widget de la pestaña implementa una función para imprimir
+            widget.print_data(printer)
         else:
-            self.statusBar.showMessage("No hay datos para imprimir en esta pestaña", 3000)
\ No newline at end of file
+            nombre = self.PESTANAS[current_index][3].lower()
+            self.statusBar.showMessage(f"La funcionalidad de impresión para {nombre} no está implementada", 3000)
\ No newline at end of file
@@ -1,21 +1,34 @@
 import logging
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                            QTableWidgetItem, QPushButton, QLabel, QLineEdit,
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, 
+                            QPushButton, QLabel, QLineEdit,
                             QComboBox, QHeaderView, QMessageBox, QMenu)
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
-from PyQt5.QtGui import QColor, QBrush, QFont
+from PyQt5.QtGui import QColor, QFont
 
 from database.mecanicos_dao import MecanicosDAO
+from database.eventos import ELIMINACION
+from database.query_runner import QueryRunner
+from database.paginacion import TAMANO_PAGINA
 from models.mecanico import Mecanico
 from models.usuario import Usuario
 from views.mecanicos.detalle_mecanico import DetalleMecanicoDialog
 from views.mecanicos.form_mecanico import FormMecanicoDialog
+from views.widgets.receptor_cambios import ReceptorCambios
+from views.widgets.table_models import Columna, EntityTableModel, FiltroProxyModel
+
+# Colores de fondo según la actividad
+COLORES_ACTIVIDAD = {
+    Mecanico.ACTIVIDAD_SIN_ACTIVIDAD: QColor(200, 255, 200),  # Verde claro
+    Mecanico.ACTIVIDAD_REPARACION: QColor(255, 200, 200),  # Rojo claro
+    Mecanico.ACTIVIDAD_MANTENIMIENTO: QColor(255, 230, 180)  # Naranja claro
+}
 
 class ListaMecanicosWidget(QWidget):
     """Widget para mostrar y gestionar la lista de mecánicos"""
     
     # Señales
-    mecanico_seleccionado = pyqtSignal(Mecanico)
+    # Emitida con la fila (FilaMecanico) seleccionada
+    mecanico_seleccionado = pyqtSignal(object)
     
     def __init__(self, current_user=None, parent=None):
         """Inicializa el widget de lista de mecánicos"""
@@ -23,9 +36,16 @@ class ListaMecanicosWidget(QWidget):
         
         self.current_user = current_user
         self.mecanicos_dao = MecanicosDAO()
+        self.query_runner = QueryRunner(self)
+        self.query_runner.cargando.connect(self.on_cargando)
         self.mecanicos = []
+        self._siguiente_pagina = None
         
         self.setup_ui()
+        
+        # Cambios publicados por otras vistas, otros usuarios o la sincronización
+        self.receptor = ReceptorCambios(self, ('mecanicos',), self.refresh_data, self.aplicar_cambio)
+        
         self.refresh_data()
     
     def setup_ui(self):
@@ -90,14 +110,31 @@ class ListaMecanicosWidget(QWidget):
         
         main_layout.addLayout(action_layout)
         
+        # Modelo de datos de la tabla
+        self.model = EntityTableModel([
+            Columna("ID", lambda m: m.id),
+            Columna("Nombre", lambda m: m.nombre),
+            Columna("Apellidos", lambda m: m.apellidos),
+            Columna("Actividad", lambda m: m.actividad, fondo=lambda m: COLORES_ACTIVIDAD.get(m.actividad))
+        ], clave=lambda m: m.id, parent=self)
+        
+        # Proxy para ordenar y filtrar sin reconstruir la tabla
+        self.proxy = FiltroProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        
+        # Cargar la siguiente página al llegar al final de la tabla
+        self.model.mas_filas_solicitadas.connect(self.cargar_mas)
+        
         # Tabla de mecánicos
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["ID", "Nombre", "Apellidos", "Actividad"])
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.AscendingOrder)
+        self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.setAlternatingRowColors(True)
         self.table.doubleClicked.connect(self.on_table_double_clicked)
         self.table.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -117,7 +154,7 @@ class ListaMecanicosWidget(QWidget):
             self.delete_button.setEnabled(False)
         
         # Conectar señal de selección
-        self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
         # Etiqueta de información
         self.info_label = QLabel("Haga doble clic en un mecánico para ver sus detalles")
@@ -129,83 +166,170 @@ class ListaMecanicosWidget(QWidget):
         main_layout.setSpacing(10)
     
     def refresh_data(self):
-        """Actualiza los datos de la tabla"""
-        self.mecanicos = self.mecanicos_dao.obtener_todos()
-        self.populate_table(self.mecanicos)
-    
-    def populate_table(self, mecanicos):
-        """Rellena la tabla con los datos de los mecánicos"""
-        self.table.setRowCount(0)
-        
-        for mecanico in mecanicos:
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
-            
-            # ID
-            item_id = QTableWidgetItem(str(mecanico.id))
-            item_id.setData(Qt.UserRole, mecanico.id)
-            self.table.setItem(row_position, 0, item_id)
-            
-            # Nombre
-            self.table.setItem(row_position, 1, QTableWidgetItem(mecanico.nombre))
-            
-            # Apellidos
-            self.table.setItem(row_position, 2, QTableWidgetItem(mecanico.apellidos))
-            
-            # Actividad
-            item_actividad = QTableWidgetItem(mecanico.actividad)
-            
-            # Colorear según la actividad
-            if mecanico.actividad == Mecanico.ACTIVIDAD_SIN_ACTIVIDAD:
-                item_actividad.setBackground(QBrush(QColor(200, 255, 200)))  # Verde claro
-            elif mecanico.actividad == Mecanico.ACTIVIDAD_REPARACION:
-                item_actividad.setBackground(QBrush(QColor(255, 200, 200)))  # Rojo claro
-            elif mecanico.actividad == Mecanico.ACTIVIDAD_MANTENIMIENTO:
-                item_actividad.setBackground(QBrush(QColor(255, 230, 180)))  # Naranja claro
-            
-            self.table.setItem(row_position, 3, item_actividad)
-        
-        self.info_label.setText(f"Total: {len(mecanicos)} mecánicos")
+        """Recarga en segundo plano las filas ya cargadas (al menos una página)"""
+        self._cargar_primera_pagina(max(TAMANO_PAGINA, self.model.rowCount()))
     
-
-
-
-    def apply_filters(self):
-        """Aplica los filtros a la tabla"""
-        nombre_filter = self.nombre_filter.text().strip().lower()
-        actividad_filter = self.actividad_filter.currentData()
-        
-        filtered_mecanicos = []
+    def _filtros(self):
+        """Devuelve los filtros de la lista para la consulta al servidor"""
+        return {
+            'texto': self.nombre_filter.text().strip(),
+            'actividad': self.actividad_filter.currentData()
+        }
+    
+    def _cargar_primera_pagina(self, tamano=TAMANO_PAGINA, retardo_ms=0):
+        """
+        Consulta la primera página con los filtros actuales.
+        
+        Args:
+            tamano (int, optional): Número de filas a cargar
+            retardo_ms (int, optional): Espera para agrupar cambios seguidos de los filtros
+        """
+        # Una página siguiente pedida con los datos anteriores ya no sirve
+        self.query_runner.cancelar('mecanicos_mas')
+        self.query_runner.ejecutar(
+            'mecanicos',
+            self.mecanicos_dao.buscar_filas,
+            self._filtros(),
+            None,
+            tamano,
+            al_terminar=self.populate_table,
+            retardo_ms=retardo_ms
+        )
+    
+    def cargar_mas(self):
+        """Carga en segundo plano la siguiente página de mecánicos"""
+        if not self._siguiente_pagina:
+            self.model.establecer_hay_mas(False)
+            return
         
-        for mecanico in self.mecanicos:
-            # Filtrar por nombre
-            if nombre_filter and nombre_filter not in mecanico.nombre.lower() and nombre_filter not in mecanico.apellidos.lower():
-                continue
-            
-            # Filtrar por actividad
-            if actividad_filter and mecanico.actividad != actividad_filter:
-                continue
-            
-            filtered_mecanicos.append(mecanico)
+        self.query_runner.ejecutar(
+            'mecanicos_mas',
+            self.mecanicos_dao.buscar_filas,
+            self._filtros(),
+            self._siguiente_pagina,
+            TAMANO_PAGINA,
+            al_terminar=self.anadir_pagina,
+            al_fallar=lambda mensaje: self.model.establecer_hay_mas(False)
+        )
+    
+    def on_cargando(self, clave, cargando):
+        """Muestra el estado de carga mientras hay una consulta en curso"""
+        if clave != 'mecanicos':
+            return
+        if cargando:
+            self.info_label.setText("Cargando mecánicos...")
+        else:
+            self.actualizar_info()
+    
+    def populate_table(self, pagina):
+        """Carga la primera página en el modelo de la tabla aplicando solo los cambios"""
+        self._siguiente_pagina = pagina.siguiente
+        self.model.establecer_filas(pagina.elementos)
+        self.model.establecer_hay_mas(pagina.hay_mas)
+        self.mecanicos = self.model.filas()
+        self.actualizar_info()
+    
+    def anadir_pagina(self, pagina):
+        """Añade al final de la tabla una página siguiente"""
+        self._siguiente_pagina = pagina.siguiente
+        self.model.anadir_filas(pagina.elementos, pagina.hay_mas)
+        self.mecanicos = self.model.filas()
+        self.actualizar_info()
+    
+    def actualizar_info(self):
+        """Actualiza la etiqueta con el número de mecánicos cargados"""
+        if self.model.hay_mas():
+            self.info_label.setText(
+                f"Mostrando {self.proxy.rowCount()} mecánicos (desplácese para cargar más)"
+            )
+        else:
+            self.info_label.setText(f"Total: {self.proxy.rowCount()} mecánicos")
+    
+    def aplicar_cambio(self, cambio):
+        """
+        Actualiza en segundo plano solo la fila del documento que cambió.
+        
+        Args:
+            cambio (CambioEntidad): Cambio recibido del bus de eventos
+        """
+        if cambio.tipo == ELIMINACION:
+            self.quitar_fila(cambio.id)
+            return
         
-        self.populate_table(filtered_mecanicos)
+        self.query_runner.ejecutar(
+            f'fila:{cambio.id}',
+            self.mecanicos_dao.obtener_fila,
+            cambio.id, self._filtros(),
+            al_terminar=lambda fila: self.actualizar_fila(cambio.id, fila)
+        )
+    
+    def actualizar_fila(self, mecanico_id, fila):
+        """Sustituye la fila del mecánico, o la quita si ya no existe o no cumple los filtros"""
+        if fila is None:
+            self.quitar_fila(mecanico_id)
+            return
+        self.model.actualizar_fila(fila)
+        self.mecanicos = self.model.filas()
+        self.actualizar_info()
+    
+    def quitar_fila(self, mecanico_id):
+        """Quita de la tabla la fila del mecánico"""
+        if self.model.eliminar_clave(mecanico_id):
+            self.mecanicos = self.model.filas()
+            self.actualizar_info()
+    
+    def apply_filters(self):
+        """Aplica los filtros consultando de nuevo al servidor"""
+        # El retardo agrupa las pulsaciones seguidas en una sola consulta
+        self._cargar_primera_pagina(retardo_ms=300)
     
     def clear_filters(self):
         """Limpia los filtros"""
         self.nombre_filter.clear()
         self.actividad_filter.setCurrentIndex(0)
-        self.populate_table(self.mecanicos)
+        self.apply_filters()
     
     def get_selected_mecanico(self):
-        """Obtiene el mecánico seleccionado"""
+        """Obtiene la fila (FilaMecanico) seleccionada"""
         selected_rows = self.table.selectionModel().selectedRows()
         if not selected_rows:
             return None
         
-        index = selected_rows[0].row()
-        mecanico_id = self.table.item(index, 0).data(Qt.UserRole)
+        return self.proxy.fila(selected_rows[0])
+    
+    def abrir_mecanico_seleccionado(self, accion):
+        """
+        Carga en segundo plano el mecánico completo seleccionado y ejecuta una acción con él.
+        
+        La tabla solo tiene las columnas visibles; el modelo completo se
+        toma de la caché de entidades o se consulta al abrir un diálogo.
+        
+        Args:
+            accion (callable): Función Mecanico -> None
+        """
+        fila = self.get_selected_mecanico()
+        if fila is None:
+            return
+        
+        # Si ya se cargó antes y no ha cambiado, se resuelve desde memoria
+        en_cache = self.mecanicos_dao.obtener_en_cache(fila.id)
+        if en_cache is not None:
+            accion(en_cache)
+            return
         
-        return self.mecanicos_dao.obtener_por_id(mecanico_id)
+        def al_cargar(mecanico):
+            if mecanico:
+                accion(mecanico)
+            else:
+                QMessageBox.warning(self, "No encontrado", "El registro seleccionado ya no existe.")
+                self.refresh_data()
+        
+        self.query_runner.ejecutar(
+            'abrir_mecanico',
+            self.mecanicos_dao.obtener_por_id,
+            fila.id,
+            al_terminar=al_cargar
+        )
     
     def on_selection_changed(self):
         """Maneja el evento de cambio de selección"""
@@ -223,31 +347,27 @@ class ListaMecanicosWidget(QWidget):
     
     def on_table_double_clicked(self, index):
         """Maneja el evento de doble clic en la tabla"""
-        mecanico = self.get_selected_mecanico()
-        if mecanico:
-            self.show_mecanico_details(mecanico)
+        self.abrir_mecanico_seleccionado(self.show_mecanico_details)
     
     def on_add_button_clicked(self):
         """Maneja el evento de clic en el botón de agregar"""
         dialog = FormMecanicoDialog(parent=self)
-        if dialog.exec_():
-            # Refrescar datos después de agregar
-            self.refresh_data()
+        # La tabla se actualiza con el cambio que publica el DAO al guardar
+        dialog.exec_()
     
     def on_edit_button_clicked(self):
         """Maneja el evento de clic en el botón de editar"""
-        mecanico = self.get_selected_mecanico()
-        if mecanico:
-            dialog = FormMecanicoDialog(mecanico=mecanico, parent=self)
-            if dialog.exec_():
-                # Refrescar datos después de editar
-                self.refresh_data()
+        self.abrir_mecanico_seleccionado(self.editar_mecanico)
+    
+    def editar_mecanico(self, mecanico):
+        """Muestra el formulario de edición de un mecánico"""
+        dialog = FormMecanicoDialog(mecanico=mecanico, parent=self)
+        # La tabla se actualiza con el cambio que publica el DAO al guardar
+        dialog.exec_()
     
     def on_details_button_clicked(self):
         """Maneja el evento de clic en el botón de detalles"""
-        mecanico = self.get_selected_mecanico()
-        if mecanico:
-            self.show_mecanico_details(mecanico)
+        self.abrir_mecanico_seleccionado(self.show_mecanico_details)
     
     def on_delete_button_clicked(self):
         """Maneja el evento de clic en el botón de eliminar"""
@@ -264,20 +384,28 @@ class ListaMecanicosWidget(QWidget):
         )
         
         if reply == QMessageBox.Yes:
-            # Eliminar el mecánico
-            if self.mecanicos_dao.eliminar(mecanico.id):
-                QMessageBox.information(
-                    self,
-                    "Eliminación exitosa",
-                    f"El mecánico {mecanico.nombre} {mecanico.apellidos} ha sido eliminado correctamente."
-                )
-                self.refresh_data()
-            else:
-                QMessageBox.warning(
-                    self,
-                    "Error al eliminar",
-                    f"No se pudo eliminar al mecánico {mecanico.nombre} {mecanico.apellidos}."
-                )
+            # Eliminar el mecánico en segundo plano
+            self.query_runner.ejecutar(
+                f'eliminar:{mecanico.id}',
+                self.mecanicos_dao.eliminar,
+                mecanico.id,
+                al_terminar=lambda eliminado: self.on_mecanico_eliminado(mecanico, eliminado)
+            )
+    
+    def on_mecanico_eliminado(self, mecanico, eliminado):
+        """Informa del resultado de eliminar el mecánico"""
+        if eliminado:
+            QMessageBox.information(
+                self,
+                "Eliminación exitosa",
+                f"El mecánico {mecanico.nombre} {mecanico.apellidos} ha sido eliminado correctamente."
+            )
+        else:
+            QMessageBox.warning(
+                self,
+                "Error al eliminar",
+                f"No se pudo eliminar al mecánico {mecanico.nombre} {mecanico.apellidos}."
+            )
     
     def show_mecanico_details(self, mecanico):
         """Muestra el diálogo de detalles de un mecánico"""
@@ -304,11 +432,9 @@ class ListaMecanicosWidget(QWidget):
         action = context_menu.exec_(self.table.mapToGlobal(position))
         
         if action == ver_action:
-            self.show_mecanico_details(mecanico)
+            self.abrir_mecanico_seleccionado(self.show_mecanico_details)
         elif action == editar_action:
-            dialog = FormMecanicoDialog(mecanico=mecanico, parent=self)
-            if dialog.exec_():
-                self.refresh_data()
+            self.abrir_mecanico_seleccionado(self.editar_mecanico)
         elif self.current_user and self.current_user.rol == Usuario.ROL_ADMIN and action == eliminar_action:
             self.on_delete_button_clicked()
 
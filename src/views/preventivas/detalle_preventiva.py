@@ -242,17 +242,6 @@ class DetallePreventiva(QDialog):
             if not self.abrir_formulario_reparacion():
                 # Si el formulario fue cancelado, volver al estado anterior
                 self.combo_estado.setCurrentText(self.estado_anterior)
-        
-        # Si la preventiva pasa a otro estado, notificar el cambio a la ventana principal
-        if nuevo_estado != self.estado_anterior:
-            # Buscar la ventana principal para notificar el cambio
-            parent_window = self.parent()
-            while parent_window and not hasattr(parent_window, 'dashboard'):
-                parent_window = parent_window.parent()
-            
-            if parent_window and hasattr(parent_window, 'dashboard'):
-                # Actualizar el dashboard con el cambio de estado
-                parent_window.refresh_data()
     
     def guardar_cambios(self):
         """Guarda los cambios realizados a la preventiva"""
@@ -274,7 +263,6 @@ class DetallePreventiva(QDialog):
             
             if parent_window and hasattr(parent_window, 'dashboard'):
                 parent_window.dashboard.agregar_actividad('preventiva', self.preventiva, "Cambio de estado/urgencia")
-                parent_window.refresh_data()
             
             QMessageBox.information(self, "Éxito", "Cambios guardados correctamente")
             self.accept()
@@ -307,20 +295,15 @@ class DetallePreventiva(QDialog):
                 'fecha_ingreso': QDate.currentDate().toString('yyyy-MM-dd')
             }
             
-            # Instanciar el controlador de reparaciones
-            controller = ReparacionController()
+            # Usar el controlador compartido con la ventana principal
+            controller = ReparacionController.compartido()
             
             # Mostrar el formulario (pasando los datos iniciales)
             dialog = FormReparaciones(controller, datos_reparacion, self)
             
             if dialog.exec_():
-                # La reparación fue registrada correctamente
-                
-                # Notificar a la ventana principal que debe actualizar la lista de reparaciones
-                main_window = self.parent()
-                if hasattr(main_window, 'reparaciones_widget') and main_window.reparaciones_widget:
-                    main_window.reparaciones_widget.cargarReparaciones()
-                
+                # La reparación fue registrada correctamente; la lista de
+                # reparaciones se actualiza con el cambio que publica el controlador
                 return True
             else:
                 # El usuario canceló el formulario
@@ -6,23 +6,47 @@ Widget para mostrar la lista de tareas de mantenimiento preventivo.
 """
 
 import logging
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                            QTableWidgetItem, QPushButton, QLabel, QLineEdit,
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, 
+                            QPushButton, QLabel, QLineEdit,
                             QComboBox, QHeaderView, QMessageBox, QMenu)
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
-from PyQt5.QtGui import QColor, QBrush, QFont
+from PyQt5.QtGui import QColor, QFont
 
 from database.preventivas_dao import PreventivasDAO
+from database.eventos import ELIMINACION
+from database.query_runner import QueryRunner
 from models.preventiva import Preventiva
 from models.usuario import Usuario
+from utils.texto import clave_busqueda
 from views.preventivas.detalle_preventiva import DetallePreventiva
 from views.preventivas.form_preventiva import FormPreventivaDialog
+from views.widgets.receptor_cambios import ReceptorCambios
+from views.widgets.table_models import Columna, EntityTableModel, FiltroProxyModel
+
+# Colores de fondo según el estado
+COLORES_ESTADO = {
+    Preventiva.ESTADO_PROGRAMADO: QColor(255, 255, 200),  # Amarillo claro
+    Preventiva.ESTADO_EN_REPARACION: QColor(255, 200, 200),  # Rojo claro
+    Preventiva.ESTADO_COMPLETADO: QColor(200, 255, 200),  # Verde claro
+    Preventiva.ESTADO_CANCELADO: QColor(200, 200, 200)  # Gris claro
+}
+
+# Colores de fondo según el nivel de urgencia
+COLORES_URGENCIA = {
+    Preventiva.URGENCIA_ALTA: QColor(255, 180, 180),  # Rojo más intenso
+    Preventiva.URGENCIA_MEDIA: QColor(255, 220, 180),  # Naranja claro
+    Preventiva.URGENCIA_BAJA: QColor(180, 255, 180)  # Verde muy claro
+}
+
+# Prioridad de los niveles de urgencia para ordenar
+ORDEN_URGENCIA = {urgencia: i for i, urgencia in enumerate(Preventiva.NIVELES_URGENCIA)}
 
 class ListaPreventivasWidget(QWidget):
     """Widget para mostrar y gestionar la lista de tareas preventivas"""
     
     # Señales
-    preventiva_seleccionada = pyqtSignal(Preventiva)
+    # Emitida con la fila (FilaPreventiva) seleccionada
+    preventiva_seleccionada = pyqtSignal(object)
     
     def __init__(self, current_user=None, parent=None):
         """Inicializa el widget de lista de preventivas"""
@@ -30,9 +54,15 @@ class ListaPreventivasWidget(QWidget):
         
         self.current_user = current_user
         self.preventivas_dao = PreventivasDAO()
+        self.query_runner = QueryRunner(self)
+        self.query_runner.cargando.connect(self.on_cargando)
         self.preventivas = []
         
         self.setup_ui()
+        
+        # Cambios publicados por otras vistas, otros usuarios o la sincronización
+        self.receptor = ReceptorCambios(self, ('preventivas',), self.refresh_data, self.aplicar_cambio)
+        
         self.refresh_data()
     
     def setup_ui(self):
@@ -106,14 +136,33 @@ class ListaPreventivasWidget(QWidget):
         
         main_layout.addLayout(button_layout)
         
+        # Modelo de datos de la tabla
+        self.model = EntityTableModel([
+            Columna("Matrícula", lambda p: p.matricula),
+            Columna("Modelo", lambda p: p.modelo),
+            Columna("Tipo", lambda p: p.tipo),
+            Columna("Estado", lambda p: p.estado, fondo=lambda p: COLORES_ESTADO.get(p.estado)),
+            Columna("Nivel Urgencia", lambda p: p.nivel_urgencia,
+                    fondo=lambda p: COLORES_URGENCIA.get(p.nivel_urgencia),
+                    orden=lambda p: ORDEN_URGENCIA.get(p.nivel_urgencia, len(ORDEN_URGENCIA))),
+            Columna("Última Actualización", self._texto_ultima_actualizacion,
+                    orden=lambda p: p.ultima_actualizacion_reparacion)
+        ], clave=lambda p: p.id, parent=self)
+        
+        # Proxy para ordenar y filtrar sin reconstruir la tabla
+        self.proxy = FiltroProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        
         # Tabla de preventivas
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["Matrícula", "Modelo", "Tipo", "Estado", "Nivel Urgencia", "Última Actualización"])
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.AscendingOrder)
+        self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.setAlternatingRowColors(True)
         self.table.doubleClicked.connect(self.on_table_double_clicked)
         self.table.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -133,7 +182,7 @@ class ListaPreventivasWidget(QWidget):
             self.delete_button.setEnabled(False)
         
         # Conectar señal de selección
-        self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
         # Etiqueta de información
         self.info_label = QLabel("Haga doble clic en una preventiva para ver sus detalles")
@@ -145,107 +194,147 @@ class ListaPreventivasWidget(QWidget):
         main_layout.setSpacing(10)
     
     def refresh_data(self):
-        """Actualiza los datos de la tabla"""
-        self.preventivas = self.preventivas_dao.obtener_todas()
-        self.populate_table(self.preventivas)
+        """Actualiza los datos de la tabla en segundo plano"""
+        self.query_runner.ejecutar(
+            'preventivas',
+            self.preventivas_dao.obtener_filas,
+            al_terminar=self.populate_table
+        )
+    
+    def on_cargando(self, clave, cargando):
+        """Muestra el estado de carga mientras hay una consulta en curso"""
+        if clave != 'preventivas':
+            return
+        if cargando:
+            self.info_label.setText("Cargando preventivas...")
+        else:
+            self.actualizar_info()
+    
+    @staticmethod
+    def _texto_ultima_actualizacion(preventiva):
+        """Texto de la columna de última actualización"""
+        if getattr(preventiva, 'ultima_actualizacion_reparacion', None):
+            return preventiva.ultima_actualizacion_reparacion.strftime("%d/%m/%Y %H:%M")
+        return "Sin actualizaciones"
     
     def populate_table(self, preventivas):
-        """Rellena la tabla con los datos de las preventivas"""
-        self.table.setRowCount(0)
-        
-        for preventiva in preventivas:
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
-            
-            # Matrícula
-            item_matricula = QTableWidgetItem(preventiva.matricula)
-            item_matricula.setData(Qt.UserRole, preventiva.id)
-            self.table.setItem(row_position, 0, item_matricula)
-            
-            # Modelo
-            self.table.setItem(row_position, 1, QTableWidgetItem(preventiva.modelo))
-            
-            # Tipo
-            self.table.setItem(row_position, 2, QTableWidgetItem(preventiva.tipo))
-            
-            # Estado
-            item_estado = QTableWidgetItem(preventiva.estado)
-            
-            # Colorear según el estado
-            if preventiva.estado == Preventiva.ESTADO_PROGRAMADO:
-                item_estado.setBackground(QBrush(QColor(255, 255, 200)))  # Amarillo claro
-            elif preventiva.estado == Preventiva.ESTADO_EN_REPARACION:
-                item_estado.setBackground(QBrush(QColor(255, 200, 200)))  # Rojo claro
-            elif preventiva.estado == Preventiva.ESTADO_COMPLETADO:
-                item_estado.setBackground(QBrush(QColor(200, 255, 200)))  # Verde claro
-            elif preventiva.estado == Preventiva.ESTADO_CANCELADO:
-                item_estado.setBackground(QBrush(QColor(200, 200, 200)))  # Gris claro
-            
-            self.table.setItem(row_position, 3, item_estado)
-            
-            # Nivel de urgencia
-            item_urgencia = QTableWidgetItem(preventiva.nivel_urgencia)
-            
-            # Colorear según el nivel de urgencia
-            if preventiva.nivel_urgencia == Preventiva.URGENCIA_ALTA:
-                item_urgencia.setBackground(QBrush(QColor(255, 180, 180)))  # Rojo más intenso
-            elif preventiva.nivel_urgencia == Preventiva.URGENCIA_MEDIA:
-                item_urgencia.setBackground(QBrush(QColor(255, 220, 180)))  # Naranja claro
-            elif preventiva.nivel_urgencia == Preventiva.URGENCIA_BAJA:
-                item_urgencia.setBackground(QBrush(QColor(180, 255, 180)))  # Verde muy claro
-            
-            self.table.setItem(row_position, 4, item_urgencia)
-            
-            # Última actualización
-            fecha_str = "Sin actualizaciones"
-            if hasattr(preventiva, 'ultima_actualizacion_reparacion') and preventiva.ultima_actualizacion_reparacion:
-                fecha_str = preventiva.ultima_actualizacion_reparacion.strftime("%d/%m/%Y %H:%M")
-            self.table.setItem(row_position, 5, QTableWidgetItem(fecha_str))
-        
-        self.info_label.setText(f"Total: {len(preventivas)} preventivas")
+        """Carga las preventivas en el modelo de la tabla aplicando solo los cambios"""
+        self.preventivas = preventivas
+        self.model.establecer_filas(preventivas)
+        self.actualizar_info()
+    
+    def actualizar_info(self):
+        """Actualiza la etiqueta con el número de preventivas visibles"""
+        self.info_label.setText(f"Total: {self.proxy.rowCount()} preventivas")
+    
+    def aplicar_cambio(self, cambio):
+        """
+        Actualiza en segundo plano solo la fila del documento que cambió.
+        
+        Args:
+            cambio (CambioEntidad): Cambio recibido del bus de eventos
+        """
+        if cambio.tipo == ELIMINACION:
+            self.quitar_fila(cambio.id)
+            return
+        
+        self.query_runner.ejecutar(
+            f'fila:{cambio.id}',
+            self.preventivas_dao.obtener_fila,
+            cambio.id,
+            al_terminar=lambda fila: self.actualizar_fila(cambio.id, fila)
+        )
+    
+    def actualizar_fila(self, preventiva_id, fila):
+        """Sustituye la fila del preventiva, o la quita si ya no existe"""
+        if fila is None:
+            self.quitar_fila(preventiva_id)
+            return
+        self.model.actualizar_fila(fila)
+        self.preventivas = self.model.filas()
+        self.actualizar_info()
+    
+    def quitar_fila(self, preventiva_id):
+        """Quita de la tabla la fila del preventiva"""
+        if self.model.eliminar_clave(preventiva_id):
+            self.preventivas = self.model.filas()
+            self.actualizar_info()
     
     def apply_filters(self):
         """Aplica los filtros a la tabla"""
-        matricula_filter = self.matricula_filter.text().strip().lower()
+        matricula_filter = clave_busqueda(self.matricula_filter.text(), '')
         estado_filter = self.estado_filter.currentData()
         urgencia_filter = self.urgencia_filter.currentData()
         
-        filtered_preventivas = []
-        
-        for preventiva in self.preventivas:
-            # Filtrar por matrícula
-            if matricula_filter and matricula_filter not in preventiva.matricula.lower():
-                continue
-            
-            # Filtrar por estado
-            if estado_filter and preventiva.estado != estado_filter:
-                continue
-            
-            # Filtrar por nivel de urgencia
-            if urgencia_filter and preventiva.nivel_urgencia != urgencia_filter:
-                continue
-            
-            filtered_preventivas.append(preventiva)
-        
-        self.populate_table(filtered_preventivas)
+        # Filtrar por matrícula
+        self.proxy.establecer_filtro(
+            'matricula',
+            (lambda p: p.matricula_busqueda.startswith(matricula_filter)) if matricula_filter else None
+        )
+        
+        # Filtrar por estado
+        self.proxy.establecer_filtro(
+            'estado',
+            (lambda p: p.estado == estado_filter) if estado_filter else None
+        )
+        
+        # Filtrar por nivel de urgencia
+        self.proxy.establecer_filtro(
+            'urgencia',
+            (lambda p: p.nivel_urgencia == urgencia_filter) if urgencia_filter else None
+        )
+        
+        self.actualizar_info()
     
     def clear_filters(self):
         """Limpia los filtros"""
         self.matricula_filter.clear()
         self.estado_filter.setCurrentIndex(0)
         self.urgencia_filter.setCurrentIndex(0)
-        self.populate_table(self.preventivas)
+        self.proxy.limpiar_filtros()
+        self.actualizar_info()
     
     def get_selected_preventiva(self):
-        """Obtiene la preventiva seleccionada"""
+        """Obtiene la fila (FilaPreventiva) seleccionada"""
         selected_rows = self.table.selectionModel().selectedRows()
         if not selected_rows:
             return None
         
-        index = selected_rows[0].row()
-        preventiva_id = self.table.item(index, 0).data(Qt.UserRole)
+        return self.proxy.fila(selected_rows[0])
+    
+    def abrir_preventiva_seleccionada(self, accion):
+        """
+        Carga en segundo plano la preventiva completa seleccionada y ejecuta una acción con ella.
+        
+        La tabla solo tiene las columnas visibles; el modelo completo se
+        toma de la caché de entidades o se consulta al abrir un diálogo.
+        
+        Args:
+            accion (callable): Función Preventiva -> None
+        """
+        fila = self.get_selected_preventiva()
+        if fila is None:
+            return
+        
+        # Si ya se cargó antes y no ha cambiado, se resuelve desde memoria
+        en_cache = self.preventivas_dao.obtener_en_cache(fila.id)
+        if en_cache is not None:
+            accion(en_cache)
+            return
+        
+        def al_cargar(preventiva):
+            if preventiva:
+                accion(preventiva)
+            else:
+                QMessageBox.warning(self, "No encontrado", "El registro seleccionado ya no existe.")
+                self.refresh_data()
         
-        return self.preventivas_dao.obtener_por_id(preventiva_id)
+        self.query_runner.ejecutar(
+            'abrir_preventiva',
+            self.preventivas_dao.obtener_por_id,
+            fila.id,
+            al_terminar=al_cargar
+        )
     
     def on_selection_changed(self):
         """Maneja el evento de cambio de selección"""
@@ -263,31 +352,27 @@ class ListaPreventivasWidget(QWidget):
     
     def on_table_double_clicked(self, index):
         """Maneja el evento de doble clic en la tabla"""
-        preventiva = self.get_selected_preventiva()
-        if preventiva:
-            self.show_preventiva_details(preventiva)
+        self.abrir_preventiva_seleccionada(self.show_preventiva_details)
     
     def on_add_button_clicked(self):
         """Maneja el evento de clic en el botón de agregar"""
         dialog = FormPreventivaDialog(parent=self)
-        if dialog.exec_():
-            # Refrescar datos después de agregar
-            self.refresh_data()
+        # La tabla se actualiza con el cambio que publica el DAO al guardar
+        dialog.exec_()
     
     def on_edit_button_clicked(self):
         """Maneja el evento de clic en el botón de editar"""
-        preventiva = self.get_selected_preventiva()
-        if preventiva:
-            dialog = FormPreventivaDialog(preventiva=preventiva, parent=self)
-            if dialog.exec_():
-                # Refrescar datos después de editar
-                self.refresh_data()
+        self.abrir_preventiva_seleccionada(self.editar_preventiva)
+    
+    def editar_preventiva(self, preventiva):
+        """Muestra el formulario de edición de una preventiva"""
+        dialog = FormPreventivaDialog(preventiva=preventiva, parent=self)
+        # La tabla se actualiza con el cambio que publica el DAO al guardar
+        dialog.exec_()
     
     def on_details_button_clicked(self):
         """Maneja el evento de clic en el botón de detalles"""
-        preventiva = self.get_selected_preventiva()
-        if preventiva:
-            self.show_preventiva_details(preventiva)
+        self.abrir_preventiva_seleccionada(self.show_preventiva_details)
     
     def on_delete_button_clicked(self):
         """Maneja el evento de clic en el botón de eliminar"""
@@ -304,20 +389,28 @@ class ListaPreventivasWidget(QWidget):
         )
         
         if reply == QMessageBox.Yes:
-            # Eliminar la preventiva
-            if self.preventivas_dao.eliminar(preventiva.id):
-                QMessageBox.information(
-                    self,
-                    "Eliminación exitosa",
-                    f"La preventiva de {preventiva.matricula} ha sido eliminada correctamente."
-                )
-                self.refresh_data()
-            else:
-                QMessageBox.warning(
-                    self,
-                    "Error al eliminar",
-                    f"No se pudo eliminar la preventiva de {preventiva.matricula}."
-                )
+            # Eliminar la preventiva en segundo plano
+            self.query_runner.ejecutar(
+                f'eliminar:{preventiva.id}',
+                self.preventivas_dao.eliminar,
+                preventiva.id,
+                al_terminar=lambda eliminado: self.on_preventiva_eliminado(preventiva, eliminado)
+            )
+    
+    def on_preventiva_eliminado(self, preventiva, eliminado):
+        """Informa del resultado de eliminar la preventiva"""
+        if eliminado:
+            QMessageBox.information(
+                self,
+                "Eliminación exitosa",
+                f"La preventiva de {preventiva.matricula} ha sido eliminada correctamente."
+            )
+        else:
+            QMessageBox.warning(
+                self,
+                "Error al eliminar",
+                f"No se pudo eliminar la preventiva de {preventiva.matricula}."
+            )
     
     def show_preventiva_details(self, preventiva):
         """Muestra el diálogo de detalles de una preventiva"""
@@ -344,11 +437,9 @@ class ListaPreventivasWidget(QWidget):
         action = context_menu.exec_(self.table.mapToGlobal(position))
         
         if action == ver_action:
-            self.show_preventiva_details(preventiva)
+            self.abrir_preventiva_seleccionada(self.show_preventiva_details)
         elif action == editar_action:
-            dialog = FormPreventivaDialog(preventiva=preventiva, parent=self)
-            if dialog.exec_():
-                self.refresh_data()
+            self.abrir_preventiva_seleccionada(self.editar_preventiva)
         elif self.current_user and self.current_user.rol == Usuario.ROL_ADMIN and action == eliminar_action:
             self.on_delete_button_clicked()
 
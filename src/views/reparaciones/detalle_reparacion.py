@@ -15,6 +15,7 @@ from PyQt5.QtGui import QFont, QIcon
 from database.reparaciones_dao import ReparacionesDAO
 from database.camiones_dao import CamionesDAO
 from database.usuarios_dao import UsuariosDAO
+from database.query_runner import QueryRunner
 from models.reparacion import Reparacion
 from models.camion import Camion
 from models.usuario import Usuario
@@ -36,6 +37,7 @@ class DetalleReparacionDialog(QDialog):
         self.reparaciones_dao = ReparacionesDAO()
         self.camiones_dao = CamionesDAO()
         self.usuarios_dao = UsuariosDAO()
+        self.query_runner = QueryRunner(self)
         
         self.setup_ui()
         self.load_data()
@@ -255,12 +257,14 @@ class DetalleReparacionDialog(QDialog):
         self.id_falla_label.setText(self.reparacion.id_falla)
         self.motivo_falla_label.setText(self.reparacion.motivo_falla)
         
-        # Buscar información del camión
-        camion = self.camiones_dao.obtener_por_id(self.reparacion.camion_id)
-        if camion:
-            self.camion_label.setText(f"{camion.matricula} - {camion.modelo}")
-        else:
-            self.camion_label.setText("Camión no encontrado")
+        # Buscar información del camión en segundo plano
+        self.camion_label.setText("Cargando...")
+        self.query_runner.ejecutar(
+            'camion',
+            self.camiones_dao.obtener_por_id,
+            self.reparacion.camion_id,
+            al_terminar=self.mostrar_camion
+        )
         
         # Descripción
         self.descripcion_browser.setText(self.reparacion.descripcion)
@@ -279,11 +283,13 @@ class DetalleReparacionDialog(QDialog):
         
         # Mecánico
         if self.reparacion.mecanico_id:
-            mecanico = self.usuarios_dao.obtener_por_id(self.reparacion.mecanico_id)
-            if mecanico:
-                self.mecanico_label.setText(f"{mecanico.nombre} {mecanico.apellido}")
-            else:
-                self.mecanico_label.setText("Mecánico no encontrado")
+            self.mecanico_label.setText("Cargando...")
+            self.query_runner.ejecutar(
+                'mecanico',
+                self.usuarios_dao.obtener_por_id,
+                self.reparacion.mecanico_id,
+                al_terminar=self.mostrar_mecanico
+            )
         else:
             self.mecanico_label.setText("No asignado")
         
@@ -311,6 +317,20 @@ class DetalleReparacionDialog(QDialog):
         else:
             self.notas_browser.setText("No hay notas adicionales.")
     
+    def mostrar_camion(self, camion):
+        """Muestra el camión de la reparación una vez cargado"""
+        if camion:
+            self.camion_label.setText(f"{camion.matricula} - {camion.modelo}")
+        else:
+            self.camion_label.setText("Camión no encontrado")
+    
+    def mostrar_mecanico(self, mecanico):
+        """Muestra el mecánico asignado una vez cargado"""
+        if mecanico:
+            self.mecanico_label.setText(f"{mecanico.nombre} {mecanico.apellido}")
+        else:
+            self.mecanico_label.setText("Mecánico no encontrado")
+    
     def on_change_status(self):
         """Maneja el evento de cambio de estado"""
         from PyQt5.QtWidgets import QInputDialog
@@ -336,24 +356,48 @@ class DetalleReparacionDialog(QDialog):
                 "Agregar notas sobre este cambio (opcional):"
             )
             
-            # Cambiar el estado
-            if self.reparaciones_dao.cambiar_estado(
-                self.reparacion.id, 
+            # Cambiar el estado en segundo plano
+            self.change_status_button.setEnabled(False)
+            self.change_status_button.setText("Actualizando...")
+            self.query_runner.ejecutar(
+                'cambiar_estado',
+                self._cambiar_estado,
+                self.reparacion.id,
                 estado_seleccionado,
-                notas if ok and notas else None
-            ):
-                QMessageBox.information(
-                    self,
-                    "Estado actualizado",
-                    f"El estado de la reparación ha sido actualizado a '{estado_seleccionado}'."
-                )
-                
-                # Recargar la reparación para ver los cambios
-                self.reparacion = self.reparaciones_dao.obtener_por_id(self.reparacion.id)
-                self.load_data()
-            else:
-                QMessageBox.warning(
-                    self,
-                    "Error al actualizar",
-                    "No se pudo actualizar el estado de la reparación."
-                )
\ No newline at end of file
+                notas if ok and notas else None,
+                al_terminar=lambda reparacion: self.on_estado_cambiado(reparacion, estado_seleccionado),
+                al_fallar=lambda mensaje: self.on_estado_cambiado(None, estado_seleccionado)
+            )
+    
+    def _cambiar_estado(self, reparacion_id, estado, notas):
+        """
+        Cambia el estado y recarga la reparación (se ejecuta fuera del hilo de la interfaz).
+        
+        Returns:
+            Reparacion: Reparación actualizada o None si no se pudo cambiar
+        """
+        if not self.reparaciones_dao.cambiar_estado(reparacion_id, estado, notas):
+            return None
+        return self.reparaciones_dao.obtener_por_id(reparacion_id)
+    
+    def on_estado_cambiado(self, reparacion, estado):
+        """Muestra el resultado del cambio de estado"""
+        self.change_status_button.setEnabled(True)
+        self.change_status_button.setText("Cambiar Estado")
+        
+        if reparacion:
+            QMessageBox.information(
+                self,
+                "Estado actualizado",
+                f"El estado de la reparación ha sido actualizado a '{estado}'."
+            )
+            
+            # Mostrar la reparación recargada con los cambios
+            self.reparacion = reparacion
+            self.load_data()
+        else:
+            QMessageBox.warning(
+                self,
+                "Error al actualizar",
+                "No se pudo actualizar el estado de la reparación."
+            )
\ No newline at end of file
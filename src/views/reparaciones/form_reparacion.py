@@ -550,30 +550,7 @@ class FormReparaciones(QDialog):
                     print(f"DEBUG - Nueva reparación creada con ID: {id_reparacion}")
                     QMessageBox.information(self, "Éxito", f"Reparación #{id_reparacion} registrada como nueva")
             
-            # Asegurarnos de que la lista de reparaciones se actualice en la ventana principal
-            try:
-                # Buscar el widget de reparaciones en la jerarquía de padres
-                parent_window = self.parent()
-                while parent_window and not hasattr(parent_window, 'reparaciones_widget'):
-                    parent_window = parent_window.parent()
-                    
-                if parent_window and hasattr(parent_window, 'reparaciones_widget') and parent_window.reparaciones_widget:
-                    print("DEBUG - Actualizando lista de reparaciones...")
-                    parent_window.reparaciones_widget.cargarReparaciones()
-                else:
-                    # Si no encontramos el widget directamente, intentar encontrar la ventana principal
-                    print("DEBUG - Buscando ventana principal para actualizar reparaciones...")
-                    main_window = self.parent()
-                    while main_window and not hasattr(main_window, 'refresh_data'):
-                        main_window = main_window.parent()
-                    
-                    if main_window and hasattr(main_window, 'refresh_data'):
-                        print("DEBUG - Refrescando datos de la aplicación...")
-                        main_window.refresh_data()
-            except Exception as e:
-                print(f"DEBUG - Advertencia al actualizar UI después de guardar: {str(e)}")
-                # No mostrar este error al usuario, solo registrarlo
-            
+            # La lista de reparaciones se actualiza con el cambio que publica el controlador
             self.accept()
         except Exception as e:
             import traceback
@@ -607,8 +584,10 @@ class FormReparaciones(QDialog):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     # Solo para pruebas
-    from src.controllers.reparacion_controller import ReparacionController
-    controller = ReparacionController()
+    from controllers.reparacion_controller import ReparacionController
+    controller = ReparacionController.compartido()
     form = FormReparaciones(controller)
     form.show()
-    sys.exit(app.exec_())
+    codigo = app.exec_()
+    ReparacionController.cerrar_compartidos()
+    sys.exit(codigo)
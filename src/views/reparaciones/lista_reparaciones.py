@@ -1,33 +1,66 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView,
                             QPushButton, QLabel, QComboBox, QHeaderView, QMessageBox, QMenu,
                             QLineEdit, QDateEdit, QDialog, QFormLayout, QTextEdit, QSpinBox)
 from PyQt5.QtCore import Qt, QDate
-from PyQt5.QtGui import QColor, QBrush
-from src.controllers.reparacion_controller import ReparacionController
+from PyQt5.QtGui import QColor
+from controllers.reparacion_controller import ReparacionController
 from src.views.reparaciones.form_reparacion import FormReparaciones
+from src.views.widgets.receptor_cambios import ReceptorCambios
+from src.views.widgets.table_models import Columna, EntityTableModel, FiltroProxyModel
 import logging
 import datetime
+from database.eventos import ELIMINACION
+from utils.texto import clave_busqueda
 
 try:
     from PyQt5.QtWidgets import QStyle
 except ImportError:
     from PyQt5.QtWidgets import QCommonStyle as QStyle
 
+# Colores de fila según el estado
+COLORES_ESTADO = {
+    "En Espera": QColor(255, 255, 200),  # Amarillo claro
+    "En Reparación": QColor(255, 200, 200),  # Rojo claro
+    "Reparado": QColor(200, 255, 200)  # Verde claro
+}
+
+
+def _color_fila(reparacion):
+    """Color de fondo de toda la fila según el estado"""
+    return COLORES_ESTADO.get(reparacion.get('estado'))
+
+
+def _problema_corto(reparacion):
+    """Acorta el problema si es muy largo"""
+    problema = reparacion.get('problema', '') or ''
+    if len(problema) > 30:
+        problema = problema[:27] + '...'
+    return problema
+
+
 class ListaReparaciones(QWidget):
     def __init__(self, controller=None, parent=None):
         """
         Widget para mostrar y gestionar la lista de reparaciones
         
         Args:
-            controller: Controlador de reparaciones (si None, se crea uno nuevo)
+            controller: Controlador de reparaciones (si None, se usa el compartido)
             parent: Widget padre
         """
         super().__init__(parent)
         
         # Inicializar controlador
-        self.controller = controller if controller is not None else ReparacionController()
+        self.controller = controller if controller is not None else ReparacionController.compartido()
         
         self.initUI()
+        
+        # Cambios publicados por el controlador, el formulario u otras vistas
+        self.receptor = ReceptorCambios(
+            self, ('reparaciones',),
+            lambda: self.cargarReparaciones(self.combo_filtro.currentText()),
+            self.aplicarCambio
+        )
+        
         self.cargarReparaciones()
         
     def initUI(self):
@@ -108,17 +141,33 @@ class ListaReparaciones(QWidget):
         
         main_layout.addLayout(action_layout)
         
+        # Modelo de datos de la tabla
+        self.modelo = EntityTableModel([
+            Columna("ID", lambda r: r.get('id', ''), fondo=_color_fila, orden=lambda r: r.get('id', 0)),
+            Columna("Matrícula", lambda r: r.get('matricula', ''), fondo=_color_fila),
+            Columna("Modelo", lambda r: r.get('modelo', ''), fondo=_color_fila),
+            Columna("Estado", lambda r: r.get('estado', ''), fondo=_color_fila),
+            Columna("Fecha Ingreso", lambda r: r.get('fecha_ingreso', ''), fondo=_color_fila),
+            Columna("Fecha Estimada", lambda r: r.get('fecha_entrega_estimada', ''), fondo=_color_fila),
+            Columna("Problema", _problema_corto, fondo=_color_fila),
+            Columna("Total", lambda r: f"${r.get('total', 0):.2f}", fondo=_color_fila,
+                    orden=lambda r: r.get('total', 0))
+        ], clave=lambda r: r['id'], parent=self)
+        
+        # Proxy para ordenar y filtrar sin reconstruir la tabla
+        self.proxy = FiltroProxyModel(self)
+        self.proxy.setSourceModel(self.modelo)
+        
         # Tabla de reparaciones
-        self.tabla = QTableWidget()
-        self.tabla.setColumnCount(8)  # Ajustado el número de columnas
-        self.tabla.setHorizontalHeaderLabels([
-            "ID", "Matrícula", "Modelo", "Estado", "Fecha Ingreso", 
-            "Fecha Estimada", "Problema", "Total"
-        ])
+        self.tabla = QTableView()
+        self.tabla.setModel(self.proxy)
+        self.tabla.setSortingEnabled(True)
+        self.tabla.sortByColumn(-1, Qt.AscendingOrder)
+        self.tabla.verticalHeader().setVisible(False)
         self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.tabla.setSelectionBehavior(QTableWidget.SelectRows)
-        self.tabla.setSelectionMode(QTableWidget.SingleSelection)
-        self.tabla.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabla.setSelectionBehavior(QTableView.SelectRows)
+        self.tabla.setSelectionMode(QTableView.SingleSelection)
+        self.tabla.setEditTriggers(QTableView.NoEditTriggers)
         self.tabla.setAlternatingRowColors(True)
         self.tabla.doubleClicked.connect(self.verDetalles)
         self.tabla.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -139,7 +188,7 @@ class ListaReparaciones(QWidget):
         self.btn_eliminar.setEnabled(False)
         
         # Conectar señal de selección
-        self.tabla.itemSelectionChanged.connect(self.on_selection_changed)
+        self.tabla.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
     def cargarReparaciones(self, filtro_estado="Todos"):
         """
@@ -150,17 +199,15 @@ class ListaReparaciones(QWidget):
         """
         try:
             
-            # Obtener todas las reparaciones
-            todas_reparaciones = self.controller.obtener_todas_reparaciones()
-            
-            # Aplicar filtro por estado si es necesario
+            # Aplicar filtro por estado usando el índice del controlador
             if filtro_estado != "Todos":
-                reparaciones_filtradas = [r for r in todas_reparaciones if r.get('estado') == filtro_estado]
+                reparaciones_filtradas = self.controller.obtener_reparaciones_por_estado(filtro_estado)
             else:
-                reparaciones_filtradas = todas_reparaciones
+                reparaciones_filtradas = self.controller.obtener_todas_reparaciones()
             
             # Almacenar las reparaciones filtradas para uso posterior
             self.reparaciones_actuales = reparaciones_filtradas
+            self.mostrarReparacionesEnTabla(reparaciones_filtradas)
             
             # Aplicar los otros filtros activos
             self.aplicarFiltros()
@@ -180,29 +227,25 @@ class ListaReparaciones(QWidget):
                 return
                 
             # Obtener valores de filtros
-            texto_matricula = self.filtro_matricula.text().strip().lower()
+            texto_matricula = clave_busqueda(self.filtro_matricula.text(), '')
             fecha_desde = self.fecha_desde.date().toString("yyyy-MM-dd")
             fecha_hasta = self.fecha_hasta.date().toString("yyyy-MM-dd")
             
-            # Aplicar filtros a las reparaciones actuales
-            reparaciones_filtradas = []
+            # Filtro por matrícula con el índice del controlador
+            filtro_matricula = None
+            if texto_matricula:
+                ids = {r['id'] for r in self.controller.buscar_por_matricula(texto_matricula)}
+                filtro_matricula = lambda r: r['id'] in ids
+            self.proxy.establecer_filtro('matricula', filtro_matricula)
             
-            for r in self.reparaciones_actuales:
-                # Filtro por matrícula
-                if texto_matricula and texto_matricula not in r.get('matricula', '').lower():
-                    continue
-                
-                # Filtro por fecha de ingreso
-                fecha_ingreso = r.get('fecha_ingreso', '')
-                if fecha_ingreso:
-                    if fecha_ingreso < fecha_desde or fecha_ingreso > fecha_hasta:
-                        continue
-                
-                # Pasó todos los filtros
-                reparaciones_filtradas.append(r)
+            # Filtro por fecha de ingreso (las reparaciones sin fecha siempre se muestran)
+            self.proxy.establecer_filtro(
+                'fecha_ingreso',
+                lambda r: not r.get('fecha_ingreso') or fecha_desde <= r['fecha_ingreso'] <= fecha_hasta
+            )
             
-            # Mostrar reparaciones en la tabla
-            self.mostrarReparacionesEnTabla(reparaciones_filtradas)
+            # Actualizar etiqueta de información
+            self.info_label.setText(f"Total: {self.proxy.rowCount()} reparaciones")
             
         except Exception as e:
             print(f"Error al aplicar filtros: {str(e)}")
@@ -226,58 +269,40 @@ class ListaReparaciones(QWidget):
         Args:
             reparaciones: Lista de reparaciones a mostrar
         """
-        # Limpiar tabla
-        self.tabla.setRowCount(0)
-        
-        # Agregar filas a la tabla
-        for reparacion in reparaciones:
-            row_position = self.tabla.rowCount()
-            self.tabla.insertRow(row_position)
-            
-            # Llenar celdas
-            self.tabla.setItem(row_position, 0, QTableWidgetItem(str(reparacion.get('id', ''))))
-            self.tabla.setItem(row_position, 1, QTableWidgetItem(reparacion.get('matricula', '')))
-            self.tabla.setItem(row_position, 2, QTableWidgetItem(reparacion.get('modelo', '')))
-            self.tabla.setItem(row_position, 3, QTableWidgetItem(reparacion.get('estado', '')))
-            self.tabla.setItem(row_position, 4, QTableWidgetItem(reparacion.get('fecha_ingreso', '')))
-            self.tabla.setItem(row_position, 5, QTableWidgetItem(reparacion.get('fecha_entrega_estimada', '')))
-            
-            # Acortar el problema si es muy largo
-            problema = reparacion.get('problema', '')
-            if len(problema) > 30:
-                problema = problema[:27] + '...'
-            self.tabla.setItem(row_position, 6, QTableWidgetItem(problema))
-            
-            # Formatear el total como moneda
-            total = reparacion.get('total', 0)
-            self.tabla.setItem(row_position, 7, QTableWidgetItem(f"${total:.2f}"))
-            
-            # Guardar el objeto reparación en el item para uso posterior
-            self.tabla.item(row_position, 0).setData(Qt.UserRole, reparacion)
-            
-            # Colorear según estado
-            estado = reparacion.get('estado')
-            
-            if estado == "En Espera":
-                color = QColor(255, 255, 200)  # Amarillo claro
-            elif estado == "En Reparación":
-                color = QColor(255, 200, 200)  # Rojo claro
-            elif estado == "Reparado":
-                color = QColor(200, 255, 200)  # Verde claro
-            else:
-                color = QColor(Qt.white)
-            
-            # Aplicar color a todas las celdas de la fila
-            for col in range(self.tabla.columnCount()):
-                self.tabla.item(row_position, col).setBackground(QBrush(color))
+        # Aplicar solo las diferencias con lo que ya se muestra
+        self.modelo.establecer_filas(reparaciones)
         
         # Actualizar etiqueta de información
-        self.info_label.setText(f"Total: {self.tabla.rowCount()} reparaciones")
+        self.info_label.setText(f"Total: {self.proxy.rowCount()} reparaciones")
+    
+    def aplicarCambio(self, cambio):
+        """
+        Actualiza solo la fila de la reparación que cambió
+        
+        Args:
+            cambio (CambioEntidad): Cambio recibido del bus de eventos
+        """
+        # Las reparaciones de esta lista se identifican por un ID entero
+        if not isinstance(cambio.id, int):
+            return
+        
+        reparacion = None
+        if cambio.tipo != ELIMINACION:
+            reparacion = self.controller.obtener_reparacion(cambio.id)
+        
+        filtro_estado = self.combo_filtro.currentText()
+        if reparacion is None or (filtro_estado != "Todos" and reparacion.get('estado') != filtro_estado):
+            self.modelo.eliminar_clave(cambio.id)
+        else:
+            self.modelo.actualizar_fila(reparacion)
+        
+        self.reparaciones_actuales = self.modelo.filas()
+        self.info_label.setText(f"Total: {self.proxy.rowCount()} reparaciones")
     
     def on_selection_changed(self):
         """Maneja el evento de cambio de selección en la tabla"""
         # Verificar si hay una fila seleccionada
-        selected = len(self.tabla.selectedItems()) > 0
+        selected = self.tabla.selectionModel().hasSelection()
         
         # Habilitar/deshabilitar botones según la selección
         self.btn_ver_detalles.setEnabled(selected)
@@ -296,18 +321,16 @@ class ListaReparaciones(QWidget):
         if not selected_rows:
             return None
             
-        # Obtener la reparación del ítem seleccionado
-        row = selected_rows[0].row()
-        return self.tabla.item(row, 0).data(Qt.UserRole)
+        # Obtener la reparación de la fila seleccionada
+        return self.proxy.fila(selected_rows[0])
     
     def nuevaReparacion(self):
         """Abre el formulario para crear una nueva reparación"""
         try:
             # Mostrar formulario
             form = FormReparaciones(self.controller, parent=self)
-            if form.exec_():
-                # Recargar lista tras agregar
-                self.cargarReparaciones(self.combo_filtro.currentText())
+            # La tabla se actualiza con el cambio que publica el controlador
+            form.exec_()
                 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"No se pudo abrir el formulario: {str(e)}")
@@ -324,9 +347,8 @@ class ListaReparaciones(QWidget):
         try:
             # Mostrar formulario para editar
             form = FormReparaciones(self.controller, reparacion, self)
-            if form.exec_():
-                # Recargar lista tras editar
-                self.cargarReparaciones(self.combo_filtro.currentText())
+            # La tabla se actualiza con el cambio que publica el controlador
+            form.exec_()
                 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"No se pudo abrir el formulario: {str(e)}")
@@ -398,8 +420,6 @@ class ListaReparaciones(QWidget):
                         "Estado actualizado", 
                         f"El estado de la reparación #{reparacion['id']} ha sido actualizado a '{nuevo_estado}'"
                     )
-                    # Recargar lista
-                    self.cargarReparaciones(self.combo_filtro.currentText())
                 else:
                     QMessageBox.warning(
                         self, 
@@ -431,8 +451,6 @@ class ListaReparaciones(QWidget):
                 # Eliminar reparación
                 if self.controller.eliminar_reparacion(reparacion['id']):
                     QMessageBox.information(self, "Éxito", "Reparación eliminada correctamente")
-                    # Recargar lista
-                    self.cargarReparaciones(self.combo_filtro.currentText())
                 else:
                     QMessageBox.warning(self, "Error", "No se pudo eliminar la reparación")
             except Exception as e:
@@ -503,7 +521,7 @@ class ListaReparaciones(QWidget):
             </head>
             <body>
                 <div class="header">Reporte de Reparaciones</div>
-                <p>Fecha de impresión: {}</p>
+                <p>Fecha de impresión: FECHA_IMPRESION</p>
                 <table>
                     <tr>
                         <th>ID</th>
@@ -513,28 +531,33 @@ class ListaReparaciones(QWidget):
                         <th>Problema</th>
                         <th>Total</th>
                     </tr>
-            """.format(QDate.currentDate().toString("dd/MM/yyyy"))
+            """.replace("FECHA_IMPRESION", QDate.currentDate().toString("dd/MM/yyyy"))
             
-            # Agregar filas
-            for row in range(self.tabla.rowCount()):
-                html += "<tr>"
-                html += f"<td>{self.tabla.item(row, 0).text()}</td>"  # ID
-                html += f"<td>{self.tabla.item(row, 1).text()}</td>"  # Matrícula
-                html += f"<td>{self.tabla.item(row, 3).text()}</td>"  # Estado
-                html += f"<td>{self.tabla.item(row, 4).text()}</td>"  # Fecha Ingreso
-                html += f"<td>{self.tabla.item(row, 6).text()}</td>"  # Problema
-                html += f"<td>{self.tabla.item(row, 7).text()}</td>"  # Total
-                html += "</tr>"
+            # Agregar las filas visibles en el orden actual de la tabla
+            filas_html = []
+            for row in range(self.proxy.rowCount()):
+                reparacion = self.proxy.fila(row)
+                filas_html.append(
+                    "<tr>"
+                    f"<td>{reparacion.get('id', '')}</td>"
+                    f"<td>{reparacion.get('matricula', '')}</td>"
+                    f"<td>{reparacion.get('estado', '')}</td>"
+                    f"<td>{reparacion.get('fecha_ingreso', '')}</td>"
+                    f"<td>{_problema_corto(reparacion)}</td>"
+                    f"<td>${reparacion.get('total', 0):.2f}</td>"
+                    "</tr>"
+                )
+            html += "".join(filas_html)
             
             # Cerrar tabla y agregar footer
-            html += """
+            html += f"""
                 </table>
                 <div class="footer">
-                    Total de reparaciones: {}
+                    Total de reparaciones: {self.proxy.rowCount()}
                 </div>
             </body>
             </html>
-            """.format(self.tabla.rowCount())
+            """
             
             # Establecer el contenido HTML en el documento
             doc.setHtml(html)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Diálogo con los conflictos de sincronización de la réplica local.
+
+Cuando un cambio hecho sin conexión no se puede subir porque el documento
+cambió en el servidor, el sincronizador conserva la versión del servidor y
+guarda el cambio descartado en la tabla de conflictos. Aquí se muestran para
+que el usuario pueda repetirlos a mano si hace falta.
+"""
+
+import datetime
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox)
+
+
+class DialogoConflictos(QDialog):
+    """Lista los conflictos registrados y permite descartarlos una vez revisados"""
+
+    # Conflictos mostrados como máximo (los más recientes)
+    LIMITE = 500
+
+    COLUMNAS = ("Fecha", "Colección", "Operación", "Documento", "Motivo", "Cambio descartado")
+
+    def __init__(self, replica, parent=None):
+        """
+        Inicializa el diálogo.
+
+        Args:
+            replica (ReplicaLocal): Réplica con los conflictos
+            parent: Widget padre
+        """
+        super().__init__(parent)
+        self.replica = replica
+        self.setWindowTitle("Conflictos de sincronización")
+        self.resize(900, 400)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(
+            "Estos cambios locales no se subieron porque el documento se modificó o eliminó "
+            "en el servidor. Se conserva la versión del servidor."
+        ))
+
+        self.tabla = QTableWidget(0, len(self.COLUMNAS))
+        self.tabla.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.tabla.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tabla.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.tabla)
+
+        botones = QHBoxLayout()
+        botones.addStretch()
+        self.btn_descartar = QPushButton("Descartar revisados")
+        self.btn_descartar.clicked.connect(self.descartar)
+        botones.addWidget(self.btn_descartar)
+        btn_cerrar = QPushButton("Cerrar")
+        btn_cerrar.clicked.connect(self.accept)
+        botones.addWidget(btn_cerrar)
+        layout.addLayout(botones)
+
+        self.cargar()
+
+    def cargar(self):
+        """Rellena la tabla con los conflictos más recientes"""
+        conflictos = self.replica.conflictos(self.LIMITE)
+        self.tabla.setRowCount(len(conflictos))
+        for fila, conflicto in enumerate(conflictos):
+            datos = dict(conflicto['datos'])
+            datos.pop('_id', None)
+            valores = (
+                datetime.datetime.fromtimestamp(conflicto['fecha']).strftime("%d/%m/%Y %H:%M"),
+                conflicto['coleccion'],
+                conflicto['operacion'],
+                conflicto['clave'],
+                conflicto['motivo'],
+                str(datos.get('actualizacion', datos.get('documento', ''))),
+            )
+            for columna, valor in enumerate(valores):
+                self.tabla.setItem(fila, columna, QTableWidgetItem(valor))
+        self.btn_descartar.setEnabled(bool(conflictos))
+
+    def descartar(self):
+        """Elimina los conflictos tras confirmarlo"""
+        respuesta = QMessageBox.question(
+            self, "Descartar conflictos",
+            "¿Descartar todos los conflictos? Los cambios descartados no se podrán recuperar.",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if respuesta == QMessageBox.Yes:
+            self.replica.descartar_conflictos()
+            self.cargar()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Recepción de los cambios del bus de eventos en una vista.
+
+Cada vista indica qué entidades muestra y cómo aplicar el cambio de un
+documento (normalmente, actualizar o quitar una fila). Mientras la vista está
+oculta los cambios solo se acumulan y se aplican cuando vuelve a mostrarse.
+"""
+
+from PyQt5.QtCore import QEvent, QObject, QTimer, pyqtSlot
+
+from database.eventos import BusEventos
+
+
+class ReceptorCambios(QObject):
+    """
+    Agrupa los cambios de unas entidades y los entrega a una vista.
+
+    Los cambios que llegan seguidos se entregan juntos, uno por documento (el
+    último). Si alguno no identifica el documento, si son más de
+    MAXIMO_PARCIALES o si la vista no sabe aplicar cambios sueltos, se pide
+    una sola recarga completa.
+    """
+
+    # Espera para agrupar ráfagas de cambios
+    RETARDO_MS = 100
+
+    # A partir de cuántos documentos pendientes se recarga la vista entera
+    MAXIMO_PARCIALES = 50
+
+    def __init__(self, vista, entidades, al_recargar, al_cambiar=None):
+        """
+        Inicializa el receptor y lo suscribe al bus.
+
+        Args:
+            vista (QWidget): Vista que muestra las entidades (padre del receptor)
+            entidades (tuple): Nombres de las colecciones que muestra
+            al_recargar (callable): Función sin argumentos que recarga la vista
+            al_cambiar (callable, optional): Función CambioEntidad -> None que
+                                             aplica el cambio de un documento
+        """
+        super().__init__(vista)
+        self._vista = vista
+        self._al_recargar = al_recargar
+        self._al_cambiar = al_cambiar
+        self._pendientes = {}
+        self._recargar = False
+
+        self._temporizador = QTimer(self)
+        self._temporizador.setSingleShot(True)
+        self._temporizador.setInterval(self.RETARDO_MS)
+        self._temporizador.timeout.connect(self._aplicar)
+
+        bus = BusEventos.instancia()
+        for entidad in entidades:
+            bus.suscribir(entidad, self._on_cambio)
+        vista.installEventFilter(self)
+
+    @property
+    def desactualizada(self):
+        """True si hay cambios sin aplicar"""
+        return self._recargar or bool(self._pendientes)
+
+    @pyqtSlot(object)
+    def _on_cambio(self, cambio):
+        """Acumula un cambio recibido del bus"""
+        if self._recargar:
+            pass
+        elif cambio.id is None or self._al_cambiar is None:
+            self._recargar = True
+            self._pendientes.clear()
+        else:
+            self._pendientes[(cambio.entidad, cambio.id)] = cambio
+            if len(self._pendientes) > self.MAXIMO_PARCIALES:
+                self._recargar = True
+                self._pendientes.clear()
+
+        # Oculta, espera a mostrarse
+        if self._vista.isVisible():
+            self._temporizador.start()
+
+    def eventFilter(self, objeto, evento):
+        if objeto is self._vista and evento.type() == QEvent.Show and self.desactualizada:
+            self._temporizador.start()
+        return False
+
+    def _aplicar(self):
+        """Entrega a la vista los cambios acumulados"""
+        if not self._vista.isVisible():
+            return
+
+        if self._recargar:
+            self._recargar = False
+            self._pendientes.clear()
+            self._al_recargar()
+            return
+
+        pendientes, self._pendientes = self._pendientes, {}
+        for cambio in pendientes.values():
+            self._al_cambiar(cambio)
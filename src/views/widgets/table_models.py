@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Modelos de tabla genéricos para las listas de la aplicación.
+
+Las vistas (QTableView) solo piden los datos de las celdas visibles, por lo
+que el coste de pintar la tabla no depende del número total de filas. Los
+textos se calculan al pedirlos; para saber qué filas cambiaron el modelo
+compara una versión barata de cada fila (ver ``EntityTableModel``).
+"""
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+
+# Rol con el que el modelo devuelve el objeto completo de una fila
+ROL_FILA = Qt.UserRole
+
+# Rol con el valor usado para ordenar una columna
+ROL_ORDEN = Qt.UserRole + 1
+
+
+class Columna:
+    """Definición de una columna de un EntityTableModel"""
+
+    def __init__(self, titulo, valor, fondo=None, orden=None):
+        """
+        Inicializa la columna.
+
+        Args:
+            titulo (str): Texto de la cabecera
+            valor (callable): Función fila -> texto a mostrar
+            fondo (callable, optional): Función fila -> QColor o None
+            orden (callable, optional): Función fila -> valor para ordenar.
+                                        Por defecto se ordena por el texto.
+        """
+        self.titulo = titulo
+        self.valor = valor
+        self.fondo = fondo
+        self.orden = orden
+
+
+class EntityTableModel(QAbstractTableModel):
+    """
+    Modelo de tabla sobre una lista de objetos (modelos o diccionarios).
+
+    Al recibir una lista nueva calcula las diferencias con la actual y emite
+    solo las inserciones, eliminaciones y cambios de las filas afectadas.
+    Una fila ha cambiado si cambia su versión: la propia fila si es una
+    tupla (las filas ligeras son namedtuples inmutables) o una copia
+    superficial de sus campos si es un diccionario.
+
+    Si se indica que hay más filas en el servidor, la vista pide la siguiente
+    página con fetchMore al llegar al final y el modelo emite
+    mas_filas_solicitadas; el widget responde llamando a anadir_filas.
+    """
+
+    # Señal emitida cuando la vista necesita la siguiente página de filas
+    mas_filas_solicitadas = pyqtSignal()
+
+    # A partir de cuántos bloques de filas nuevas se reinicia el modelo: cada
+    # inserción le cuesta O(N) al proxy, y con tantas es más barato reiniciar
+    MAXIMO_BLOQUES = 100
+
+    def __init__(self, columnas, clave, parent=None, version=None):
+        """
+        Inicializa el modelo.
+
+        Args:
+            columnas (list): Lista de objetos Columna
+            clave (callable): Función fila -> identificador único
+            parent (QObject, optional): Objeto padre
+            version (callable, optional): Función fila -> valor que cambia
+                                          cuando cambian sus datos
+        """
+        super().__init__(parent)
+        self.columnas = list(columnas)
+        self.clave = clave
+        self.version = version or self._version
+        self._filas = []
+        self._versiones = []
+        self._posiciones = {}
+        self._brochas = {}
+        self._hay_mas = False
+        self._pidiendo_mas = False
+
+    # --- API de QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._filas)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columnas)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        fila = self._filas[index.row()]
+        columna = self.columnas[index.column()]
+
+        if role == Qt.DisplayRole:
+            return str(columna.valor(fila))
+        if role == Qt.BackgroundRole and columna.fondo is not None:
+            return self._brocha(columna.fondo(fila))
+        if role == ROL_FILA:
+            return fila
+        if role == ROL_ORDEN:
+            if columna.orden is not None:
+                return columna.orden(fila)
+            return str(columna.valor(fila))
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columnas[section].titulo
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._hay_mas and not self._pidiendo_mas
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            # Solo una petición en curso hasta que lleguen las filas
+            self._pidiendo_mas = True
+            self.mas_filas_solicitadas.emit()
+
+    # --- Acceso a filas ---
+
+    def fila(self, row):
+        """Devuelve el objeto de la fila indicada"""
+        return self._filas[row]
+
+    def filas(self):
+        """Devuelve una copia de la lista de filas"""
+        return list(self._filas)
+
+    def fila_por_clave(self, clave):
+        """Devuelve la fila con la clave indicada o None"""
+        posicion = self._posiciones.get(clave)
+        return self._filas[posicion] if posicion is not None else None
+
+    # --- Actualización de datos ---
+
+    def hay_mas(self):
+        """True si quedan filas por cargar en el servidor"""
+        return self._hay_mas
+
+    def establecer_hay_mas(self, hay_mas):
+        """
+        Indica si quedan filas por cargar y permite una nueva petición.
+
+        Args:
+            hay_mas (bool): True si existe una página siguiente
+        """
+        self._hay_mas = bool(hay_mas)
+        self._pidiendo_mas = False
+
+    def anadir_filas(self, filas, hay_mas=False):
+        """
+        Añade al final las filas de una página nueva.
+
+        Las filas cuya clave ya está en el modelo se actualizan en su sitio
+        (pueden repetirse si los datos cambiaron entre dos páginas).
+
+        Args:
+            filas (list): Filas de la página
+            hay_mas (bool, optional): True si existe una página siguiente
+        """
+        nuevas = []
+        claves_nuevas = set()
+        for fila in filas:
+            clave = self.clave(fila)
+            if clave in self._posiciones:
+                self._actualizar_en(self._posiciones[clave], fila)
+            elif clave not in claves_nuevas:
+                claves_nuevas.add(clave)
+                nuevas.append(fila)
+
+        if nuevas:
+            inicio = len(self._filas)
+            self.beginInsertRows(QModelIndex(), inicio, inicio + len(nuevas) - 1)
+            self._filas.extend(nuevas)
+            self._versiones.extend(self.version(f) for f in nuevas)
+            for i, fila in enumerate(nuevas, inicio):
+                self._posiciones[self.clave(fila)] = i
+            self.endInsertRows()
+
+        self.establecer_hay_mas(hay_mas)
+
+    def establecer_filas(self, filas):
+        """
+        Sustituye el contenido del modelo aplicando solo las diferencias.
+
+        Args:
+            filas (list): Nueva lista de filas en el orden deseado
+        """
+        filas = list(filas)
+        claves_nuevas = [self.clave(f) for f in filas]
+        conjunto_nuevo = set(claves_nuevas)
+
+        if len(conjunto_nuevo) != len(claves_nuevas):
+            # Claves repetidas: no se puede calcular un diff fiable
+            self._reiniciar(filas)
+            return
+
+        # 1. Eliminar filas que ya no existen (de abajo arriba, por bloques)
+        eliminadas = [i for i, f in enumerate(self._filas) if self.clave(f) not in conjunto_nuevo]
+        for inicio, fin in reversed(self._bloques(eliminadas)):
+            self.beginRemoveRows(QModelIndex(), inicio, fin)
+            del self._filas[inicio:fin + 1]
+            del self._versiones[inicio:fin + 1]
+            self.endRemoveRows()
+
+        # Si las filas que quedan cambiaron de orden relativo, reiniciar
+        claves_actuales = [self.clave(f) for f in self._filas]
+        presentes = set(claves_actuales)
+        orden_restante = [c for c in claves_nuevas if c in presentes]
+        if orden_restante != claves_actuales:
+            self._reiniciar(filas)
+            return
+
+        bloques = sum(
+            1 for i, clave in enumerate(claves_nuevas)
+            if clave not in presentes and (i == 0 or claves_nuevas[i - 1] in presentes)
+        )
+        if bloques > self.MAXIMO_BLOQUES:
+            self._reiniciar(filas)
+            return
+
+        # 2. Recorrer la lista nueva insertando y actualizando en su posición.
+        # El índice de posiciones se reconstruye una sola vez, al final
+        insertadas = False
+        i = 0
+        while i < len(filas):
+            if claves_nuevas[i] in presentes:
+                self._actualizar_en(i, filas[i])
+                i += 1
+                continue
+
+            # Bloque contiguo de filas nuevas
+            fin = i
+            while fin + 1 < len(filas) and claves_nuevas[fin + 1] not in presentes:
+                fin += 1
+            self.beginInsertRows(QModelIndex(), i, fin)
+            self._filas[i:i] = filas[i:fin + 1]
+            self._versiones[i:i] = [self.version(f) for f in filas[i:fin + 1]]
+            self.endInsertRows()
+            insertadas = True
+            i = fin + 1
+
+        if eliminadas or insertadas:
+            self._reindexar()
+
+    def actualizar_fila(self, fila):
+        """
+        Actualiza una fila existente o la añade al final si no existe.
+
+        Args:
+            fila: Objeto con los datos nuevos
+        """
+        posicion = self._posiciones.get(self.clave(fila))
+        if posicion is None:
+            posicion = len(self._filas)
+            self.beginInsertRows(QModelIndex(), posicion, posicion)
+            self._filas.append(fila)
+            self._versiones.append(self.version(fila))
+            self._posiciones[self.clave(fila)] = posicion
+            self.endInsertRows()
+        else:
+            self._actualizar_en(posicion, fila)
+
+    def eliminar_clave(self, clave):
+        """
+        Elimina la fila con la clave indicada.
+
+        Returns:
+            bool: True si existía la fila
+        """
+        posicion = self._posiciones.get(clave)
+        if posicion is None:
+            return False
+        self.beginRemoveRows(QModelIndex(), posicion, posicion)
+        del self._filas[posicion]
+        del self._versiones[posicion]
+        # Solo se desplazan las filas que estaban detrás
+        del self._posiciones[clave]
+        for i in range(posicion, len(self._filas)):
+            self._posiciones[self.clave(self._filas[i])] = i
+        self.endRemoveRows()
+        return True
+
+    # --- Utilidades internas ---
+
+    def _version(self, fila):
+        """
+        Versión por defecto de una fila, sin formatear ningún texto.
+
+        Los diccionarios se copian porque pueden modificarse en su sitio; los
+        demás objetos mutables se comparan por lo que muestran sus columnas.
+        """
+        if isinstance(fila, tuple):
+            return fila
+        if isinstance(fila, dict):
+            return tuple(fila.items())
+        return tuple(columna.valor(fila) for columna in self.columnas)
+
+    def _actualizar_en(self, posicion, fila):
+        """Reemplaza una fila y notifica solo si cambiaron sus datos"""
+        version = self.version(fila)
+        self._filas[posicion] = fila
+        if version != self._versiones[posicion]:
+            self._versiones[posicion] = version
+            self.dataChanged.emit(
+                self.index(posicion, 0),
+                self.index(posicion, len(self.columnas) - 1)
+            )
+
+    def _reiniciar(self, filas):
+        """Sustituye todas las filas de golpe"""
+        self.beginResetModel()
+        self._filas = list(filas)
+        self._versiones = [self.version(f) for f in self._filas]
+        self._reindexar()
+        self.endResetModel()
+
+    def _reindexar(self):
+        """Reconstruye el índice clave -> posición"""
+        self._posiciones = {self.clave(f): i for i, f in enumerate(self._filas)}
+
+    def _brocha(self, color):
+        """Devuelve una QBrush reutilizable para un color"""
+        if color is None:
+            return None
+        color = QColor(color)
+        clave = color.rgba()
+        brocha = self._brochas.get(clave)
+        if brocha is None:
+            brocha = self._brochas[clave] = QBrush(color)
+        return brocha
+
+    @staticmethod
+    def _bloques(posiciones):
+        """Agrupa posiciones ordenadas en rangos contiguos [(inicio, fin), ...]"""
+        bloques = []
+        for p in posiciones:
+            if bloques and bloques[-1][1] == p - 1:
+                bloques[-1] = (bloques[-1][0], p)
+            else:
+                bloques.append((p, p))
+        return bloques
+
+
+class FiltroProxyModel(QSortFilterProxyModel):
+    """
+    Proxy de ordenación y filtrado sobre un EntityTableModel.
+
+    Los filtros son funciones fila -> bool registradas por nombre; una fila se
+    muestra si todas devuelven True.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._filtros = {}
+        self.setSortRole(ROL_ORDEN)
+        self.setSortCaseSensitivity(Qt.CaseInsensitive)
+        self.setDynamicSortFilter(True)
+
+    def establecer_filtro(self, nombre, predicado):
+        """
+        Registra o quita un filtro.
+
+        Args:
+            nombre (str): Nombre del filtro
+            predicado (callable or None): Función fila -> bool. None lo elimina.
+        """
+        if predicado is None:
+            self._filtros.pop(nombre, None)
+        else:
+            self._filtros[nombre] = predicado
+        self.invalidateFilter()
+
+    def limpiar_filtros(self):
+        """Elimina todos los filtros"""
+        self._filtros.clear()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._filtros:
+            return True
+        fila = self.sourceModel().fila(source_row)
+        return all(predicado(fila) for predicado in self._filtros.values())
+
+    def fila(self, index_o_row):
+        """
+        Devuelve el objeto de una fila del proxy.
+
+        Args:
+            index_o_row (QModelIndex or int): Índice o número de fila del proxy
+        """
+        if not isinstance(index_o_row, QModelIndex):
+            index_o_row = self.index(index_o_row, 0)
+        origen = self.mapToSource(index_o_row)
+        return self.sourceModel().fila(origen.row())